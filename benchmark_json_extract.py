@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark voor de JSON-extractie uit LLM-antwoorden (_extract_json).
+
+Vergelijkt de oude brace-scan (per '{' opnieuw tot het einde scannen) met de
+huidige enkele doorloop via json.JSONDecoder.raw_decode, op realistische
+antwoordgroottes met en zonder denktekst vóór de JSON.
+"""
+
+import json
+import sys
+import time
+
+# Voeg src directory toe aan Python path
+sys.path.append('src')
+
+from analysis.criterion_checking import _extract_json
+
+
+def _extract_json_oud(text: str) -> dict:
+    """Stap 3 van de vorige implementatie (kwadratisch in het aantal accolades)."""
+    brace_positions = [i for i, c in enumerate(text) if c == '{']
+    candidates = []
+    for start in brace_positions:
+        depth = 0
+        end = -1
+        in_string = False
+        escape_next = False
+        for j in range(start, len(text)):
+            ch = text[j]
+            if escape_next:
+                escape_next = False
+                continue
+            if ch == '\\' and in_string:
+                escape_next = True
+                continue
+            if ch == '"':
+                in_string = not in_string
+                continue
+            if in_string:
+                continue
+            if ch == '{':
+                depth += 1
+            elif ch == '}':
+                depth -= 1
+                if depth == 0:
+                    end = j
+                    break
+        if end > start:
+            try:
+                candidates.append((end - start, json.loads(text[start:end + 1])))
+            except json.JSONDecodeError:
+                continue
+    matches = [(s, o) for s, o in candidates if 'oordeel' in o and 'problemen' in o]
+    return max(matches or candidates, key=lambda x: x[0])[1]
+
+
+def _maak_antwoord(n_problemen: int, preambule: str) -> str:
+    antwoord = {
+        'oordeel': 'matig',
+        'problemen': [
+            {
+                'citaat': f'De onderzoeker stelt in alinea {i} dat {{x}} geldt.',
+                'probleem': 'Bewering zonder bronvermelding.',
+                'suggestie': 'Voeg een bron toe (APA 7).',
+            }
+            for i in range(n_problemen)
+        ],
+        'samenvatting': 'De sectie is inhoudelijk redelijk maar onvoldoende onderbouwd.',
+    }
+    return preambule + json.dumps(antwoord, ensure_ascii=False)
+
+
+def _meet(func, text: str, herhalingen: int) -> float:
+    start = time.perf_counter()
+    for _ in range(herhalingen):
+        func(text)
+    return (time.perf_counter() - start) / herhalingen * 1000
+
+
+def run_benchmark():
+    print("⏱️  Benchmark JSON-extractie uit LLM-antwoorden\n")
+    gevallen = [
+        ('klein, geen preambule',   _maak_antwoord(3, 'Hier is mijn beoordeling:\n')),
+        ('groot, geen preambule',   _maak_antwoord(40, 'Hier is mijn beoordeling:\n')),
+        ('groot, denktekst met {}', _maak_antwoord(40, 'Ik overweeg {a} en {b}. ' * 200)),
+    ]
+    print(f"{'geval':<26} {'bytes':>8} {'oud (ms)':>10} {'nieuw (ms)':>11} {'factor':>8}")
+    for naam, tekst in gevallen:
+        # Beide implementaties moeten hetzelfde object opleveren
+        assert _extract_json_oud(tekst) == _extract_json(tekst)
+        oud = _meet(_extract_json_oud, tekst, 5)
+        nieuw = _meet(_extract_json, tekst, 5)
+        print(f"{naam:<26} {len(tekst):>8} {oud:>10.2f} {nieuw:>11.2f} {oud / max(nieuw, 1e-6):>7.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+End-to-end loadtest van de LLM-pijplijn tegen de lokale stub (llm_stub_server.py).
+
+Draait generate_feedback op een synthetisch document met de echte planner, retries,
+cache-warming, streaming en SDK's — alleen de API aan de andere kant is nagebootst.
+Rapporteert doorlooptijd, calls per seconde, latency en cachegebruik.
+
+Voorbeelden:
+    python benchmark_llm_pipeline.py
+    python benchmark_llm_pipeline.py --sections 12 --criteria 6 --latency-median 1.5 --rate-limit-p 0.05
+    python benchmark_llm_pipeline.py --stub-url http://127.0.0.1:8765 --model gemini-2.5-flash
+"""
+
+import argparse
+import json
+import sys
+import time
+import urllib.request
+
+# Voeg src directory toe aan Python path
+sys.path.append('src')
+
+from config import Config
+from llm_stub_server import start_stub_server
+
+
+def _document(n_sections: int, paragraphs: int) -> tuple:
+    """Synthetisch document: (volledige tekst, herkende secties)."""
+    sections, parts, pos = [], [], 0
+    for i in range(n_sections):
+        body = '\n\n'.join(
+            f"Paragraaf {i}.{j}: de onderzoeker bespreekt artikel {j} van de wet en de "
+            f"gevolgen voor de huurder. De rechtspraak is op dit punt niet eenduidig. " * 3
+            for j in range(paragraphs)
+        )
+        text = f"Hoofdstuk {i + 1}\n\n{body}"
+        sections.append({
+            'name': f"Hoofdstuk {i + 1}", 'identifier': f"h{i + 1}", 'content': body,
+            'db_id': i + 1, 'found': True, 'level': 1,
+            'start_char': pos, 'end_char': pos + len(text), 'heading_text': f"Hoofdstuk {i + 1}",
+        })
+        parts.append(text)
+        pos += len(text) + 2
+    return '\n\n'.join(parts), sections
+
+
+def _criteria(n: int, model: str) -> list:
+    return [{
+        'id': 100 + i, 'name': f"Criterium {i + 1}", 'check_type': 'llm_review',
+        'application_scope': 'all', 'is_enabled': 1, 'severity': 'warning', 'color': '#4895EF',
+        'parameters': json.dumps({'llm_model': model,
+                                  'llm_criteria_prompt': f"Controleer aspect {i + 1} van de argumentatie."}),
+        'error_message': None, 'fixed_feedback_text': None, 'section_mappings': [],
+    } for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sections', type=int, default=8)
+    parser.add_argument('--paragraphs', type=int, default=6, help='alinea\'s per sectie')
+    parser.add_argument('--criteria', type=int, default=4)
+    parser.add_argument('--model', default='claude-haiku-4-5')
+    parser.add_argument('--stub-url', help='bestaande stub gebruiken i.p.v. er een te starten')
+    parser.add_argument('--latency-median', type=float, default=0.8)
+    parser.add_argument('--latency-sigma', type=float, default=0.4)
+    parser.add_argument('--tokens-per-s', type=float, default=150.0)
+    parser.add_argument('--rate-limit-p', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = None
+    url = args.stub_url
+    if not url:
+        server = start_stub_server(
+            latency_median=args.latency_median, latency_sigma=args.latency_sigma,
+            tokens_per_s=args.tokens_per_s, rate_limit_p=args.rate_limit_p, seed=args.seed,
+        )
+        url = server.url
+    Config.ANTHROPIC_BASE_URL = url
+    Config.GEMINI_BASE_URL = url
+    Config.LLM_DOCUMENT_DIGEST = False
+
+    from analysis import criterion_checking
+    from analysis.llm_resilience import breaker_stats
+
+    doc_text, sections = _document(args.sections, args.paragraphs)
+    criteria = _criteria(args.criteria, args.model)
+    document_id = -1
+    criterion_checking.reset_token_usage(document_id)
+
+    print(f"Stub: {url} | {args.sections} secties × {args.criteria} criteria | model={args.model} | "
+          f"LLM_MAX_WORKERS={Config.LLM_MAX_WORKERS} | LLM_MAX_CONCURRENT_CALLS={Config.LLM_MAX_CONCURRENT_CALLS}")
+    t0 = time.time()
+    items = criterion_checking.generate_feedback(doc_text, sections, criteria, None, document_id, None)
+    elapsed = time.time() - t0
+
+    usage = criterion_checking.get_token_usage_summary(document_id)
+    stub_stats = json.load(urllib.request.urlopen(f"{url}/stats"))
+    print(f"\nDoorlooptijd        : {elapsed:.2f}s")
+    print(f"Feedback-items      : {len(items)}")
+    print(f"LLM-calls           : {usage['calls']} ({usage['calls'] / elapsed:.1f}/s)")
+    print(f"Stub-requests       : {stub_stats['requests']} (429: {stub_stats['rate_limited']}, "
+          f"fouten: {stub_stats['errors']}, gestreamd: {stub_stats['streamed']})")
+    print(f"Tokens in/uit       : {usage['input_tokens']} / {usage['output_tokens']}")
+    print(f"Cache created/read  : {usage['cache_created']} / {usage['cache_read']} "
+          f"(hit ratio {usage['cache_hit_ratio']:.0%})")
+    for b in breaker_stats():
+        print(f"Latency {b['provider']:<10}: p50={b['p50_s']}s p95={b['p95_s']}s "
+              f"(breaker {b['state']}, {b['failures']} fouten)")
+    if server:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,11 @@ Zodra een bestand verschijnt:
 
 Gebruik:
     python docucheck_watcher.py [MAP]
+    python docucheck_watcher.py --batch MAP
+
+Met --batch worden alle .docx bestanden in MAP in één keer als batch geüpload (een hele
+klas); de server analyseert ze parallel en de watcher pakt de ZIP met gecommentarieerde
+bestanden uit in MAP/feedback.
 
 Standaard map: huidige werkmap (.)
 Configuratie onderaan dit bestand of via omgevingsvariabelen.
@@ -17,9 +22,11 @@ Configuratie onderaan dit bestand of via omgevingsvariabelen.
 
 import os
 import sys
+import json
 import time
 import logging
 import shutil
+import zipfile
 import requests
 from pathlib import Path
 from watchdog.observers import Observer
@@ -35,6 +42,7 @@ DOCUMENT_TYPE   = os.environ.get('DOCUCHECK_DOCTYPE',  '3')    # ID van document
 ORGANIZATION    = os.environ.get('DOCUCHECK_ORG',      '1')    # ID van organisatie
 POLL_INTERVAL   = 3     # seconden tussen statuschecks
 MAX_WAIT        = 300   # maximaal 5 minuten wachten op analyse
+BATCH_MAX_WAIT  = 4 * 3600  # maximaal 4 uur wachten op een batch
 FEEDBACK_SUFFIX = '_feedback'  # toegevoegd aan bestandsnaam
 
 # ---------------------------------------------------------------------------
@@ -105,8 +113,13 @@ class DocuCheckClient:
             )
 
         if resp.status_code == 201:
-            doc_id = resp.json()['document_id']
-            log.info('Document geupload: id=%d', doc_id)
+            body = resp.json()
+            doc_id = body['document_id']
+            if body.get('duplicate_of'):
+                log.info('Document geupload: id=%d (identiek aan document %d, analyse overgenomen)',
+                         doc_id, body['duplicate_of'])
+            else:
+                log.info('Document geupload: id=%d', doc_id)
             return doc_id
 
         raise RuntimeError(
@@ -116,7 +129,71 @@ class DocuCheckClient:
     def wait_for_analysis(self, document_id: int,
                           poll_interval: int = POLL_INTERVAL,
                           max_wait: int = MAX_WAIT) -> bool:
-        """Wacht tot de analyse klaar is. Geeft True terug bij succes."""
+        """Wacht tot de analyse klaar is. Geeft True terug bij succes.
+
+        Volgt de voortgangsstream (Server-Sent Events); valt terug op polling van de
+        status-API als de server geen stream aanbiedt.
+        """
+        deadline = time.monotonic() + max_wait
+        try:
+            status = self._follow_events(document_id, deadline)
+        except Exception as exc:
+            log.info('Voortgangsstream niet beschikbaar (%s), terug naar polling', exc)
+            status = self._poll_status(document_id, poll_interval,
+                                       max(0, int(deadline - time.monotonic())))
+        if status == 'completed':
+            log.info('Analyse voltooid (document %d)', document_id)
+            return True
+        if status == 'failed':
+            log.error('Analyse mislukt (document %d)', document_id)
+            return False
+        log.error('Timeout na %ds (document %d)', max_wait, document_id)
+        return False
+
+    def _follow_events(self, document_id: int, deadline: float) -> str:
+        """Lees /api/analysis/<id>/events tot een status-event; '' bij timeout."""
+        url = f'{self.base_url}/api/analysis/{document_id}/events'
+        last_id = None
+        while time.monotonic() < deadline:
+            headers = {'Accept': 'text/event-stream'}
+            if last_id is not None:
+                headers['Last-Event-ID'] = last_id
+            with self.session.get(url, headers=headers, stream=True, timeout=(10, 60)) as resp:
+                resp.raise_for_status()
+                if not resp.headers.get('Content-Type', '').startswith('text/event-stream'):
+                    raise RuntimeError(f'geen event-stream (HTTP {resp.status_code})')
+                event, data = None, ''
+                for line in resp.iter_lines(decode_unicode=True):
+                    if line.startswith('id:'):
+                        last_id = line[3:].strip()
+                    elif line.startswith('event:'):
+                        event = line[6:].strip()
+                    elif line.startswith('data:'):
+                        data += line[5:].strip()
+                    elif not line and event:
+                        payload = json.loads(data or '{}')
+                        if event == 'status':
+                            return payload.get('status', '')
+                        if event == 'progress':
+                            self._log_progress(payload)
+                        event, data = None, ''
+                    if time.monotonic() >= deadline:
+                        return ''
+            # Stream gesloten door de server (maximale duur): opnieuw verbinden
+        return ''
+
+    @staticmethod
+    def _log_progress(progress: dict):
+        stage = progress.get('stage')
+        if progress.get('total'):
+            eta = progress.get('eta_s')
+            log.info('Analyse bezig: %s %d/%d%s', stage, progress.get('done', 0), progress['total'],
+                     f' (nog ~{eta:.0f}s)' if eta else '')
+        else:
+            log.info('Analyse bezig: %s', stage)
+
+    def _poll_status(self, document_id: int, poll_interval: int, max_wait: int) -> str:
+        """Poll de status-API tot 'completed' of 'failed'; '' bij timeout."""
         url = f'{self.base_url}/api/analysis/{document_id}/status'
         elapsed = 0
         while elapsed < max_wait:
@@ -127,19 +204,12 @@ class DocuCheckClient:
                 log.warning('Statuscheck mislukt: %s', exc)
                 status = 'unknown'
 
-            if status == 'completed':
-                log.info('Analyse voltooid (document %d)', document_id)
-                return True
-            elif status == 'failed':
-                log.error('Analyse mislukt (document %d)', document_id)
-                return False
-            else:
-                log.info('Analyse bezig... (%ds)', elapsed)
-                time.sleep(poll_interval)
-                elapsed += poll_interval
-
-        log.error('Timeout na %ds (document %d)', max_wait, document_id)
-        return False
+            if status in ('completed', 'failed'):
+                return status
+            log.info('Analyse bezig... (%ds)', elapsed)
+            time.sleep(poll_interval)
+            elapsed += poll_interval
+        return ''
 
     def download_feedback(self, document_id: int, output_path: Path) -> bool:
         """Download het feedback Word-document."""
@@ -159,6 +229,67 @@ class DocuCheckClient:
         log.info('Feedback opgeslagen: %s', output_path)
         return True
 
+    def upload_batch(self, paths: list, document_type_id: str, organization_id: str,
+                     name: str = None) -> dict:
+        """Upload meerdere .docx bestanden als één batch. Geeft de batchstatus terug."""
+        handles = [open(p, 'rb') for p in paths]
+        try:
+            resp = self.session.post(
+                f'{self.base_url}/api/batches',
+                data={'document_type_id': document_type_id,
+                      'organization_id':  organization_id,
+                      'name':             name or ''},
+                files=[('files', (p.name, f, 'application/vnd.openxmlformats-officedocument'
+                                              '.wordprocessingml.document'))
+                       for p, f in zip(paths, handles)],
+                timeout=300,
+            )
+        finally:
+            for f in handles:
+                f.close()
+        if resp.status_code != 201:
+            raise RuntimeError(f'Batch-upload mislukt (HTTP {resp.status_code}): {resp.text[:200]}')
+        batch = resp.json()
+        log.info('Batch %d geupload: %d document(en), %d overgeslagen',
+                 batch['id'], batch['total'], len(batch.get('skipped') or []))
+        return batch
+
+    def wait_for_batch(self, batch_id: int, poll_interval: int = POLL_INTERVAL * 5,
+                       max_wait: int = BATCH_MAX_WAIT) -> dict:
+        """Poll de batchstatus tot alle documenten klaar zijn; None bij timeout."""
+        deadline = time.monotonic() + max_wait
+        while time.monotonic() < deadline:
+            try:
+                batch = self.session.get(f'{self.base_url}/api/batches/{batch_id}', timeout=30).json()
+            except Exception as exc:
+                log.warning('Batchstatus mislukt: %s', exc)
+            else:
+                if batch.get('status') == 'done':
+                    return batch
+                log.info('Batch %d: %d/%d klaar (%d mislukt)', batch_id,
+                         batch['completed'] + batch['failed'], batch['total'], batch['failed'])
+            time.sleep(poll_interval)
+        log.error('Timeout na %ds (batch %d)', max_wait, batch_id)
+        return None
+
+    def download_batch(self, batch_id: int, output_dir: Path) -> bool:
+        """Download de ZIP met gecommentarieerde bestanden en pak hem uit in output_dir."""
+        resp = self.session.get(f'{self.base_url}/api/batches/{batch_id}/export',
+                                timeout=600, stream=True)
+        if resp.status_code != 200:
+            log.error('Download mislukt: HTTP %d', resp.status_code)
+            return False
+        output_dir.mkdir(exist_ok=True)
+        zip_path = output_dir / f'batch_{batch_id}.zip'
+        with open(zip_path, 'wb') as f:
+            for chunk in resp.iter_content(chunk_size=8192):
+                f.write(chunk)
+        with zipfile.ZipFile(zip_path) as zf:
+            zf.extractall(output_dir)
+        zip_path.unlink()
+        log.info('Feedback van batch %d opgeslagen in %s', batch_id, output_dir)
+        return True
+
 
 # ---------------------------------------------------------------------------
 # Bestandssysteem-watcher
@@ -217,8 +348,25 @@ class DocxHandler(FileSystemEventHandler):
 # ---------------------------------------------------------------------------
 # Hoofdprogramma
 # ---------------------------------------------------------------------------
+def run_batch(client: DocuCheckClient, folder: Path) -> bool:
+    """Verwerk alle .docx bestanden in folder als één batch."""
+    paths = sorted(p for p in folder.iterdir()
+                   if p.suffix.lower() == '.docx' and FEEDBACK_SUFFIX not in p.stem
+                   and not p.name.startswith('~$'))
+    if not paths:
+        log.error('Geen .docx bestanden in %s', folder)
+        return False
+    batch = client.upload_batch(paths, DOCUMENT_TYPE, ORGANIZATION, name=folder.name)
+    if client.wait_for_batch(batch['id']) is None:
+        return False
+    return client.download_batch(batch['id'], folder / 'feedback')
+
+
 def main():
-    watch_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path('.')
+    args = sys.argv[1:]
+    batch_mode = '--batch' in args
+    args = [a for a in args if a != '--batch']
+    watch_dir = Path(args[0]) if args else Path('.')
     watch_dir = watch_dir.resolve()
 
     if not watch_dir.is_dir():
@@ -247,6 +395,9 @@ def main():
         log.error('Inloggen mislukt: %s', exc)
         sys.exit(1)
 
+    if batch_mode:
+        sys.exit(0 if run_batch(client, watch_dir) else 1)
+
     handler  = DocxHandler(client, watch_dir)
     observer = Observer()
     observer.schedule(handler, str(watch_dir), recursive=False)
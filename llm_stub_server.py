@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Lokale stand-in voor de Anthropic- en Gemini-API, voor load- en latencytests zonder tokens.
+
+Zet ANTHROPIC_BASE_URL en/of GEMINI_BASE_URL op de URL van deze server; _call_llm
+gebruikt dan de echte SDK's (streaming, tool-use, JSON-modus, retries) tegen de stub.
+
+Nagebootst:
+  - Anthropic POST /v1/messages            (JSON en SSE-streaming, tool-use)
+  - Gemini    POST /v1beta/models/{m}:generateContent / :streamGenerateContent
+  - latency   : time-to-first-token lognormaal verdeeld (mediaan, sigma) + outputsnelheid
+  - 429's     : kans per request (--rate-limit-p) en/of een limiet per minuut (--rpm)
+  - 5xx       : kans per request (--error-p)
+  - prompt-cache (Anthropic): prefix t/m het laatste cache_control-blok; een herhaalde
+                prefix binnen --cache-ttl telt als cache_read, anders cache_creation
+  - antwoorden: uit een JSONL-bestand (--replies; per regel 'prompt_sha256' of 'contains'
+                plus 'reply'), anders gegenereerd uit het gevraagde JSON-schema met citaten
+                uit de prompt. Met --record worden alle geleverde antwoorden als JSONL
+                weggeschreven; dat bestand is als --replies opnieuw af te spelen.
+
+Alle willekeur is deterministisch per (seed, prompt, volgnummer van die prompt).
+
+Gebruik:
+    python llm_stub_server.py --port 8765 --latency-median 1.2 --rate-limit-p 0.05
+    GET  /stats  → tellers (requests, 429's, cache)     POST /reset → tellers en cache leeg
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_GEMINI_PATH_RE = re.compile(r'^/v1(?:beta)?/models/([^/:]+):(generateContent|streamGenerateContent)')
+_SECTION_RE     = re.compile(r'\[TE BEOORDELEN SECTIE[^\]]*\]\n(.*?)\n\[/TE BEOORDELEN SECTIE\]', re.S)
+_SENTENCE_RE    = re.compile(r'[^.!?\n]{25,200}[.!?]')
+
+# Minimale prefixgrootte (tokens) waaronder Anthropic niet cachet
+_MIN_CACHE_TOKENS = 1024
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text or '') // 4)
+
+
+class StubOptions:
+    """Instellingen van de stub (zie argparse in main voor de betekenis)."""
+
+    def __init__(self, latency_median=0.8, latency_sigma=0.4, tokens_per_s=150.0,
+                 rate_limit_p=0.0, rpm=0, error_p=0.0, retry_after=1, cache_ttl=300.0,
+                 seed=0, replies=None, record=None):
+        self.latency_median = latency_median
+        self.latency_sigma  = latency_sigma
+        self.tokens_per_s   = tokens_per_s
+        self.rate_limit_p   = rate_limit_p
+        self.rpm            = rpm
+        self.error_p        = error_p
+        self.retry_after    = retry_after
+        self.cache_ttl      = cache_ttl
+        self.seed           = seed
+        self.replies        = replies
+        self.record         = record
+
+
+class StubState:
+    """Gedeelde toestand van de server: cache, tellers, opgenomen antwoorden."""
+
+    def __init__(self, options: StubOptions):
+        self.options = options
+        self.lock = threading.Lock()
+        self.replies = _load_replies(options.replies)
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.cache = {}              # prefix-hash → verlooptijd
+            self.prompt_counts = {}      # prompt-hash → aantal keer gezien
+            self.window = []             # tijdstippen van requests (voor --rpm)
+            self.stats = {
+                'requests': 0, 'rate_limited': 0, 'errors': 0,
+                'anthropic': 0, 'gemini': 0, 'streamed': 0,
+                'input_tokens': 0, 'output_tokens': 0,
+                'cache_created': 0, 'cache_read': 0,
+            }
+
+    def rng_for(self, prompt_hash: str) -> random.Random:
+        with self.lock:
+            n = self.prompt_counts.get(prompt_hash, 0)
+            self.prompt_counts[prompt_hash] = n + 1
+        return random.Random(f"{self.options.seed}:{prompt_hash}:{n}")
+
+    def admit(self, rng: random.Random):
+        """None als het request door mag, anders (status, soort) van de geïnjecteerde fout."""
+        now = time.time()
+        with self.lock:
+            self.stats['requests'] += 1
+            if self.options.rpm:
+                self.window = [t for t in self.window if now - t < 60]
+                if len(self.window) >= self.options.rpm:
+                    self.stats['rate_limited'] += 1
+                    return 429, 'rate_limit'
+                self.window.append(now)
+            if rng.random() < self.options.rate_limit_p:
+                self.stats['rate_limited'] += 1
+                return 429, 'rate_limit'
+            if rng.random() < self.options.error_p:
+                self.stats['errors'] += 1
+                return 529, 'overloaded'
+        return None
+
+    def cache_lookup(self, prefix_hash: str, prefix_tokens: int) -> tuple:
+        """(cache_created, cache_read) voor een cachebare prefix."""
+        now = time.time()
+        with self.lock:
+            hit = self.cache.get(prefix_hash, 0) > now
+            self.cache[prefix_hash] = now + self.options.cache_ttl
+            key = 'cache_read' if hit else 'cache_created'
+            self.stats[key] += prefix_tokens
+        return (0, prefix_tokens) if hit else (prefix_tokens, 0)
+
+    def count(self, **kwargs):
+        with self.lock:
+            for k, v in kwargs.items():
+                self.stats[k] += v
+
+    def find_reply(self, prompt_hash: str, prompt: str):
+        for entry in self.replies:
+            if entry.get('prompt_sha256') == prompt_hash:
+                return entry['reply']
+        for entry in self.replies:
+            if entry.get('contains') and entry['contains'] in prompt:
+                return entry['reply']
+        return None
+
+    def record(self, prompt_hash: str, model: str, reply):
+        if not self.options.record:
+            return
+        line = json.dumps({'prompt_sha256': prompt_hash, 'model': model, 'reply': reply},
+                          ensure_ascii=False)
+        with self.lock:
+            with open(self.options.record, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+def _load_replies(path):
+    if not path:
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ---------------------------------------------------------------------------
+# Antwoorden genereren
+# ---------------------------------------------------------------------------
+
+def _quotes_from_prompt(prompt: str) -> list:
+    """Zinnen uit de te beoordelen sectie (of de hele prompt) — bruikbaar als citaat."""
+    m = _SECTION_RE.search(prompt)
+    source = m.group(1) if m else prompt
+    return [s.strip() for s in _SENTENCE_RE.findall(source)] or ['(geen citaat)']
+
+
+# Gemini-REST stuurt schema-types als proto-enum (Type.STRING = 1, ...)
+_GEMINI_TYPES = {1: 'string', 2: 'number', 3: 'integer', 4: 'boolean', 5: 'array', 6: 'object'}
+
+
+def _fake_from_schema(schema: dict, rng: random.Random, quotes: list, key: str = ''):
+    """Waarde die aan een (Anthropic- of Gemini-)JSON-schema voldoet."""
+    schema = schema or {}
+    kind = schema.get('type', 'object')
+    kind = _GEMINI_TYPES.get(kind, str(kind)).lower()
+    if schema.get('enum'):
+        if key == 'oordeel':
+            return rng.choices(schema['enum'], weights=[1, 3, 4, 2][:len(schema['enum'])])[0]
+        return rng.choice(schema['enum'])
+    if kind == 'object':
+        return {k: _fake_from_schema(v, rng, quotes, k) for k, v in (schema.get('properties') or {}).items()}
+    if kind == 'array':
+        return [_fake_from_schema(schema.get('items'), rng, quotes, key) for _ in range(rng.randint(0, 3))]
+    if kind in ('integer', 'number'):
+        return rng.randint(0, 10)
+    if kind == 'boolean':
+        return rng.random() < 0.5
+    if key == 'citaat':
+        return rng.choice(quotes)
+    return f"Stub-{key or 'tekst'} {rng.randint(1000, 9999)}."
+
+
+_DEFAULT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'oordeel': {'type': 'string', 'enum': ['onvoldoende', 'matig', 'voldoende', 'goed']},
+        'problemen': {'type': 'array', 'items': {'type': 'object', 'properties': {
+            'citaat': {'type': 'string'}, 'probleem': {'type': 'string'}, 'suggestie': {'type': 'string'},
+        }}},
+        'samenvatting': {'type': 'string'},
+    },
+}
+
+
+# ---------------------------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------------------------
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = 'LlmStub/1.0'
+
+    def log_message(self, fmt, *args):
+        pass   # stil; tellers via /stats
+
+    @property
+    def state(self) -> StubState:
+        return self.server.state
+
+    # -- hulpfuncties ------------------------------------------------------
+    def _send_json(self, status: int, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _sleep_ttft(self, rng: random.Random):
+        o = self.state.options
+        if o.latency_median > 0:
+            time.sleep(o.latency_median * math.exp(rng.gauss(0, o.latency_sigma)))
+
+    def _output_delay(self, tokens: int) -> float:
+        tps = self.state.options.tokens_per_s
+        return tokens / tps if tps > 0 else 0.0
+
+    # -- routes ------------------------------------------------------------
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            with self.state.lock:
+                stats = dict(self.state.stats)
+            return self._send_json(200, stats)
+        self._send_json(404, {'error': 'onbekend pad'})
+
+    def do_POST(self):
+        if self.path.rstrip('/') == '/reset':
+            self.state.reset()
+            return self._send_json(200, {'ok': True})
+        if self.path.startswith('/v1/messages'):
+            return self._anthropic(self._read_json())
+        m = _GEMINI_PATH_RE.match(self.path)
+        if m:
+            return self._gemini(m.group(1), m.group(2) == 'streamGenerateContent', self._read_json())
+        self._send_json(404, {'error': 'onbekend pad'})
+
+    # -- Anthropic ---------------------------------------------------------
+    def _anthropic(self, req: dict):
+        system = req.get('system') or ''
+        if isinstance(system, list):
+            system = '\n'.join(b.get('text', '') for b in system)
+        tools = req.get('tools') or []
+        blocks = []
+        for msg in req.get('messages') or []:
+            content = msg.get('content')
+            blocks.extend([{'type': 'text', 'text': content}] if isinstance(content, str) else content or [])
+        texts = [b.get('text', '') for b in blocks]
+        prompt = system + '\n' + '\n'.join(texts)
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        rng = self.state.rng_for(prompt_hash)
+        self.state.count(anthropic=1)
+
+        failure = self.state.admit(rng)
+        if failure:
+            status, kind = failure
+            err = 'rate_limit_error' if kind == 'rate_limit' else 'overloaded_error'
+            return self._send_json(status, {'type': 'error', 'error': {'type': err, 'message': f'stub: {kind}'}},
+                                   headers={'retry-after': str(self.state.options.retry_after)})
+
+        # Prompt-cache: tools → system → blokken t/m het laatste cache_control-blok
+        total_tokens = estimate_tokens(json.dumps(tools)) + estimate_tokens(prompt)
+        last_cached = max((i for i, b in enumerate(blocks) if b.get('cache_control')), default=None)
+        cache_created = cache_read = 0
+        if last_cached is not None:
+            prefix = json.dumps(tools) + system + ''.join(texts[:last_cached + 1])
+            prefix_tokens = estimate_tokens(prefix)
+            if prefix_tokens >= _MIN_CACHE_TOKENS:
+                prefix_hash = hashlib.sha256(f"{req.get('model')}|{prefix}".encode('utf-8')).hexdigest()
+                cache_created, cache_read = self.state.cache_lookup(prefix_hash, prefix_tokens)
+        input_tokens = max(1, total_tokens - cache_created - cache_read)
+
+        tool = tools[0] if tools and (req.get('tool_choice') or {}).get('type') == 'tool' else None
+        reply = self.state.find_reply(prompt_hash, prompt)
+        if reply is None:
+            reply = _fake_from_schema(tool['input_schema'] if tool else _DEFAULT_SCHEMA, rng,
+                                      _quotes_from_prompt(prompt))
+        self.state.record(prompt_hash, req.get('model'), reply)
+        reply_text = reply if isinstance(reply, str) else json.dumps(reply, ensure_ascii=False)
+        output_tokens = estimate_tokens(reply_text)
+        self.state.count(input_tokens=input_tokens, output_tokens=output_tokens)
+
+        usage = {'input_tokens': input_tokens, 'output_tokens': output_tokens,
+                 'cache_creation_input_tokens': cache_created, 'cache_read_input_tokens': cache_read}
+        if tool and not isinstance(reply, str):
+            block = {'type': 'tool_use', 'id': f"toolu_stub{rng.randint(0, 10**9)}",
+                     'name': tool['name'], 'input': reply}
+            stop_reason = 'tool_use'
+        else:
+            block = {'type': 'text', 'text': reply_text}
+            stop_reason = 'end_turn'
+        message = {
+            'id': f"msg_stub{rng.randint(0, 10**9)}", 'type': 'message', 'role': 'assistant',
+            'model': req.get('model'), 'content': [block], 'stop_reason': stop_reason,
+            'stop_sequence': None, 'usage': usage,
+        }
+
+        self._sleep_ttft(rng)
+        if not req.get('stream'):
+            time.sleep(self._output_delay(output_tokens))
+            return self._send_json(200, message)
+
+        self.state.count(streamed=1)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        def event(name, data):
+            self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        event('message_start', {'type': 'message_start', 'message': {
+            **message, 'content': [], 'stop_reason': None, 'usage': {**usage, 'output_tokens': 1}}})
+        if block['type'] == 'tool_use':
+            event('content_block_start', {'type': 'content_block_start', 'index': 0,
+                                          'content_block': {**block, 'input': {}}})
+            delta_key, delta_type = 'partial_json', 'input_json_delta'
+        else:
+            event('content_block_start', {'type': 'content_block_start', 'index': 0,
+                                          'content_block': {'type': 'text', 'text': ''}})
+            delta_key, delta_type = 'text', 'text_delta'
+        for piece in _pieces(reply_text):
+            time.sleep(self._output_delay(estimate_tokens(piece)))
+            event('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                          'delta': {'type': delta_type, delta_key: piece}})
+        event('content_block_stop', {'type': 'content_block_stop', 'index': 0})
+        event('message_delta', {'type': 'message_delta',
+                                'delta': {'stop_reason': stop_reason, 'stop_sequence': None},
+                                'usage': {'output_tokens': output_tokens}})
+        event('message_stop', {'type': 'message_stop'})
+        self.close_connection = True
+
+    # -- Gemini ------------------------------------------------------------
+    def _gemini(self, model: str, stream: bool, req: dict):
+        system = ' '.join(p.get('text', '') for p in ((req.get('systemInstruction') or
+                                                       req.get('system_instruction') or {}).get('parts') or []))
+        texts = [p.get('text', '') for c in req.get('contents') or [] for p in c.get('parts') or []]
+        prompt = system + '\n' + '\n'.join(texts)
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        rng = self.state.rng_for(prompt_hash)
+        self.state.count(gemini=1)
+
+        failure = self.state.admit(rng)
+        if failure:
+            status, kind = failure
+            if kind == 'rate_limit':
+                body = {'error': {'code': 429, 'message': 'Resource has been exhausted (e.g. check quota).',
+                                  'status': 'RESOURCE_EXHAUSTED'}}
+            else:
+                status = 503
+                body = {'error': {'code': 503, 'message': 'stub: overloaded', 'status': 'UNAVAILABLE'}}
+            return self._send_json(status, body)
+
+        gen_cfg = req.get('generationConfig') or req.get('generation_config') or {}
+        schema = gen_cfg.get('responseSchema') or gen_cfg.get('response_schema')
+        reply = self.state.find_reply(prompt_hash, prompt)
+        if reply is None:
+            reply = _fake_from_schema(schema or _DEFAULT_SCHEMA, rng, _quotes_from_prompt(prompt))
+        self.state.record(prompt_hash, model, reply)
+        reply_text = reply if isinstance(reply, str) else json.dumps(reply, ensure_ascii=False)
+        input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(reply_text)
+        self.state.count(input_tokens=input_tokens, output_tokens=output_tokens)
+        usage = {'promptTokenCount': input_tokens, 'candidatesTokenCount': output_tokens,
+                 'totalTokenCount': input_tokens + output_tokens}
+
+        def chunk(text, final):
+            body = {'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'},
+                                    'index': 0, **({'finishReason': 'STOP'} if final else {})}]}
+            if final:
+                body['usageMetadata'] = usage
+            return body
+
+        self._sleep_ttft(rng)
+        if not stream:
+            time.sleep(self._output_delay(output_tokens))
+            return self._send_json(200, chunk(reply_text, True))
+
+        # REST-streaming van de SDK: één JSON-array waarvan de elementen binnendruppelen
+        self.state.count(streamed=1)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        pieces = _pieces(reply_text)
+        self.wfile.write(b'[')
+        for i, piece in enumerate(pieces):
+            time.sleep(self._output_delay(estimate_tokens(piece)))
+            if i:
+                self.wfile.write(b',\r\n')
+            self.wfile.write(json.dumps(chunk(piece, i == len(pieces) - 1)).encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(b']')
+        self.close_connection = True
+
+
+def _pieces(text: str, size: int = 48) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)] or ['']
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, options: StubOptions):
+        super().__init__(address, StubHandler)
+        self.state = StubState(options)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_stub_server(host: str = '127.0.0.1', port: int = 0, **options) -> StubServer:
+    """Start de stub in een achtergrondthread (port=0: vrije poort); stop met server.shutdown()."""
+    server = StubServer((host, port), StubOptions(**options))
+    threading.Thread(target=server.serve_forever, daemon=True, name='llm-stub').start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lokale Anthropic/Gemini-stub voor load- en latencytests.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-median', type=float, default=0.8, help='mediane time-to-first-token (s)')
+    parser.add_argument('--latency-sigma', type=float, default=0.4, help='spreiding (lognormaal sigma)')
+    parser.add_argument('--tokens-per-s', type=float, default=150.0, help='outputsnelheid (0 = direct)')
+    parser.add_argument('--rate-limit-p', type=float, default=0.0, help='kans op een 429 per request')
+    parser.add_argument('--rpm', type=int, default=0, help='maximaal aantal requests per minuut (0 = geen)')
+    parser.add_argument('--error-p', type=float, default=0.0, help='kans op een overbelast-fout per request')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry-after header bij 429 (s)')
+    parser.add_argument('--cache-ttl', type=float, default=300.0, help='levensduur prompt-cache (s)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--replies', help='JSONL met vaste/opgenomen antwoorden')
+    parser.add_argument('--record', help='schrijf geleverde antwoorden als JSONL naar dit bestand')
+    args = parser.parse_args()
+
+    options = {k: v for k, v in vars(args).items() if k not in ('host', 'port')}
+    server = StubServer((args.host, args.port), StubOptions(**options))
+    print(f"LLM-stub luistert op {server.url}")
+    print(f"  ANTHROPIC_BASE_URL={server.url}  GEMINI_BASE_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
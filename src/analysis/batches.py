@@ -0,0 +1,234 @@
+"""
+Batches van inzendingen (tabel analysis_batches, kolom documents.batch_id).
+
+Een docent levert een hele klas in één keer aan: een ZIP-archief of meerdere bestanden
+(POST /api/batches). Elk bestand wordt een gewoon document met batch_id en gaat via
+dezelfde weg als een losse upload (versies, dedupe, wachtrij). De wachtrij laat van één
+batch maximaal ANALYSIS_BATCH_MAX_RUNNING jobs tegelijk lopen (analysis_queue.claim);
+binnen die jobs bepaalt de LLM-planner het tempo richting de provider. Criteria en
+verwachte secties van het documenttype worden tussen de analyses gedeeld
+(config_fingerprint.load_settings).
+
+status() telt de documentstatussen op; export_zip() bundelt de gecommentarieerde
+Word-bestanden van de voltooide documenten met een overzicht in één ZIP.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import uuid
+import zipfile
+
+from werkzeug.utils import secure_filename
+
+_logger = logging.getLogger('docucheck')
+
+# Alleen Word-bestanden: de export zet de feedback als opmerkingen in het origineel
+ALLOWED_EXTENSIONS = ('.docx',)
+
+_EXPORT_SUFFIX = '_gecommentarieerd'
+
+
+class BatchError(ValueError):
+    """Ongeldige batch (leeg, te groot of geen geldig ZIP-archief)."""
+
+
+def _skip_reason(name: str):
+    """Reden om een bestand niet op te nemen, of None."""
+    base = os.path.basename(name.rstrip('/'))
+    if '__MACOSX' in name.split('/') or base.startswith(('.', '~$')):
+        return 'systeembestand'
+    if os.path.splitext(base)[1].lower() not in ALLOWED_EXTENSIONS:
+        return 'geen .docx'
+    return None
+
+
+def _target_path(folder: str, original_name: str) -> str:
+    """Uniek pad in de uploadmap voor een bestand uit de batch."""
+    base, ext = os.path.splitext(secure_filename(os.path.basename(original_name)) or 'inzending.docx')
+    return os.path.join(folder, f"{base}_{uuid.uuid4().hex[:8]}{ext}")
+
+
+def extract_archive(archive, folder: str) -> tuple:
+    """
+    Pak de .docx-bestanden uit een ZIP-archief (pad of bestandsobject) uit in folder.
+    Retourneert (opgeslagen, overgeslagen): [(originele naam, pad)] en [(naam, reden)].
+    Mappen in het archief worden platgeslagen. Gooit BatchError bij een ongeldig archief
+    of als BATCH_MAX_FILES of BATCH_MAX_UNPACKED_MB overschreden wordt.
+    """
+    from config import Config
+    max_bytes = Config.BATCH_MAX_UNPACKED_MB * 1024 * 1024
+    saved, skipped, written = [], [], 0
+    try:
+        zf = zipfile.ZipFile(archive)
+    except (zipfile.BadZipFile, OSError) as exc:
+        raise BatchError(f'Geen geldig ZIP-archief: {exc}')
+    try:
+        with zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                reason = _skip_reason(info.filename)
+                if reason:
+                    skipped.append((info.filename, reason))
+                    continue
+                if len(saved) >= Config.BATCH_MAX_FILES:
+                    raise BatchError(f'Meer dan {Config.BATCH_MAX_FILES} bestanden in de batch')
+                path = _target_path(folder, info.filename)
+                with zf.open(info) as src, open(path, 'wb') as dst:
+                    # Gelezen bytes tellen, niet de opgegeven grootte (ZIP-bommen)
+                    while True:
+                        chunk = src.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        written += len(chunk)
+                        if written > max_bytes:
+                            dst.close()
+                            os.remove(path)
+                            raise BatchError(f'Uitgepakt groter dan {Config.BATCH_MAX_UNPACKED_MB} MB')
+                        dst.write(chunk)
+                saved.append((os.path.basename(info.filename), path))
+    except (BatchError, zipfile.BadZipFile, RuntimeError, OSError) as exc:
+        # Niets half laten staan; beschadigd of versleuteld archief → BatchError
+        discard(saved)
+        if isinstance(exc, BatchError):
+            raise
+        raise BatchError(f'ZIP-archief kan niet gelezen worden: {exc}') from exc
+    return saved, skipped
+
+
+def save_uploads(files, folder: str, saved: list, skipped: list) -> None:
+    """
+    Sla losse uploads (FileStorage) op in folder, met dezelfde regels als extract_archive;
+    vult saved en skipped aan. Gooit BatchError boven BATCH_MAX_FILES.
+    """
+    from config import Config
+    for file in files:
+        reason = _skip_reason(file.filename)
+        if reason:
+            skipped.append((file.filename, reason))
+            continue
+        if len(saved) >= Config.BATCH_MAX_FILES:
+            raise BatchError(f'Meer dan {Config.BATCH_MAX_FILES} bestanden in de batch')
+        path = _target_path(folder, file.filename)
+        file.save(path)
+        saved.append((os.path.basename(file.filename), path))
+
+
+def discard(saved: list) -> None:
+    """Verwijder opgeslagen bestanden van een batch die niet doorgaat."""
+    for _, path in saved:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def create(conn: sqlite3.Connection, document_type_id, organization_id=None, name=None,
+           created_by=None, skipped: list = None) -> int:
+    """Leg een nieuwe batch vast; retourneert het id."""
+    cur = conn.execute(
+        'INSERT INTO analysis_batches (name, document_type_id, organization_id, skipped, created_by) '
+        'VALUES (?,?,?,?,?)',
+        (name, document_type_id, organization_id or None,
+         json.dumps([{'name': n, 'reason': r} for n, r in skipped or []]), created_by)
+    )
+    conn.commit()
+    return cur.lastrowid
+
+
+def get(conn: sqlite3.Connection, batch_id: int):
+    """De batch (of None)."""
+    return conn.execute('SELECT * FROM analysis_batches WHERE id=?', (batch_id,)).fetchone()
+
+
+def status(conn: sqlite3.Connection, batch_id: int):
+    """
+    Samengevoegde status van een batch (of None): aantallen per documentstatus, de
+    voortgang en per document id, naam en status. 'done' zodra geen document meer wacht
+    of loopt.
+    """
+    batch = get(conn, batch_id)
+    if batch is None:
+        return None
+    documents = conn.execute(
+        'SELECT id, original_filename, analysis_status, duplicate_of FROM documents '
+        'WHERE batch_id=? ORDER BY id', (batch_id,)
+    ).fetchall()
+    counts = {}
+    for doc in documents:
+        counts[doc['analysis_status']] = counts.get(doc['analysis_status'], 0) + 1
+    finished = counts.get('completed', 0) + counts.get('failed', 0)
+    return {
+        'id':               batch_id,
+        'name':             batch['name'],
+        'document_type_id': batch['document_type_id'],
+        'status':           'done' if finished == len(documents) else 'running',
+        'total':            len(documents),
+        'pending':          counts.get('pending', 0),
+        'analyzing':        counts.get('analyzing', 0),
+        'completed':        counts.get('completed', 0),
+        'failed':           counts.get('failed', 0),
+        'progress':         finished / len(documents) if documents else 1.0,
+        'skipped':          json.loads(batch['skipped'] or '[]'),
+        'created_at':       batch['created_at'],
+        'documents': [
+            {'id': d['id'], 'name': d['original_filename'], 'status': d['analysis_status'],
+             'duplicate_of': d['duplicate_of']}
+            for d in documents
+        ],
+    }
+
+
+def _unique(name: str, used: set) -> str:
+    base, ext = os.path.splitext(name)
+    candidate, n = name, 2
+    while candidate.lower() in used:
+        candidate, n = f'{base} ({n}){ext}', n + 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def export_zip(conn: sqlite3.Connection, batch_id: int, output_path: str) -> int:
+    """
+    Schrijf één ZIP met per voltooid document het gecommentarieerde Word-bestand en een
+    overzicht.csv (naam, status, aantal opmerkingen). Retourneert het aantal exports.
+    """
+    from analysis.inline_word_comments import add_inline_comments
+
+    documents = conn.execute(
+        'SELECT id, original_filename, file_path, analysis_status, analysis_data FROM documents '
+        'WHERE batch_id=? ORDER BY id', (batch_id,)
+    ).fetchall()
+    overview = io.StringIO()
+    writer = csv.writer(overview, delimiter=';')
+    writer.writerow(['document_id', 'bestand', 'status', 'opmerkingen', 'export'])
+    used, exported = set(), 0
+    with tempfile.TemporaryDirectory() as tmp, \
+            zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for doc in documents:
+            export_name, remarks = '', ''
+            if doc['analysis_status'] == 'completed' and doc['analysis_data']:
+                data = json.loads(doc['analysis_data'])
+                feedback = data.get('feedback', [])
+                remarks = sum(1 for item in feedback if item.get('status') != 'ok')
+                base = os.path.splitext(doc['original_filename'] or f"document_{doc['id']}")[0]
+                export_name = _unique(f'{base}{_EXPORT_SUFFIX}.docx', used)
+                target = os.path.join(tmp, f"{doc['id']}.docx")
+                try:
+                    add_inline_comments(
+                        original_docx_path  = doc['file_path'],
+                        feedback_items      = feedback,
+                        recognized_sections = data.get('sections', []),
+                        output_path         = target,
+                    )
+                    zf.write(target, export_name)
+                    exported += 1
+                except Exception as exc:
+                    _logger.warning(f"[BATCH] {batch_id}: export van document {doc['id']} mislukt: {exc}")
+                    export_name = ''
+            writer.writerow([doc['id'], doc['original_filename'], doc['analysis_status'], remarks, export_name])
+        zf.writestr('overzicht.csv', overview.getvalue())
+    _logger.info(f"[BATCH] {batch_id}: {exported} van {len(documents)} document(en) geëxporteerd")
+    return exported
@@ -0,0 +1,109 @@
+"""
+Checkpoints per analysejob (tabel analysis_checkpoints).
+
+Een analyse bestaat uit stappen waarvan het resultaat na afloop direct wordt
+weggeschreven, zodat een nieuwe poging van dezelfde job (na een crash, deploy of
+verlopen lease, zie analysis_queue) verdergaat waar de vorige ophield:
+
+  parsed      : tekst, alinea's en koppen uit parse_document
+  recognized  : herkende secties (incl. voetnoten) en opmaakwaarschuwingen
+  digest      : de documentdigest (kost zelf LLM-calls)
+  fast        : ruwe resultaten van alle snelle (niet-LLM) checks
+  llm         : ruw resultaat per LLM-taak (criterium × sectie), per taak weggeschreven
+  holistic    : de items van de holistische reviews
+
+Checkpoints horen bij één job: een nieuwe analyse-aanvraag begint altijd schoon.
+Ze worden opgeruimd zodra de job 'done' of definitief 'failed' is (analysis_queue).
+Mislukte LLM-calls (fout-items) worden niet vastgelegd, zodat een nieuwe poging
+ze opnieuw probeert.
+"""
+import json
+import logging
+import sqlite3
+import threading
+
+_logger = logging.getLogger('docucheck')
+
+STAGES = ('parsed', 'recognized', 'digest', 'fast', 'llm', 'holistic')
+
+
+class AnalysisCheckpoint:
+    """
+    Checkpoints van één job. Bestaande checkpoints worden bij het aanmaken in één
+    query geladen; put() schrijft direct weg via een eigen verbinding (wordt ook
+    vanuit LLM-worker-threads aangeroepen).
+    """
+
+    def __init__(self, database: str, document_id: int, job_id: int):
+        self.database = database
+        self.document_id = document_id
+        self.job_id = job_id
+        self._lock = threading.Lock()
+        self._data = {}        # (stage, key) → gedecodeerde waarde
+        try:
+            conn = sqlite3.connect(database, timeout=30.0)
+            try:
+                for stage, key, payload in conn.execute(
+                    'SELECT stage, key, payload FROM analysis_checkpoints WHERE job_id=?', (job_id,)
+                ):
+                    self._data[(stage, key)] = json.loads(payload)
+            finally:
+                conn.close()
+        except (sqlite3.Error, ValueError) as exc:
+            _logger.warning(f"[CHECKPOINT] Laden mislukt voor job {job_id}: {exc}")
+            self._data = {}
+        self.resumed = sorted({stage for stage, _ in self._data}, key=STAGES.index)
+
+    def has(self, stage: str, key: str = '') -> bool:
+        return (stage, key) in self._data
+
+    def get(self, stage: str, key: str = '', default=None):
+        return self._data.get((stage, key), default)
+
+    def count(self, stage: str) -> int:
+        return sum(1 for s, _ in self._data if s == stage)
+
+    def put(self, stage: str, value, key: str = '') -> None:
+        """Leg een stapresultaat vast; een fout bij wegschrijven breekt de analyse niet."""
+        try:
+            payload = json.dumps(value)
+        except (TypeError, ValueError) as exc:
+            _logger.warning(f"[CHECKPOINT] {stage}/{key} niet serialiseerbaar voor job {self.job_id}: {exc}")
+            return
+        with self._lock:
+            self._data[(stage, key)] = json.loads(payload)
+        try:
+            conn = sqlite3.connect(self.database, timeout=30.0)
+            try:
+                conn.execute(
+                    'INSERT OR REPLACE INTO analysis_checkpoints (job_id, document_id, stage, key, payload) '
+                    'VALUES (?,?,?,?,?)',
+                    (self.job_id, self.document_id, stage, key, payload)
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as exc:
+            _logger.warning(f"[CHECKPOINT] {stage}/{key} niet weggeschreven voor job {self.job_id}: {exc}")
+
+
+def open_checkpoint(database: str, document_id: int, job_id: int = None):
+    """Checkpoint voor deze job, of None buiten de wachtrij of als ANALYSIS_CHECKPOINTS uit staat."""
+    from config import Config
+    if job_id is None or not Config.ANALYSIS_CHECKPOINTS:
+        return None
+    checkpoint = AnalysisCheckpoint(database, document_id, job_id)
+    if checkpoint.resumed:
+        _logger.info(
+            f"[CHECKPOINT] document={document_id} | job={job_id} | hervat na: "
+            f"{', '.join(checkpoint.resumed)} ({checkpoint.count('llm')} LLM-taak/taken al klaar)"
+        )
+    return checkpoint
+
+
+def task_key(criterion: dict, section: dict = None) -> str:
+    """Stabiele sleutel voor een (criterium, sectie)-taak over pogingen heen."""
+    crit_id = criterion['id']
+    if section is None:
+        return f"{crit_id}|"
+    return f"{crit_id}|{section.get('identifier') or ''}|{section.get('name') or ''}"
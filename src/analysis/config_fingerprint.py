@@ -0,0 +1,224 @@
+"""
+Configuratie-fingerprint per documenttype (tabel config_fingerprints, kolom
+documents.config_fingerprint).
+
+Een analyse hangt af van meer dan alleen het bestand: de criteria (inclusief
+`parameters` en sectiemappings), de verwachte secties met hun alternatieve namen, de
+standaard rolprompt en modelinstellingen van het documenttype en de globale modellen.
+De fingerprint is een hash over al die instellingen. Hij wordt opnieuw berekend bij elke
+wijziging in het beheer (criteria, secties, documenttypes) en bij elke analyse, en
+meegeschreven met het resultaat. Een analyse is verouderd als haar fingerprint niet meer
+gelijk is aan die van haar documenttype; dat is één query zonder analysis_data te laden.
+
+Hergebruik van eerdere resultaten (analysis/versioning.py, analysis/dedupe.py) gebeurt
+alleen bij een gelijke fingerprint; cache_key() combineert hem met de bestandshash.
+
+load_settings() deelt de criteria en verwachte secties van een documenttype tussen
+analyses in hetzelfde proces (een batch van een hele klas laadt ze zo één keer), zolang
+de vastgelegde fingerprint gelijk blijft en maximaal ANALYSIS_CONFIG_CACHE_S seconden.
+"""
+import copy
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+_logger = logging.getLogger('docucheck')
+
+# Verhogen als prompts of checklogica in de code zo veranderen dat oude resultaten
+# niet meer herbruikbaar zijn.
+FINGERPRINT_VERSION = 1
+
+# Velden van document_types die de uitkomst van een analyse beïnvloeden
+_DOCUMENT_TYPE_FIELDS = ('default_llm_role_prompt', 'show_suggestions', 'llm_token_budget',
+                         'llm_fast_model', 'llm_strong_model')
+
+# Gedeelde instellingen per (database, documenttype): (geladen_op, fingerprint, criteria, secties)
+_settings_cache: dict = {}
+_settings_lock = threading.Lock()
+
+
+def _parameters(raw):
+    """parameters-JSON in vaste volgorde; witruimte of sleutelvolgorde telt niet mee."""
+    try:
+        return json.loads(raw) if isinstance(raw, str) else raw
+    except json.JSONDecodeError:
+        return raw
+
+
+def snapshot(conn: sqlite3.Connection, document_type_id: int,
+             criteria: list = None, sections: list = None) -> dict:
+    """
+    Alle instellingen die een analyse van dit documenttype bepalen. criteria en sections:
+    al geladen criteria en verwachte secties (anders uit de database).
+    """
+    from config import Config
+    import db_utils
+
+    row = conn.execute('SELECT * FROM document_types WHERE id=?', (document_type_id,)).fetchone()
+    document_type = {f: row[f] for f in _DOCUMENT_TYPE_FIELDS if f in row.keys()} if row is not None else {}
+
+    if criteria is None:
+        criteria = db_utils.get_criteria_for_document_type(conn, document_type_id)
+    if sections is None:
+        sections = db_utils.get_expected_sections(conn, document_type_id)
+
+    criteria_rows = []
+    for criterion in criteria:
+        criterion = dict(criterion)
+        criterion['parameters'] = _parameters(criterion.get('parameters'))
+        criterion['section_mappings'] = sorted(
+            (dict(m) for m in criterion.get('section_mappings') or []),
+            key=lambda m: str(m.get('section_id')))
+        criteria_rows.append(criterion)
+
+    section_rows = []
+    for section in sections:
+        section = dict(section)
+        section['alternative_names'] = _parameters(section.get('alternative_names'))
+        section_rows.append(section)
+
+    return {
+        'version':       FINGERPRINT_VERSION,
+        'document_type': document_type,
+        'criteria':      sorted(criteria_rows, key=lambda c: str(c.get('id'))),
+        'sections':      sorted(section_rows, key=lambda s: str(s.get('id'))),
+        'models':        {'fast': Config.LLM_FAST_MODEL, 'strong': Config.LLM_STRONG_MODEL},
+    }
+
+
+def compute(conn: sqlite3.Connection, document_type_id: int,
+            criteria: list = None, sections: list = None) -> str:
+    """Fingerprint van de huidige configuratie van een documenttype."""
+    payload = json.dumps(snapshot(conn, document_type_id, criteria, sections),
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def refresh(conn: sqlite3.Connection, document_type_id: int,
+            criteria: list = None, sections: list = None) -> str:
+    """Bereken de fingerprint opnieuw en leg hem vast; retourneert de nieuwe waarde."""
+    fingerprint = compute(conn, document_type_id, criteria, sections)
+    row = conn.execute('SELECT fingerprint FROM config_fingerprints WHERE document_type_id=?',
+                       (document_type_id,)).fetchone()
+    if row is None or row[0] != fingerprint:
+        conn.execute(
+            "INSERT INTO config_fingerprints (document_type_id, fingerprint, updated_at) "
+            "VALUES (?, ?, CURRENT_TIMESTAMP) "
+            "ON CONFLICT(document_type_id) DO UPDATE SET fingerprint=excluded.fingerprint, "
+            "updated_at=excluded.updated_at",
+            (document_type_id, fingerprint)
+        )
+        conn.commit()
+        if row is not None:
+            _logger.info(f"[CONFIG] documenttype={document_type_id}: configuratie gewijzigd "
+                         f"({row[0][:8]} → {fingerprint[:8]}), eerdere analyses zijn verouderd")
+    return fingerprint
+
+
+def refresh_all(conn: sqlite3.Connection) -> dict:
+    """
+    Herbereken de fingerprints van alle documenttypes. Criteria en secties worden door
+    meerdere types gedeeld, dus na een wijziging daarvan worden ze allemaal bijgewerkt.
+    """
+    conn.execute('DELETE FROM config_fingerprints '
+                 'WHERE document_type_id NOT IN (SELECT id FROM document_types)')
+    conn.commit()
+    return {type_id: refresh(conn, type_id)
+            for (type_id,) in conn.execute('SELECT id FROM document_types').fetchall()}
+
+
+def _database_key(conn: sqlite3.Connection) -> str:
+    """Bestand van de hoofddatabase (verbindingen naar dezelfde database delen de cache)."""
+    row = conn.execute('PRAGMA database_list').fetchone()
+    return row[2] if row is not None else ''
+
+
+def load_settings(conn: sqlite3.Connection, document_type_id: int) -> tuple:
+    """
+    (fingerprint, criteria, verwachte secties) voor een analyse van dit documenttype.
+
+    Binnen ANALYSIS_CONFIG_CACHE_S seconden en zolang de vastgelegde fingerprint niet
+    veranderd is (beheerwijzigingen roepen refresh/refresh_all aan), komen criteria en
+    secties uit de gedeelde cache; anders worden ze geladen en wordt de fingerprint
+    opnieuw berekend. De aanroeper krijgt eigen kopieën en mag ze aanpassen.
+    """
+    from config import Config
+    import db_utils
+
+    key = (_database_key(conn), document_type_id)
+    shared = Config.ANALYSIS_CONFIG_CACHE_S > 0 and bool(key[0])   # niet voor :memory:
+    if shared:
+        with _settings_lock:
+            entry = _settings_cache.get(key)
+        if entry is not None and time.monotonic() - entry[0] < Config.ANALYSIS_CONFIG_CACHE_S:
+            stored = conn.execute('SELECT fingerprint FROM config_fingerprints WHERE document_type_id=?',
+                                  (document_type_id,)).fetchone()
+            if stored is not None and stored[0] == entry[1]:
+                return entry[1], copy.deepcopy(entry[2]), copy.deepcopy(entry[3])
+
+    criteria = [dict(c) for c in db_utils.get_criteria_for_document_type(conn, document_type_id)]
+    sections = [dict(s) for s in db_utils.get_expected_sections(conn, document_type_id)]
+    fingerprint = refresh(conn, document_type_id, criteria, sections)
+    if shared:
+        with _settings_lock:
+            _settings_cache[key] = (time.monotonic(), fingerprint, criteria, sections)
+    return fingerprint, copy.deepcopy(criteria), copy.deepcopy(sections)
+
+
+def clear_settings_cache() -> None:
+    """Leeg de gedeelde instellingen (tests, of na een wijziging buiten het beheer om)."""
+    with _settings_lock:
+        _settings_cache.clear()
+
+
+def current(conn: sqlite3.Connection, document_type_id: int) -> str:
+    """De vastgelegde fingerprint van een documenttype (berekend als die nog ontbreekt)."""
+    row = conn.execute('SELECT fingerprint FROM config_fingerprints WHERE document_type_id=?',
+                       (document_type_id,)).fetchone()
+    return row[0] if row is not None else refresh(conn, document_type_id)
+
+
+def cache_key(conn: sqlite3.Connection, document_id: int):
+    """
+    Cachesleutel van een analyseresultaat: bestandshash + configuratie-fingerprint.
+    None als het document nog niet gehasht of geanalyseerd is.
+    """
+    row = conn.execute('SELECT file_hash, config_fingerprint FROM documents WHERE id=?',
+                       (document_id,)).fetchone()
+    if row is None or not row[0] or not row[1]:
+        return None
+    return f'{row[0]}:{row[1]}'
+
+
+def stale_documents(conn: sqlite3.Connection, document_type_id: int = None) -> list:
+    """
+    Ids van voltooide analyses waarvan de configuratie niet meer overeenkomt met die van
+    hun documenttype (of die van vóór de fingerprint dateren).
+    """
+    missing = conn.execute(
+        'SELECT DISTINCT d.document_type_id FROM documents d '
+        'LEFT JOIN config_fingerprints f ON f.document_type_id = d.document_type_id '
+        'WHERE d.document_type_id IS NOT NULL AND f.document_type_id IS NULL'
+    ).fetchall()
+    for (type_id,) in missing:
+        refresh(conn, type_id)
+    query = ("SELECT d.id FROM documents d "
+             "JOIN config_fingerprints f ON f.document_type_id = d.document_type_id "
+             "WHERE d.analysis_status='completed' AND d.config_fingerprint IS NOT f.fingerprint")
+    params = ()
+    if document_type_id is not None:
+        query += ' AND d.document_type_id=?'
+        params = (document_type_id,)
+    return [r[0] for r in conn.execute(query + ' ORDER BY d.id', params).fetchall()]
+
+
+def is_stale(conn: sqlite3.Connection, document_id: int) -> bool:
+    """True als de analyse van dit document met een andere configuratie is gemaakt."""
+    row = conn.execute('SELECT document_type_id, config_fingerprint FROM documents WHERE id=?',
+                       (document_id,)).fetchone()
+    if row is None or row[0] is None:
+        return False
+    return row[1] != current(conn, row[0])
@@ -0,0 +1,284 @@
+"""
+Token-budgettering voor de LLM-context.
+
+In plaats van vaste tekenslices ([:40000] voor het document, [:8000] voor een sectie)
+wordt per call een tokenbudget verdeeld over:
+  1. de documentcontext  (gecacht; per document en model één keer gekozen zodat
+                          alle calls dezelfde cache-prefix houden)
+  2. de te beoordelen sectie (ongecacht; krijgt wat er van het budget over is)
+  3. de buursecties       (ongecacht; alleen als de documentcontext ingekort of
+                          afwezig is, anders staan ze al in de context)
+
+Tokens worden lokaal geschat per modelfamilie — geen API-call. Inkorten gebeurt op
+alinea-grenzen; alleen een enkele te lange alinea wordt op een zinsgrens afgekapt.
+Elke keuze levert een rapport op zodat inkorting per call zichtbaar is.
+"""
+import math
+import re
+from functools import lru_cache
+
+# Gemiddeld aantal tekens per sub-woord-token voor Nederlandse tekst, per modelfamilie.
+# Empirisch: de Claude-tokenizer splitst Nederlandse samenstellingen fijner dan Gemini.
+_CHARS_PER_PIECE = {
+    'claude': 4.0,
+    'gemini': 4.8,
+}
+_DEFAULT_CHARS_PER_PIECE = 4.0
+
+_WORD_RE      = re.compile(r'\w+|[^\w\s]')
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+_SENTENCE_END_RE = re.compile(r'[.!?](?=\s)')
+
+# Markering voor weggelaten tekst — zichtbaar voor de LLM zodat die niet concludeert
+# dat iets ontbreekt wat alleen buiten de context valt.
+_OMISSION_MARKER = "[… {n} alinea('s) weggelaten wegens contextbudget …]"
+
+
+def _model_family(model: str) -> str:
+    return 'gemini' if (model or '').startswith('gemini') else 'claude'
+
+
+def estimate_tokens(text: str, model: str = 'claude-haiku-4-5') -> int:
+    """
+    Lokale schatting van het aantal input-tokens van text voor dit model.
+    Elk woord telt als ceil(lengte / tekens-per-stuk) tokens, elk leesteken als één.
+    """
+    if not text:
+        return 0
+    per_piece = _CHARS_PER_PIECE.get(_model_family(model), _DEFAULT_CHARS_PER_PIECE)
+    return sum(math.ceil(len(tok) / per_piece) for tok in _WORD_RE.findall(text))
+
+
+def split_paragraphs(text: str) -> list:
+    """Splits tekst op lege regels; lege alinea's vervallen."""
+    return [p.strip() for p in _PARAGRAPH_RE.split(text or '') if p.strip()]
+
+
+def _cut_at_sentence(paragraph: str, max_tokens: int, model: str) -> str:
+    """Kort één alinea in tot max_tokens, bij voorkeur op een zinsgrens."""
+    per_piece = _CHARS_PER_PIECE.get(_model_family(model), _DEFAULT_CHARS_PER_PIECE)
+    # Ruwe eerste schatting in tekens, daarna verfijnen op tokens
+    cut = paragraph[:int(max_tokens * per_piece)]
+    while cut and estimate_tokens(cut, model) > max_tokens:
+        cut = cut[:int(len(cut) * 0.9)]
+    ends = [m.end() for m in _SENTENCE_END_RE.finditer(cut + ' ')]
+    if ends and ends[-1] > len(cut) // 2:
+        cut = cut[:ends[-1]]
+    return cut.rstrip()
+
+
+def _report(text_in: str, text_out: str, model: str, kept: int, total: int) -> dict:
+    original = estimate_tokens(text_in, model)
+    used = estimate_tokens(text_out, model)
+    return {
+        'tokens':              used,
+        'original_tokens':     original,
+        'truncated':           kept < total or used < original,
+        'kept_paragraphs':     kept,
+        'total_paragraphs':    total,
+    }
+
+
+def fit_to_budget(text: str, max_tokens: int, model: str = 'claude-haiku-4-5') -> tuple:
+    """
+    Neem hele alinea's vanaf het begin zolang ze binnen max_tokens passen.
+    Retourneert (tekst, rapport). Past de eerste alinea al niet, dan wordt die op
+    een zinsgrens afgekapt zodat er altijd iets te beoordelen overblijft.
+    """
+    text = (text or '').strip()
+    if estimate_tokens(text, model) <= max_tokens:
+        n = len(split_paragraphs(text))
+        return text, _report(text, text, model, n, n)
+
+    paragraphs = split_paragraphs(text)
+    kept, used = [], 0
+    for para in paragraphs:
+        cost = estimate_tokens(para, model) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(para)
+        used += cost
+    if not kept and paragraphs and max_tokens > 0:
+        kept = [_cut_at_sentence(paragraphs[0], max_tokens, model)]
+    out = '\n\n'.join(kept)
+    return out, _report(text, out, model, len(kept), len(paragraphs))
+
+
+@lru_cache(maxsize=16)
+def select_document_context(full_doc_text: str, model: str, max_tokens: int) -> tuple:
+    """
+    Kies de documentcontext binnen max_tokens — één keer per (document, model, budget),
+    zodat elke call op het document byte-identieke context (en dus één cache-prefix) krijgt.
+
+    Past het document niet, dan blijven hele alinea's van het begin (inleiding,
+    probleemstelling) én van het einde (conclusie, bronnen) staan; het midden valt weg
+    en wordt gemarkeerd.
+    """
+    text = (full_doc_text or '').strip()
+    if estimate_tokens(text, model) <= max_tokens:
+        n = len(split_paragraphs(text))
+        return text, _report(text, text, model, n, n)
+
+    paragraphs = split_paragraphs(text)
+    costs = [estimate_tokens(p, model) + 1 for p in paragraphs]
+    marker_cost = estimate_tokens(_OMISSION_MARKER.format(n=len(paragraphs)), model) + 1
+    budget = max_tokens - marker_cost
+
+    # Ca. 75% voor het begin, de rest voor het einde
+    head, used = [], 0
+    for i, cost in enumerate(costs):
+        if used + cost > budget * 0.75:
+            break
+        head.append(i)
+        used += cost
+    tail = []
+    for i in range(len(paragraphs) - 1, head[-1] if head else -1, -1):
+        if used + costs[i] > budget:
+            break
+        tail.append(i)
+        used += costs[i]
+    tail.reverse()
+
+    if not head and not tail:
+        out, report = fit_to_budget(text, max_tokens, model)
+        return out, report
+
+    omitted = len(paragraphs) - len(head) - len(tail)
+    parts = [paragraphs[i] for i in head]
+    parts.append(_OMISSION_MARKER.format(n=omitted))
+    parts.extend(paragraphs[i] for i in tail)
+    out = '\n\n'.join(parts)
+    return out, _report(text, out, model, len(head) + len(tail), len(paragraphs))
+
+
+def select_neighbour_context(neighbours: list, max_tokens: int, model: str = 'claude-haiku-4-5') -> tuple:
+    """
+    Vul max_tokens met het begin van de buursecties (lijst van (naam, tekst), in
+    documentvolgorde, dichtstbijzijnde eerst). Retourneert (tekst, aantal_opgenomen).
+    """
+    blocks, used = [], 0
+    per_neighbour = max_tokens // max(len(neighbours), 1)
+    for name, content in neighbours:
+        if used >= max_tokens or not (content or '').strip():
+            continue
+        excerpt, _ = fit_to_budget(content, min(per_neighbour, max_tokens - used), model)
+        if not excerpt:
+            continue
+        block = f"[BUURSECTIE: '{name}']\n{excerpt}\n[/BUURSECTIE]"
+        blocks.append(block)
+        used += estimate_tokens(block, model)
+    return '\n\n'.join(blocks), len(blocks)
+
+
+def plan_call_context(
+    full_doc_text: str,
+    section_text: str,
+    model: str,
+    total_budget: int,
+    section_reserve: int,
+    neighbours: list = None,
+    neighbour_budget: int = 0,
+) -> dict:
+    """
+    Verdeel het tokenbudget van één LLM-call.
+
+    full_doc_text  : documentcontext (leeg/None = geen documentcontext in deze call)
+    total_budget   : tokens voor documentcontext + sectie (+ buren) samen
+    section_reserve: minimum aantal tokens dat voor de sectie vrij blijft; de
+                     documentcontext krijgt total_budget - section_reserve
+    neighbours     : [(naam, tekst), ...] — alleen gebruikt als de documentcontext
+                     ingekort of afwezig is
+
+    Retourneert {'doc_text', 'section_text', 'neighbour_text', 'report'}.
+    """
+    doc_text, doc_report = '', None
+    if full_doc_text:
+        doc_text, doc_report = select_document_context(
+            full_doc_text, model, max(total_budget - section_reserve, 0)
+        )
+    doc_tokens = doc_report['tokens'] if doc_report else 0
+
+    # Korte documenten laten meer ruimte over voor de sectie dan de vaste reservering
+    section_budget = max(total_budget - doc_tokens, section_reserve)
+    sec_text, sec_report = fit_to_budget(section_text, section_budget, model)
+
+    neighbour_text, n_neighbours = '', 0
+    doc_complete = doc_report is not None and not doc_report['truncated']
+    if neighbours and neighbour_budget > 0 and not doc_complete:
+        remaining = max(total_budget - doc_tokens - sec_report['tokens'], 0)
+        neighbour_text, n_neighbours = select_neighbour_context(
+            neighbours, min(neighbour_budget, remaining), model
+        )
+
+    return {
+        'doc_text':       doc_text,
+        'section_text':   sec_text,
+        'neighbour_text': neighbour_text,
+        'report': {
+            'budget':           total_budget,
+            'doc':              doc_report,
+            'section':          sec_report,
+            'neighbours':       n_neighbours,
+            'truncated':        bool((doc_report and doc_report['truncated']) or sec_report['truncated']),
+        },
+    }
+
+
+def format_report(report: dict) -> str:
+    """Eén logregel-fragment, bijv. 'doc=9120/9120 tok | sectie=2400/5100 tok (ingekort 3/7 alinea's)'."""
+    def _part(label, r):
+        if not r:
+            return f"{label}=—"
+        s = f"{label}={r['tokens']}/{r['original_tokens']} tok"
+        if r['truncated']:
+            s += f" (ingekort {r['kept_paragraphs']}/{r['total_paragraphs']} alinea's)"
+        return s
+    return (f"budget={report['budget']} | {_part('doc', report['doc'])} | "
+            f"{_part('sectie', report['section'])} | buren={report['neighbours']}")
+
+
+def split_into_chunks(text: str, max_tokens: int, model: str = 'claude-haiku-4-5') -> list:
+    """
+    Verdeel text in opeenvolgende delen van hooguit ~max_tokens, op alinea-grenzen.
+    Een alinea die alleen al te groot is wordt op zinsgrenzen gesplitst.
+
+    Retourneert [(offset, deeltekst), ...] met offset = tekenpositie in text, zodat
+    citaten uit een deel terug te herleiden zijn naar hun plek in de sectie.
+    """
+    text = text or ''
+    # Alinea's met hun beginpositie in text
+    units, start = [], 0
+    for m in _PARAGRAPH_RE.finditer(text):
+        units.append((start, text[start:m.start()]))
+        start = m.end()
+    units.append((start, text[start:]))
+
+    pieces = []
+    for offset, para in units:
+        if not para.strip():
+            continue
+        if estimate_tokens(para, model) <= max_tokens:
+            pieces.append((offset, para))
+            continue
+        # Te grote alinea: splits op zinsgrenzen
+        s_start = 0
+        for m in _SENTENCE_END_RE.finditer(para + ' '):
+            pieces.append((offset + s_start, para[s_start:m.end()]))
+            s_start = m.end()
+        if para[s_start:].strip():
+            pieces.append((offset + s_start, para[s_start:]))
+
+    chunks, cur_start, cur_end, used = [], None, None, 0
+    for offset, piece in pieces:
+        cost = estimate_tokens(piece, model) + 1
+        if cur_start is not None and used + cost > max_tokens:
+            chunks.append((cur_start, text[cur_start:cur_end].strip()))
+            cur_start, used = None, 0
+        if cur_start is None:
+            cur_start = offset
+        cur_end = offset + len(piece)
+        used += cost
+    if cur_start is not None:
+        chunks.append((cur_start, text[cur_start:cur_end].strip()))
+    # offset wijst naar het eerste niet-witruimteteken van het deel
+    return [(off + (len(text[off:]) - len(text[off:].lstrip())), chunk) for off, chunk in chunks if chunk]
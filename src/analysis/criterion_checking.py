@@ -1,6 +1,8 @@
+import contextlib
 import json
 import re
 import sqlite3
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Any, Optional
 
@@ -583,10 +585,315 @@ _OORDEEL_TO_STATUS = {
 }
 
 
+# ---------------------------------------------------------------------------
+# Prompt-indeling (cache-bewust)
+#
+# Anthropic prompt-caching werkt op de PREFIX van de prompt (system → berichten).
+# Alles vóór het cache_control-blok moet daarom identiek zijn voor alle calls op
+# hetzelfde document. Volgorde per call:
+#   1. system        : gedeeld, persona-vrij (_build_llm_system_prompt)
+#   2. gecacht blok  : documentcontext (_build_document_context_block)
+#   3. ongecacht blok: rol/persona, te beoordelen sectie, criteria, schema
+# Een criterium met een eigen llm_role_prompt of de holistische reviewer
+# leest zo dezelfde cache-entry als alle andere calls op het document.
+# ---------------------------------------------------------------------------
+
+_MAANDEN_NL = ['januari', 'februari', 'maart', 'april', 'mei', 'juni',
+               'juli', 'augustus', 'september', 'oktober', 'november', 'december']
+
+
+def _vandaag_str() -> str:
+    """Datum van vandaag in het Nederlands, bijv. '19 oktober 2026'."""
+    from datetime import date as _date
+    _d = _date.today()
+    return f"{_d.day} {_MAANDEN_NL[_d.month - 1]} {_d.year}"
+
+
+def _build_llm_system_prompt() -> str:
+    """
+    Gedeeld systeemprompt voor ALLE LLM-calls (criteria én holistisch).
+    Bevat bewust geen persona: die staat in het ongecachte deel van het bericht,
+    zodat de cache-prefix niet per criterium verschilt.
+    """
+    return (
+        'Je beoordeelt studentenwerk uit het Nederlandse hoger onderwijs. '
+        'De documentcontext staat aan het begin van het bericht; de rol die je aanneemt, '
+        'de te beoordelen tekst en de beoordelingsopdracht volgen daarna.\n\n'
+        f'VANDAAG IS HET: {_vandaag_str()}. '
+        'Beoordeel data en jaartallen in de tekst altijd ten opzichte van deze datum. '
+        'Een datum in 2025 of 2026 is dus NIET per definitie een toekomstige datum.\n\n'
+        + _NL_TAALGEBRUIK
+    )
+
+
+def _build_document_context_block(doc_context: str) -> str:
+    """
+    Gecacht blok met de documentcontext — identiek voor alle calls op een document.
+    doc_context is al binnen het tokenbudget gekozen (context_budget.select_document_context).
+    """
+    return (
+        f"[VOLLEDIG DOCUMENT — CONTEXT]\n{doc_context.strip()}\n"
+        f"[/VOLLEDIG DOCUMENT]"
+    )
+
+
+def _build_digest_context_block(digest_text: str) -> str:
+    """Gecacht blok met de documentdigest (zie document_digest) — identiek voor alle calls."""
+    return (
+        f"[DOCUMENTSAMENVATTING — CONTEXT]\n{digest_text.strip()}\n"
+        f"[/DOCUMENTSAMENVATTING]"
+    )
+
+
+# Scope-zin bij digest-context: de LLM ziet niet de hele tekst, alleen wat waar staat.
+_DIGEST_SCOPE_NOTE = (
+    "Hierboven staat een samenvatting van het hele document (opbouw, inhoud per sectie, "
+    "definities, onderzoeksvragen) als context; de volledige tekst van andere secties zie je niet. "
+)
+
+
+def _context_budget_for(section: dict) -> dict:
+    """
+    Tokenbudget voor één call: documenttype-instelling (llm_token_budget, via
+    generate_feedback als _token_budget in de sectie gezet) of de Config-standaard.
+    """
+    from config import Config
+    return {
+        'total_budget':     int(section.get('_token_budget') or Config.LLM_CONTEXT_TOKEN_BUDGET),
+        'section_reserve':  Config.LLM_SECTION_TOKEN_BUDGET,
+        'neighbour_budget': Config.LLM_NEIGHBOUR_TOKEN_BUDGET,
+    }
+
+
+def _section_neighbours(sections: list, section: dict) -> list:
+    """
+    Buursecties van section in documentvolgorde, dichtstbijzijnde eerst:
+    [(naam, content), ...] — de vorige en de volgende gevonden sectie.
+    """
+    found = [s for s in sections if s.get('found') and s.get('identifier') != 'document']
+    found.sort(key=lambda s: s.get('start_char') or 0)
+    idx = next((i for i, s in enumerate(found) if s is section), None)
+    if idx is None:
+        return []
+    result = []
+    for j in (idx - 1, idx + 1):
+        if 0 <= j < len(found):
+            result.append((found[j].get('name', ''), found[j].get('content') or ''))
+    return result
+
+
+def _log_context_report(label: str, document_id, report: dict) -> None:
+    """Log de budgetverdeling van één call en tel inkortingen mee in het token-gebruik."""
+    import logging as _l
+    from analysis.context_budget import format_report
+    _l.getLogger('docucheck').info(f"CONTEXT-BUDGET | {label} | {format_report(report)}")
+    _record_context_report(document_id, report)
+
+
+def _build_role_block(role_prompt: str) -> str:
+    """Ongecacht blok met de persona voor deze specifieke beoordeling."""
+    return f"JOUW ROL BIJ DEZE BEOORDELING:\n{role_prompt.strip()}"
+
+
+# ---------------------------------------------------------------------------
+# Token-gebruik per analyse
+# Wordt gevuld door _call_llm_with_retry() en uitgelezen door analysis_runner,
+# zodat per document zichtbaar is hoeveel input uit de prompt-cache kwam.
+# ---------------------------------------------------------------------------
+
+_token_usage: Dict[Any, dict] = {}
+_token_usage_lock = threading.Lock()
+# Per document: (Event, thread-id van de warmer). Het Event wordt gezet zodra de eerste
+# (warming) taak klaar is; gelijktijdige fases (criteria + holistisch) warmen de cache
+# zo maar één keer. De warmer zelf wacht nooit op zijn eigen Event (map-reduce binnen
+# de warming-taak roept _run_llm_tasks genest aan).
+_cache_warmed: Dict[Any, tuple] = {}
+# Gebruik van de calls van één taak (zie _collect_call_usage): de warming-beslissing in
+# _run_llm_tasks kijkt alleen naar de eigen warming-call, niet naar het documenttotaal
+# waar gelijktijdige calls ook aan bijdragen.
+_task_usage = threading.local()
+# Dry-run (analysis/dry_run.py): document_id → callback die elke geplande LLM-call
+# ontvangt. Voor zo'n document wordt geen enkele provider aangeroepen.
+_dry_run_planners: Dict[Any, Any] = {}
+# Profilering (analysis/criterion_profiler.py): document_id → CriterionProfile van de
+# lopende generate_feedback-run; ontvangt latency/tokens/retries per (criterium, sectie).
+_profilers: Dict[Any, Any] = {}
+# Prioriteit in de LLM-planner per document (generate_feedback(priority=...)): calls zonder
+# eigen prioriteit krijgen die van hun document, bijv. PRIORITY_LOW bij een herbeoordeling.
+_document_priorities: Dict[Any, int] = {}
+
+
+class DryRunSkipped(RuntimeError):
+    """De LLM-call is in een dry-run alleen gepland, niet uitgevoerd."""
+
+
+def _new_usage_totals() -> dict:
+    return {
+        'calls': 0, 'input_tokens': 0, 'output_tokens': 0,
+        'cache_created': 0, 'cache_read': 0,
+        'truncated_calls': 0, 'context_tokens_dropped': 0,
+        'cost_usd': 0.0,
+        # Modelroutering (zie _resolve_llm_routing): per tier calls/latency/kosten
+        'tiers': {},
+        'routed_reviews': 0, 'escalations': 0, 'escalation_reasons': {},
+        # llm_resilience: calls die naar het alternatieve model uitweken / gehedged werden
+        'failover_calls': 0, 'hedged_calls': 0,
+    }
+
+
+# Richtprijzen in USD per miljoen tokens (input, output), alleen voor rapportage.
+# Anthropic rekent cache-schrijven tegen 1,25× en cache-lezen tegen 0,1× de inputprijs.
+# Modelnamen met een datumsuffix (claude-haiku-4-5-20251001) vallen onder hun prefix.
+_MODEL_PRICES_PER_MTOK = {
+    'claude-haiku-4-5':  (1.00, 5.00),
+    'claude-sonnet-4-5': (3.00, 15.00),
+    'claude-opus-4-1':   (15.00, 75.00),
+    'gemini-2.5-flash':  (0.30, 2.50),
+    'gemini-2.5-pro':    (1.25, 10.00),
+}
+
+
+def _estimate_cost_usd(model: str, llm_result: dict) -> float:
+    """Geschatte kosten van één call; 0.0 voor modellen zonder bekende prijs."""
+    prices = next((p for name, p in _MODEL_PRICES_PER_MTOK.items()
+                   if (model or '').startswith(name)), None)
+    if prices is None:
+        return 0.0
+    price_in, price_out = prices
+    tokens_in = (llm_result.get('input_tokens', 0)
+                 + 1.25 * llm_result.get('cache_created', 0)
+                 + 0.1 * llm_result.get('cache_read', 0))
+    return (tokens_in * price_in + llm_result.get('output_tokens', 0) * price_out) / 1_000_000
+
+
+def reset_token_usage(document_id) -> None:
+    """
+    Begin een nieuwe telling voor dit document (aan het begin van een analyse) en
+    ruim de telling op na afloop (analysis_runner), zodat _token_usage niet groeit.
+    """
+    with _token_usage_lock:
+        _token_usage.pop(document_id, None)
+        _cache_warmed.pop(document_id, None)
+
+
+def _record_token_usage(document_id, llm_result: dict, model: str = None,
+                        tier: str = None, latency: float = 0.0) -> None:
+    """
+    Tel het token-gebruik van één LLM-call op bij het totaal van het document.
+    Met tier (bijv. 'snel' / 'sterk') ook calls, latency en kosten per routeringstier.
+    """
+    if document_id is None:
+        return
+    cost = _estimate_cost_usd(model, llm_result)
+    with _token_usage_lock:
+        totals = _token_usage.setdefault(document_id, _new_usage_totals())
+        totals['calls']         += 1
+        totals['input_tokens']  += llm_result.get('input_tokens', 0)
+        totals['output_tokens'] += llm_result.get('output_tokens', 0)
+        totals['cache_created'] += llm_result.get('cache_created', 0)
+        totals['cache_read']    += llm_result.get('cache_read', 0)
+        totals['cost_usd']      += cost
+        if tier:
+            t = totals['tiers'].setdefault(tier, {
+                'models': [], 'calls': 0, 'latency_s': 0.0,
+                'input_tokens': 0, 'output_tokens': 0, 'cost_usd': 0.0,
+            })
+            if model and model not in t['models']:
+                t['models'].append(model)
+            t['calls']         += 1
+            t['latency_s']     += latency
+            t['input_tokens']  += llm_result.get('input_tokens', 0)
+            t['output_tokens'] += llm_result.get('output_tokens', 0)
+            t['cost_usd']      += cost
+
+
+def _record_routing(document_id, escalation_reason: str = None) -> None:
+    """Tel één gerouteerde llm_review; met reden als die (ook) naar het sterke model ging."""
+    if document_id is None:
+        return
+    with _token_usage_lock:
+        totals = _token_usage.setdefault(document_id, _new_usage_totals())
+        totals['routed_reviews'] += 1
+        if escalation_reason:
+            totals['escalations'] += 1
+            reasons = totals['escalation_reasons']
+            reasons[escalation_reason] = reasons.get(escalation_reason, 0) + 1
+
+
+def _record_resilience(document_id, info: dict) -> None:
+    """Tel failover en hedging van één call (info uit llm_resilience.call_with_resilience)."""
+    if document_id is None:
+        return
+    with _token_usage_lock:
+        totals = _token_usage.setdefault(document_id, _new_usage_totals())
+        if info.get('hedged'):
+            totals['hedged_calls'] += 1
+        elif info.get('failover'):
+            totals['failover_calls'] += 1
+
+
+def _record_context_report(document_id, report: dict) -> None:
+    """Tel calls waarvan de context door het tokenbudget is ingekort (zie context_budget)."""
+    if document_id is None or not report.get('truncated'):
+        return
+    dropped = sum(
+        r['original_tokens'] - r['tokens']
+        for r in (report.get('doc'), report.get('section')) if r
+    )
+    with _token_usage_lock:
+        totals = _token_usage.setdefault(document_id, _new_usage_totals())
+        totals['truncated_calls']        += 1
+        totals['context_tokens_dropped'] += dropped
+
+
+@contextlib.contextmanager
+def _collect_call_usage():
+    """
+    Verzamel de llm_results van de geslaagde calls in deze thread (en in de taken die
+    _run_llm_tasks van hieruit start). Levert de lijst op.
+    """
+    calls = []
+    previous = getattr(_task_usage, 'calls', None)
+    _task_usage.calls = calls
+    try:
+        yield calls
+    finally:
+        _task_usage.calls = previous
+
+
+def get_token_usage_summary(document_id) -> dict:
+    """
+    Samenvatting van het token-gebruik voor een document, inclusief cache-ratio's:
+      cache_hit_ratio   : cache_read / (cache_read + cache_created)
+      cached_input_share: aandeel van alle input-tokens dat uit de cache kwam
+    truncated_calls en context_tokens_dropped tonen hoe vaak het contextbudget knelde.
+    Modelroutering: escalation_rate (escalaties / gerouteerde reviews) en per tier
+    de gemiddelde latency (avg_latency_s) en kosten (cost_usd, geschat).
+    """
+    import copy
+    with _token_usage_lock:
+        totals = copy.deepcopy(_token_usage.get(document_id) or _new_usage_totals())
+    cache_total = totals['cache_read'] + totals['cache_created']
+    input_total = totals['input_tokens'] + cache_total
+    totals['cache_hit_ratio']    = round(totals['cache_read'] / cache_total, 3) if cache_total else 0.0
+    totals['cached_input_share'] = round(totals['cache_read'] / input_total, 3) if input_total else 0.0
+    totals['cost_usd'] = round(totals['cost_usd'], 4)
+    totals['escalation_rate'] = (round(totals['escalations'] / totals['routed_reviews'], 3)
+                                 if totals['routed_reviews'] else 0.0)
+    for t in totals['tiers'].values():
+        t['avg_latency_s'] = round(t['latency_s'] / t['calls'], 2) if t['calls'] else 0.0
+        t['latency_s'] = round(t['latency_s'], 2)
+        t['cost_usd']  = round(t['cost_usd'], 4)
+    return totals
+
+
 # ---------------------------------------------------------------------------
 # Universele LLM-caller: ondersteunt Anthropic (claude-*) én Google Gemini (gemini-*)
 # ---------------------------------------------------------------------------
 
+_JSON_OBJECT_START_RE = re.compile(r'\{\s*["}]')
+
+
 def _extract_json(raw: str) -> dict:
     """
     Extraheer een JSON-object uit een LLM-respons op een robuuste manier.
@@ -597,8 +904,11 @@ def _extract_json(raw: str) -> dict:
     - Naambule tekst na de JSON
     - Geneste accolades (vindt het buitenste complete object)
 
-    Strategie: probeer van het meest rechtse '{' naar links — Gemini-denktekst
-    staat vrijwel altijd VOOR de daadwerkelijke JSON-payload.
+    Strategie: één doorloop van links naar rechts met json.JSONDecoder.raw_decode.
+    Een geslaagd object wordt in zijn geheel overgeslagen, zodat elk teken in de
+    praktijk één keer door de (C-)scanner gaat in plaats van per '{' opnieuw.
+    Voorkeur: het grootste object met de verwachte sleutels ('oordeel' + 'problemen',
+    ook als het genest in een ander object staat), anders het grootste geldige object.
     """
     import logging as _l
     _log = _l.getLogger('docucheck')
@@ -613,51 +923,29 @@ def _extract_json(raw: str) -> dict:
     except json.JSONDecodeError:
         pass
 
-    # Stap 3: vind alle complete JSON-objecten (links naar rechts).
-    # Gebruik een string-aware nesting-teller zodat { in strings niet meetellen.
-    # Geef voorkeur aan het grootste object dat de verwachte sleutels bevat
-    # ('oordeel' + 'problemen'), anders het grootste geldige object.
-    brace_positions = [i for i, c in enumerate(text) if c == '{']
-    candidates = []
-    for start in brace_positions:
-        depth = 0
-        end = -1
-        in_string = False
-        escape_next = False
-        for j in range(start, len(text)):
-            ch = text[j]
-            if escape_next:
-                escape_next = False
-                continue
-            if ch == '\\' and in_string:
-                escape_next = True
-                continue
-            if ch == '"':
-                in_string = not in_string
-                continue
-            if in_string:
-                continue
-            if ch == '{':
-                depth += 1
-            elif ch == '}':
-                depth -= 1
-                if depth == 0:
-                    end = j
-                    break
-        if end > start:
-            candidate = text[start:end + 1]
-            try:
-                parsed = json.loads(candidate)
-                candidates.append((end - start, parsed))  # (grootte, object)
-            except json.JSONDecodeError:
-                continue
+    # Stap 3: één doorloop over de tekst; verzamel complete top-level objecten.
+    # Alleen '{' gevolgd door '"' of '}' kan een JSON-object openen; losse accolades
+    # in denktekst ('{x}') worden zo overgeslagen zonder decodeerpoging.
+    decoder = json.JSONDecoder()
+    candidates = []   # (grootte, object)
+    m = _JSON_OBJECT_START_RE.search(text)
+    while m:
+        pos = m.start()
+        try:
+            obj, end = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            m = _JSON_OBJECT_START_RE.search(text, pos + 1)
+            continue
+        if isinstance(obj, dict):
+            candidates.append((end - pos, obj))
+        m = _JSON_OBJECT_START_RE.search(text, end)
 
     if candidates:
         # Geef voorkeur aan het grootste object met de verwachte sleutels
-        schema_matches = [
-            (size, obj) for size, obj in candidates
-            if 'oordeel' in obj and 'problemen' in obj
-        ]
+        schema_matches = []
+        for size, obj in candidates:
+            for sub_size, sub in _iter_schema_objects(obj, size):
+                schema_matches.append((sub_size, sub))
         if schema_matches:
             return max(schema_matches, key=lambda x: x[0])[1]
         # Geen schema-match: geef het grootste geldige object terug
@@ -667,12 +955,89 @@ def _extract_json(raw: str) -> dict:
     raise ValueError(f"Geen geldige JSON in LLM-response (lengte={len(raw)})")
 
 
+def _iter_schema_objects(obj, size: int):
+    """
+    Levert (grootte, dict) voor elk object in obj (inclusief obj zelf) dat de
+    verwachte sleutels 'oordeel' + 'problemen' bevat. Voor geneste objecten wordt
+    de grootte benaderd met de lengte van de geserialiseerde vorm.
+    """
+    stack = [(obj, size)]
+    while stack:
+        node, node_size = stack.pop()
+        if isinstance(node, dict):
+            if 'oordeel' in node and 'problemen' in node:
+                yield node_size, node
+                continue   # geneste objecten zijn altijd kleiner
+            children = node.values()
+        elif isinstance(node, list):
+            children = node
+        else:
+            continue
+        for child in children:
+            if isinstance(child, (dict, list)):
+                stack.append((child, len(json.dumps(child, ensure_ascii=False))))
+
+
+# JSON-schema's voor provider-native gestructureerde output (tool-use bij
+# Anthropic, response_schema bij Gemini). Zelfde velden als _LLM_RESPONSE_SCHEMA.
+_LLM_RESPONSE_JSON_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'oordeel': {'type': 'string', 'enum': ['onvoldoende', 'matig', 'voldoende', 'goed']},
+        'problemen': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'citaat':    {'type': 'string'},
+                    'probleem':  {'type': 'string'},
+                    'suggestie': {'type': 'string'},
+                },
+                'required': ['citaat', 'probleem', 'suggestie'],
+            },
+        },
+        'samenvatting': {'type': 'string'},
+    },
+    'required': ['oordeel', 'problemen', 'samenvatting'],
+}
+
+_LLM_RESPONSE_JSON_SCHEMA_NO_SUGGESTIONS = {
+    **_LLM_RESPONSE_JSON_SCHEMA,
+    'properties': {
+        **_LLM_RESPONSE_JSON_SCHEMA['properties'],
+        'problemen': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'citaat':   {'type': 'string'},
+                    'probleem': {'type': 'string'},
+                },
+                'required': ['citaat', 'probleem'],
+            },
+        },
+    },
+}
+
+_STRUCTURED_TOOL_NAME = 'beoordeling'
+
+
+def _use_structured_output(params: dict) -> bool:
+    """Per criterium (llm_structured_output) of globaal (LLM_STRUCTURED_OUTPUT)."""
+    if 'llm_structured_output' in params:
+        return bool(params['llm_structured_output'])
+    from config import Config
+    return Config.LLM_STRUCTURED_OUTPUT
+
+
 def _call_llm(
     model: str,
-    role_prompt: str,
+    system_prompt: str,
     cached_text: str,
     uncached_text: str,
     max_tokens: int = 4096,
+    on_text=None,
+    response_schema: dict = None,
 ) -> dict:
     """
     Voert één LLM-call uit en geeft een uniform resultaat-dict terug:
@@ -682,17 +1047,30 @@ def _call_llm(
         'output_tokens': int,
         'cache_created': int,  # altijd 0 voor Gemini
         'cache_read': int,     # altijd 0 voor Gemini
+        'parsed': dict | None, # alleen bij response_schema: het gestructureerde antwoord
       }
 
     Routering:
       model begint met 'gemini-' → Google Generative AI SDK
       anders                     → Anthropic (met prompt-caching)
 
+    Volgorde in de prompt: system_prompt → cached_text → uncached_text.
+    Persona's en criteria horen in uncached_text (zie _build_llm_system_prompt).
+
+    on_text: optionele callback. Indien opgegeven wordt de respons gestreamd en
+    wordt on_text(delta) aangeroepen voor elk binnenkomend tekstfragment.
+    Het resultaat-dict is gelijk aan de niet-gestreamde variant.
+
+    response_schema: optioneel JSON-schema. Dan levert de provider het antwoord
+    native gestructureerd (Anthropic: geforceerde tool-use; Gemini: JSON-modus met
+    response_schema) en staat het resultaat in 'parsed' — geen tekst-extractie nodig.
+
     Raises een Exception bij API-fouten zodat de aanroepende code retry kan doen.
     """
     if model.startswith('gemini'):
         import os
         import google.generativeai as _genai
+        from config import Config
 
         # API-sleutel ophalen (ook via .env als die nog niet geladen is)
         api_key = os.environ.get('GEMINI_API_KEY')
@@ -703,38 +1081,82 @@ def _call_llm(
                 api_key = os.environ.get('GEMINI_API_KEY')
             except ImportError:
                 pass
+        if not api_key and Config.GEMINI_BASE_URL:
+            api_key = 'stub'   # lokale stub (llm_stub_server.py) controleert geen sleutel
         if not api_key:
             raise RuntimeError('GEMINI_API_KEY niet gevonden in omgevingsvariabelen.')
 
-        _genai.configure(api_key=api_key)
+        if Config.GEMINI_BASE_URL:
+            _genai.configure(api_key=api_key, transport='rest',
+                             client_options={'api_endpoint': Config.GEMINI_BASE_URL})
+        else:
+            _genai.configure(api_key=api_key)
         gmodel = _genai.GenerativeModel(
             model_name=model,
-            system_instruction=role_prompt,
+            system_instruction=system_prompt,
         )
         # Gemini kent geen prompt-caching via de messages-API op deze manier;
         # we sturen cached_text en uncached_text gewoon aaneengesloten als één prompt.
         combined_prompt = cached_text + '\n\n' + uncached_text
-        resp = gmodel.generate_content(
-            combined_prompt,
-            generation_config=_genai.GenerationConfig(max_output_tokens=max_tokens),
-        )
+        if response_schema is not None:
+            generation_config = _genai.GenerationConfig(
+                max_output_tokens=max_tokens,
+                response_mime_type='application/json',
+                response_schema=response_schema,
+            )
+        else:
+            generation_config = _genai.GenerationConfig(max_output_tokens=max_tokens)
+        request_options = {'timeout': Config.LLM_CALL_TIMEOUT_S}
+        if on_text is not None:
+            resp = gmodel.generate_content(
+                combined_prompt, generation_config=generation_config, stream=True,
+                request_options=request_options,
+            )
+            parts = []
+            for chunk in resp:
+                try:
+                    delta = chunk.text
+                except ValueError:
+                    continue  # chunk zonder tekst (bijv. alleen metadata)
+                if delta:
+                    parts.append(delta)
+                    on_text(delta)
+            text = ''.join(parts)
+        else:
+            resp = gmodel.generate_content(
+                combined_prompt, generation_config=generation_config, request_options=request_options,
+            )
+            text = resp.text
         usage = resp.usage_metadata
+        parsed = None
+        if response_schema is not None:
+            try:
+                parsed = json.loads(text)
+            except (json.JSONDecodeError, TypeError):
+                parsed = None   # valt terug op _extract_json() bij de aanroeper
         return {
-            'text':          resp.text,
+            'text':          text,
             'input_tokens':  getattr(usage, 'prompt_token_count', 0) or 0,
             'output_tokens': getattr(usage, 'candidates_token_count', 0) or 0,
             'cache_created': 0,
             'cache_read':    0,
+            'parsed':        parsed if isinstance(parsed, dict) else None,
         }
     else:
         # Anthropic — met prompt-caching
         import anthropic as _anthropic
         from config import Config
-        client = _anthropic.Anthropic(api_key=Config.ANTHROPIC_API_KEY)
-        resp = client.messages.create(
+        # Begrensde timeout: een hangende provider kost zo hooguit LLM_CALL_TIMEOUT_S per
+        # poging, en de circuit breaker (llm_resilience) stopt verdere pogingen.
+        client = _anthropic.Anthropic(
+            api_key=Config.ANTHROPIC_API_KEY or ('stub' if Config.ANTHROPIC_BASE_URL else None),
+            base_url=Config.ANTHROPIC_BASE_URL or None,
+            timeout=Config.LLM_CALL_TIMEOUT_S,
+        )
+        request = dict(
             model=model,
             max_tokens=max_tokens,
-            system=role_prompt,
+            system=system_prompt,
             messages=[{
                 'role': 'user',
                 'content': [
@@ -751,16 +1173,536 @@ def _call_llm(
             }],
             extra_headers={'anthropic-beta': 'prompt-caching-2024-07-31'},
         )
+        if response_schema is not None:
+            # Tool-definities staan vóór het systeemprompt in de cache-prefix; het
+            # schema is per document constant, dus de prefix blijft gedeeld.
+            request['tools'] = [{
+                'name': _STRUCTURED_TOOL_NAME,
+                'description': 'Lever de beoordeling van de sectie aan in het vaste formaat.',
+                'input_schema': response_schema,
+            }]
+            request['tool_choice'] = {'type': 'tool', 'name': _STRUCTURED_TOOL_NAME}
+        if on_text is not None:
+            with client.messages.stream(**request) as stream:
+                for event in stream:
+                    if event.type == 'text':
+                        on_text(event.text)
+                    elif event.type == 'input_json':
+                        on_text(event.partial_json)   # tool-input streamt als JSON-tekst
+                resp = stream.get_final_message()
+        else:
+            resp = client.messages.create(**request)
         u = resp.usage
+        parsed = next(
+            (b.input for b in resp.content
+             if getattr(b, 'type', '') == 'tool_use' and isinstance(b.input, dict)),
+            None,
+        )
         return {
-            'text':          resp.content[0].text,
+            'text':          ''.join(b.text for b in resp.content if getattr(b, 'type', '') == 'text'),
             'input_tokens':  u.input_tokens,
             'output_tokens': u.output_tokens,
             'cache_created': getattr(u, 'cache_creation_input_tokens', 0) or 0,
             'cache_read':    getattr(u, 'cache_read_input_tokens', 0) or 0,
+            'parsed':        parsed,
         }
 
 
+class _ProblemenStreamParser:
+    """
+    Incrementele parser voor gestreamde LLM-antwoorden in het _LLM_RESPONSE_SCHEMA.
+
+    feed(delta) retourneert de 'problemen'-entries die sinds de vorige aanroep
+    volledig binnen zijn. Elk entry wordt precies één keer teruggegeven.
+    Het oordeel wordt uitgelezen zodra het in de stream staat (self.oordeel).
+
+    De parser is een voorproefje voor live feedback: het definitieve resultaat
+    komt altijd uit _extract_json() op de volledige respons.
+    """
+
+    _OORDEEL_RE   = re.compile(r'"oordeel"\s*:\s*"([a-zA-Z]+)"')
+    _PROBLEMEN_RE = re.compile(r'"problemen"\s*:\s*\[')
+
+    def __init__(self):
+        self._buf = ''
+        self._pos = None      # positie in _buf waar het volgende entry kan beginnen
+        self._done = False
+        self._decoder = json.JSONDecoder()
+        self.oordeel = None
+
+    def feed(self, delta: str) -> list:
+        self._buf += delta
+        if self.oordeel is None:
+            m = self._OORDEEL_RE.search(self._buf)
+            if m:
+                self.oordeel = m.group(1).lower()
+        if self._done:
+            return []
+        if self._pos is None:
+            m = self._PROBLEMEN_RE.search(self._buf)
+            if not m:
+                return []
+            self._pos = m.end()
+
+        found = []
+        buf = self._buf
+        while True:
+            pos = self._pos
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buf):
+                break
+            if buf[pos] == ']':
+                self._done = True
+                break
+            try:
+                obj, end = self._decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # entry nog niet compleet — wacht op meer tekst
+            self._pos = end
+            if isinstance(obj, dict):
+                found.append(obj)
+        return found
+
+
+def _is_rate_limit_error(exc: Exception) -> bool:
+    """True als de fout een rate-limit/quota-fout van de provider is."""
+    exc_str = str(exc)
+    return '429' in exc_str or 'rate_limit' in exc_str.lower() or 'quota' in exc_str.lower()
+
+
+def _call_llm_with_retry(
+    model: str,
+    system_prompt: str,
+    cached_text: str,
+    uncached_text: str,
+    max_tokens: int,
+    label: str,
+    document_id=None,
+    on_text_factory=None,
+    response_schema: dict = None,
+    priority: int = None,
+    tier: str = None,
+    criterion_id=None,
+    section_name: str = None,
+):
+    """
+    Roept _call_llm aan met retry bij rate-limiting (15s, 30s, 60s) en telt
+    het token-gebruik op bij het document. Andere fouten worden niet herhaald.
+    tier: routeringstier van deze call ('snel' / 'sterk'); telt latency en kosten per tier.
+
+    Elke aanroep (geslaagd of niet) wordt als één rij in llm_calls vastgelegd
+    (llm_telemetry), met criterion_id en section_name als herkomst, en bij een
+    lopende profilering ook in het CriterionProfile van het document.
+    Loopt voor document_id een dry-run, dan wordt de call alleen aan de planner
+    doorgegeven en komt (None, DryRunSkipped) terug.
+
+    Elke poging wacht op een slot van de procesbrede LLM-planner (llm_scheduler);
+    priority bepaalt de volgorde bij drukte (standaard PRIORITY_NORMAL). Het
+    wachten na een rate-limit gebeurt buiten het slot.
+
+    Elke poging loopt via llm_resilience: staat de circuit breaker van de provider
+    open, dan gaat de call naar het failover-model of faalt hij direct (geen retry);
+    met LLM_HEDGING gaat na de p95-latency een duplicaat naar het alternatieve model.
+
+    on_text_factory: optioneel; levert per poging een verse on_text-callback
+    (zodat een herhaalde, gestreamde poging niet met de vorige vermengd raakt).
+    Zonder factory of met LLM_STREAMING=false wordt niet gestreamd.
+
+    Retourneert (llm_result, last_exc): llm_result is None als alle pogingen faalden.
+    """
+    import time as _time
+    import logging as _log
+    _logger = _log.getLogger('docucheck')
+
+    from config import Config
+    from analysis.llm_scheduler import get_scheduler, PRIORITY_NORMAL
+    from analysis.llm_resilience import CircuitOpenError, HedgeCancelled, call_with_resilience
+    from analysis import llm_telemetry
+    planner = _dry_run_planners.get(document_id) if document_id is not None else None
+    if planner is not None:
+        planner(model=model, system_prompt=system_prompt, cached_text=cached_text,
+                uncached_text=uncached_text, max_tokens=max_tokens, label=label,
+                response_schema=response_schema, tier=tier,
+                criterion_id=criterion_id, section_name=section_name)
+        return None, DryRunSkipped(label)
+    if not Config.LLM_STREAMING:
+        on_text_factory = None
+    scheduler = get_scheduler()
+    if priority is None:
+        priority = _document_priorities.get(document_id, PRIORITY_NORMAL) \
+            if document_id is not None else PRIORITY_NORMAL
+
+    def _attempt(call_model: str, cancel_event):
+        extra = {}
+        on_text = on_text_factory() if on_text_factory is not None else None
+        if cancel_event is not None:
+            # Gehedgede call: altijd streamen zodat de verliezer tussen twee fragmenten
+            # kan stoppen; live feedback alleen vanuit het oorspronkelijke model.
+            live = on_text if call_model == model else None
+
+            def on_text(delta, _live=live):
+                if cancel_event.is_set():
+                    raise HedgeCancelled()
+                if _live is not None:
+                    _live(delta)
+        if on_text is not None:
+            extra['on_text'] = on_text
+        if response_schema is not None:
+            extra['response_schema'] = response_schema
+        with scheduler.slot(priority):
+            if cancel_event is not None and cancel_event.is_set():
+                raise HedgeCancelled()
+            return _call_llm(call_model, system_prompt, cached_text, uncached_text,
+                             max_tokens=max_tokens, **extra)
+
+    def _telemetry(call_model, latency, attempts, outcome, llm_result=None, info=None):
+        llm_telemetry.record_call(
+            document_id=document_id, criterion_id=criterion_id, section_name=section_name,
+            label=label, model=call_model, tier=tier, latency=latency, llm_result=llm_result,
+            cost_usd=_estimate_cost_usd(call_model, llm_result) if llm_result else 0.0,
+            attempts=attempts, outcome=outcome,
+            failover=bool(info and info['failover']), hedged=bool(info and info['hedged']),
+        )
+        profiler = _profilers.get(document_id) if document_id is not None else None
+        if profiler is not None and criterion_id is not None:
+            profiler.add_llm_call(criterion_id, section_name, latency, attempts, llm_result)
+
+    # Latency in de telemetrie = hele aanroep, inclusief eerdere pogingen en wachttijd
+    # na een rate-limit (geslaagd of niet gelijk gemeten)
+    last_exc = None
+    outcome = 'fout'
+    t0 = _time.time()
+    for _attempt_nr in range(3):
+        try:
+            llm_result, info = call_with_resilience(model, _attempt, label=label)
+        except CircuitOpenError as exc:
+            last_exc, outcome = exc, 'breaker_open'
+            _logger.warning(f"[BREAKER] {label} | {exc}")
+            break  # provider onbereikbaar: direct falen i.p.v. wachten op timeouts
+        except Exception as exc:
+            last_exc = exc
+            if _is_rate_limit_error(exc):
+                outcome = 'rate_limit'
+                wait = 15 * (2 ** _attempt_nr)   # 15s, 30s, 60s
+                _logger.warning(
+                    f"[RATE LIMIT] {label} | poging {_attempt_nr + 1}/3 | wacht {wait}s | "
+                    f"fout: {str(exc)[:300]}"
+                )
+                _time.sleep(wait)
+                continue
+            _logger.warning(f"[LLM FOUT] {label} | fout: {str(exc)[:300]}")
+            outcome = 'fout'
+            break  # niet-rate-limit fout: meteen stoppen
+        _record_token_usage(document_id, llm_result, model=info['model'], tier=tier,
+                            latency=info['latency'])
+        collected = getattr(_task_usage, 'calls', None)
+        if collected is not None:
+            collected.append(llm_result)
+        _telemetry(info['model'], _time.time() - t0, _attempt_nr + 1, 'ok', llm_result, info)
+        if info['failover'] or info['hedged']:
+            _record_resilience(document_id, info)
+        doc_rate = ''
+        if document_id is not None:
+            doc_rate = f" | doc_cache_read_rate={get_token_usage_summary(document_id)['cache_hit_ratio']:.0%}"
+        _logger.info(
+            f"TOKEN-GEBRUIK | {label} | model={info['model']}{f' | tier={tier}' if tier else ''} | "
+            f"input={llm_result['input_tokens']} | output={llm_result['output_tokens']} | "
+            f"cache_created={llm_result['cache_created']} | cache_read={llm_result['cache_read']} | "
+            f"totaal={llm_result['input_tokens'] + llm_result['output_tokens']}{doc_rate}"
+        )
+        return llm_result, None
+    _telemetry(model, _time.time() - t0, _attempt_nr + 1, outcome)
+    return None, last_exc
+
+
+# Maximaal aantal warming-calls na elkaar als de vorige mislukte (zie _run_llm_tasks)
+_WARMUP_ATTEMPTS = 3
+
+
+def _run_llm_tasks(tasks: list, run_one, document_id=None, label: str = 'LLM') -> List[tuple]:
+    """
+    Voert LLM-taken uit met cache-warming:
+      1. De eerste taak draait alleen — die maakt de ephemeral prompt-cache aan.
+      2. Pas als de provider een cache-schrijf (of -lees) meldt, worden de overige
+         taken parallel gestart; zij lezen uit de cache in plaats van elk opnieuw
+         cache_creation_input_tokens te betalen. Mislukt de warming-call, dan warmt
+         de volgende taak (maximaal _WARMUP_ATTEMPTS keer); slaagt hij zonder
+         cache-melding (provider zonder prompt-caching), dan valt er niets te wachten.
+    Warming gebeurt één keer per document (na reset_token_usage): een gelijktijdige
+    fase wacht op de lopende warming-taak en slaat daarna de eigen warming over.
+
+    run_one(task) voert één taak uit; fouten worden gelogd en leveren None op.
+    Retourneert een lijst van (task, result).
+    """
+    import logging as _log
+    from config import Config
+    _logger = _log.getLogger('docucheck')
+
+    def _safe_run(task):
+        try:
+            return run_one(task)
+        except Exception as exc:
+            _logger.warning(f"[{label}] Fout bij taak: {exc}")
+            return None
+
+    # Genest binnen een warming-taak: calls uit de pool tellen ook voor die warming
+    collect = getattr(_task_usage, 'calls', None)
+
+    def _pooled(task):
+        _task_usage.calls = collect
+        try:
+            return _safe_run(task)
+        finally:
+            _task_usage.calls = None
+
+    results: List[tuple] = []
+    if not tasks:
+        return results
+
+    max_workers = max(1, Config.LLM_MAX_WORKERS)
+    remaining = list(tasks)
+
+    # Loopt er voor dit document al een warming-taak (bijv. van een gelijktijdige
+    # fase), dan daarop wachten en daarna direct alles parallel starten.
+    warm_event, owner = None, True
+    if Config.LLM_CACHE_WARMUP and document_id is not None:
+        with _token_usage_lock:
+            entry = _cache_warmed.get(document_id)
+            owner = entry is None
+            if owner:
+                warm_event = threading.Event()
+                _cache_warmed[document_id] = (warm_event, threading.get_ident())
+        if not owner and entry[1] != threading.get_ident():
+            if not entry[0].wait(timeout=Config.LLM_CACHE_WARMUP_WAIT_S):
+                _logger.warning(
+                    f"[{label}] Cache-warming document={document_id} niet klaar na "
+                    f"{Config.LLM_CACHE_WARMUP_WAIT_S}s; taken starten zonder te wachten"
+                )
+
+    if owner and Config.LLM_CACHE_WARMUP and max_workers > 1 and len(remaining) > 1:
+        try:
+            for attempt in range(1, _WARMUP_ATTEMPTS + 1):
+                first = remaining.pop(0)
+                with _collect_call_usage() as calls:
+                    results.append((first, _safe_run(first)))
+                created = sum(c.get('cache_created', 0) for c in calls)
+                read = sum(c.get('cache_read', 0) for c in calls)
+                confirmed = created > 0 or read > 0
+                answered = bool(calls)
+                _logger.info(
+                    f"[{label}] Cache-warming document={document_id} (poging {attempt}): "
+                    f"{'cache bevestigd' if confirmed else 'geen cache gerapporteerd'} "
+                    f"(created={created}, read={read})"
+                    + ('' if confirmed or answered else ' — call mislukt, volgende taak warmt')
+                )
+                # Zonder cache-melding maar met antwoord: provider cachet niet, niets te wachten
+                if confirmed or answered or len(remaining) <= 1:
+                    break
+        finally:
+            if warm_event is not None:
+                warm_event.set()
+        _logger.info(f"[{label}] document={document_id}: {len(remaining)} taken vrijgegeven")
+    elif owner and warm_event is not None and len(remaining) == 1:
+        # Eén taak: die warmt zelf de cache; gelijktijdige fases wachten erop
+        first = remaining.pop(0)
+        try:
+            results.append((first, _safe_run(first)))
+        finally:
+            warm_event.set()
+    elif owner and warm_event is not None:
+        warm_event.set()   # geen warming mogelijk (1 worker): niemand laten wachten
+
+    print(f"[{label}] {len(remaining)} taken gestart met max {max_workers} workers")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_map = {executor.submit(_pooled, task): task for task in remaining}
+        for future in as_completed(future_map):
+            results.append((future_map[future], future.result()))
+    return results
+
+
+def _llm_review_status(oordeel: str, criterion: dict) -> str:
+    """Status op basis van het LLM-oordeel; respecteer criterion.severity als override."""
+    base_status = _OORDEEL_TO_STATUS.get(oordeel, 'warning')
+    crit_severity = get_criterion_value(criterion, 'severity')
+    # Alleen overschrijven als de criterium-severity 'warning' is (standaard) of hoger
+    if crit_severity in ('violation', 'error') and base_status == 'warning':
+        base_status = crit_severity
+    return base_status
+
+
+def _llm_problem_item(criterion: dict, section: dict, problem: dict, status: str, samen: str = '') -> dict:
+    """Zet één 'problemen'-entry uit een LLM-antwoord om naar een feedback-item."""
+    citaat    = (problem.get('citaat') or '').strip()[:200]
+    probleem  = (problem.get('probleem') or '').strip()
+    suggestie = (problem.get('suggestie') or '').strip()
+    item = {
+        'criteria_id':      get_criterion_value(criterion, 'id'),
+        'criteria_name':    get_criterion_value(criterion, 'name'),
+        'section_id':       section.get('db_id'),
+        'section_name':     section['name'],
+        'status':           status,
+        'message':          probleem or samen,
+        'suggestion':       suggestie,
+        'location':         f"Sectie: {section['name']}",
+        'confidence':       0.85,
+        'color':            get_criterion_value(criterion, 'color', '#4895EF'),
+        'offending_snippet': citaat if len(citaat) >= 5 else None,
+        'check_type':       'llm_review',
+    }
+    # Map-reduce: herkomst van het citaat binnen de sectie (zie _merge_chunk_results)
+    if 'chunk_offset' in problem:
+        item['chunk_offset']  = problem['chunk_offset']
+        item['citaat_offset'] = problem.get('citaat_offset')
+    return item
+
+
+def _live_stream_handler(criterion: dict, section: dict, sink=None):
+    """
+    Maakt een on_text-factory voor _call_llm_with_retry als de sectie een live
+    feed heeft (section['_live_feed']). Elk compleet 'problemen'-entry wordt
+    direct als voorlopig feedback-item (live=True) doorgegeven.
+    sink: ontvangt de items in plaats van de live feed (om ze vast te houden).
+    """
+    live_feed = section.get('_live_feed')
+    if live_feed is None:
+        return None
+    if sink is not None:
+        live_feed = sink
+
+    def factory():
+        parser = _ProblemenStreamParser()
+
+        def on_text(delta: str):
+            for problem in parser.feed(delta):
+                status = _llm_review_status(parser.oordeel or 'matig', criterion)
+                if status == 'ok':
+                    continue
+                item = _llm_problem_item(criterion, section, problem, status)
+                item['live'] = True
+                try:
+                    live_feed(item)
+                except Exception:
+                    pass  # live feed mag de beoordeling nooit breken
+        return on_text
+
+    return factory
+
+
+# Instructie bij deel-calls van een lange sectie (map-reduce).
+_CHUNK_NOTE = (
+    "LET OP — DEEL VAN EEN LANGE SECTIE: Je ziet hierboven één deel van de sectie. "
+    "Beoordeel alleen wat in dit deel staat. Markeer iets NIET als ontbrekend omdat het "
+    "niet in dit deel voorkomt — het kan in een ander deel van de sectie staan."
+)
+
+# Rangorde van oordelen, slechtste eerst (voor het samenvoegen van deel-oordelen)
+_OORDEEL_RANK = {'onvoldoende': 0, 'matig': 1, 'voldoende': 2, 'goed': 3}
+
+
+def _normalize_for_dedupe(text: str) -> str:
+    return re.sub(r'\s+', ' ', (text or '').strip().lower())
+
+
+def _merge_chunk_results(parts: list) -> dict:
+    """
+    Voeg de LLM-antwoorden van de delen van één sectie samen (reduce-stap).
+
+    parts: [(offset, deeltekst, result), ...]
+    - oordeel      : het slechtste deel-oordeel
+    - problemen    : alle problemen in sectievolgorde (max 5 per deel), zonder dubbelen
+                     (zelfde citaat + probleem); elk krijgt chunk_offset en, als het
+                     citaat in de deeltekst staat, citaat_offset (positie in de sectie)
+    - samenvatting : die van het deel met het slechtste oordeel
+    """
+    parts = sorted(parts, key=lambda p: p[0])
+    worst = min(
+        parts,
+        key=lambda p: _OORDEEL_RANK.get(str(p[2].get('oordeel', 'matig')).lower(), 1),
+    )
+    problemen, seen = [], set()
+    for offset, chunk_text, result in parts:
+        for problem in (result.get('problemen') or [])[:5]:
+            if not isinstance(problem, dict):
+                continue
+            key = (_normalize_for_dedupe(problem.get('citaat')),
+                   _normalize_for_dedupe(problem.get('probleem')))
+            if key in seen:
+                continue
+            seen.add(key)
+            citaat = (problem.get('citaat') or '').strip()
+            pos = chunk_text.find(citaat) if citaat else -1
+            problemen.append({
+                **problem,
+                'chunk_offset':  offset,
+                'citaat_offset': offset + pos if pos >= 0 else None,
+            })
+    return {
+        'oordeel':      str(worst[2].get('oordeel', 'matig')).lower(),
+        'problemen':    problemen,
+        'samenvatting': worst[2].get('samenvatting', ''),
+    }
+
+
+def _resolve_llm_routing(params: dict, section: dict) -> dict:
+    """
+    Modelkeuze voor één llm_review: criteriumparameters → documenttype (section['_routing'],
+    gezet door generate_feedback) → Config.
+
+    Criteriumparameters:
+        llm_model                 : vast model (oud gedrag); escaleert alleen met llm_strong_model
+        llm_fast_model            : model voor de eerste beoordeling
+        llm_strong_model          : model voor escalatie ('' = niet escaleren)
+        llm_escalate_on           : oordelen die escaleren (lijst of kommagescheiden)
+        llm_escalate_above_tokens : secties boven dit aantal tokens direct naar het sterke model
+        llm_routing               : false = geen escalatie voor dit criterium
+
+    Retourneert {'fast', 'strong', 'escalate_on', 'above_tokens'}; strong=None = geen escalatie.
+    """
+    from config import Config
+    doc_routing = section.get('_routing') or {}
+    fixed  = (params.get('llm_model') or '').strip()
+    fast   = ((params.get('llm_fast_model') or '').strip() or fixed
+              or doc_routing.get('fast_model') or Config.LLM_FAST_MODEL)
+    strong = (params.get('llm_strong_model') or '').strip()
+    if not strong and not fixed:
+        strong = doc_routing.get('strong_model') or Config.LLM_STRONG_MODEL
+    if params.get('llm_routing') is False or strong == fast:
+        strong = ''
+
+    escalate_on = params.get('llm_escalate_on', Config.LLM_ESCALATE_ON)
+    if isinstance(escalate_on, str):
+        escalate_on = escalate_on.split(',')
+    try:
+        above_tokens = int(params.get('llm_escalate_above_tokens', Config.LLM_ESCALATE_ABOVE_TOKENS) or 0)
+    except (TypeError, ValueError):
+        above_tokens = Config.LLM_ESCALATE_ABOVE_TOKENS
+    return {
+        'fast':         fast,
+        'strong':       strong or None,
+        'escalate_on':  {str(o).strip().lower() for o in escalate_on if str(o).strip()},
+        'above_tokens': above_tokens,
+    }
+
+
+def _is_valid_review(result) -> bool:
+    """Voldoet een LLM-antwoord aan het beoordelingsschema (bekend oordeel, problemen-lijst)?"""
+    return (
+        isinstance(result, dict)
+        and str(result.get('oordeel', '')).lower() in _OORDEEL_RANK
+        and isinstance(result.get('problemen', []), list)
+    )
+
+
+def _is_failed_review(result) -> bool:
+    """Fout-item van check_llm_review (call of JSON-parse mislukt) in plaats van een beoordeling?"""
+    return (
+        isinstance(result, dict)
+        and result.get('check_type') == 'llm_review'
+        and result.get('confidence') == 0.0
+    )
+
+
 def check_llm_review(criterion: dict, section: dict, db_connection: sqlite3.Connection = None):
     """
     Inhoudelijke beoordeling van een sectie via Claude (Anthropic API).
@@ -769,6 +1711,15 @@ def check_llm_review(criterion: dict, section: dict, db_connection: sqlite3.Conn
         llm_role_prompt     : str  - Persona/expertise die het LLM aanneemt
         llm_criteria_prompt : str  - Beoordelingscriteria in vrije tekst
         llm_check_ai_style  : bool - Voeg AI-stijldetectie toe aan de prompt
+        llm_context_mode    : str  - 'digest' (standaard: documentsamenvatting als context)
+                                     of 'full' (ruwe documenttekst binnen het tokenbudget)
+        llm_model / llm_fast_model / llm_strong_model / llm_escalate_on /
+        llm_escalate_above_tokens   - modelroutering, zie _resolve_llm_routing
+
+    Modelroutering: de eerste beoordeling gaat naar het snelle model. Is het oordeel
+    zwak (standaard 'onvoldoende'/'matig') of voldoet het antwoord niet aan het schema,
+    dan beoordeelt het sterke model de sectie opnieuw en telt dat antwoord. Secties
+    boven de complexiteitsdrempel gaan direct naar het sterke model.
 
     Retourneert een lijst van feedback-items (één per gevonden probleem),
     of één 'ok'-item als de sectie voldoet.
@@ -779,34 +1730,30 @@ def check_llm_review(criterion: dict, section: dict, db_connection: sqlite3.Conn
     except (json.JSONDecodeError, TypeError):
         params = {}
 
-    # Rolprompt: criterium-specifiek → document-type standaard (via section) → hardcoded fallback
+    # Rolprompt: criterium-specifiek → document-type standaard (via section) → hardcoded fallback.
+    # De persona gaat in het ONGECACHTE deel van de prompt; het systeemprompt is gedeeld
+    # zodat alle calls op dit document dezelfde cache-prefix hebben.
     role_prompt = (
         params.get('llm_role_prompt', '').strip()
         or section.get('_default_role_prompt', '')
         or 'Je bent een kritische Nederlandse docent die studentenwerk beoordeelt.'
     )
-    # Voeg datum en taalrichtlijnen toe aan het systeemprompt
-    # De datum voorkomt dat de LLM jaartallen uit de tekst ten onrechte als "toekomst" beoordeelt
-    from datetime import date as _date
-    _d = _date.today()
-    _maanden = ['januari','februari','maart','april','mei','juni',
-                'juli','augustus','september','oktober','november','december']
-    _vandaag_str = f"{_d.day} {_maanden[_d.month - 1]} {_d.year}"
-    role_prompt = (
-        role_prompt.rstrip()
-        + f'\n\nVANDAAG IS HET: {_vandaag_str}. '
-        + 'Beoordeel data en jaartallen in de tekst altijd ten opzichte van deze datum. '
-        + 'Een datum in 2025 of 2026 is dus NIET per definitie een toekomstige datum.\n\n'
-        + _NL_TAALGEBRUIK
-    )
+    system_prompt = _build_llm_system_prompt()
+
     criteria_prompt    = params.get('llm_criteria_prompt', '').strip()
     check_ai_style     = bool(params.get('llm_check_ai_style', False))
-    llm_model          = params.get('llm_model', '').strip() or 'claude-haiku-4-5'
+    routing            = _resolve_llm_routing(params, section)
 
     # show_suggestions: ingesteld op documenttype-niveau; default True.
     # False → slankere response-schema zonder "suggestie"-veld → bespaart ~30-60 output-tokens per probleem.
     show_suggestions   = bool(section.get('_show_suggestions', True))
     _response_schema   = _LLM_RESPONSE_SCHEMA if show_suggestions else _LLM_RESPONSE_SCHEMA_NO_SUGGESTIONS
+    # Gestructureerde output: de provider levert het antwoord direct als object.
+    # Uitschakelen per criterium met llm_structured_output=false (dan tekst + _extract_json).
+    _json_schema = None
+    if _use_structured_output(params):
+        _json_schema = (_LLM_RESPONSE_JSON_SCHEMA if show_suggestions
+                        else _LLM_RESPONSE_JSON_SCHEMA_NO_SUGGESTIONS)
 
     # --- Sectie-inhoud ophalen ---
     content = get_section_content(section, db_connection).strip()
@@ -819,142 +1766,222 @@ def check_llm_review(criterion: dict, section: dict, db_connection: sqlite3.Conn
     # maximale tokenbesparing. Uitschakelen kan per criterium via llm_use_full_doc_context=false.
     use_full_doc = bool(params.get('llm_use_full_doc_context', True))
     full_doc_text = (section.get('_full_doc_text') or '').strip()
-
-    if use_full_doc and full_doc_text:
-        # GECACHT blok: volledig document — identiek voor alle calls op dit document.
-        cached_text = (
-            f"[VOLLEDIG DOCUMENT — CONTEXT]\n{full_doc_text[:40000]}\n"
-            f"[/VOLLEDIG DOCUMENT]"
-        )
-        # ONGECACHT blok: de te beoordelen sectie + criteria + cross-sectie-instructie.
-        # De sectie-content staat hier expliciet zodat de LLM weet wat hij beoordeelt.
-        section_block = (
-            f"[TE BEOORDELEN SECTIE: '{section['name']}']\n"
-            f"{content[:8000]}\n"
-            f"[/TE BEOORDELEN SECTIE]"
-        )
-        cross_section_note = (
-            "LET OP — SCOPE: Beoordeel uitsluitend de bovenstaande sectie aan dit criterium. "
-            "Het volledige document staat hierboven als context. "
-            "Als een vereist element elders in het document aanwezig is (buiten de te beoordelen sectie), "
-            "benoem dit expliciet (bijv. 'Dit staat in sectie X, niet hier') — "
-            "maar markeer het NIET als 'ontbrekend' voor de huidige sectie."
+    # Documentdigest (zie document_digest): compacte context in plaats van de ruwe tekst.
+    # Per criterium terug te zetten naar de volledige tekst met llm_context_mode='full'.
+    digest_text = ''
+    if params.get('llm_context_mode', 'digest') != 'full':
+        digest_text = (section.get('_doc_digest_text') or '').strip()
+
+    from analysis.context_budget import estimate_tokens, plan_call_context, split_into_chunks
+    label = f"criterium={get_criterion_value(criterion, 'name')} | sectie={section['name']}"
+    on_text_factory = _live_stream_handler(criterion, section)
+    # Met escalatie gaan de live-items van het snelle model pas na de escalatiebeslissing
+    # naar de feed: bij escalatie vervallen ze en streamt alleen het sterke model.
+    held_live_items = []
+    held_text_factory = _live_stream_handler(criterion, section, sink=held_live_items.append) \
+        if routing['strong'] else None
+    invalid_replies = []   # modellen waarvan een antwoord niet als JSON te verwerken was
+
+    def _review(text: str, llm_model: str, tier: str, part: str = ''):
+        """
+        Eén LLM-call op text (de hele sectie of één deel ervan).
+        Retourneert (result, None) of (None, fout-item).
+        """
+        call_label = f"{label} | deel={part}" if part else label
+        sec_title  = f"{section['name']} — deel {part}" if part else section['name']
+
+        # --- Tokenbudget verdelen over documentcontext, sectie en buursecties ---
+        plan = plan_call_context(
+            full_doc_text if use_full_doc and not digest_text else '',
+            text,
+            llm_model,
+            neighbours=section.get('_neighbours'),
+            **_context_budget_for(section),
         )
-        uncached_blocks = [section_block]
-        if criteria_prompt:
-            uncached_blocks.append(f"BEOORDELINGSCRITERIA:\n{criteria_prompt}")
-        if check_ai_style:
-            uncached_blocks.append(_AI_STYLE_PROMPT_NL)
-        uncached_blocks.append(cross_section_note)
+        _log_context_report(call_label, section.get('_document_id'), plan['report'])
+        neighbour_block = plan['neighbour_text']
+
+        if use_full_doc and (digest_text or full_doc_text):
+            # GECACHT blok: documentcontext — identiek voor alle calls op dit document.
+            if digest_text:
+                cached_text = _build_digest_context_block(digest_text)
+            else:
+                cached_text = _build_document_context_block(plan['doc_text'])
+            # ONGECACHT blok: rol + te beoordelen sectie + criteria + cross-sectie-instructie.
+            # De sectie-content staat hier expliciet zodat de LLM weet wat hij beoordeelt.
+            section_block = (
+                f"[TE BEOORDELEN SECTIE: '{sec_title}']\n"
+                f"{plan['section_text']}\n"
+                f"[/TE BEOORDELEN SECTIE]"
+            )
+            cross_section_note = (
+                "LET OP — SCOPE: Beoordeel uitsluitend de bovenstaande sectie aan dit criterium. "
+                + (_DIGEST_SCOPE_NOTE if digest_text else "Het volledige document staat hierboven als context. ")
+                + "Als een vereist element elders in het document aanwezig is (buiten de te beoordelen sectie), "
+                "benoem dit expliciet (bijv. 'Dit staat in sectie X, niet hier') — "
+                "maar markeer het NIET als 'ontbrekend' voor de huidige sectie."
+            )
+            uncached_blocks = [_build_role_block(role_prompt), section_block]
+            if neighbour_block:
+                uncached_blocks.append(neighbour_block)
+            if criteria_prompt:
+                uncached_blocks.append(f"BEOORDELINGSCRITERIA:\n{criteria_prompt}")
+            if check_ai_style:
+                uncached_blocks.append(_AI_STYLE_PROMPT_NL)
+            uncached_blocks.append(cross_section_note)
+        else:
+            # Fallback: alleen de sectie-content gecacht (geen volledige documentcontext).
+            cached_text = (
+                f"[TE BEOORDELEN SECTIE — '{sec_title}']\n{plan['section_text']}\n"
+                f"[/TE BEOORDELEN SECTIE]"
+            )
+            uncached_blocks = [_build_role_block(role_prompt)]
+            if neighbour_block:
+                uncached_blocks.append(neighbour_block)
+            if criteria_prompt:
+                uncached_blocks.append(f"BEOORDELINGSCRITERIA:\n{criteria_prompt}")
+            if check_ai_style:
+                uncached_blocks.append(_AI_STYLE_PROMPT_NL)
+        if section.get('_subsections_elsewhere'):
+            uncached_blocks.append(
+                "LET OP — SUBSECTIES: Hierboven staat alleen de eigen tekst van deze sectie. "
+                f"De subsecties {', '.join(section['_subsections_elsewhere'])} worden apart aan dit "
+                "criterium getoetst; markeer niets als ontbrekend omdat het in een subsectie staat."
+            )
+        if part:
+            uncached_blocks.append(_CHUNK_NOTE)
         uncached_blocks.append(_response_schema)
         uncached_text = '\n\n'.join(uncached_blocks)
-    else:
-        # Fallback: alleen de sectie-content gecacht (geen volledige documentcontext).
-        cached_text = (
-            f"[TE BEOORDELEN SECTIE — '{section['name']}']\n{content[:20000]}\n"
-            f"[/TE BEOORDELEN SECTIE]"
+
+        # --- LLM-call met retry bij rate-limiting (ondersteunt Anthropic én Gemini) ---
+        llm_result, last_exc = _call_llm_with_retry(
+            llm_model, system_prompt, cached_text, uncached_text, max_tokens=4096,
+            label=call_label,
+            document_id=section.get('_document_id'),
+            on_text_factory=held_text_factory if tier == 'snel' and held_text_factory else on_text_factory,
+            response_schema=_json_schema,
+            tier=tier if routing['strong'] else None,
+            criterion_id=get_criterion_value(criterion, 'id'),
+            section_name=section.get('name'),
         )
-        uncached_blocks = []
-        if criteria_prompt:
-            uncached_blocks.append(f"BEOORDELINGSCRITERIA:\n{criteria_prompt}")
-        if check_ai_style:
-            uncached_blocks.append(_AI_STYLE_PROMPT_NL)
-        uncached_blocks.append(_response_schema)
-        uncached_text = '\n\n'.join(uncached_blocks)
 
-    # --- LLM-call met retry bij rate-limiting (ondersteunt Anthropic én Gemini) ---
-    import time as _time
-    import logging as _log
-    _logger = _log.getLogger('docucheck')
+        if llm_result is None:
+            return None, {
+                'criteria_id':   get_criterion_value(criterion, 'id'),
+                'criteria_name': get_criterion_value(criterion, 'name'),
+                'section_id':    section.get('db_id'),
+                'section_name':  section['name'],
+                'status':        'warning',
+                'message':       f"LLM-beoordeling mislukt: {last_exc}",
+                'suggestion':    'Controleer de API-sleutel (ANTHROPIC_API_KEY / GEMINI_API_KEY).',
+                'location':      f"Sectie: {section['name']}",
+                'confidence':    0.0,
+                'color':         '#F9C74F',
+                'check_type':    'llm_review',
+            }
+
+        raw = llm_result['text'].strip()
 
-    llm_result = None
-    last_exc   = None
-    for _attempt in range(3):
+        # --- JSON-antwoord parsen (overgeslagen als de provider al een object leverde) ---
         try:
-            llm_result = _call_llm(llm_model, role_prompt, cached_text, uncached_text, max_tokens=4096)
-            break
-        except Exception as exc:
-            last_exc = exc
-            exc_str  = str(exc)
-            if '429' in exc_str or 'rate_limit' in exc_str.lower() or 'quota' in exc_str.lower():
-                wait = 15 * (2 ** _attempt)   # 15s, 30s, 60s
-                _logger.warning(
-                    f"[RATE LIMIT] criterium={get_criterion_value(criterion, 'name')} | "
-                    f"sectie={section['name']} | poging {_attempt + 1}/3 | wacht {wait}s | "
-                    f"fout: {exc_str[:300]}"
-                )
-                _time.sleep(wait)
-            else:
-                _logger.warning(
-                    f"[LLM FOUT] criterium={get_criterion_value(criterion, 'name')} | "
-                    f"sectie={section['name']} | fout: {exc_str[:300]}"
-                )
-                break  # niet-rate-limit fout: meteen stoppen
+            return llm_result.get('parsed') or _extract_json(raw), None
+        except (ValueError, json.JSONDecodeError) as exc:
+            import logging as _log2
+            _log2.getLogger('docucheck').warning(
+                f"[JSON-PARSE] {call_label} | fout={exc} | raw={raw!r}"
+            )
+            invalid_replies.append(llm_model)
+            return None, {
+                'criteria_id':   get_criterion_value(criterion, 'id'),
+                'criteria_name': get_criterion_value(criterion, 'name'),
+                'section_id':    section.get('db_id'),
+                'section_name':  section['name'],
+                'status':        'warning',
+                'message':       'LLM-antwoord kon niet worden verwerkt (geen geldige JSON).',
+                'suggestion':    f"Ruwe LLM-output: {raw[:300]}",
+                'location':      f"Sectie: {section['name']}",
+                'confidence':    0.0,
+                'color':         '#F9C74F',
+                'check_type':    'llm_review',
+            }
 
-    if llm_result is None:
-        return {
-            'criteria_id':   get_criterion_value(criterion, 'id'),
-            'criteria_name': get_criterion_value(criterion, 'name'),
-            'section_id':    section.get('db_id'),
-            'section_name':  section['name'],
-            'status':        'warning',
-            'message':       f"LLM-beoordeling mislukt: {last_exc}",
-            'suggestion':    'Controleer de API-sleutel (ANTHROPIC_API_KEY / GEMINI_API_KEY).',
-            'location':      f"Sectie: {section['name']}",
-            'confidence':    0.0,
-            'color':         '#F9C74F',
-            'check_type':    'llm_review',
-        }
+    from config import Config
 
-    raw           = llm_result['text'].strip()
-    cache_read    = llm_result['cache_read']
-    cache_created = llm_result['cache_created']
-    _logger.info(
-        f"TOKEN-GEBRUIK | criterium={get_criterion_value(criterion, 'name')} | "
-        f"model={llm_model} | sectie={section['name']} | "
-        f"input={llm_result['input_tokens']} | output={llm_result['output_tokens']} | "
-        f"cache_created={cache_created} | cache_read={cache_read} | "
-        f"totaal={llm_result['input_tokens'] + llm_result['output_tokens']}"
-    )
+    def _evaluate(llm_model: str, tier: str):
+        """
+        Beoordeel de hele sectie met één model. Retourneert (result, fout-item, aantal delen).
 
-    # --- JSON-antwoord parsen ---
-    try:
-        result = _extract_json(raw)
-    except (ValueError, json.JSONDecodeError) as exc:
-        import logging as _log2
-        _log2.getLogger('docucheck').warning(
-            f"[JSON-PARSE] criterium={get_criterion_value(criterion, 'name')} | "
-            f"sectie={section['name']} | fout={exc} | "
-            f"raw={raw!r}"
+        Map-reduce voor lange secties: boven LLM_MAP_REDUCE_THRESHOLD_TOKENS wordt de
+        sectie in alinea-delen parallel beoordeeld in plaats van afgekapt; korte
+        secties houden hun ene call.
+        """
+        chunks = []
+        threshold = Config.LLM_MAP_REDUCE_THRESHOLD_TOKENS
+        if threshold and estimate_tokens(content, llm_model) > threshold:
+            chunks = split_into_chunks(content, Config.LLM_MAP_REDUCE_CHUNK_TOKENS, llm_model)
+        if len(chunks) <= 1:
+            result, error_item = _review(content, llm_model, tier)
+            return result, error_item, 1
+
+        outcomes = _run_llm_tasks(
+            list(enumerate(chunks)),
+            lambda task: _review(task[1][1], llm_model, tier, part=f"{task[0] + 1}/{len(chunks)}"),
+            document_id=section.get('_document_id'),
+            label='MAP-REDUCE',
         )
-        return {
-            'criteria_id':   get_criterion_value(criterion, 'id'),
-            'criteria_name': get_criterion_value(criterion, 'name'),
-            'section_id':    section.get('db_id'),
-            'section_name':  section['name'],
-            'status':        'warning',
-            'message':       'LLM-antwoord kon niet worden verwerkt (geen geldige JSON).',
-            'suggestion':    f"Ruwe LLM-output: {raw[:300]}",
-            'location':      f"Sectie: {section['name']}",
-            'confidence':    0.0,
-            'color':         '#F9C74F',
-            'check_type':    'llm_review',
-        }
+        parts, error_item = [], None
+        for (_, (offset, chunk_text)), outcome in outcomes:
+            part_result, part_error = outcome if outcome else (None, None)
+            if part_result is not None:
+                parts.append((offset, chunk_text, part_result))
+            elif error_item is None:
+                error_item = part_error
+        if not parts:
+            return None, error_item, len(chunks)
+        return _merge_chunk_results(parts), error_item, len(chunks)
+
+    # --- Modelroutering: snel model eerst, escaleren naar het sterke model ---
+    model, tier, reason = routing['fast'], 'snel', None
+    if (routing['strong'] and routing['above_tokens']
+            and estimate_tokens(content, routing['fast']) > routing['above_tokens']):
+        model, tier, reason = routing['strong'], 'sterk', 'complexiteit'
+    result, error_item, n_chunks = _evaluate(model, tier)
+
+    if routing['strong'] and tier == 'snel':
+        if invalid_replies or (result is not None and not _is_valid_review(result)):
+            reason = 'ongeldige JSON'
+        elif result is not None and str(result.get('oordeel', '')).lower() in routing['escalate_on']:
+            reason = f"oordeel={str(result.get('oordeel')).lower()}"
+        if reason:
+            import logging as _log3
+            _log3.getLogger('docucheck').info(
+                f"[ROUTERING] {label} | escalatie {routing['fast']} → {routing['strong']} | reden={reason}"
+            )
+            strong_result, strong_error, strong_chunks = _evaluate(routing['strong'], 'sterk')
+            # Faalt het sterke model, dan blijft het (geldige) antwoord van het snelle model staan
+            if strong_result is not None:
+                result, error_item, n_chunks = strong_result, strong_error, strong_chunks
+                held_live_items.clear()
+    if routing['strong']:
+        _record_routing(section.get('_document_id'), reason)
+    # Het antwoord van het snelle model is definitief: zijn live-items alsnog doorgeven
+    for item in held_live_items:
+        try:
+            section['_live_feed'](item)
+        except Exception:
+            pass  # live feed mag de beoordeling nooit breken
+
+    if result is None:
+        return error_item
 
     oordeel   = result.get('oordeel', 'matig').lower()
     problemen = result.get('problemen', [])
     samen     = result.get('samenvatting', '')
 
-    # Status op basis van oordeel; respecteer criterion.severity als override
-    base_status = _OORDEEL_TO_STATUS.get(oordeel, 'warning')
-    crit_severity = get_criterion_value(criterion, 'severity')
-    # Alleen overschrijven als de criterium-severity 'warning' is (standaard) of hoger
-    if crit_severity in ('violation', 'error') and base_status == 'warning':
-        base_status = crit_severity
+    base_status = _llm_review_status(oordeel, criterion)
 
     crit_id    = get_criterion_value(criterion, 'id')
     crit_name  = get_criterion_value(criterion, 'name')
-    crit_color = get_criterion_value(criterion, 'color', '#4895EF')
     sec_id     = section.get('db_id')
     sec_name   = section['name']
 
@@ -975,29 +2002,9 @@ def check_llm_review(criterion: dict, section: dict, db_connection: sqlite3.Conn
         }
 
     # --- Eén feedback-item per probleem → elk krijgt zijn eigen Word-comment ---
-    # Begrens op max 5 problemen (de LLM kan het schema negeren)
-    problemen = problemen[:5]
-    items = []
-    for p in problemen:
-        citaat    = (p.get('citaat') or '').strip()[:200]
-        probleem  = (p.get('probleem') or '').strip()
-        suggestie = (p.get('suggestie') or '').strip()
-        items.append({
-            'criteria_id':      crit_id,
-            'criteria_name':    crit_name,
-            'section_id':       sec_id,
-            'section_name':     sec_name,
-            'status':           base_status,
-            'message':          probleem or samen,
-            'suggestion':       suggestie,
-            'location':         f"Sectie: {sec_name}",
-            'confidence':       0.85,
-            'color':            crit_color,
-            'offending_snippet': citaat if len(citaat) >= 5 else None,
-            'check_type':       'llm_review',
-        })
-
-    return items
+    # Begrens op max 5 problemen per call (de LLM kan het schema negeren)
+    problemen = problemen[:5 * max(n_chunks, 1)]
+    return [_llm_problem_item(criterion, section, p, base_status, samen) for p in problemen]
 
 
 def check_smart_formulation(criterion: dict, section: dict, db_connection: sqlite3.Connection = None):
@@ -1621,46 +2628,75 @@ Formuleer elk aandachtspunt coachend en constructief: benoem het probleem, leg u
 """.strip()
 
 
+def _holistic_item(section: dict, prob: dict, status: str) -> dict:
+    """Zet één 'problemen'-entry van de holistische review om naar een feedback-item."""
+    sec_name = section.get('name', 'Onbekend')
+    return {
+        'criteria_id':       None,
+        'criteria_name':     'Holistische beoordeling',
+        'section_id':        section.get('db_id'),
+        'section_name':      sec_name,
+        'status':            status,
+        'message':           prob.get('probleem', ''),
+        'suggestion':        prob.get('suggestie', ''),
+        'location':          f"Sectie: {sec_name}",
+        'confidence':        0.85,
+        'color':             '#9B72CF',  # paars: onderscheidt holistische van criterium-feedback
+        'offending_snippet': (prob.get('citaat') or '')[:200] or None,
+        'check_type':        'holistic',
+    }
+
+
 def run_holistic_section_reviews(
     recognized_sections: list,
     full_doc_text: str,
     llm_model: str = 'claude-haiku-4-5',
     min_words: int = 20,
     show_suggestions: bool = True,
+    document_id: int = None,
+    live_feed=None,
+    token_budget: int = None,
+    digest_text: str = None,
+    priority: int = None,
+    cancel_event: threading.Event = None,
 ) -> list:
     """
     Voert een holistische LLM-review uit voor elke gevonden sectie met voldoende content.
     Retourneert een lijst van feedback-items (kan leeg zijn bij fouten of te korte secties).
 
     Alle calls delen dezelfde gecachte documentblob → tokenkosten zijn minimaal.
+    document_id wordt alleen gebruikt om het token-gebruik per analyse bij te houden.
+    live_feed ontvangt elk voltooid probleem direct tijdens het streamen (zie generate_feedback).
+    token_budget: tokenbudget per call (documenttype-instelling); None = Config-standaard.
+    digest_text: documentdigest als gedeelde context in plaats van de ruwe documenttekst.
+    priority: prioriteit in de LLM-planner (llm_scheduler). analysis_runner draait deze
+              reviews gelijktijdig met de criteria en geeft ze PRIORITY_LOW, zodat de
+              criteria-calls bij drukte voorgaan.
+    cancel_event: gezet door de runner als de analyse afbreekt; secties die nog niet
+              gestart zijn worden overgeslagen en lopende streams voeden de live feed niet meer.
     """
-    from datetime import date as _date
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-
     if not full_doc_text:
         return []
+    from analysis.context_budget import plan_call_context
 
-    _d = _date.today()
-    _maanden = ['januari','februari','maart','april','mei','juni',
-                'juli','augustus','september','oktober','november','december']
-    _vandaag_str = f"{_d.day} {_maanden[_d.month - 1]} {_d.year}"
+    def _cancelled() -> bool:
+        return cancel_event is not None and cancel_event.is_set()
 
-    role_prompt = (
+    # Gedeeld systeemprompt + gedeeld documentblok: dezelfde cache-prefix als de
+    # criteria-calls. De holistische persona staat in het ongecachte deel.
+    system_prompt = _build_llm_system_prompt()
+    role_block = _build_role_block(
         'Je bent een kritische Nederlandse docent die de kwaliteit van studentwerk beoordeelt. '
-        'Jij geeft een integrale, holistische beoordeling van een sectie — geen lijstje checkboxen.\n\n'
-        f'VANDAAG IS HET: {_vandaag_str}. '
-        'Beoordeel data en jaartallen altijd ten opzichte van deze datum.\n\n'
-        + _NL_TAALGEBRUIK
-    )
-
-    # Gecacht blok: identiek voor alle holistische calls op dit document
-    cached_text = (
-        f"[VOLLEDIG DOCUMENT — CONTEXT]\n{full_doc_text[:40000]}\n"
-        f"[/VOLLEDIG DOCUMENT]"
+        'Jij geeft een integrale, holistische beoordeling van een sectie — geen lijstje checkboxen.'
     )
+    budget = _context_budget_for({'_token_budget': token_budget})
+    json_schema = None
+    if _use_structured_output({}):
+        json_schema = (_LLM_RESPONSE_JSON_SCHEMA if show_suggestions
+                       else _LLM_RESPONSE_JSON_SCHEMA_NO_SUGGESTIONS)
 
     def _review_one(section: dict) -> list:
-        if not section.get('found'):
+        if not section.get('found') or _cancelled():
             return []
         sec_content = (section.get('content') or '').strip()
         word_count = len(re.findall(r'\b\w+\b', sec_content))
@@ -1669,43 +2705,59 @@ def run_holistic_section_reviews(
 
         sec_name = section.get('name', 'Onbekend')
         _schema  = _LLM_RESPONSE_SCHEMA if show_suggestions else _LLM_RESPONSE_SCHEMA_NO_SUGGESTIONS
-        uncached_text = '\n\n'.join([
-            f"[TE BEOORDELEN SECTIE: '{sec_name}']\n{sec_content[:8000]}\n[/TE BEOORDELEN SECTIE]",
+        label    = f"criterium=Holistische beoordeling | sectie={sec_name}"
+        plan = plan_call_context(
+            '' if digest_text else full_doc_text, sec_content, llm_model,
+            neighbours=_section_neighbours(recognized_sections, section),
+            **budget,
+        )
+        _log_context_report(label, document_id, plan['report'])
+        if digest_text:
+            cached_text = _build_digest_context_block(digest_text)
+        else:
+            cached_text = _build_document_context_block(plan['doc_text'])
+        uncached_text = '\n\n'.join(b for b in [
+            role_block,
+            f"[TE BEOORDELEN SECTIE: '{sec_name}']\n{plan['section_text']}\n[/TE BEOORDELEN SECTIE]",
+            plan['neighbour_text'],
             _HOLISTIC_CRITERIA_PROMPT,
             _schema,
-        ])
-
-        import time as _time
-        import logging as _logging
-        _hlog = _logging.getLogger('docucheck')
-
-        llm_result = None
-        for _attempt in range(3):
-            try:
-                llm_result = _call_llm(llm_model, role_prompt, cached_text, uncached_text, max_tokens=2048)
-                break
-            except Exception as exc:
-                exc_str = str(exc)
-                if '429' in exc_str or 'rate_limit' in exc_str.lower() or 'quota' in exc_str.lower():
-                    wait = 15 * (2 ** _attempt)
-                    _hlog.warning(f"[HOLISTISCH RATE LIMIT] sectie={sec_name} | poging {_attempt + 1}/3 | wacht {wait}s")
-                    _time.sleep(wait)
-                else:
-                    _hlog.warning(f"[HOLISTISCH] LLM-fout voor sectie '{sec_name}': {exc}")
-                    break
-
-        if llm_result is None:
+        ] if b)
+
+        on_text_factory = None
+        if live_feed is not None:
+            def on_text_factory():
+                parser = _ProblemenStreamParser()
+
+                def on_text(delta):
+                    for prob in parser.feed(delta):
+                        live_status = _OORDEEL_TO_STATUS.get(parser.oordeel or 'matig', 'warning')
+                        if live_status == 'ok' or _cancelled():
+                            continue
+                        item = _holistic_item(section, prob, live_status)
+                        item['live'] = True
+                        try:
+                            live_feed(item)
+                        except Exception:
+                            pass
+                return on_text
+
+        llm_result, _ = _call_llm_with_retry(
+            llm_model, system_prompt, cached_text, uncached_text, max_tokens=2048,
+            label=label,
+            document_id=document_id,
+            on_text_factory=on_text_factory,
+            response_schema=json_schema,
+            priority=priority,
+            section_name=sec_name,
+        )
+        if llm_result is None or _cancelled():
             return []
 
-        _hlog.info(
-            f"TOKEN-GEBRUIK | criterium=Holistische beoordeling | model={llm_model} | "
-            f"sectie={sec_name} | input={llm_result['input_tokens']} | output={llm_result['output_tokens']} | "
-            f"cache_created={llm_result['cache_created']} | cache_read={llm_result['cache_read']}"
-        )
         raw = llm_result['text'].strip()
 
         try:
-            result = _extract_json(raw)
+            result = llm_result.get('parsed') or _extract_json(raw)
         except (ValueError, json.JSONDecodeError):
             return []
 
@@ -1730,22 +2782,7 @@ def run_holistic_section_reviews(
                 'check_type':        'holistic',
             }]
 
-        items = []
-        for prob in problemen[:3]:
-            items.append({
-                'criteria_id':       None,
-                'criteria_name':     'Holistische beoordeling',
-                'section_id':        section.get('db_id'),
-                'section_name':      sec_name,
-                'status':            status,
-                'message':           prob.get('probleem', ''),
-                'suggestion':        prob.get('suggestie', ''),
-                'location':          f"Sectie: {sec_name}",
-                'confidence':        0.85,
-                'color':             '#9B72CF',  # paars: onderscheidt holistische van criterium-feedback
-                'offending_snippet': (prob.get('citaat') or '')[:200] or None,
-                'check_type':        'holistic',
-            })
+        items = [_holistic_item(section, prob, status) for prob in problemen[:3]]
         if samen:
             items[0]['message'] = f"{samen}\n\n{items[0]['message']}" if items else samen
         return items
@@ -1758,21 +2795,114 @@ def run_holistic_section_reviews(
     import logging as _log_outer
     _olog = _log_outer.getLogger('docucheck')
     _olog.info(f"[HOLISTISCH] {len(tasks)} secties worden holistisch beoordeeld")
-    with ThreadPoolExecutor(max_workers=1) as executor:
-        future_map = {executor.submit(_review_one, sec): sec for sec in tasks}
-        for future in as_completed(future_map):
-            try:
-                items = future.result()
-                results.extend(items)
-            except Exception as exc:
-                _olog.warning(f"[HOLISTISCH] Onverwachte fout: {exc}")
+    for _sec, items in _run_llm_tasks(tasks, _review_one, document_id=document_id, label='HOLISTISCH'):
+        if items:
+            results.extend(items)
 
     return results
 
 
 # --- Hoofd Feedback Generatie Functie ---
 
-def generate_feedback(doc_content: str, recognized_sections: list, criteria_list: list, db_connection: sqlite3.Connection, document_id: int, document_type_id: int, only_section_names: set = None, include_doc_wide: bool = True) -> list[dict]:
+# ---------------------------------------------------------------------------
+# Overlappende secties (parent-sectie die subsecties omvat)
+# ---------------------------------------------------------------------------
+
+# Check-typen waarvan een bevinding op een tekstdeel ook geldt voor elke sectie die
+# dat tekstdeel bevat (bevindingen per zin/passage). Voor deze typen wordt een
+# parent-sectie alleen op haar eigen tekst beoordeeld; de subsecties apart.
+# Typen die de sectie als geheel meten (woorden, alinea's, koppen, vereiste
+# termen) beoordelen de parent altijd volledig.
+# llm_review hoort hier niet standaard bij: een LLM-oordeel over de parent zonder
+# haar subsecties is een ander oordeel dan over de hele sectie. Per criterium te
+# overschrijven met parameter overlap_dedupe (true/false); met true ziet de LLM
+# alleen de eigen tekst van de parent plus een verwijzing naar de subsecties.
+_SPAN_LOCAL_CHECK_TYPES = {'keyword_forbidden', 'smart_check'}
+
+
+def _is_span_local(criterion: dict, check_type: str) -> bool:
+    try:
+        params = json.loads(criterion.get('parameters') or '{}')
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        params = {}
+    if 'overlap_dedupe' in params:
+        return bool(params['overlap_dedupe'])
+    return check_type in _SPAN_LOCAL_CHECK_TYPES
+
+
+def _section_span(section: dict):
+    start, end = section.get('start_char'), section.get('end_char')
+    if start is None or end is None or end <= start:
+        return None
+    return start, end
+
+
+def _plan_overlap_units(sections: list, doc_content: str, span_local: bool, suffix: str = '') -> list:
+    """
+    Bepaal per criterium welke (tekst)delen één keer beoordeeld worden.
+
+    Retourneert [(eval_section, also_in_names), ...]:
+      - Secties met exact hetzelfde tekstbereik worden één keer beoordeeld; de
+        andere namen komen in also_in_names.
+      - Bij span_local: een sectie die andere toepasselijke secties omvat wordt
+        alleen op haar eigen tekst beoordeeld (subsecties eruit geknipt); de
+        bevindingen van de subsecties gelden via also_in_names ook voor haar.
+        Blijft er van de eigen tekst (vrijwel) niets over, dan vervalt die unit.
+    suffix wordt aan de eigen tekst toegevoegd (voetnotenblok, zie generate_feedback).
+    """
+    units: List[tuple] = []
+    by_span: Dict[tuple, list] = {}
+    for sec in sections:
+        span = _section_span(sec)
+        if span is None:
+            units.append((sec, []))
+        else:
+            by_span.setdefault(span, []).append(sec)
+
+    spans = sorted(by_span, key=lambda sp: (sp[0], -sp[1]))
+    for span in spans:
+        rep, *dups = by_span[span]
+        also_in = [d.get('name', '') for d in dups]
+        eval_section = rep
+
+        if span_local:
+            # Omvattende secties (ancestors) krijgen de bevindingen van deze sectie ook
+            for other in spans:
+                if other != span and other[0] <= span[0] and span[1] <= other[1]:
+                    also_in.extend(s.get('name', '') for s in by_span[other])
+
+            children = [c for c in spans
+                        if c != span and span[0] <= c[0] and c[1] <= span[1]]
+            if children:
+                # Eigen tekst: het bereik van de sectie zonder de bereiken van subsecties
+                pieces, pos = [], span[0]
+                for c_start, c_end in sorted(children):
+                    if c_start > pos:
+                        pieces.append(doc_content[pos:c_start])
+                    pos = max(pos, c_end)
+                if pos < span[1]:
+                    pieces.append(doc_content[pos:span[1]])
+                own = '\n'.join(p.strip() for p in pieces if p.strip())
+                heading = (rep.get('heading_text') or '').strip()
+                if heading and own.startswith(heading):
+                    own = own[len(heading):].strip()
+                if len(re.findall(r'\b\w+\b', own)) < 5:
+                    continue   # volledig gedekt door subsecties
+                child_names = []
+                for c in sorted(children):
+                    child_names.extend(s.get('name', '') for s in by_span[c])
+                eval_section = dict(
+                    rep,
+                    content=own + suffix,
+                    word_count=len(re.findall(r'\b\w+\b', own)),
+                    _subsections_elsewhere=child_names,
+                )
+
+        units.append((eval_section, also_in))
+    return units
+
+
+def generate_feedback(doc_content: str, recognized_sections: list, criteria_list: list, db_connection: sqlite3.Connection, document_id: int, document_type_id: int, only_section_names: set = None, include_doc_wide: bool = True, live_feed=None, digest_text: str = None, dry_run: bool = False, checkpoint=None, progress=None, priority: int = None) -> list[dict]:
     """
     Genereert feedback op basis van de gehele documentinhoud, herkende secties en criteria.
 
@@ -1786,11 +2916,67 @@ def generate_feedback(doc_content: str, recognized_sections: list, criteria_list
         db_connection: De actieve database connectie.
         document_id: Het ID van het specifieke document dat wordt geanalyseerd (voor opslag in de database).
         document_type_id: Het ID van het documenttype dat wordt geanalyseerd (nodig voor sectie mappings).
+        live_feed: Optionele callback die elk voltooid LLM-probleem direct ontvangt
+                   (gestreamd, vóór post-processing) — voor live voortgang in de UI.
+        digest_text: Optionele documentdigest (document_digest.build_document_digest);
+                     wordt de gecachte context van de LLM-calls in plaats van doc_content.
+        dry_run: Alleen de takenlijst opbouwen; geen enkele check uitvoeren (zie analysis/dry_run.py).
+        checkpoint: Optionele analysis.checkpoints.AnalysisCheckpoint van de job: ruwe resultaten
+                    van de snelle checks en van elke LLM-taak worden vastgelegd, en wat al in het
+                    checkpoint staat (eerdere poging) wordt niet opnieuw uitgevoerd.
+        progress: Optionele analysis.progress.ProgressReporter: meldt de LLM-fase met het aantal
+                  taken en elke afgeronde taak (voor de voortgang in de UI).
+        priority: Optionele prioriteit in de LLM-planner voor alle calls van deze run
+                  (standaard PRIORITY_NORMAL); herbeoordelingen gebruiken PRIORITY_LOW.
+
+    Met CRITERION_PROFILING worden tijd, CPU, LLM-latency, tokens en retries per
+    (criterium, sectie) gemeten en in criterion_profile opgeslagen (zie analysis/criterion_profiler.py).
 
     Returns:
-        Lijst van feedback items dictionaries.
+        Lijst van feedback items dictionaries. Bij dry_run een dict met
+        'llm_tasks' [(criterium, sectie)] in uitvoervolgorde, 'fast_tasks' (idem, niet-LLM)
+        en 'overlap_saved'.
     """
 
+    from config import Config
+    from analysis.criterion_profiler import CriterionProfile, save as save_profile
+
+    profile = None
+    if Config.CRITERION_PROFILING and not dry_run:
+        profile = CriterionProfile(document_id)
+        if document_id is not None:
+            _profilers[document_id] = profile
+
+    def _measured(criterion, section, check_type):
+        """Meet de check van (criterium, sectie) als profilering aan staat."""
+        if profile is None:
+            return contextlib.nullcontext()
+        return profile.measure(get_criterion_value(criterion, 'id'),
+                               section.get('name') if section else None, check_type)
+
+    if priority is not None and document_id is not None:
+        _document_priorities[document_id] = priority
+    try:
+        return _generate_feedback(
+            doc_content, recognized_sections, criteria_list, db_connection, document_id,
+            document_type_id, only_section_names, include_doc_wide, live_feed, digest_text,
+            dry_run, _measured, checkpoint, progress,
+        )
+    finally:
+        if priority is not None and document_id is not None:
+            _document_priorities.pop(document_id, None)
+        if profile is not None:
+            if _profilers.get(document_id) is profile:
+                del _profilers[document_id]
+            if db_connection is not None:
+                save_profile(db_connection, profile)
+
+
+def _generate_feedback(doc_content, recognized_sections, criteria_list, db_connection, document_id,
+                       document_type_id, only_section_names, include_doc_wide, live_feed, digest_text,
+                       dry_run, _measured, checkpoint=None, progress=None) -> list[dict]:
+    """Implementatie van generate_feedback; _measured(criterium, sectie, check_type) is de profiler-context."""
+    from analysis.checkpoints import task_key
     feedback_items = []
     # Deze dictionary houdt bij hoe vaak een criterium is voorgekomen binnen een bepaalde scope
     # Key formaat: (criterium_id, scope_key)
@@ -1815,6 +3001,8 @@ def generate_feedback(doc_content: str, recognized_sections: list, criteria_list
     # Haal de standaard LLM-rolprompt en show_suggestions op voor dit documenttype (eenmalig)
     _default_role_prompt = ''
     _show_suggestions    = True
+    _token_budget        = None
+    _routing             = {}
     if db_connection and document_type_id:
         try:
             row = db_connection.execute(
@@ -1826,6 +3014,23 @@ def generate_feedback(doc_content: str, recognized_sections: list, criteria_list
                 _show_suggestions    = bool(row[1]) if row[1] is not None else True
         except Exception:
             pass
+        try:
+            row = db_connection.execute(
+                'SELECT llm_token_budget FROM document_types WHERE id=?', (document_type_id,)
+            ).fetchone()
+            if row and row[0]:
+                _token_budget = int(row[0])
+        except Exception:
+            pass   # kolom ontbreekt (oude DB zonder migratie) → Config-standaard
+        try:
+            row = db_connection.execute(
+                'SELECT llm_fast_model, llm_strong_model FROM document_types WHERE id=?',
+                (document_type_id,)
+            ).fetchone()
+            if row:
+                _routing = {'fast_model': (row[0] or '').strip(), 'strong_model': (row[1] or '').strip()}
+        except Exception:
+            pass   # idem: modelroutering uit Config
 
     # Injecteer rolprompt, volledige documenttekst en show_suggestions in alle secties.
     # _show_suggestions bepaalt of de LLM suggesties genereert (effect op output-tokens).
@@ -1833,6 +3038,14 @@ def generate_feedback(doc_content: str, recognized_sections: list, criteria_list
         s['_default_role_prompt'] = _default_role_prompt
         s['_full_doc_text']       = doc_content
         s['_show_suggestions']    = _show_suggestions
+        s['_document_id']         = document_id
+        s['_live_feed']           = live_feed
+        s['_token_budget']        = _token_budget
+        s['_doc_digest_text']     = digest_text
+        s['_routing']             = _routing
+    # Buursecties: gebruikt als de documentcontext het tokenbudget niet past
+    for s in recognized_sections:
+        s['_neighbours'] = _section_neighbours(recognized_sections, s)
 
     # Voeg een virtuele "hele document" sectie toe aan recognized_sections voor globale checks.
     # Deze sectie heeft 'document' als identifier en een db_id van None.
@@ -1848,6 +3061,11 @@ def generate_feedback(doc_content: str, recognized_sections: list, criteria_list
         'headings': [],
         '_default_role_prompt': _default_role_prompt,
         '_full_doc_text': doc_content,
+        '_document_id': document_id,
+        '_live_feed': live_feed,
+        '_token_budget': _token_budget,
+        '_doc_digest_text': digest_text,
+        '_routing': _routing,
     }
     # Combineer de herkende secties met de virtuele 'hele document' sectie.
     # Bij gedeeltelijke heranalyse (only_section_names) worden niet-geselecteerde secties
@@ -1867,6 +3085,12 @@ def generate_feedback(doc_content: str, recognized_sections: list, criteria_list
     # -----------------------------------------------------------------------
     fast_raw: List[tuple] = []   # (criterion, section, result)
     llm_tasks: List[tuple] = []  # (criterion, section)
+    # (id(criterion), id(section)) → namen van andere secties waarvoor het resultaat ook geldt
+    also_in_sections: Dict[tuple, list] = {}
+    overlap_saved = 0
+    # Snelle checks van een eerdere poging van deze job: resultaten hergebruiken
+    fast_done = checkpoint.get('fast') if checkpoint is not None and checkpoint.has('fast') else None
+    fast_results: Dict[str, object] = {}   # task_key → ruw resultaat, voor het checkpoint
 
     for criterion in criteria_list:
         if not get_criterion_value(criterion, 'is_enabled', True):
@@ -1877,8 +3101,14 @@ def generate_feedback(doc_content: str, recognized_sections: list, criteria_list
             if check_type_doc == 'llm_review':
                 # LLM-check op heel het document: gebruik de virtuele document_section
                 llm_tasks.append((criterion, document_section))
+            elif dry_run:
+                fast_raw.append((criterion, None, None))
+            elif fast_done is not None:
+                fast_raw.append((criterion, None, fast_done.get(task_key(criterion))))
             else:
-                result = check_document_wide_criterion(criterion, doc_content, all_sections_for_processing)
+                with _measured(criterion, None, check_type_doc):
+                    result = check_document_wide_criterion(criterion, doc_content, all_sections_for_processing)
+                fast_results[task_key(criterion)] = result
                 fast_raw.append((criterion, None, result))
             continue
 
@@ -1891,50 +3121,100 @@ def generate_feedback(doc_content: str, recognized_sections: list, criteria_list
 
         check_type = get_criterion_value(criterion, 'check_type', 'none') or 'none'
 
-        for section in applicable_sections:
+        # Overlappende secties: elk (criterium, tekstbereik) één keer beoordelen en
+        # het resultaat toeschrijven aan alle secties die dat bereik bevatten.
+        units = _plan_overlap_units(
+            applicable_sections, doc_content, _is_span_local(criterion, check_type), voetnoten_blok,
+        )
+        overlap_saved += len(applicable_sections) - len(units)
+
+        for section, also_in in units:
+            if also_in:
+                also_in_sections[(id(criterion), id(section))] = also_in
             if check_type == 'llm_review':
                 # Sla op voor parallelle uitvoering; content zit al in sectie-dict
                 llm_tasks.append((criterion, section))
+            elif dry_run:
+                fast_raw.append((criterion, section, None))
+            elif fast_done is not None:
+                fast_raw.append((criterion, section, fast_done.get(task_key(criterion, section))))
             else:
                 # Snelle check: direct uitvoeren
-                if check_type != 'none' and check_type in CHECK_REGISTRY:
-                    result = CHECK_REGISTRY[check_type](criterion, section, db_connection)
-                elif get_criterion_value(criterion, 'rule_type') == 'tekstueel':
-                    result = check_textual_criterion(criterion, section, db_connection)
-                elif get_criterion_value(criterion, 'rule_type') == 'structureel':
-                    result = check_structural_criterion(criterion, section, db_connection)
-                elif get_criterion_value(criterion, 'rule_type') == 'inhoudelijk':
-                    result = check_content_criterion(criterion, section, all_sections_for_processing, db_connection)
-                else:
-                    print(f"    WAARSCHUWING: onbekend rule_type '{criterion['rule_type']}' "
-                          f"voor criterium [{criterion['id']}] {criterion['name']!r}")
-                    result = None
+                with _measured(criterion, section, check_type):
+                    if check_type != 'none' and check_type in CHECK_REGISTRY:
+                        result = CHECK_REGISTRY[check_type](criterion, section, db_connection)
+                    elif get_criterion_value(criterion, 'rule_type') == 'tekstueel':
+                        result = check_textual_criterion(criterion, section, db_connection)
+                    elif get_criterion_value(criterion, 'rule_type') == 'structureel':
+                        result = check_structural_criterion(criterion, section, db_connection)
+                    elif get_criterion_value(criterion, 'rule_type') == 'inhoudelijk':
+                        result = check_content_criterion(criterion, section, all_sections_for_processing, db_connection)
+                    else:
+                        print(f"    WAARSCHUWING: onbekend rule_type '{criterion['rule_type']}' "
+                              f"voor criterium [{criterion['id']}] {criterion['name']!r}")
+                        result = None
+                fast_results[task_key(criterion, section)] = result
                 fast_raw.append((criterion, section, result))
 
+    if overlap_saved:
+        import logging as _l
+        _l.getLogger('docucheck').info(
+            f"[OVERLAP] document={document_id} | {overlap_saved} dubbele (criterium, sectie)-"
+            f"beoordelingen samengevoegd"
+        )
+
     # -----------------------------------------------------------------------
     # Stap 2: Voer LLM-taken parallel uit.
     #   db_connection=None is veilig: content zit al in de sectie-dict.
     # -----------------------------------------------------------------------
     llm_raw: List[tuple] = []  # (criterion, section, result)
     if llm_tasks:
-        # 1 worker: serieel uitvoeren voorkomt token-per-minuut rate limits bij Anthropic.
-        # Met prompt-caching is de overhead per call klein genoeg dat serieel acceptabel is.
-        max_workers = 1
-        print(f"[LLM-PARALLEL] {len(llm_tasks)} taken gestart met max {max_workers} workers")
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_map = {
-                executor.submit(check_llm_review, crit, sec, None): (crit, sec)
-                for crit, sec in llm_tasks
-            }
-            for future in as_completed(future_map):
-                crit, sec = future_map[future]
-                try:
-                    result = future.result()
-                except Exception as exc:
-                    print(f"[LLM-PARALLEL] Fout bij criterium "
-                          f"{get_criterion_value(crit, 'name')}: {exc}")
-                    result = None
-                llm_raw.append((crit, sec, result))
+        # Taak die de gedeelde documentcontext gebruikt vooraan zetten: die maakt
+        # de cache-entry aan waar alle andere taken daarna uit lezen.
+        def _uses_doc_context(task):
+            try:
+                params = json.loads(task[0].get('parameters') or '{}')
+            except (json.JSONDecodeError, TypeError, AttributeError):
+                params = {}
+            return bool(params.get('llm_use_full_doc_context', True))
+        llm_tasks.sort(key=lambda t: 0 if _uses_doc_context(t) else 1)
+
+    if dry_run:
+        return {
+            'llm_tasks':     llm_tasks,
+            'fast_tasks':    [(crit, sec) for crit, sec, _ in fast_raw],
+            'overlap_saved': overlap_saved,
+        }
+
+    if checkpoint is not None and fast_done is None:
+        checkpoint.put('fast', fast_results)
+
+    if llm_tasks:
+        if progress is not None:
+            progress.stage('llm', total=len(llm_tasks))
+
+        def _run_llm_task(task):
+            key = task_key(task[0], task[1])
+            try:
+                if checkpoint is not None and checkpoint.has('llm', key):
+                    return checkpoint.get('llm', key)
+                with _measured(task[0], task[1], 'llm_review'):
+                    result = check_llm_review(task[0], task[1], None)
+                # Mislukte calls niet vastleggen: een volgende poging probeert ze opnieuw
+                if checkpoint is not None and not _is_failed_review(result):
+                    checkpoint.put('llm', result, key)
+                return result
+            finally:
+                if progress is not None:
+                    progress.task_done()
+
+        for (crit, sec), result in _run_llm_tasks(
+            llm_tasks,
+            _run_llm_task,
+            document_id=document_id,
+            label='LLM-PARALLEL',
+        ):
+            llm_raw.append((crit, sec, result))
 
     # -----------------------------------------------------------------------
     # Stap 3: Post-processing op alle resultaten (snelle + LLM).
@@ -1948,7 +3228,12 @@ def generate_feedback(doc_content: str, recognized_sections: list, criteria_list
         else:
             return
 
+        also_in = also_in_sections.get((id(criterion), id(section))) if section is not None else None
+
         for item in candidates:
+            if also_in:
+                item['also_in_sections'] = list(also_in)
+
             # show_suggestion uitschakelen indien geconfigureerd
             try:
                 crit_params = json.loads(criterion.get('parameters') or '{}')
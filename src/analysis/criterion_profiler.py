@@ -0,0 +1,148 @@
+"""
+Profilering van generate_feedback per criterium × sectie.
+
+Per run van generate_feedback (één document) wordt per (criterium, sectie) vastgelegd:
+  wall_ms        : wandkloktijd van de check (bij LLM-checks inclusief wachten op een slot)
+  cpu_ms         : CPU-tijd van de thread die de check uitvoert (regex, parsing, promptbouw)
+  llm_calls      : aantal LLM-calls, met opgetelde latency, tokens, retries en mislukte calls
+
+De LLM-meetwaarden komen uit _call_llm_with_retry (zie criterion_checking._profilers),
+los van LLM_TELEMETRY. De rijen worden aan het eind van de run in één executemany
+naar criterion_profile geschreven; get_criteria_profile middelt over de laatste N runs
+voor de criterialijst.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+_logger = logging.getLogger('docucheck')
+
+_COLUMNS = (
+    'run_at', 'document_id', 'criterion_id', 'section_name', 'check_type',
+    'wall_ms', 'cpu_ms', 'llm_calls', 'llm_latency_ms',
+    'input_tokens', 'output_tokens', 'cache_tokens', 'retries', 'failed_calls',
+)
+_INSERT_SQL = (f"INSERT INTO criterion_profile ({', '.join(_COLUMNS)}) "
+               f"VALUES ({', '.join('?' for _ in _COLUMNS)})")
+
+
+class CriterionProfile:
+    """Meetwaarden van één generate_feedback-run (thread-safe: LLM-taken lopen parallel)."""
+
+    def __init__(self, document_id):
+        self.document_id = document_id
+        self.run_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+        self._lock = threading.Lock()
+        self._entries = {}     # (criterion_id, section_name) → dict
+
+    def _entry(self, criterion_id, section_name) -> dict:
+        key = (criterion_id, section_name)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = {
+                'check_type': None, 'wall_ms': 0.0, 'cpu_ms': 0.0,
+                'llm_calls': 0, 'llm_latency_ms': 0.0, 'input_tokens': 0,
+                'output_tokens': 0, 'cache_tokens': 0, 'retries': 0, 'failed_calls': 0,
+            }
+        return entry
+
+    @contextmanager
+    def measure(self, criterion_id, section_name, check_type):
+        """Meet wandklok- en CPU-tijd van het blok (CPU-tijd van de huidige thread)."""
+        wall0, cpu0 = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall = (time.perf_counter() - wall0) * 1000
+            cpu = (time.thread_time() - cpu0) * 1000
+            with self._lock:
+                entry = self._entry(criterion_id, section_name)
+                entry['check_type'] = check_type
+                entry['wall_ms'] += wall
+                entry['cpu_ms'] += cpu
+
+    def add_llm_call(self, criterion_id, section_name, latency: float, attempts: int,
+                     llm_result: dict = None) -> None:
+        usage = llm_result or {}
+        with self._lock:
+            entry = self._entry(criterion_id, section_name)
+            entry['llm_calls'] += 1
+            entry['llm_latency_ms'] += latency * 1000
+            entry['input_tokens'] += usage.get('input_tokens', 0)
+            entry['output_tokens'] += usage.get('output_tokens', 0)
+            entry['cache_tokens'] += usage.get('cache_created', 0) + usage.get('cache_read', 0)
+            entry['retries'] += max(0, attempts - 1)
+            entry['failed_calls'] += 0 if llm_result else 1
+
+    def rows(self) -> list:
+        with self._lock:
+            return [
+                (self.run_at, self.document_id, crit_id, section_name, e['check_type'],
+                 round(e['wall_ms'], 3), round(e['cpu_ms'], 3), e['llm_calls'],
+                 round(e['llm_latency_ms'], 1), e['input_tokens'], e['output_tokens'],
+                 e['cache_tokens'], e['retries'], e['failed_calls'])
+                for (crit_id, section_name), e in self._entries.items()
+            ]
+
+
+def save(conn: sqlite3.Connection, profile: CriterionProfile) -> int:
+    """Schrijf de meetwaarden van een run weg; fouten worden gelogd, nooit doorgegeven."""
+    rows = profile.rows()
+    if not rows:
+        return 0
+    try:
+        conn.executemany(_INSERT_SQL, rows)
+        conn.commit()
+    except sqlite3.Error as exc:
+        _logger.warning(f"[PROFIEL] {len(rows)} meetwaarde(n) niet weggeschreven: {exc}")
+        return 0
+    return len(rows)
+
+
+def get_criteria_profile(conn: sqlite3.Connection, last_n: int = 20) -> dict:
+    """
+    Gemiddelden per criterium over de laatste `last_n` runs:
+    {criterion_id: {runs, evaluations, wall_ms, cpu_ms, max_wall_ms, llm_calls,
+                    llm_latency_ms, tokens, retries, failed_calls, share}}.
+    wall_ms/cpu_ms/llm_calls/tokens zijn per run (opgeteld over de secties),
+    llm_latency_ms is per call, max_wall_ms de traagste enkele sectie en share
+    het aandeel in de totale criteriumtijd van die runs.
+    """
+    try:
+        rows = conn.execute("""
+            WITH runs AS (
+                SELECT DISTINCT run_at, document_id FROM criterion_profile
+                ORDER BY run_at DESC LIMIT ?
+            )
+            SELECT p.criterion_id, COUNT(DISTINCT p.run_at), COUNT(*),
+                   SUM(p.wall_ms), SUM(p.cpu_ms), MAX(p.wall_ms), SUM(p.llm_calls),
+                   SUM(p.llm_latency_ms), SUM(p.input_tokens + p.output_tokens + p.cache_tokens),
+                   SUM(p.retries), SUM(p.failed_calls)
+            FROM criterion_profile p
+            JOIN runs r ON r.run_at = p.run_at AND r.document_id IS p.document_id
+            GROUP BY p.criterion_id
+        """, (int(last_n),)).fetchall()
+    except sqlite3.OperationalError:
+        return {}   # tabel ontbreekt (oude DB zonder migratie)
+
+    total_wall = sum(r[3] or 0 for r in rows)
+    profile = {}
+    for (crit_id, runs, evaluations, wall, cpu, max_wall, llm_calls, llm_latency,
+         tokens, retries, failed) in rows:
+        profile[crit_id] = {
+            'runs':           runs,
+            'evaluations':    evaluations,
+            'wall_ms':        round((wall or 0) / runs, 1),
+            'cpu_ms':         round((cpu or 0) / runs, 1),
+            'max_wall_ms':    round(max_wall or 0, 1),
+            'llm_calls':      round((llm_calls or 0) / runs, 1),
+            'llm_latency_ms': round(llm_latency / llm_calls) if llm_calls else None,
+            'tokens':         round((tokens or 0) / runs),
+            'retries':        retries or 0,
+            'failed_calls':   failed or 0,
+            'share':          round((wall or 0) / total_wall, 3) if total_wall else 0.0,
+        }
+    return profile
@@ -0,0 +1,96 @@
+"""
+Dubbele uploads herkennen (kolommen documents.file_hash en documents.duplicate_of).
+
+Bij het uploaden wordt de SHA-256 van het bestand vastgelegd. Is hetzelfde bestand al
+geanalyseerd voor hetzelfde documenttype met dezelfde configuratie (documents.config_fingerprint,
+zie analysis/config_fingerprint.py), dan wordt die analyse
+gekopieerd in plaats van opnieuw uitgevoerd: dubbel verzonden formulieren, een watcher
+die bij elke opslag opnieuw uploadt, of docent en student die hetzelfde bestand uploaden.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+
+_logger = logging.getLogger('docucheck')
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 van de bestandsinhoud."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_duplicate(conn: sqlite3.Connection, content_hash: str, document_type_id, fingerprint: str):
+    """Id van het nieuwste voltooide document met dezelfde inhoud, hetzelfde type en dezelfde configuratie."""
+    row = conn.execute(
+        "SELECT id FROM documents WHERE file_hash=? AND document_type_id=? AND analysis_status='completed' "
+        "AND config_fingerprint=? ORDER BY id DESC LIMIT 1",
+        (content_hash, document_type_id, fingerprint)
+    ).fetchone()
+    return row[0] if row is not None else None
+
+
+def clone_results(conn: sqlite3.Connection, document_id: int, source_id: int) -> None:
+    """Neem de analyse van source_id over; het document staat daarna direct op 'completed'."""
+    source = conn.execute(
+        'SELECT analysis_data, config_fingerprint FROM documents WHERE id=?', (source_id,)
+    ).fetchone()
+    data = json.loads(source[0])
+    data.pop('live_feedback', None)
+    if source_id != document_id:
+        data['duplicate_of'] = source_id
+    conn.execute(
+        "UPDATE documents SET analysis_status='completed', analysis_data=?, duplicate_of=?, "
+        "config_fingerprint=? WHERE id=?",
+        (json.dumps(data), source_id if source_id != document_id else None, source[1], document_id)
+    )
+    conn.commit()
+    _logger.info(f"[DEDUPE] document={document_id}: identiek aan document {source_id}, "
+                 f"analyse overgenomen (≈${(data.get('token_usage') or {}).get('cost_usd', 0):.4f} bespaard)")
+
+
+def dedupe_upload(conn: sqlite3.Connection, document_id: int, path: str, document_type_id):
+    """
+    Hash een net geüpload bestand en neem bij een identiek, al geanalyseerd document
+    diens resultaten over. Retourneert het id van dat document (kan document_id zelf zijn),
+    of None als het document geanalyseerd moet worden.
+    """
+    from config import Config
+    from analysis import config_fingerprint
+
+    content_hash = file_hash(path)
+    source_id = None
+    if Config.ANALYSIS_DEDUPE:
+        # Vóór het vastleggen van de nieuwe hash zoeken: een opnieuw geüpload bestand met
+        # dezelfde naam overschrijft hetzelfde document, dat dan alleen zichzelf mag vinden
+        # als de inhoud niet veranderd is.
+        fingerprint = config_fingerprint.refresh(conn, int(document_type_id))
+        source_id = find_duplicate(conn, content_hash, int(document_type_id), fingerprint)
+    conn.execute('UPDATE documents SET file_hash=? WHERE id=?', (content_hash, document_id))
+    conn.commit()
+    if source_id is not None:
+        clone_results(conn, document_id, source_id)
+    return source_id
+
+
+def stats(conn: sqlite3.Connection) -> dict:
+    """Aantal gehashte uploads, dubbele uploads en de bespaarde analysekosten (voor /performance)."""
+    try:
+        hashed, duplicates, saved = conn.execute(
+            "SELECT COUNT(d.file_hash), COUNT(d.duplicate_of), "
+            "COALESCE(SUM(CASE WHEN d.duplicate_of IS NOT NULL AND json_valid(s.analysis_data) "
+            "THEN json_extract(s.analysis_data, '$.token_usage.cost_usd') END), 0) "
+            "FROM documents d LEFT JOIN documents s ON s.id = d.duplicate_of"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return {'hashed_uploads': 0, 'duplicate_uploads': 0, 'hit_ratio': 0.0, 'saved_cost_usd': 0.0}
+    return {
+        'hashed_uploads':    hashed,
+        'duplicate_uploads': duplicates,
+        'hit_ratio':         duplicates / hashed if hashed else 0.0,
+        'saved_cost_usd':    round(saved or 0.0, 4),
+    }
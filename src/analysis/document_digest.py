@@ -0,0 +1,229 @@
+"""
+Compacte documentsamenvatting ("digest") als gedeelde LLM-context.
+
+De criteria- en holistische calls hebben het hele document alleen nodig om te zien
+of iets elders al behandeld wordt. Daarvoor volstaat een digest die één keer per
+document wordt gemaakt, direct na de sectieherkenning:
+  - opbouw        : de gevonden secties in documentvolgorde, met omvang
+  - per sectie    : een korte samenvatting
+  - definities    : kernbegrippen zoals het document ze definieert
+  - onderzoeksvragen: hoofd- en deelvragen letterlijk
+
+De digest wordt met één LLM-call gemaakt (gestructureerde output). Lukt dat niet,
+dan vult een lokale extractie (eerste zinnen, definitie- en vraagpatronen) de
+ontbrekende onderdelen aan, zodat er altijd een bruikbare digest is.
+De digest wordt opgeslagen in analysis_data['document_digest'] en bij een
+gedeeltelijke heranalyse hergebruikt.
+"""
+import logging
+import re
+
+_logger = logging.getLogger('docucheck')
+
+_DIGEST_JSON_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'secties': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'naam':         {'type': 'string'},
+                    'samenvatting': {'type': 'string'},
+                },
+                'required': ['naam', 'samenvatting'],
+            },
+        },
+        'definities': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'term':        {'type': 'string'},
+                    'omschrijving': {'type': 'string'},
+                },
+                'required': ['term', 'omschrijving'],
+            },
+        },
+        'onderzoeksvragen': {'type': 'array', 'items': {'type': 'string'}},
+    },
+    'required': ['secties', 'definities', 'onderzoeksvragen'],
+}
+
+_DIGEST_PROMPT = """Maak een compacte samenvatting van het document hierboven. Deze samenvatting
+vervangt het document als context bij latere beoordelingen per sectie; de beoordelaar
+moet er uit kunnen afleiden WAT er WAAR in het document staat.
+
+Lever:
+- secties: voor elke sectie uit de opbouw hieronder (zelfde naam) een samenvatting van
+  1-3 zinnen: welke onderwerpen, bronnen, begrippen en conclusies staan erin.
+- definities: kernbegrippen die het document zelf definieert of afbakent (max. 10),
+  met de omschrijving zoals in het document.
+- onderzoeksvragen: de hoofdvraag en deelvragen letterlijk, als die er zijn.
+
+Geef GEEN oordeel over de kwaliteit. Antwoord uitsluitend met JSON in dit formaat:
+{"secties": [{"naam": "...", "samenvatting": "..."}],
+ "definities": [{"term": "...", "omschrijving": "..."}],
+ "onderzoeksvragen": ["..."]}"""
+
+_SENTENCE_RE   = re.compile(r'[^.!?]+[.!?]')
+_DEFINITION_RE = re.compile(
+    r'[^.!?\n]*\b(?:wordt|worden)\b[^.!?\n]{0,80}\b(?:verstaan|gedefinieerd|bedoeld)\b[^.!?\n]*[.!?]',
+    re.IGNORECASE,
+)
+_QUESTION_RE   = re.compile(r'[^.!?\n]{15,}\?')
+_RESEARCH_Q_HINT_RE = re.compile(r'hoofdvraag|deelvra|onderzoeksvra|probleemstelling', re.IGNORECASE)
+
+
+def _found_in_order(recognized_sections: list) -> list:
+    found = [s for s in recognized_sections
+             if s.get('found') and s.get('identifier') != 'document']
+    return sorted(found, key=lambda s: s.get('start_char') or 0)
+
+
+def _build_outline(recognized_sections: list) -> list:
+    return [
+        {
+            'naam':   s.get('name', ''),
+            'niveau': s.get('level') or 1,
+            'woorden': s.get('word_count') or len(re.findall(r'\b\w+\b', s.get('content') or '')),
+        }
+        for s in _found_in_order(recognized_sections)
+    ]
+
+
+def _local_section_summaries(recognized_sections: list) -> list:
+    """Eerste twee zinnen van elke sectie (zonder voetnotenblok)."""
+    result = []
+    for s in _found_in_order(recognized_sections):
+        content = (s.get('content') or '').split('[VOETNOTEN/EINDNOTEN]')[0]
+        sentences = [m.group(0).strip() for m in _SENTENCE_RE.finditer(content)][:2]
+        result.append({'naam': s.get('name', ''), 'samenvatting': ' '.join(sentences)[:400]})
+    return result
+
+
+def _local_definitions(full_doc_text: str) -> list:
+    found, seen = [], set()
+    for m in _DEFINITION_RE.finditer(full_doc_text or ''):
+        zin = m.group(0).strip()
+        if zin.lower() in seen:
+            continue
+        seen.add(zin.lower())
+        found.append({'term': '', 'omschrijving': zin[:300]})
+        if len(found) >= 10:
+            break
+    return found
+
+
+def _local_research_questions(recognized_sections: list) -> list:
+    """Vragen uit secties die naar hun naam of inhoud over de onderzoeksvraag gaan."""
+    questions = []
+    for s in _found_in_order(recognized_sections):
+        content = (s.get('content') or '').split('[VOETNOTEN/EINDNOTEN]')[0]
+        if not (_RESEARCH_Q_HINT_RE.search(s.get('name') or '') or _RESEARCH_Q_HINT_RE.search(content)):
+            continue
+        for m in _QUESTION_RE.finditer(content):
+            q = m.group(0).strip()
+            if q not in questions:
+                questions.append(q)
+    return questions[:12]
+
+
+def _llm_digest(outline: list, full_doc_text: str, llm_model: str, document_id) -> dict:
+    """Eén LLM-call die samenvattingen, definities en onderzoeksvragen levert (of None)."""
+    from config import Config
+    from analysis.context_budget import select_document_context
+    from analysis.criterion_checking import (
+        _build_document_context_block, _build_llm_system_prompt,
+        DryRunSkipped, _call_llm_with_retry, _extract_json,
+    )
+    doc_text, _ = select_document_context(full_doc_text, llm_model, Config.LLM_DIGEST_INPUT_TOKEN_BUDGET)
+    opbouw = '\n'.join(f"- {o['naam']} ({o['woorden']} woorden)" for o in outline)
+    llm_result, last_exc = _call_llm_with_retry(
+        llm_model,
+        _build_llm_system_prompt(),
+        _build_document_context_block(doc_text),
+        f"OPBOUW VAN HET DOCUMENT:\n{opbouw or '- (geen secties herkend)'}\n\n{_DIGEST_PROMPT}",
+        max_tokens=3000,
+        label='DOCUMENT-DIGEST',
+        document_id=document_id,
+        response_schema=_DIGEST_JSON_SCHEMA,
+    )
+    if llm_result is None:
+        if not isinstance(last_exc, DryRunSkipped):
+            _logger.warning(f"[DIGEST] LLM-digest mislukt voor document {document_id}: {last_exc}")
+        return None
+    try:
+        return llm_result.get('parsed') or _extract_json(llm_result['text'])
+    except ValueError as exc:
+        _logger.warning(f"[DIGEST] Ongeldig digest-antwoord voor document {document_id}: {exc}")
+        return None
+
+
+def format_digest(digest: dict) -> str:
+    """Tekstvorm van de digest zoals die als gecachte context naar de LLM gaat."""
+    lines = ['OPBOUW:']
+    for o in digest.get('outline') or []:
+        indent = '  ' * max((o.get('niveau') or 1) - 1, 0)
+        lines.append(f"{indent}- {o['naam']} ({o['woorden']} woorden)")
+    if digest.get('sections'):
+        lines.append('\nINHOUD PER SECTIE:')
+        for s in digest['sections']:
+            if s.get('samenvatting'):
+                lines.append(f"- {s['naam']}: {s['samenvatting']}")
+    if digest.get('definitions'):
+        lines.append('\nDEFINITIES EN AFBAKENINGEN:')
+        for d in digest['definitions']:
+            term = f"{d['term']}: " if d.get('term') else ''
+            lines.append(f"- {term}{d.get('omschrijving', '')}")
+    if digest.get('research_questions'):
+        lines.append('\nONDERZOEKSVRAGEN:')
+        lines.extend(f"- {q}" for q in digest['research_questions'])
+    return '\n'.join(lines)
+
+
+def build_document_digest(
+    recognized_sections: list,
+    full_doc_text: str,
+    llm_model: str = 'claude-haiku-4-5',
+    document_id: int = None,
+) -> dict:
+    """
+    Maak de digest voor één document.
+
+    Retourneert een dict met outline, sections, definitions, research_questions,
+    source ('llm' of 'lokaal'), text (de contextvorm) en tokens (geschat).
+    """
+    from analysis.context_budget import estimate_tokens
+
+    outline = _build_outline(recognized_sections)
+    digest = {
+        'outline':            outline,
+        'sections':           [],
+        'definitions':        [],
+        'research_questions': [],
+        'source':             'lokaal',
+    }
+
+    llm_part = _llm_digest(outline, full_doc_text, llm_model, document_id) if full_doc_text else None
+    if isinstance(llm_part, dict):
+        digest['sections']           = [s for s in (llm_part.get('secties') or []) if isinstance(s, dict)]
+        digest['definitions']        = [d for d in (llm_part.get('definities') or []) if isinstance(d, dict)]
+        digest['research_questions'] = [q for q in (llm_part.get('onderzoeksvragen') or []) if isinstance(q, str)]
+        digest['source'] = 'llm'
+
+    # Lokale aanvulling voor wat de LLM niet (of niet succesvol) leverde
+    if not digest['sections']:
+        digest['sections'] = _local_section_summaries(recognized_sections)
+    if not digest['definitions']:
+        digest['definitions'] = _local_definitions(full_doc_text)
+    if not digest['research_questions']:
+        digest['research_questions'] = _local_research_questions(recognized_sections)
+
+    digest['text'] = format_digest(digest)
+    digest['tokens'] = estimate_tokens(digest['text'], llm_model)
+    _logger.info(
+        f"[DIGEST] document={document_id} | bron={digest['source']} | "
+        f"digest={digest['tokens']} tok | document={estimate_tokens(full_doc_text or '', llm_model)} tok"
+    )
+    return digest
@@ -0,0 +1,294 @@
+"""
+Dry-run van een analyse: welke LLM-calls zou de pijplijn doen, wat kosten ze en hoe
+lang duurt het — zonder één provider aan te roepen.
+
+De planner doorloopt dezelfde code als een echte analyse (digest, generate_feedback,
+check_llm_review met contextbudget, map-reduce en modelroutering, holistische reviews),
+maar _call_llm_with_retry geeft elke call alleen door aan de planner (zie
+criterion_checking._dry_run_planners). Per call wordt lokaal geteld:
+  - prefix-tokens  : tools-schema + systeemprompt + gecachte context (Anthropic-cacheprefix)
+  - overige input  : het ongecachte deel van de prompt
+  - output         : gemeten gemiddelde per model (llm_calls), anders een vaste aanname
+Cache-schrijven versus -lezen volgt de uitvoervolgorde: de eerste call met een prefix
+schrijft, latere calls lezen (Anthropic; prefixen onder het minimum worden niet gecacht,
+Gemini cachet niet).
+
+Doorlooptijd per document: digest en warming-call na elkaar, daarna het overige werk
+verdeeld over LLM_MAX_WORKERS (criteria) en LLM_MAX_CONCURRENT_CALLS (criteria +
+holistisch), begrensd door de rate limits van het account (LLM_RATE_LIMIT_*).
+Voor een batch van N documenten delen alle analyses het procesbrede callbudget.
+
+Escalaties naar het sterke model hangen af van het oordeel en zijn vooraf niet te
+kennen; die worden als bovengrens gerapporteerd (alle snelle beoordelingen escaleren).
+"""
+import hashlib
+import itertools
+import json
+import threading
+
+_DEFAULT_OUTPUT_TOKENS = 500       # per call, zonder gemeten historie
+_DEFAULT_TTFT_S = 2.0              # tijd tot het eerste token
+_DEFAULT_OUTPUT_TOKENS_PER_S = 80.0
+
+# Minimale prefix (tokens) waaronder Anthropic niet cachet
+_MIN_CACHE_TOKENS = {'claude-haiku': 2048}
+_MIN_CACHE_TOKENS_DEFAULT = 1024
+
+_dry_run_ids = itertools.count(1)
+
+
+def _min_cache_tokens(model: str) -> int:
+    return next((n for prefix, n in _MIN_CACHE_TOKENS.items() if model.startswith(prefix)),
+                _MIN_CACHE_TOKENS_DEFAULT)
+
+
+class _CallRecorder:
+    """Ontvangt de geplande calls (thread-safe: map-reduce en holistisch lopen parallel)."""
+
+    def __init__(self):
+        from analysis.context_budget import estimate_tokens
+        self._estimate = estimate_tokens
+        self._lock = threading.Lock()
+        self.calls = []
+        self.phase = ''
+
+    def __call__(self, *, model, system_prompt, cached_text, uncached_text, max_tokens, label,
+                 response_schema=None, tier=None, criterion_id=None, section_name=None):
+        schema_text = json.dumps(response_schema, sort_keys=True) if response_schema else ''
+        prefix_key = hashlib.sha256(
+            '\x00'.join((model, schema_text, system_prompt, cached_text)).encode('utf-8')
+        ).hexdigest()
+        call = {
+            'phase':           self.phase,
+            'label':           label,
+            'model':           model,
+            'tier':            tier,
+            'criterion_id':    criterion_id,
+            'section_name':    section_name,
+            'max_tokens':      max_tokens,
+            'prefix_key':      prefix_key,
+            'prefix_tokens':   (self._estimate(schema_text, model) + self._estimate(system_prompt, model)
+                                + self._estimate(cached_text, model)),
+            'uncached_tokens': self._estimate(uncached_text, model),
+        }
+        with self._lock:
+            self.calls.append(call)
+
+
+def _estimate_call(call: dict, cached_prefixes: set, history: dict) -> None:
+    """Vul tokens, cache, kosten en latency van één geplande call in (in uitvoervolgorde)."""
+    from analysis.criterion_checking import _estimate_cost_usd
+    model = call['model']
+    hist = history.get(model) or {}
+    output = min(call['max_tokens'], hist.get('avg_output_tokens') or _DEFAULT_OUTPUT_TOKENS)
+
+    cache_created = cache_read = 0
+    input_tokens = call['prefix_tokens'] + call['uncached_tokens']
+    if not model.startswith('gemini') and call['prefix_tokens'] >= _min_cache_tokens(model):
+        input_tokens = call['uncached_tokens']
+        if call['prefix_key'] in cached_prefixes:
+            cache_read = call['prefix_tokens']
+        else:
+            cache_created = call['prefix_tokens']
+            cached_prefixes.add(call['prefix_key'])
+
+    usage = {'input_tokens': input_tokens, 'output_tokens': output,
+             'cache_created': cache_created, 'cache_read': cache_read}
+    call.update(usage)
+    call['cost_usd'] = _estimate_cost_usd(model, usage)
+    call['latency_s'] = hist.get('p50_s') or (_DEFAULT_TTFT_S + output / _DEFAULT_OUTPUT_TOKENS_PER_S)
+
+
+def _sum(calls: list, key: str):
+    return sum(c[key] for c in calls)
+
+
+def _project_duration(calls: list, documents: int) -> dict:
+    """Doorlooptijd (seconden) voor één document en voor een batch van `documents`."""
+    from config import Config
+    workers    = max(1, min(Config.LLM_MAX_WORKERS, Config.LLM_MAX_CONCURRENT_CALLS))
+    concurrent = max(1, Config.LLM_MAX_CONCURRENT_CALLS)
+
+    digest   = [c for c in calls if c['phase'] == 'digest']
+    criteria = [c for c in calls if c['phase'] == 'criteria']
+    holistic = [c for c in calls if c['phase'] == 'holistisch']
+    serial = _sum(digest, 'latency_s') + (criteria[0]['latency_s'] if criteria else 0.0)
+    rest_criteria = _sum(criteria[1:], 'latency_s')
+    parallel = max(
+        rest_criteria / workers,
+        (rest_criteria + _sum(holistic, 'latency_s')) / concurrent,
+        max((c['latency_s'] for c in criteria[1:] + holistic), default=0.0),
+    )
+    per_document = serial + parallel
+
+    # Rate limits van het account: ondergrens voor het totale werk per minuut.
+    # Anthropic telt cache-reads niet mee voor de input-limiet.
+    def _limit_bound(n_docs: int) -> float:
+        bounds = [0.0]
+        if Config.LLM_RATE_LIMIT_RPM:
+            bounds.append(len(calls) * n_docs / Config.LLM_RATE_LIMIT_RPM * 60)
+        if Config.LLM_RATE_LIMIT_INPUT_TPM:
+            tokens_in = _sum(calls, 'input_tokens') + _sum(calls, 'cache_created')
+            bounds.append(tokens_in * n_docs / Config.LLM_RATE_LIMIT_INPUT_TPM * 60)
+        if Config.LLM_RATE_LIMIT_OUTPUT_TPM:
+            bounds.append(_sum(calls, 'output_tokens') * n_docs / Config.LLM_RATE_LIMIT_OUTPUT_TPM * 60)
+        return max(bounds)
+
+    capacity = max(per_document, _sum(calls, 'latency_s') * documents / concurrent)
+    limit = _limit_bound(documents)
+    return {
+        'per_document_s':   round(max(per_document, _limit_bound(1)), 1),
+        'batch_s':          round(max(capacity, limit), 1),
+        'rate_limited':     limit > capacity,   # de accountlimiet bepaalt de doorlooptijd
+        'workers':          workers,
+        'concurrent_calls': concurrent,
+    }
+
+
+def plan_analysis(
+    doc_content: str,
+    recognized_sections: list,
+    criteria_list: list,
+    db_connection,
+    document_type_id: int,
+    documents: int = 1,
+    history: dict = None,
+) -> dict:
+    """
+    Plan de LLM-calls van één analyse en schat tokens, kosten en doorlooptijd.
+
+    recognized_sections zoals na sectieherkenning (wordt niet gewijzigd).
+    documents: aantal inzendingen waarvoor de batch-projectie geldt.
+    history: gemeten gedrag per model (llm_telemetry.model_history); None = uit db_connection.
+
+    Retourneert een dict met calls (per call), per_phase, per_criterion, totals,
+    escalation (bovengrens), duration en assumptions.
+    """
+    from config import Config
+    from analysis import criterion_checking as cc
+    from analysis.document_digest import build_document_digest
+    from analysis import llm_telemetry
+
+    if history is None:
+        history = llm_telemetry.model_history(db_connection) if db_connection is not None else {}
+
+    sections = [dict(s) for s in recognized_sections]
+    key = f"dry-run-{next(_dry_run_ids)}"
+    recorder = _CallRecorder()
+    cc._dry_run_planners[key] = recorder
+    try:
+        digest_text = None
+        if Config.LLM_DOCUMENT_DIGEST:
+            recorder.phase = 'digest'
+            digest_text = build_document_digest(sections, doc_content, document_id=key)['text']
+
+        recorder.phase = 'criteria'
+        plan = cc.generate_feedback(
+            doc_content, sections, criteria_list, db_connection, key, document_type_id,
+            digest_text=digest_text, dry_run=True,
+        )
+        escalation_candidates = []
+        for criterion, section in plan['llm_tasks']:
+            before = len(recorder.calls)
+            cc.check_llm_review(criterion, section, None)
+            try:
+                params = json.loads(criterion.get('parameters') or '{}')
+            except (json.JSONDecodeError, TypeError):
+                params = {}
+            strong = cc._resolve_llm_routing(params, section)['strong']
+            if strong:
+                escalation_candidates.extend(
+                    (c, strong) for c in recorder.calls[before:] if c['tier'] == 'snel'
+                )
+
+        recorder.phase = 'holistisch'
+        show_suggestions = sections[0].get('_show_suggestions', True) if sections else True
+        token_budget = sections[0].get('_token_budget') if sections else None
+        cc.run_holistic_section_reviews(
+            [dict(s) for s in recognized_sections], doc_content, llm_model='claude-haiku-4-5',
+            show_suggestions=show_suggestions, document_id=key,
+            token_budget=token_budget, digest_text=digest_text,
+        )
+    finally:
+        cc._dry_run_planners.pop(key, None)
+        cc.reset_token_usage(key)
+
+    calls = recorder.calls
+    cached_prefixes = set()
+    for call in calls:
+        _estimate_call(call, cached_prefixes, history)
+
+    def _totals(subset: list) -> dict:
+        return {
+            'calls':         len(subset),
+            'input_tokens':  _sum(subset, 'input_tokens'),
+            'cache_created': _sum(subset, 'cache_created'),
+            'cache_read':    _sum(subset, 'cache_read'),
+            'output_tokens': _sum(subset, 'output_tokens'),
+            'cost_usd':      round(_sum(subset, 'cost_usd'), 4),
+        }
+
+    per_phase = {phase: _totals([c for c in calls if c['phase'] == phase])
+                 for phase in ('digest', 'criteria', 'holistisch')}
+    names = {cc.get_criterion_value(c, 'id'): cc.get_criterion_value(c, 'name') for c in criteria_list}
+    per_criterion = []
+    for crit_id in dict.fromkeys(c['criterion_id'] for c in calls if c['criterion_id'] is not None):
+        subset = [c for c in calls if c['criterion_id'] == crit_id]
+        per_criterion.append({'criterion_id': crit_id, 'name': names.get(crit_id, str(crit_id)),
+                              'sections': len({c['section_name'] for c in subset}), **_totals(subset)})
+    per_criterion.sort(key=lambda r: r['cost_usd'], reverse=True)
+
+    totals = _totals(calls)
+    cache_total = totals['cache_created'] + totals['cache_read']
+    totals['cache_hit_ratio'] = round(totals['cache_read'] / cache_total, 3) if cache_total else 0.0
+    totals['fast_checks'] = len(plan['fast_tasks'])
+    totals['overlap_saved'] = plan['overlap_saved']
+
+    escalation_cost = 0.0
+    for call, strong in escalation_candidates:
+        escalation_cost += cc._estimate_cost_usd(strong, call)
+    escalation = {'max_calls': len(escalation_candidates), 'max_cost_usd': round(escalation_cost, 4)}
+
+    return {
+        'documents':     documents,
+        'calls':         calls,
+        'per_phase':     per_phase,
+        'per_criterion': per_criterion,
+        'totals':        totals,
+        'batch_cost_usd': round(totals['cost_usd'] * documents, 2),
+        'escalation':    escalation,
+        'duration':      _project_duration(calls, documents),
+        'assumptions': {
+            'measured_models': sorted(history),
+            'default_output_tokens': _DEFAULT_OUTPUT_TOKENS,
+            'default_latency': f"{_DEFAULT_TTFT_S:.0f}s + output / {_DEFAULT_OUTPUT_TOKENS_PER_S:.0f} tok/s",
+        },
+    }
+
+
+def prepare_sample(db_connection, document_type_id: int, file_path: str) -> tuple:
+    """
+    Parse en herken een voorbeelddocument zoals analysis_runner dat doet.
+    Retourneert (volledige tekst, herkende secties).
+    """
+    import db_utils
+    from analysis import document_parsing, section_recognition
+
+    full_text, paragraphs, headings = document_parsing.parse_document(file_path)
+    recognized, _ = section_recognition.recognize_and_enrich_sections(
+        full_text, paragraphs, headings, db_utils.get_expected_sections(db_connection, document_type_id)
+    )
+    if '[VOETNOTEN/EINDNOTEN]' in full_text:
+        voetnoten = full_text[full_text.index('[VOETNOTEN/EINDNOTEN]'):].strip()
+        for sec in recognized:
+            if sec.get('found') and sec.get('content'):
+                sec['content'] = sec['content'].rstrip() + '\n\n' + voetnoten
+    return full_text, recognized
+
+
+def plan_for_file(db_connection, document_type_id: int, file_path: str, documents: int = 1) -> dict:
+    """Dry-run voor een documenttype op basis van een voorbeeldbestand."""
+    import db_utils
+    full_text, recognized = prepare_sample(db_connection, document_type_id, file_path)
+    criteria = db_utils.get_criteria_for_document_type(db_connection, document_type_id)
+    return plan_analysis(full_text, recognized, criteria, db_connection, document_type_id, documents)
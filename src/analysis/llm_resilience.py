@@ -0,0 +1,322 @@
+"""
+Veerkracht van LLM-calls per provider (Anthropic / Gemini).
+
+Eén trage of haperende provider mag niet alle lopende analyses laten vastlopen:
+  - circuit breaker per provider: na LLM_BREAKER_FAILURES opeenvolgende fouten of
+    te trage calls (> LLM_BREAKER_SLOW_CALL_S) gaat de breaker open. Alleen fouten die
+    iets zeggen over de provider tellen (timeouts, verbindingsfouten, 5xx/overloaded);
+    rate limits (429) en andere 4xx-fouten horen bij het account of het verzoek. Calls naar die
+    provider falen dan direct (of wijken uit, zie failover) in plaats van elk de
+    volledige SDK-timeout te wachten. Na LLM_BREAKER_COOLDOWN_S mag één proef-call
+    door (half-open); slaagt die, dan sluit de breaker weer.
+  - latency-percentielen: per provider worden de laatste geslaagde calls bijgehouden
+    (p50 / p95) — voor rapportage en als wachttijd voor hedging.
+  - failover: staat de breaker van de provider open, dan gaat de call naar het
+    alternatieve model uit LLM_FAILOVER_MODELS (als de breaker daarvan dicht is).
+  - hedged requests (LLM_HEDGING): duurt een call langer dan de p95 van zijn provider,
+    dan gaat een duplicaat naar het alternatieve model; het eerste geslaagde antwoord
+    wint en de verliezer wordt geannuleerd (zie call_with_resilience).
+"""
+import logging
+import math
+import queue
+import threading
+import time
+from collections import deque
+
+_logger = logging.getLogger('docucheck')
+
+STATE_CLOSED    = 'gesloten'
+STATE_OPEN      = 'open'
+STATE_HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(RuntimeError):
+    """De breaker van de provider staat open en er is geen bruikbaar alternatief."""
+
+
+class HedgeCancelled(Exception):
+    """De call is geannuleerd omdat de andere (gehedgede) call al een antwoord had."""
+
+
+_FAULT_MARKERS = ('overloaded', 'timeout', 'timed out', 'connection', 'unavailable',
+                  'deadline_exceeded', 'internal server error', 'bad gateway')
+
+
+def is_provider_fault(exc: Exception) -> bool:
+    """
+    Telt deze fout mee voor de breaker? Ja voor timeouts, verbindingsfouten en
+    5xx/overloaded; nee voor rate limits (429), andere 4xx en onbekende fouten.
+    """
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, 'status_code', None) or getattr(exc, 'code', None)
+    if isinstance(status, int):
+        return status >= 500
+    name = type(exc).__name__.lower()
+    if 'timeout' in name or 'connection' in name:
+        return True
+    text = str(exc).lower()
+    if '429' in text or 'rate_limit' in text or 'quota' in text:
+        return False
+    return (any(code in text for code in ('500', '502', '503', '504', '529'))
+            or any(marker in text for marker in _FAULT_MARKERS))
+
+
+def _record_error(provider: str, exc: Exception) -> None:
+    breaker = get_breaker(provider)
+    if is_provider_fault(exc):
+        breaker.record_failure()
+    else:
+        breaker.record_client_error()
+
+
+def provider_of(model: str) -> str:
+    return 'gemini' if (model or '').startswith('gemini') else 'anthropic'
+
+
+class CircuitBreaker:
+    """Breaker + latency-venster voor één provider."""
+
+    def __init__(self, provider: str, failure_threshold: int, cooldown_s: float,
+                 slow_call_s: float, window: int = 200):
+        self.provider          = provider
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown_s        = cooldown_s
+        self.slow_call_s       = slow_call_s
+        self._lock      = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._state     = STATE_CLOSED
+        self._failures  = 0          # opeenvolgende fouten
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.counts = {'calls': 0, 'failures': 0, 'slow_calls': 0, 'rejected': 0, 'opened': 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """Mag er nu een call naar deze provider? Telt afgewezen calls mee."""
+        with self._lock:
+            if self._state == STATE_OPEN and time.time() - self._opened_at >= self.cooldown_s:
+                self._state = STATE_HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == STATE_CLOSED:
+                return True
+            if self._state == STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.counts['rejected'] += 1
+            return False
+
+    def record_success(self, latency: float) -> None:
+        with self._lock:
+            self.counts['calls'] += 1
+            self._latencies.append(latency)
+            if self.slow_call_s and latency > self.slow_call_s:
+                self.counts['slow_calls'] += 1
+                self._fail_locked()
+                return
+            self._failures = 0
+            self._probe_in_flight = False
+            self._state = STATE_CLOSED
+
+    def record_cancelled(self) -> None:
+        """Geannuleerde call (hedge-verliezer): geen oordeel over de provider."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_client_error(self) -> None:
+        """Rate limit of 4xx: de provider is bereikbaar, geen oordeel over zijn beschikbaarheid."""
+        with self._lock:
+            self.counts['calls'] += 1
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.counts['calls'] += 1
+            self.counts['failures'] += 1
+            self._fail_locked()
+
+    def _fail_locked(self) -> None:
+        self._failures += 1
+        self._probe_in_flight = False
+        if self._state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != STATE_OPEN:
+                self.counts['opened'] += 1
+                _logger.warning(
+                    f"[BREAKER] {self.provider} open na {self._failures} opeenvolgende fout(en) / trage calls"
+                )
+            self._state = STATE_OPEN
+            self._opened_at = time.time()
+
+    def percentile(self, pct: float, min_samples: int = 1):
+        """Latency-percentiel (seconden) van de recente geslaagde calls, of None."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < max(1, min_samples):
+            return None
+        idx = min(len(samples) - 1, max(0, math.ceil(pct / 100 * len(samples)) - 1))
+        return samples[idx]
+
+    def stats(self) -> dict:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        with self._lock:
+            return {
+                'provider': self.provider,
+                'state':    self._state,
+                'p50_s':    round(p50, 2) if p50 is not None else None,
+                'p95_s':    round(p95, 2) if p95 is not None else None,
+                'samples':  len(self._latencies),
+                **self.counts,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            from config import Config
+            breaker = _breakers[provider] = CircuitBreaker(
+                provider,
+                failure_threshold=Config.LLM_BREAKER_FAILURES,
+                cooldown_s=Config.LLM_BREAKER_COOLDOWN_S,
+                slow_call_s=Config.LLM_BREAKER_SLOW_CALL_S,
+            )
+        return breaker
+
+
+def reset_breakers() -> None:
+    """Vergeet alle breakers en latencies (nieuwe Config-waarden worden opnieuw gelezen)."""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def breaker_stats() -> list:
+    """Status per provider voor de performance-pagina."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [b.stats() for b in sorted(breakers, key=lambda b: b.provider)]
+
+
+def failover_model(model: str):
+    """
+    Alternatief model op een andere provider volgens LLM_FAILOVER_MODELS
+    ('anthropic=gemini-2.5-flash,gemini=claude-haiku-4-5'), of None.
+    """
+    from config import Config
+    mapping = {}
+    for pair in (Config.LLM_FAILOVER_MODELS or '').split(','):
+        if '=' in pair:
+            provider, alt = pair.split('=', 1)
+            mapping[provider.strip()] = alt.strip()
+    alt = mapping.get(provider_of(model)) or None
+    return alt if alt and alt != model else None
+
+
+def hedge_delay(model: str):
+    """Seconden waarna een duplicaat-call gerechtvaardigd is (p95), of None (geen hedging)."""
+    from config import Config
+    if not Config.LLM_HEDGING:
+        return None
+    p95 = get_breaker(provider_of(model)).percentile(95, min_samples=Config.LLM_HEDGE_MIN_SAMPLES)
+    if p95 is None:
+        return None
+    return max(p95, Config.LLM_HEDGE_MIN_DELAY_S)
+
+
+def call_with_resilience(model: str, call, label: str = ''):
+    """
+    Voer één LLM-call uit met breaker, failover en (optioneel) hedging.
+
+    call(model, cancel_event) doet de eigenlijke call en gooit bij fouten. cancel_event
+    is None zonder hedging; anders moet call stoppen (HedgeCancelled) zodra het gezet is.
+
+    Retourneert (result, info) met info = {'model', 'latency', 'failover', 'hedged'}.
+    Gooit de fout van de primaire call, of CircuitOpenError als geen provider beschikbaar is.
+    """
+    primary = model
+    failover = False
+    if not get_breaker(provider_of(model)).allow():
+        alt = failover_model(model)
+        if alt is None or not get_breaker(provider_of(alt)).allow():
+            raise CircuitOpenError(f"circuit breaker open voor {provider_of(model)} ({model})")
+        _logger.warning(f"[FAILOVER] {label} | breaker {provider_of(model)} open → {alt}")
+        primary, failover = alt, True
+
+    delay = None if failover else hedge_delay(primary)
+    if delay is None:
+        t0 = time.time()
+        try:
+            result = call(primary, None)
+        except Exception as exc:
+            _record_error(provider_of(primary), exc)
+            raise
+        latency = time.time() - t0
+        get_breaker(provider_of(primary)).record_success(latency)
+        return result, {'model': primary, 'latency': latency, 'failover': failover, 'hedged': False}
+
+    return _hedged_call(primary, call, delay, label)
+
+
+def _hedged_call(primary: str, call, delay: float, label: str):
+    """Primaire call; na delay seconden zonder antwoord een duplicaat naar het alternatief."""
+    outcomes = queue.Queue()
+    cancels = {}
+
+    def _run(m):
+        cancel = cancels[m] = threading.Event()
+
+        def _target():
+            t0 = time.time()
+            try:
+                res = call(m, cancel)
+            except HedgeCancelled:
+                get_breaker(provider_of(m)).record_cancelled()
+                outcomes.put((m, None, None, time.time() - t0))
+                return
+            except Exception as exc:
+                _record_error(provider_of(m), exc)
+                outcomes.put((m, None, exc, time.time() - t0))
+                return
+            latency = time.time() - t0
+            get_breaker(provider_of(m)).record_success(latency)
+            outcomes.put((m, res, None, latency))
+
+        threading.Thread(target=_target, daemon=True, name=f'llm-hedge-{m}').start()
+
+    _run(primary)
+    running, errors = 1, {}
+    try:
+        outcome = outcomes.get(timeout=delay)
+    except queue.Empty:
+        outcome = None
+        alt = failover_model(primary)
+        if alt and get_breaker(provider_of(alt)).allow():
+            _logger.info(f"[HEDGE] {label} | {primary} > {delay:.1f}s → duplicaat naar {alt}")
+            _run(alt)
+            running += 1
+
+    while True:
+        if outcome is None:
+            outcome = outcomes.get()
+        m, res, exc, latency = outcome
+        running -= 1
+        if res is not None:
+            for other, cancel in cancels.items():
+                if other != m:
+                    cancel.set()     # verliezer stopt bij het volgende streamfragment
+            return res, {'model': m, 'latency': latency, 'failover': m != primary,
+                         'hedged': len(cancels) > 1}
+        if exc is not None:
+            errors[m] = exc
+        if running == 0:
+            raise (errors.get(primary) or next(iter(errors.values()), None)
+                   or CircuitOpenError(f"geen antwoord van {primary}"))
+        outcome = None
@@ -0,0 +1,81 @@
+"""
+Procesbrede planner voor LLM-calls.
+
+Alle LLM-calls in dit proces (criteria, deel-calls van lange secties, holistische
+reviews — ook van gelijktijdige analyses) delen één budget van gelijktijdige calls.
+Een call vraagt vóór het versturen een slot aan met een prioriteit; vrijgekomen
+slots gaan eerst naar de laagste prioriteitswaarde en binnen een prioriteit op
+volgorde van aanvraag.
+
+Slots worden alleen rond de API-call zelf vastgehouden (zie _call_llm_with_retry),
+niet rond een hele taak: een taak die zelf weer deel-calls uitzet houdt dus geen
+slot bezet terwijl hij wacht, en kan de planner niet laten vastlopen.
+"""
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+# Lagere waarde = eerder aan de beurt
+PRIORITY_HIGH   = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW    = 2
+
+
+class LlmScheduler:
+    """Priority-gate met een vast aantal gelijktijdige LLM-calls."""
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self._cond    = threading.Condition()
+        self._active  = 0
+        self._waiting = []                 # heap van (prioriteit, volgnummer)
+        self._seq     = itertools.count()
+
+    def acquire(self, priority: int = PRIORITY_NORMAL) -> None:
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            while not (self._active < self.max_concurrent and self._waiting[0] == ticket):
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._active += 1
+            # De volgende wachtende past misschien ook nog
+            self._cond.notify_all()
+
+    def release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_NORMAL):
+        """Houd één slot vast voor de duur van het with-blok."""
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'active':         self._active,
+                'waiting':        len(self._waiting),
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LlmScheduler:
+    """De gedeelde planner van dit proces (grootte: Config.LLM_MAX_CONCURRENT_CALLS)."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                from config import Config
+                _scheduler = LlmScheduler(Config.LLM_MAX_CONCURRENT_CALLS)
+    return _scheduler
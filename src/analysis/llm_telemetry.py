@@ -0,0 +1,271 @@
+"""
+Telemetrie per LLM-call: één rij in llm_calls per _call_llm_with_retry-aanroep.
+
+Vastgelegd: document, criterium, sectie, label, model, tier, latency, input/output/
+cache-tokens, geschatte kosten, aantal pogingen en uitkomst ('ok', 'rate_limit',
+'fout', 'breaker_open'), plus of failover of hedging is gebruikt.
+
+Schrijven gebeurt buiten het hete pad: record_call zet de rij alleen in een
+wachtrij; een achtergrondthread schrijft per LLM_TELEMETRY_BATCH rijen of na
+LLM_TELEMETRY_FLUSH_S seconden met één executemany weg (eigen DB-verbinding).
+Is de wachtrij vol of de writer niet gestart, dan wordt de rij overgeslagen —
+telemetrie mag een analyse nooit ophouden.
+
+get_dashboard levert de aggregaten voor de /performance-pagina.
+"""
+import logging
+import math
+import queue
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+_logger = logging.getLogger('docucheck')
+
+_COLUMNS = (
+    'created_at', 'document_id', 'criterion_id', 'section_name', 'label', 'model', 'tier',
+    'latency_ms', 'input_tokens', 'output_tokens', 'cache_created', 'cache_read',
+    'cost_usd', 'attempts', 'outcome', 'failover', 'hedged',
+)
+_INSERT_SQL = (f"INSERT INTO llm_calls ({', '.join(_COLUMNS)}) "
+               f"VALUES ({', '.join('?' for _ in _COLUMNS)})")
+
+
+class TelemetryWriter:
+    """Wachtrij + achtergrondthread die rijen gebundeld naar llm_calls schrijft."""
+
+    def __init__(self, database: str, batch_size: int = 50, flush_interval: float = 2.0,
+                 max_queue: int = 10000):
+        self.database       = database
+        self.batch_size     = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue   = queue.Queue(maxsize=max_queue)
+        self._wake    = threading.Event()     # gezet zodra een volle batch klaarstaat
+        self._lock    = threading.Lock()      # één schrijver tegelijk (thread of flush())
+        self.written  = 0
+        self.dropped  = 0
+        self._thread  = threading.Thread(target=self._run, daemon=True, name='llm-telemetry')
+        self._thread.start()
+
+    def record(self, row: tuple) -> None:
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(timeout=self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Schrijf alles wat in de wachtrij staat weg, per batch van batch_size rijen."""
+        while True:
+            rows = []
+            while len(rows) < self.batch_size:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not rows:
+                return
+            self._write(rows)
+
+    def _write(self, rows: list) -> None:
+        with self._lock:
+            try:
+                conn = sqlite3.connect(self.database, timeout=30.0)
+                try:
+                    conn.executemany(_INSERT_SQL, rows)
+                    conn.commit()
+                finally:
+                    conn.close()
+                self.written += len(rows)
+            except Exception as exc:
+                self.dropped += len(rows)
+                _logger.warning(f"[TELEMETRIE] {len(rows)} LLM-call(s) niet weggeschreven: {exc}")
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def start_writer(database: str):
+    """Start de procesbrede writer (idempotent); None als LLM_TELEMETRY uit staat."""
+    global _writer
+    from config import Config
+    if not Config.LLM_TELEMETRY:
+        return None
+    with _writer_lock:
+        if _writer is None or _writer.database != database:
+            _writer = TelemetryWriter(database, Config.LLM_TELEMETRY_BATCH, Config.LLM_TELEMETRY_FLUSH_S)
+        return _writer
+
+
+def stop_writer() -> None:
+    """Schrijf de wachtrij weg en vergeet de writer."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.flush()
+
+
+def flush() -> None:
+    if _writer is not None:
+        _writer.flush()
+
+
+def record_call(*, document_id=None, criterion_id=None, section_name=None, label='',
+                model='', tier=None, latency=0.0, llm_result=None, cost_usd=0.0,
+                attempts=1, outcome='ok', failover=False, hedged=False) -> None:
+    """Leg één LLM-call vast (niet-blokkerend; zonder gestarte writer een no-op)."""
+    writer = _writer
+    if writer is None:
+        return
+    usage = llm_result or {}
+    writer.record((
+        datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+        document_id, criterion_id, section_name, label, model, tier,
+        int(round(latency * 1000)),
+        usage.get('input_tokens', 0), usage.get('output_tokens', 0),
+        usage.get('cache_created', 0), usage.get('cache_read', 0),
+        round(cost_usd, 6), attempts, outcome, int(bool(failover)), int(bool(hedged)),
+    ))
+
+
+# ---------------------------------------------------------------------------
+# Aggregaten voor /performance
+# ---------------------------------------------------------------------------
+
+def _percentile(sorted_values: list, pct: float):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+
+def _cache_hit_ratio(cache_read, cache_created) -> float:
+    total = (cache_read or 0) + (cache_created or 0)
+    return round((cache_read or 0) / total, 3) if total else 0.0
+
+
+def get_dashboard(conn: sqlite3.Connection, days: int = 7, top_n: int = 10) -> dict:
+    """
+    Aggregaten over de LLM-calls van de laatste `days` dagen:
+      totals        : calls, fouten, tokens, kosten, cache-hit-ratio
+      per_model     : p50/p95-latency (geslaagde calls), calls, fouten, tokens, kosten
+      per_doc_type  : tokens en kosten per documenttype (totaal en per document)
+      top_criteria  : duurste criteria (kosten), met calls en gemiddelde latency
+    """
+    since = f'-{int(days)} days'
+    where = "c.created_at >= datetime('now', ?)"
+
+    totals = conn.execute(f"""
+        SELECT COUNT(*), SUM(c.outcome != 'ok'), SUM(c.input_tokens), SUM(c.output_tokens),
+               SUM(c.cache_created), SUM(c.cache_read), SUM(c.cost_usd),
+               SUM(c.attempts - 1), COUNT(DISTINCT c.document_id)
+        FROM llm_calls c WHERE {where}
+    """, (since,)).fetchone()
+    summary = {
+        'calls': totals[0] or 0, 'errors': totals[1] or 0,
+        'input_tokens': totals[2] or 0, 'output_tokens': totals[3] or 0,
+        'cache_created': totals[4] or 0, 'cache_read': totals[5] or 0,
+        'cost_usd': round(totals[6] or 0.0, 4), 'retries': totals[7] or 0,
+        'documents': totals[8] or 0,
+        'cache_hit_ratio': _cache_hit_ratio(totals[5], totals[4]),
+    }
+
+    latencies = {}
+    for model, latency_ms in conn.execute(f"""
+        SELECT c.model, c.latency_ms FROM llm_calls c
+        WHERE {where} AND c.outcome = 'ok' ORDER BY c.model, c.latency_ms
+    """, (since,)):
+        latencies.setdefault(model, []).append(latency_ms / 1000)
+
+    per_model = []
+    for row in conn.execute(f"""
+        SELECT c.model, COUNT(*), SUM(c.outcome != 'ok'), SUM(c.input_tokens), SUM(c.output_tokens),
+               SUM(c.cache_created), SUM(c.cache_read), SUM(c.cost_usd)
+        FROM llm_calls c WHERE {where}
+        GROUP BY c.model ORDER BY SUM(c.cost_usd) DESC
+    """, (since,)):
+        samples = latencies.get(row[0], [])
+        per_model.append({
+            'model': row[0], 'calls': row[1], 'errors': row[2] or 0,
+            'input_tokens': row[3] or 0, 'output_tokens': row[4] or 0,
+            'cache_hit_ratio': _cache_hit_ratio(row[6], row[5]),
+            'cost_usd': round(row[7] or 0.0, 4),
+            'p50_s': _percentile(samples, 50), 'p95_s': _percentile(samples, 95),
+        })
+
+    per_doc_type = []
+    for row in conn.execute(f"""
+        SELECT COALESCE(dt.name, '(onbekend)'), COUNT(DISTINCT c.document_id), COUNT(*),
+               SUM(c.input_tokens + c.cache_created + c.cache_read), SUM(c.output_tokens),
+               SUM(c.cache_created), SUM(c.cache_read), SUM(c.cost_usd)
+        FROM llm_calls c
+        LEFT JOIN documents d       ON d.id = c.document_id
+        LEFT JOIN document_types dt ON dt.id = d.document_type_id
+        WHERE {where}
+        GROUP BY dt.id ORDER BY SUM(c.cost_usd) DESC
+    """, (since,)):
+        documents = row[1] or 0
+        per_doc_type.append({
+            'document_type': row[0], 'documents': documents, 'calls': row[2],
+            'input_tokens': row[3] or 0, 'output_tokens': row[4] or 0,
+            'tokens_per_document': round(((row[3] or 0) + (row[4] or 0)) / documents) if documents else None,
+            'cache_hit_ratio': _cache_hit_ratio(row[6], row[5]),
+            'cost_usd': round(row[7] or 0.0, 4),
+        })
+
+    top_criteria = [
+        {'criterion_id': row[0], 'name': row[1] or f'criterium {row[0]}', 'calls': row[2],
+         'tokens': row[3] or 0, 'avg_latency_s': round((row[4] or 0) / 1000, 2),
+         'cost_usd': round(row[5] or 0.0, 4)}
+        for row in conn.execute(f"""
+            SELECT c.criterion_id, cr.name, COUNT(*),
+                   SUM(c.input_tokens + c.cache_created + c.cache_read + c.output_tokens),
+                   AVG(c.latency_ms), SUM(c.cost_usd)
+            FROM llm_calls c LEFT JOIN criteria cr ON cr.id = c.criterion_id
+            WHERE {where} AND c.criterion_id IS NOT NULL
+            GROUP BY c.criterion_id ORDER BY SUM(c.cost_usd) DESC, COUNT(*) DESC
+            LIMIT ?
+        """, (since, top_n))
+    ]
+
+    return {'days': days, 'totals': summary, 'per_model': per_model,
+            'per_doc_type': per_doc_type, 'top_criteria': top_criteria}
+
+
+def model_history(conn: sqlite3.Connection, days: int = 30, min_calls: int = 5) -> dict:
+    """
+    Gemeten gedrag per model (geslaagde calls, laatste `days` dagen), voor de dry-run:
+    {model: {'calls', 'p50_s', 'avg_output_tokens'}}. Modellen met minder dan
+    min_calls calls ontbreken (te weinig data voor een schatting).
+    """
+    history = {}
+    try:
+        rows = conn.execute("""
+            SELECT model, latency_ms, output_tokens FROM llm_calls
+            WHERE outcome = 'ok' AND created_at >= datetime('now', ?)
+            ORDER BY model, latency_ms
+        """, (f'-{int(days)} days',)).fetchall()
+    except sqlite3.OperationalError:
+        return history   # tabel ontbreekt (oude DB zonder migratie)
+    per_model = {}
+    for model, latency_ms, output_tokens in rows:
+        per_model.setdefault(model, []).append((latency_ms / 1000, output_tokens or 0))
+    for model, samples in per_model.items():
+        if len(samples) < min_calls:
+            continue
+        history[model] = {
+            'calls':             len(samples),
+            'p50_s':             _percentile([lat for lat, _ in samples], 50),
+            'avg_output_tokens': round(sum(out for _, out in samples) / len(samples)),
+        }
+    return history
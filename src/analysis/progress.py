@@ -0,0 +1,100 @@
+"""
+Voortgang van een lopende analyse (tabel analysis_progress, één rij per document).
+
+De runner meldt per stap waar hij is; in de LLM-fase ook hoeveel taken klaar zijn en
+een geschatte resterende tijd. De rij wordt via een eigen verbinding geschreven, zodat
+de webserver (SSE-endpoint /api/analysis/<id>/events) de voortgang ook ziet als de
+analyse in een losse worker draait. Elke schrijfactie verhoogt `seq`; het endpoint
+stuurt alleen een event als seq veranderd is.
+
+Stappen: parse, recognize, digest, criteria, llm, holistic, save.
+"""
+import logging
+import sqlite3
+import threading
+import time
+
+_logger = logging.getLogger('docucheck')
+
+STAGES = ('parse', 'recognize', 'digest', 'criteria', 'llm', 'holistic', 'save')
+
+
+class ProgressReporter:
+    """
+    Voortgang van één analyse. stage() schrijft direct; task_done() hoogstens eens per
+    min_interval seconden (wordt vanuit LLM-worker-threads aangeroepen). Schrijffouten
+    worden gelogd en breken de analyse niet.
+    """
+
+    def __init__(self, database: str, document_id: int, job_id: int = None, min_interval: float = 1.0):
+        self.database = database
+        self.document_id = document_id
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self.stage_name = None
+        self.done = 0
+        self.total = 0
+        self._stage_started = time.time()
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+    def stage(self, stage: str, total: int = 0) -> None:
+        """Begin een nieuwe stap (met optioneel het aantal taken in die stap)."""
+        with self._lock:
+            self.stage_name = stage
+            self.done = 0
+            self.total = total
+            self._stage_started = time.time()
+        self._write()
+
+    def task_done(self, n: int = 1) -> None:
+        with self._lock:
+            self.done += n
+            due = (time.time() - self._last_write >= self.min_interval
+                   or self.done >= self.total)
+        if due:
+            self._write()
+
+    def eta_s(self):
+        """Geschatte resterende seconden van de huidige stap, of None zonder meetpunt."""
+        with self._lock:
+            if not self.total or not self.done or self.done >= self.total:
+                return None
+            elapsed = time.time() - self._stage_started
+            return round(elapsed / self.done * (self.total - self.done), 1)
+
+    def _write(self) -> None:
+        eta = self.eta_s()
+        with self._lock:
+            row = (self.document_id, self.job_id, self.stage_name, self.done, self.total, eta)
+            self._last_write = time.time()
+        try:
+            conn = sqlite3.connect(self.database, timeout=30.0)
+            try:
+                conn.execute(
+                    'INSERT INTO analysis_progress (document_id, job_id, stage, done, total, eta_s, seq, updated_at) '
+                    "VALUES (?,?,?,?,?,?,1,datetime('now')) "
+                    'ON CONFLICT(document_id) DO UPDATE SET job_id=excluded.job_id, stage=excluded.stage, '
+                    'done=excluded.done, total=excluded.total, eta_s=excluded.eta_s, '
+                    'seq=analysis_progress.seq + 1, updated_at=excluded.updated_at',
+                    row
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as exc:
+            _logger.warning(f"[VOORTGANG] Opslaan mislukt voor document {self.document_id}: {exc}")
+
+
+def read_progress(conn: sqlite3.Connection, document_id: int):
+    """De laatste voortgang van een document als dict (seq, stage, done, total, eta_s), of None."""
+    try:
+        row = conn.execute(
+            'SELECT seq, stage, done, total, eta_s FROM analysis_progress WHERE document_id=?',
+            (document_id,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None     # tabel bestaat nog niet (migratie niet gedraaid)
+    if row is None:
+        return None
+    return dict(zip(('seq', 'stage', 'done', 'total', 'eta_s'), tuple(row)))
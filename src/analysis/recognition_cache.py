@@ -0,0 +1,62 @@
+"""
+Gecachete parse- en herkenningsresultaten per document (tabel document_recognition_cache).
+
+Checkpoints (analysis/checkpoints.py) gelden alleen binnen één job. Deze cache bewaart
+na een volledige analyse de documenttekst en de herkende secties (met koppen,
+identifiers en voetnoten), zodat latere jobs die alleen criteria opnieuw checken
+(herbeoordeling van één criterium, zie analysis/reevaluation.py) het document niet
+opnieuw hoeven te parsen en herkennen.
+
+De cache is geldig zolang het bestand (file_hash) en de verwachte secties van het
+documenttype (sections_key) niet veranderd zijn.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+
+_logger = logging.getLogger('docucheck')
+
+
+def sections_key(expected_sections: list) -> str:
+    """Hash van de verwachte secties waarmee herkend is (namen, aliassen, volgorde)."""
+    rows = [dict(s) if hasattr(s, 'keys') else s for s in expected_sections]
+    payload = json.dumps(rows, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def load(conn: sqlite3.Connection, document_id: int, file_hash: str, key: str):
+    """(tekst, secties) uit de cache, of None als er niets (geldigs) is."""
+    if not file_hash:
+        return None
+    row = conn.execute(
+        'SELECT full_text, sections FROM document_recognition_cache '
+        'WHERE document_id=? AND file_hash=? AND sections_key=?',
+        (document_id, file_hash, key)
+    ).fetchone()
+    if row is None:
+        return None
+    try:
+        return row[0], json.loads(row[1])
+    except (json.JSONDecodeError, TypeError):
+        return None
+
+
+def store(database: str, document_id: int, file_hash: str, key: str,
+          full_text: str, sections: list) -> None:
+    """Leg tekst en herkende secties vast; een fout bij wegschrijven breekt de analyse niet."""
+    if not file_hash:
+        return
+    try:
+        conn = sqlite3.connect(database, timeout=30.0)
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO document_recognition_cache '
+                '(document_id, file_hash, sections_key, full_text, sections) VALUES (?,?,?,?,?)',
+                (document_id, file_hash, key, full_text, json.dumps(sections))
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    except (sqlite3.Error, TypeError, ValueError) as exc:
+        _logger.warning(f"[CACHE] Herkenning niet vastgelegd voor document {document_id}: {exc}")
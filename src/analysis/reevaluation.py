@@ -0,0 +1,212 @@
+"""
+Herbeoordeling van één criterium over bestaande analyses (tabel criterion_reevaluations).
+
+Na het wijzigen van een criterium (routes/criteria.edit_criterion) hoeft niet elk
+document volledig opnieuw geanalyseerd te worden: een herbeoordeling zet voor elk
+voltooid document van de documenttypes waaraan het criterium gekoppeld is een job van
+het soort 'criterion' in de wachtrij (analysis_queue). De runner
+(analysis_runner.run_criterion_reevaluation_background) gebruikt de gecachete tekst en
+secties (analysis/recognition_cache.py), checkt alleen dit criterium met lage prioriteit
+in de LLM-planner en vervangt alleen de feedback van dit criterium.
+
+Eén job kan meerdere herbeoordelingen dragen (payload 'reevaluations': lijst van
+{criteria_id, batch_id}): wacht er voor een document al een criterion-job, dan wordt het
+criterium daaraan toegevoegd. Loopt er al een job, of wacht er een deelanalyse, dan komt
+de herbeoordeling in 'followup' en zet analysis_queue na afloop een nieuwe criterion-job
+in de wachtrij. Alleen naast een volledige analyse (die de nieuwe instellingen gebruikt)
+wordt een document overgeslagen.
+
+Het document blijft tijdens een herbeoordeling 'completed'. Voortgang komt uit de jobs
+van de herbeoordeling; annuleren haalt de wachtende jobs uit de wachtrij en laat lopende
+jobs zonder schrijven stoppen. Was een document vóór de wijziging bij met de configuratie
+(analysis/config_fingerprint.py), dan krijgt het na de herbeoordeling de nieuwe
+fingerprint en telt het niet meer als verouderd.
+"""
+import json
+import logging
+import sqlite3
+
+_logger = logging.getLogger('docucheck')
+
+# Jobs van één herbeoordeling, en actieve jobs die haar na afloop als vervolgjob inplannen
+_BATCH_JOBS = ("kind='criterion' AND EXISTS (SELECT 1 FROM json_each(analysis_jobs.payload, "
+               "'$.reevaluations') WHERE json_extract(value, '$.batch_id')=?)")
+_FOLLOWUP_JOBS = ("status IN ('queued', 'running') AND EXISTS (SELECT 1 FROM json_each("
+                  "analysis_jobs.payload, '$.followup') WHERE json_extract(value, '$.batch_id')=?)")
+
+
+def affected_document_types(conn: sqlite3.Connection, criteria_id: int) -> list:
+    """Ids van de documenttypes waaraan het criterium gekoppeld is."""
+    return [r[0] for r in conn.execute(
+        'SELECT DISTINCT document_type_id FROM document_type_criteria_mappings WHERE criteria_id=?',
+        (criteria_id,)
+    ).fetchall()]
+
+
+def start(conn: sqlite3.Connection, criteria_id: int, fingerprints: dict, created_by=None) -> int:
+    """
+    Start een herbeoordeling van criteria_id. fingerprints: {documenttype: (oud, nieuw)},
+    de configuratie-fingerprints van vóór en na de wijziging. Retourneert het id.
+    """
+    import analysis_queue
+
+    type_ids = affected_document_types(conn, criteria_id)
+    cur = conn.execute(
+        "INSERT INTO criterion_reevaluations (criteria_id, status, fingerprints, created_by) "
+        "VALUES (?, 'running', ?, ?)",
+        (criteria_id, json.dumps({str(t): list(fingerprints.get(t) or ()) for t in type_ids}), created_by)
+    )
+    batch_id = cur.lastrowid
+    conn.commit()
+
+    documents = conn.execute(
+        "SELECT id FROM documents WHERE analysis_status='completed' AND document_type_id IN ({}) "
+        "ORDER BY id".format(','.join('?' * len(type_ids))), type_ids
+    ).fetchall() if type_ids else []
+    entry = {'criteria_id': criteria_id, 'batch_id': batch_id}
+    queued = skipped = 0
+    for (document_id,) in documents:
+        _, added = analysis_queue.enqueue(conn, document_id, 'criterion', {'reevaluations': [entry]})
+        if not added:
+            added = _add_to_active_job(conn, document_id, entry)
+        if not added and analysis_queue.active_job(conn, document_id) is None:
+            # De actieve job was net klaar: nu kan er een eigen job in de wachtrij
+            _, added = analysis_queue.enqueue(conn, document_id, 'criterion', {'reevaluations': [entry]})
+        if added:
+            queued += 1
+        else:
+            skipped += 1     # loopt al een volledige analyse: die gebruikt de nieuwe instellingen
+    conn.execute('UPDATE criterion_reevaluations SET total=?, skipped=? WHERE id=?',
+                 (queued, skipped, batch_id))
+    if not queued:
+        conn.execute("UPDATE criterion_reevaluations SET status='done', finished_at=datetime('now') "
+                     "WHERE id=?", (batch_id,))
+    conn.commit()
+    _logger.info(f"[HERBEOORDELING] {batch_id}: criterium {criteria_id} voor {queued} document(en) "
+                 f"in de wachtrij ({skipped} overgeslagen, types {type_ids})")
+    return batch_id
+
+
+def _add_to_active_job(conn: sqlite3.Connection, document_id: int, entry: dict) -> bool:
+    """
+    Neem een herbeoordeling op in de job die al voor het document wacht of loopt: een
+    wachtende criterion-job krijgt het criterium erbij, andere jobs krijgen het als
+    followup. False bij een volledige analyse of als er geen actieve job (meer) is.
+    """
+    import analysis_queue
+    job = analysis_queue.active_job(conn, document_id)
+    if job is None or job['kind'] == 'full':
+        return False
+    key = 'reevaluations' if job['kind'] == 'criterion' and job['status'] == 'queued' else 'followup'
+    # Toevoegen in SQL: een gelijktijdige samenvoeging gaat niet verloren
+    cur = conn.execute(
+        f"UPDATE analysis_jobs SET payload=json_insert(json_insert(COALESCE(payload, '{{}}'), "
+        f"'$.{key}', json('[]')), '$.{key}[#]', json(?)) WHERE id=? AND status=?",
+        (json.dumps(entry), job['id'], job['status'])
+    )
+    conn.commit()
+    return cur.rowcount == 1
+
+
+def is_cancelled(conn: sqlite3.Connection, batch_id) -> bool:
+    """True als de herbeoordeling geannuleerd is (False zonder batch_id)."""
+    if batch_id is None:
+        return False
+    row = conn.execute('SELECT status FROM criterion_reevaluations WHERE id=?', (batch_id,)).fetchone()
+    return row is not None and row[0] == 'cancelled'
+
+
+def cancel(conn: sqlite3.Connection, batch_id: int) -> int:
+    """
+    Annuleer een herbeoordeling; retourneert het aantal wachtende jobs waaruit ze is
+    gehaald. Een job die ook andere herbeoordelingen draagt blijft voor die staan.
+    """
+    cur = conn.execute(
+        "UPDATE criterion_reevaluations SET status='cancelled', finished_at=datetime('now') "
+        "WHERE id=? AND status='running'", (batch_id,)
+    )
+    if cur.rowcount == 0:
+        return 0
+    removed = 0
+    for job in conn.execute(
+        "SELECT id, payload FROM analysis_jobs WHERE " + _BATCH_JOBS + " AND status='queued'", (batch_id,)
+    ).fetchall():
+        payload = json.loads(job['payload'] or '{}')
+        others = [e for e in payload.get('reevaluations') or [] if e.get('batch_id') != batch_id]
+        if others:
+            payload['reevaluations'] = others
+            cur = conn.execute("UPDATE analysis_jobs SET payload=? WHERE id=? AND status='queued' AND payload=?",
+                               (json.dumps(payload), job['id'], job['payload']))
+        else:
+            cur = conn.execute(
+                "UPDATE analysis_jobs SET status='cancelled', last_error='herbeoordeling geannuleerd', "
+                "finished_at=datetime('now') WHERE id=? AND status='queued'", (job['id'],)
+            )
+        removed += cur.rowcount
+    conn.commit()
+    _logger.info(f"[HERBEOORDELING] {batch_id}: geannuleerd ({removed} wachtende job(s) verwijderd)")
+    return removed
+
+
+def fingerprint_after(conn: sqlite3.Connection, batch_id, document_type_id):
+    """(oud, nieuw) fingerprint van de herbeoordeling voor dit documenttype, of None."""
+    if batch_id is None:
+        return None
+    row = conn.execute('SELECT fingerprints FROM criterion_reevaluations WHERE id=?', (batch_id,)).fetchone()
+    try:
+        pair = json.loads(row[0] or '{}').get(str(document_type_id)) if row is not None else None
+    except json.JSONDecodeError:
+        return None
+    return tuple(pair) if pair and len(pair) == 2 else None
+
+
+def status(conn: sqlite3.Connection, batch_id: int):
+    """
+    Voortgang van een herbeoordeling (of None): status, totaal, aantallen per jobstatus
+    en het aandeel verwerkte documenten. Een herbeoordeling zonder wachtende of lopende
+    jobs wordt hier op 'done' gezet.
+    """
+    batch = conn.execute('SELECT * FROM criterion_reevaluations WHERE id=?', (batch_id,)).fetchone()
+    if batch is None:
+        return None
+    counts = dict(conn.execute(
+        'SELECT status, COUNT(*) FROM analysis_jobs WHERE ' + _BATCH_JOBS + ' GROUP BY status', (batch_id,)
+    ).fetchall())
+    # Nog in te plannen vervolgjobs tellen als wachtend
+    followups = conn.execute('SELECT COUNT(*) FROM analysis_jobs WHERE ' + _FOLLOWUP_JOBS,
+                             (batch_id,)).fetchone()[0]
+    if followups:
+        counts['queued'] = counts.get('queued', 0) + followups
+    state = batch['status']
+    if state == 'running' and not counts.get('queued') and not counts.get('running'):
+        conn.execute("UPDATE criterion_reevaluations SET status='done', finished_at=datetime('now') "
+                     "WHERE id=? AND status='running'", (batch_id,))
+        conn.commit()
+        state = 'done'
+    processed = counts.get('done', 0) + counts.get('failed', 0)
+    return {
+        'id':          batch_id,
+        'criteria_id': batch['criteria_id'],
+        'status':      state,
+        'total':       batch['total'],
+        'skipped':     batch['skipped'],
+        'queued':      counts.get('queued', 0),
+        'running':     counts.get('running', 0),
+        'done':        counts.get('done', 0),
+        'failed':      counts.get('failed', 0),
+        'cancelled':   counts.get('cancelled', 0),
+        'progress':    processed / batch['total'] if batch['total'] else 1.0,
+        'created_at':  batch['created_at'],
+        'finished_at': batch['finished_at'],
+    }
+
+
+def recent(conn: sqlite3.Connection, limit: int = 5) -> list:
+    """Status van de laatste herbeoordelingen (voor de criteria-overzichtspagina)."""
+    try:
+        ids = [r[0] for r in conn.execute(
+            'SELECT id FROM criterion_reevaluations ORDER BY id DESC LIMIT ?', (limit,)
+        ).fetchall()]
+    except sqlite3.OperationalError:
+        return []
+    return [status(conn, batch_id) for batch_id in ids]
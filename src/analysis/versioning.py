@@ -0,0 +1,161 @@
+"""
+Versies van hetzelfde document (kolom documents.previous_version_id).
+
+Studenten leveren dezelfde scriptie vaak meerdere keren in. Een nieuwe upload wordt
+gekoppeld aan de vorige versie van dezelfde gebruiker en hetzelfde documenttype met
+een vergelijkbare bestandsnaam (bij het uploaden) of, als dat niets oplevert, een
+vergelijkbare indeling (herkende secties, in de runner).
+
+Elke analyse legt per sectie een inhoudshash vast (analysis_data['section_hashes']) en
+één voor de hele tekst ('document_hash'). Bij een nieuwe versie worden de criteria alleen
+opnieuw gecheckt voor secties waarvan de hash veranderd is; de feedback van ongewijzigde
+secties komt uit de vorige versie. Document-brede criteria lopen opnieuw zodra er iets
+aan de tekst veranderd is. Hergebruik gebeurt alleen als de vorige analyse met dezelfde
+configuratie is gedaan (documents.config_fingerprint, zie analysis/config_fingerprint.py)
+en ANALYSIS_INCREMENTAL aan staat.
+"""
+import difflib
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+
+_logger = logging.getLogger('docucheck')
+
+# Minimale overeenkomst van genormaliseerde bestandsnamen / sectie-indelingen
+NAME_SIMILARITY = 0.8
+OUTLINE_SIMILARITY = 0.8
+# Aantal eerdere documenten van dezelfde gebruiker en hetzelfde type dat bekeken wordt
+_CANDIDATES = 20
+
+_VERSION_NOISE = re.compile(
+    r'\bv\d+\b|\b(versie|version|concept|draft|definitief|final|def|herzien|revised|nieuw|new)\b'
+    r'|\(\d+\)|\d+',
+    re.IGNORECASE,
+)
+
+
+def normalize_name(filename: str) -> str:
+    """Bestandsnaam zonder extensie, versienummers, datums en woorden als 'concept' of 'final'."""
+    stem = os.path.splitext(os.path.basename(filename or ''))[0].lower()
+    stem = _VERSION_NOISE.sub(' ', re.sub(r'[_\-.]+', ' ', stem))
+    return ' '.join(stem.split())
+
+
+def section_hash(section: dict) -> str:
+    """Inhoudshash van een herkende sectie (witruimte genormaliseerd)."""
+    content = ' '.join((section.get('content') or '').split())
+    return hashlib.sha256(f"{section.get('name') or ''}\n{content}".encode('utf-8')).hexdigest()[:32]
+
+
+def section_hashes(sections: list) -> dict:
+    """{sectienaam: hash} voor alle gevonden secties."""
+    return {s['name']: section_hash(s) for s in sections if s.get('found') and s.get('name')}
+
+
+def text_hash(text: str) -> str:
+    """Inhoudshash van de volledige documenttekst (witruimte genormaliseerd)."""
+    return hashlib.sha256(' '.join((text or '').split()).encode('utf-8')).hexdigest()[:32]
+
+
+def _candidates(conn: sqlite3.Connection, document_id: int) -> list:
+    document = conn.execute(
+        'SELECT id, uploaded_by, document_type_id FROM documents WHERE id=?', (document_id,)
+    ).fetchone()
+    if document is None or document['uploaded_by'] is None:
+        return []
+    return conn.execute(
+        "SELECT id, original_filename, analysis_data FROM documents "
+        "WHERE uploaded_by=? AND document_type_id=? AND id<? AND analysis_status='completed' "
+        "ORDER BY id DESC LIMIT ?",
+        (document['uploaded_by'], document['document_type_id'], document_id, _CANDIDATES)
+    ).fetchall()
+
+
+def link_previous_version(conn: sqlite3.Connection, document_id: int, outline: list = None):
+    """
+    Zoek de vorige versie van een document en leg die vast in previous_version_id.
+    Zonder outline wordt op bestandsnaam gezocht (bij het uploaden); met outline (namen van
+    de gevonden secties) op indeling. Retourneert het id van de vorige versie of None.
+    """
+    row = conn.execute('SELECT original_filename FROM documents WHERE id=?', (document_id,)).fetchone()
+    if row is None:
+        return None
+    name = normalize_name(row['original_filename'])
+    wanted = set(outline or [])
+    previous = None
+    for candidate in _candidates(conn, document_id):
+        if outline is None:
+            ratio = difflib.SequenceMatcher(None, name, normalize_name(candidate['original_filename'])).ratio()
+            if name and ratio >= NAME_SIMILARITY:
+                previous = candidate['id']
+                break
+        else:
+            try:
+                found = {s['name'] for s in json.loads(candidate['analysis_data'] or '{}').get('sections', [])
+                         if s.get('found')}
+            except (json.JSONDecodeError, TypeError, AttributeError):
+                continue
+            if wanted and found and len(wanted & found) / len(wanted | found) >= OUTLINE_SIMILARITY:
+                previous = candidate['id']
+                break
+    if previous is not None:
+        conn.execute('UPDATE documents SET previous_version_id=? WHERE id=?', (previous, document_id))
+        conn.commit()
+        _logger.info(f"[VERSIE] document={document_id} is een nieuwe versie van document {previous} "
+                     f"({'bestandsnaam' if outline is None else 'indeling'})")
+    return previous
+
+
+def plan_reuse(conn: sqlite3.Connection, document_id: int, hashes: dict, fingerprint: str,
+               document_hash: str = None):
+    """
+    Bepaal wat er van de vorige versie hergebruikt kan worden.
+    Retourneert None (alles analyseren) of een dict met:
+      previous_id : de vorige versie
+      unchanged   : sectienamen met dezelfde hash als in de vorige versie
+      changed     : sectienamen die nieuw of gewijzigd zijn
+      doc_wide    : True als de document-brede criteria opnieuw moeten (tekst gewijzigd)
+      feedback    : de hergebruikte feedback-items (opmaakwaarschuwingen worden altijd
+                    opnieuw bepaald)
+    """
+    row = conn.execute('SELECT previous_version_id FROM documents WHERE id=?', (document_id,)).fetchone()
+    previous_id = row['previous_version_id'] if row is not None else None
+    if previous_id is None:
+        previous_id = link_previous_version(conn, document_id, outline=list(hashes))
+    if previous_id is None:
+        return None
+    previous = conn.execute(
+        "SELECT analysis_status, analysis_data, config_fingerprint FROM documents WHERE id=?",
+        (previous_id,)
+    ).fetchone()
+    if previous is None or previous['analysis_status'] != 'completed':
+        return None
+    try:
+        data = json.loads(previous['analysis_data'] or '{}')
+    except (json.JSONDecodeError, TypeError):
+        return None
+    old_hashes = data.get('section_hashes') or {}
+    if not old_hashes or previous['config_fingerprint'] != fingerprint:
+        _logger.info(f"[VERSIE] document={document_id}: vorige versie {previous_id} niet herbruikbaar "
+                     f"({'geen sectiehashes' if not old_hashes else 'configuratie gewijzigd'})")
+        return None
+
+    unchanged = {name for name, h in hashes.items() if old_hashes.get(name) == h}
+    changed = set(hashes) - unchanged
+    doc_wide = document_hash is None or data.get('document_hash') != document_hash
+
+    def _reusable(item):
+        if item.get('check_type') == 'formatting':
+            return False
+        name = item.get('section_name') or ''
+        if name in ('', 'Hele Document'):
+            return not doc_wide
+        # Items die ook voor een gewijzigde (parent)sectie gelden worden opnieuw bepaald
+        return name in unchanged and not any(n in changed for n in item.get('also_in_sections') or [])
+
+    feedback = [dict(item, reused_from=previous_id) for item in data.get('feedback', []) if _reusable(item)]
+    return {'previous_id': previous_id, 'unchanged': unchanged, 'changed': changed,
+            'doc_wide': doc_wide, 'feedback': feedback}
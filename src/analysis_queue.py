@@ -0,0 +1,826 @@
+# src/analysis_queue.py
+"""
+Duurzame analysewachtrij op SQLite (tabel analysis_jobs).
+
+Routes zetten een job in de wachtrij (enqueue); runner-threads claimen jobs en voeren
+ze uit met analysis_runner. Omdat de wachtrij in de database staat, werkt dit over
+processen heen (meerdere gunicorn-workers) en overleeft het herstarts en deploys:
+
+  - enqueue is idempotent per document: zolang er een job 'queued' of 'running' is,
+    geeft een nieuwe enqueue die job terug (unieke partiële index op document_id).
+  - claim is atomair (BEGIN IMMEDIATE) en geeft een lease van ANALYSIS_JOB_LEASE_S
+    seconden; de runner verlengt die met heartbeats zolang de analyse loopt.
+  - Verloopt een lease (proces gestopt of gecrasht), dan wordt de job opnieuw
+    'queued' en pakt een andere runner hem op. Na ANALYSIS_JOB_MAX_ATTEMPTS pogingen
+    wordt de job 'failed'.
+  - Een mislukte analyse wordt met exponentiële backoff opnieuw ingepland
+    (ANALYSIS_JOB_RETRY_BASE_S × 2^(poging-1)).
+  - Een nieuwe poging van een job gaat verder vanaf zijn checkpoints (tabel
+    analysis_checkpoints, zie analysis/checkpoints.py); die worden opgeruimd zodra de
+    job 'done' of definitief 'failed' is.
+
+Documentstatus: 'pending' zolang de job wacht, 'analyzing' zodra hij loopt, en bij
+definitief falen 'failed' (volledige analyse) of weer 'completed' (gedeeltelijke
+heranalyse: de bestaande analyse blijft geldig). Achtergrondjobs (BACKGROUND_KINDS:
+herbeoordeling van één criterium, zie analysis/reevaluation.py) laten het document op
+'completed' staan; een volledige of gedeeltelijke analyse die wordt aangevraagd terwijl
+zo'n job nog wacht, vervangt die job.
+
+Planning (claim): elke job heeft een prioriteitsklasse — interactief (losse upload of
+heranalyse), batch (analysis/batches.py) of achtergrond (herbeoordeling). Claim kiest de
+beste klasse; een wachtende job schuift per ANALYSIS_PRIORITY_AGING_S een klasse op, zodat
+achtergrondwerk niet eindeloos wacht. Binnen een klasse gaat de organisatie met de minste
+lopende jobs voor (fair share), daarna de oudste job. Jobs worden overgeslagen zolang hun
+batch ANALYSIS_BATCH_MAX_RUNNING lopende jobs heeft, of hun organisatie haar quotum aan
+gelijktijdige jobs of tokens per uur (LLM-telemetrie) heeft bereikt. queue_position()
+geeft gebruikers hun plaats in de wachtrij en een schatting van de wachttijd.
+"""
+
+import json
+import logging
+import math
+import os
+import socket
+import sqlite3
+import threading
+import traceback
+from collections import Counter
+
+_logger = logging.getLogger('docucheck')
+
+_FAILED_DOCUMENT_STATUS = {'full': 'failed', 'partial': 'completed', 'criterion': 'completed'}
+
+# Jobs die de status van het document niet veranderen (de bestaande analyse blijft zichtbaar)
+BACKGROUND_KINDS = ('criterion',)
+
+# Prioriteitsklassen (kolom analysis_jobs.priority; lager = eerder aan de beurt)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH       = 1
+PRIORITY_BACKGROUND  = 2
+PRIORITY_CLASSES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BATCH: 'batch',
+                    PRIORITY_BACKGROUND: 'background'}
+
+# Aantal wachtende jobs dat claim per keer bekijkt
+_CLAIM_SCAN = 500
+
+# Gezet door enqueue (_notify): runners in hetzelfde proces hoeven niet op het
+# poll-interval te wachten. Elke runner heeft een eigen event, zodat de ene runner
+# het wekken van een andere niet kan wissen.
+_wake_events: set = set()
+_wake_lock = threading.Lock()
+
+
+def _notify() -> None:
+    with _wake_lock:
+        for event in _wake_events:
+            event.set()
+
+
+def _connect(database: str) -> sqlite3.Connection:
+    """Eigen verbinding met autocommit, zodat BEGIN IMMEDIATE expliciet kan."""
+    conn = sqlite3.connect(database, timeout=30.0, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+# ---------------------------------------------------------------------------
+# Wachtrij-operaties
+# ---------------------------------------------------------------------------
+
+def default_priority(conn: sqlite3.Connection, document_id: int, kind: str) -> int:
+    """
+    Prioriteitsklasse van een nieuwe job: achtergrond (herbeoordeling), batch (volledige
+    analyse van een document uit een batch) of interactief (al het andere, ook een
+    heranalyse die een gebruiker voor een batchdocument aanvraagt).
+    """
+    if kind in BACKGROUND_KINDS:
+        return PRIORITY_BACKGROUND
+    if kind != 'full':
+        return PRIORITY_INTERACTIVE
+    row = conn.execute('SELECT batch_id FROM documents WHERE id=?', (document_id,)).fetchone()
+    return PRIORITY_BATCH if row is not None and row[0] is not None else PRIORITY_INTERACTIVE
+
+
+def enqueue(conn: sqlite3.Connection, document_id: int, kind: str = 'full',
+            payload: dict = None, priority: int = None) -> tuple:
+    """
+    Zet een analyse in de wachtrij en commit. Retourneert (job_id, created): loopt of
+    wacht er al een job voor dit document, dan is dat de job_id en created=False.
+    priority: prioriteitsklasse (standaard default_priority()).
+    Een bestaande actieve job wordt via ON CONFLICT DO NOTHING herkend, niet via een
+    rollback: niet-gecommitte wijzigingen op conn blijven staan.
+    """
+    from config import Config
+    if priority is None:
+        priority = default_priority(conn, document_id, kind)
+
+    def _insert():
+        # Conflict = de unieke index op actieve jobs per document (idx_analysis_jobs_active)
+        return conn.execute(
+            'INSERT INTO analysis_jobs (document_id, kind, payload, max_attempts, priority) '
+            'VALUES (?,?,?,?,?) ON CONFLICT DO NOTHING',
+            (document_id, kind, json.dumps(payload or {}), max(1, Config.ANALYSIS_JOB_MAX_ATTEMPTS),
+             priority)
+        ).rowcount == 1
+
+    def _existing():
+        job = active_job(conn, document_id)
+        if job is None:
+            raise sqlite3.IntegrityError(f'analysis_jobs: job voor document {document_id} niet toegevoegd')
+        return job
+
+    if not _insert():
+        job = _existing()
+        if not (job['kind'] in BACKGROUND_KINDS and job['status'] == 'queued'
+                and kind not in BACKGROUND_KINDS):
+            conn.commit()
+            return job['id'], False
+        # Een wachtende achtergrondjob maakt plaats voor een door de gebruiker gevraagde analyse
+        conn.execute(
+            "UPDATE analysis_jobs SET status='cancelled', last_error=?, finished_at=datetime('now') "
+            "WHERE id=? AND status='queued'", (f'vervangen door {kind}-analyse', job['id'])
+        )
+        if not _insert():
+            job = _existing()
+            conn.commit()
+            return job['id'], False
+    job_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+    if kind not in BACKGROUND_KINDS:
+        conn.execute("UPDATE documents SET analysis_status='pending' WHERE id=?", (document_id,))
+    conn.commit()
+    _notify()
+    return job_id, True
+
+
+def active_job(conn: sqlite3.Connection, document_id: int):
+    """De job die voor dit document wacht of loopt (of None)."""
+    return conn.execute(
+        "SELECT * FROM analysis_jobs WHERE document_id=? AND status IN ('queued', 'running')",
+        (document_id,)
+    ).fetchone()
+
+
+def _release_expired(conn: sqlite3.Connection) -> None:
+    """Jobs met een verlopen lease: opnieuw in de wachtrij, of 'failed' na de laatste poging."""
+    for job in conn.execute(
+        "SELECT * FROM analysis_jobs WHERE status='running' AND lease_expires_at < datetime('now')"
+    ).fetchall():
+        _logger.warning(
+            f"[WACHTRIJ] Lease verlopen voor job {job['id']} (document {job['document_id']}, "
+            f"runner {job['lease_owner']}, poging {job['attempts']}/{job['max_attempts']})"
+        )
+        _retry_or_fail(conn, job, 'lease verlopen (runner gestopt)', delay_s=0)
+
+
+def _queue_followup(conn: sqlite3.Connection, job_id: int) -> bool:
+    """
+    Herbeoordelingen die tijdens deze job binnenkwamen (payload 'followup', zie
+    analysis/reevaluation.py) als nieuwe criterion-job in de wachtrij; binnen de
+    transactie van de afronding, zodat er geen toevoeging tussendoor verloren gaat.
+    """
+    from config import Config
+    row = conn.execute('SELECT document_id, payload FROM analysis_jobs WHERE id=?', (job_id,)).fetchone()
+    followup = json.loads(row[1] or '{}').get('followup') if row is not None else None
+    if not followup:
+        return False
+    conn.execute(
+        'INSERT INTO analysis_jobs (document_id, kind, payload, max_attempts, priority) VALUES (?,?,?,?,?)',
+        (row[0], 'criterion', json.dumps({'reevaluations': followup}),
+         max(1, Config.ANALYSIS_JOB_MAX_ATTEMPTS), PRIORITY_BACKGROUND)
+    )
+    return True
+
+
+def _retry_or_fail(conn: sqlite3.Connection, job, error: str, delay_s: int) -> str:
+    if job['attempts'] < job['max_attempts']:
+        conn.execute(
+            "UPDATE analysis_jobs SET status='queued', lease_owner=NULL, lease_expires_at=NULL, "
+            "last_error=?, run_after=datetime('now', ?) WHERE id=?",
+            (error, f'+{int(delay_s)} seconds', job['id'])
+        )
+        if job['kind'] not in BACKGROUND_KINDS:
+            conn.execute("UPDATE documents SET analysis_status='pending' WHERE id=?", (job['document_id'],))
+        return 'queued'
+    conn.execute(
+        "UPDATE analysis_jobs SET status='failed', lease_owner=NULL, lease_expires_at=NULL, "
+        "last_error=?, finished_at=datetime('now') WHERE id=?",
+        (error, job['id'])
+    )
+    conn.execute('DELETE FROM analysis_checkpoints WHERE job_id=?', (job['id'],))
+    conn.execute(
+        'UPDATE documents SET analysis_status=? WHERE id=?',
+        (_FAILED_DOCUMENT_STATUS.get(job['kind'], 'failed'), job['document_id'])
+    )
+    _queue_followup(conn, job['id'])
+    return 'failed'
+
+
+# ---------------------------------------------------------------------------
+# Planning: prioriteit, fair share en quota
+# ---------------------------------------------------------------------------
+
+def batch_max_running() -> int:
+    """Aantal jobs van één batch dat tegelijk mag lopen."""
+    from config import Config
+    return Config.ANALYSIS_BATCH_MAX_RUNNING or max(1, Config.ANALYSIS_WORKERS - 1)
+
+
+def organization_usage(conn: sqlite3.Connection) -> dict:
+    """
+    Per organisatie (None = zonder organisatie): lopende en wachtende jobs, tokens in het
+    afgelopen uur en de quota (0 = onbeperkt). Eigen quota in de tabel organizations gaan
+    voor ORG_MAX_RUNNING_JOBS / ORG_MAX_TOKENS_PER_HOUR.
+    """
+    from config import Config
+    usage = {}
+
+    def _entry(org_id):
+        return usage.setdefault(org_id, {
+            'running': 0, 'queued': 0, 'tokens_last_hour': 0,
+            'max_running_jobs': Config.ORG_MAX_RUNNING_JOBS if org_id is not None else 0,
+            'max_tokens_per_hour': Config.ORG_MAX_TOKENS_PER_HOUR if org_id is not None else 0,
+        })
+
+    for org_id, status, count in conn.execute(
+        "SELECT d.organization_id, j.status, COUNT(*) FROM analysis_jobs j "
+        "LEFT JOIN documents d ON d.id = j.document_id "
+        "WHERE j.status IN ('queued', 'running') GROUP BY d.organization_id, j.status"
+    ).fetchall():
+        _entry(org_id)[status] = count
+    for org in conn.execute(
+        'SELECT id, max_running_jobs, max_tokens_per_hour FROM organizations'
+    ).fetchall():
+        entry = _entry(org[0])
+        if org[1] is not None:
+            entry['max_running_jobs'] = org[1]
+        if org[2] is not None:
+            entry['max_tokens_per_hour'] = org[2]
+    if any(e['max_tokens_per_hour'] for e in usage.values()):
+        try:
+            for org_id, tokens in conn.execute(
+                "SELECT d.organization_id, SUM(c.input_tokens + c.output_tokens) FROM llm_calls c "
+                "JOIN documents d ON d.id = c.document_id "
+                "WHERE c.created_at >= datetime('now', '-1 hours') GROUP BY d.organization_id"
+            ).fetchall():
+                _entry(org_id)['tokens_last_hour'] = tokens or 0
+        except sqlite3.OperationalError:
+            pass    # geen telemetrietabel: tokenquotum niet af te dwingen
+    return usage
+
+
+def _blocked_reason(org: dict):
+    """Waarom een organisatie nu geen nieuwe job mag starten, of None."""
+    if org['max_running_jobs'] and org['running'] >= org['max_running_jobs']:
+        return 'max_running_jobs'
+    if org['max_tokens_per_hour'] and org['tokens_last_hour'] >= org['max_tokens_per_hour']:
+        return 'max_tokens_per_hour'
+    return None
+
+
+def _queued_candidates(conn: sqlite3.Connection, limit: int = _CLAIM_SCAN) -> list:
+    """Claimbare wachtende jobs met hun effectieve prioriteit (na veroudering)."""
+    from config import Config
+    rows = conn.execute(
+        "SELECT j.id, j.document_id, j.priority, d.batch_id, d.organization_id, "
+        "  (julianday('now') - julianday(j.created_at)) * 86400 AS waited_s "
+        "FROM analysis_jobs j LEFT JOIN documents d ON d.id = j.document_id "
+        "WHERE j.status='queued' AND j.run_after <= datetime('now') "
+        "ORDER BY j.priority, j.id LIMIT ?", (limit,)
+    ).fetchall()
+    aging = Config.ANALYSIS_PRIORITY_AGING_S
+    candidates = []
+    for row in rows:
+        effective = row['priority'] or 0
+        if aging > 0:
+            effective = max(PRIORITY_INTERACTIVE, effective - int((row['waited_s'] or 0) // aging))
+        candidates.append({**dict(row), 'effective': effective})
+    return candidates
+
+
+def _select_job(conn: sqlite3.Connection):
+    """Id van de job die nu geclaimd moet worden (of None), zie de moduledocstring."""
+    candidates = _queued_candidates(conn)
+    if not candidates:
+        return None
+    batch_running = Counter(r[0] for r in conn.execute(
+        "SELECT d.batch_id FROM analysis_jobs j JOIN documents d ON d.id = j.document_id "
+        "WHERE j.status='running' AND d.batch_id IS NOT NULL"
+    ).fetchall())
+    usage = organization_usage(conn)
+    cap = batch_max_running()
+    eligible = [
+        c for c in candidates
+        if (c['batch_id'] is None or batch_running[c['batch_id']] < cap)
+        and (c['organization_id'] not in usage or _blocked_reason(usage[c['organization_id']]) is None)
+    ]
+    if not eligible:
+        return None
+    best = min(c['effective'] for c in eligible)
+
+    def _running(org_id):
+        return usage[org_id]['running'] if org_id in usage else 0
+
+    chosen = min((c for c in eligible if c['effective'] == best),
+                 key=lambda c: (_running(c['organization_id']), c['id']))
+    return chosen['id']
+
+
+def _has_work(conn: sqlite3.Connection) -> bool:
+    """Is er een claimbare wachtende job of een verlopen lease? (alleen lezen)"""
+    return bool(conn.execute(
+        "SELECT EXISTS (SELECT 1 FROM analysis_jobs WHERE status='queued' AND run_after <= datetime('now')) "
+        "OR EXISTS (SELECT 1 FROM analysis_jobs WHERE status='running' AND lease_expires_at < datetime('now'))"
+    ).fetchone()[0])
+
+
+def claim(database: str, owner: str, lease_s: int = None):
+    """
+    Claim atomair de volgende job volgens de planning (of None). Verlopen leases worden
+    eerst vrijgegeven. De job krijgt status 'running' en een lease tot nu + lease_s.
+    """
+    from config import Config
+    lease_s = lease_s or Config.ANALYSIS_JOB_LEASE_S
+    conn = _connect(database)
+    try:
+        # Eerst zonder schrijfslot kijken of er iets te doen is: een lege wachtrij
+        # pollen mag schrijvers (enqueue, heartbeats) niet ophouden
+        if not _has_work(conn):
+            return None
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            _release_expired(conn)
+            job_id = _select_job(conn)
+            job = conn.execute('SELECT * FROM analysis_jobs WHERE id=?', (job_id,)).fetchone() \
+                if job_id is not None else None
+            if job is not None:
+                conn.execute(
+                    "UPDATE analysis_jobs SET status='running', lease_owner=?, "
+                    "lease_expires_at=datetime('now', ?), heartbeat_at=datetime('now'), "
+                    "started_at=COALESCE(started_at, datetime('now')), attempts=attempts+1 "
+                    "WHERE id=?",
+                    (owner, f'+{int(lease_s)} seconds', job['id'])
+                )
+                if job['kind'] not in BACKGROUND_KINDS:
+                    conn.execute("UPDATE documents SET analysis_status='analyzing' WHERE id=?",
+                                 (job['document_id'],))
+                job = conn.execute('SELECT * FROM analysis_jobs WHERE id=?', (job['id'],)).fetchone()
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return dict(job) if job is not None else None
+    finally:
+        conn.close()
+
+
+def queue_position(conn: sqlite3.Connection, document_id: int):
+    """
+    Plaats van de wachtende job van dit document (of None als er geen wacht): het aantal
+    wachtende jobs dat vóór gaat, het aantal lopende jobs, de prioriteitsklasse, of de
+    organisatie op een quotum wacht, en eta_s: geschatte seconden tot de analyse start
+    (gemiddelde duur van recente analyses × aantal rondes van ANALYSIS_WORKERS runners).
+    """
+    from config import Config
+    job = conn.execute(
+        "SELECT j.id, j.priority, j.run_after, d.organization_id FROM analysis_jobs j "
+        "LEFT JOIN documents d ON d.id = j.document_id "
+        "WHERE j.document_id=? AND j.status='queued'", (document_id,)
+    ).fetchone()
+    if job is None:
+        return None
+    # Volgorde van claim bij benadering: effectieve prioriteit, dan leeftijd (zonder fair share)
+    ahead = 0
+    for candidate in sorted(_queued_candidates(conn, limit=-1), key=lambda c: (c['effective'], c['id'])):
+        if candidate['id'] == job['id']:
+            break
+        ahead += 1
+    else:
+        # Nog in backoff (run_after in de toekomst): achter alle claimbare jobs
+        ahead = conn.execute(
+            "SELECT COUNT(*) FROM analysis_jobs WHERE status='queued' AND run_after <= datetime('now')"
+        ).fetchone()[0]
+    running = conn.execute("SELECT COUNT(*) FROM analysis_jobs WHERE status='running'").fetchone()[0]
+    usage = organization_usage(conn)
+    blocked = _blocked_reason(usage[job['organization_id']]) if job['organization_id'] in usage else None
+
+    avg = conn.execute(
+        "SELECT AVG((julianday(finished_at) - julianday(started_at)) * 86400) FROM ("
+        "  SELECT started_at, finished_at FROM analysis_jobs WHERE status='done' AND kind='full' "
+        "  AND started_at IS NOT NULL AND finished_at IS NOT NULL ORDER BY id DESC LIMIT 20)"
+    ).fetchone()[0]
+    slots = max(1, Config.ANALYSIS_WORKERS)
+    rounds = math.ceil(max(0, ahead + running - slots + 1) / slots)
+    return {
+        'position': ahead + 1,
+        'ahead':    ahead,
+        'running':  running,
+        'priority': PRIORITY_CLASSES.get(job['priority'], 'interactive'),
+        'blocked':  blocked,
+        'eta_s':    round(rounds * avg) if avg is not None else None,
+    }
+
+
+def llm_priority(conn: sqlite3.Connection, job_id):
+    """
+    Prioriteit in de LLM-planner voor de calls van een job: batch- en achtergrondjobs
+    krijgen PRIORITY_LOW, zodat interactieve analyses in hetzelfde proces voorgaan.
+    None = standaard (interactief of zonder job).
+    """
+    from analysis.llm_scheduler import PRIORITY_LOW
+    if job_id is None:
+        return None
+    row = conn.execute('SELECT priority FROM analysis_jobs WHERE id=?', (job_id,)).fetchone()
+    return PRIORITY_LOW if row is not None and (row[0] or 0) > PRIORITY_INTERACTIVE else None
+
+
+def heartbeat(database: str, job_id: int, owner: str, lease_s: int = None) -> bool:
+    """Verleng de lease; False als deze runner de job niet (meer) bezit."""
+    from config import Config
+    lease_s = lease_s or Config.ANALYSIS_JOB_LEASE_S
+    conn = _connect(database)
+    try:
+        cur = conn.execute(
+            "UPDATE analysis_jobs SET heartbeat_at=datetime('now'), lease_expires_at=datetime('now', ?) "
+            "WHERE id=? AND lease_owner=? AND status='running'",
+            (f'+{int(lease_s)} seconds', job_id, owner)
+        )
+        return cur.rowcount == 1
+    finally:
+        conn.close()
+
+
+def complete(database: str, job_id: int, owner: str) -> bool:
+    """Markeer de job als 'done' en ruim zijn checkpoints op; False als de lease al kwijt was."""
+    conn = _connect(database)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cur = conn.execute(
+                "UPDATE analysis_jobs SET status='done', lease_owner=NULL, lease_expires_at=NULL, "
+                "finished_at=datetime('now') WHERE id=? AND lease_owner=? AND status='running'",
+                (job_id, owner)
+            )
+            done = cur.rowcount == 1
+            followup = False
+            if done:
+                conn.execute('DELETE FROM analysis_checkpoints WHERE job_id=?', (job_id,))
+                followup = _queue_followup(conn, job_id)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if followup:
+            _notify()
+        return done
+    finally:
+        conn.close()
+
+
+def fail(database: str, job_id: int, owner: str, error: str) -> str:
+    """
+    Markeer een poging als mislukt: opnieuw 'queued' met backoff, of 'failed' na de
+    laatste poging. Retourneert de nieuwe status (None als de lease al kwijt was).
+    """
+    from config import Config
+    conn = _connect(database)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            job = conn.execute(
+                "SELECT * FROM analysis_jobs WHERE id=? AND lease_owner=? AND status='running'",
+                (job_id, owner)
+            ).fetchone()
+            status = None
+            if job is not None:
+                delay = Config.ANALYSIS_JOB_RETRY_BASE_S * 2 ** max(0, job['attempts'] - 1)
+                status = _retry_or_fail(conn, job, (error or '')[:2000], delay)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return status
+    finally:
+        conn.close()
+
+
+def release(database: str, job_id: int, owner: str) -> bool:
+    """
+    Geef een lopende job terug aan de wachtrij zonder dat het als poging telt
+    (bij het netjes stoppen van een runner die zijn analyse niet kon afmaken).
+    """
+    conn = _connect(database)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            job = conn.execute(
+                "SELECT * FROM analysis_jobs WHERE id=? AND lease_owner=? AND status='running'",
+                (job_id, owner)
+            ).fetchone()
+            if job is not None:
+                conn.execute(
+                    "UPDATE analysis_jobs SET status='queued', lease_owner=NULL, lease_expires_at=NULL, "
+                    "attempts=MAX(0, attempts-1), run_after=datetime('now') WHERE id=?",
+                    (job_id,)
+                )
+                if job['kind'] not in BACKGROUND_KINDS:
+                    conn.execute("UPDATE documents SET analysis_status='pending' WHERE id=?",
+                                 (job['document_id'],))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return job is not None
+    finally:
+        conn.close()
+
+
+def recover_interrupted(database: str) -> int:
+    """
+    Bij het opstarten: documenten die op 'analyzing' staan zonder actieve job (een
+    analyse van vóór de wachtrij, of een job die handmatig is opgeruimd) opnieuw in
+    de wachtrij zetten. Lopende jobs van een gestopt proces op deze host worden direct
+    vrijgegeven; die van andere hosts na het verlopen van hun lease.
+    Retourneert het aantal opnieuw ingeplande documenten.
+    """
+    import db_utils
+    conn = sqlite3.connect(database, timeout=30.0)
+    conn.row_factory = sqlite3.Row
+    try:
+        db_utils.migrate_db(conn)
+        host = socket.gethostname()
+        for job in conn.execute(
+            "SELECT id, lease_owner FROM analysis_jobs WHERE status='running'"
+        ).fetchall():
+            owner_host, _, rest = (job['lease_owner'] or '').partition(':')
+            pid = rest.partition(':')[0]
+            if owner_host == host and pid.isdigit() and not _pid_alive(int(pid)):
+                conn.execute("UPDATE analysis_jobs SET lease_expires_at=datetime('now', '-1 seconds') "
+                             "WHERE id=?", (job['id'],))
+        conn.commit()
+
+        stranded = [row['id'] for row in conn.execute(
+            "SELECT d.id FROM documents d WHERE d.analysis_status='analyzing' AND NOT EXISTS ("
+            "  SELECT 1 FROM analysis_jobs j WHERE j.document_id=d.id AND j.status IN ('queued', 'running'))"
+        ).fetchall()]
+        for document_id in stranded:
+            # Soort en secties van de laatste job behouden: een onderbroken gedeeltelijke
+            # heranalyse blijft gedeeltelijk (zonder job: analyse van vóór de wachtrij → 'full')
+            last = conn.execute(
+                'SELECT kind, payload FROM analysis_jobs WHERE document_id=? AND kind NOT IN ({}) '
+                'ORDER BY id DESC LIMIT 1'.format(','.join('?' * len(BACKGROUND_KINDS))),
+                (document_id, *BACKGROUND_KINDS)
+            ).fetchone()
+            if last is not None:
+                enqueue(conn, document_id, last['kind'], json.loads(last['payload'] or '{}'))
+            else:
+                enqueue(conn, document_id, 'full')
+        return len(stranded)
+    finally:
+        conn.close()
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True   # bestaat, maar van een andere gebruiker
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Runners
+# ---------------------------------------------------------------------------
+
+class LeaseLost(RuntimeError):
+    """De runner is de lease van zijn job kwijt; een andere runner kan hem al uitvoeren."""
+
+
+class JobLease:
+    """
+    Lease van een lopende job in dit proces. De heartbeat-thread zet `lost` zodra
+    heartbeat() mislukt; de analyserunner roept check() aan vóór elke stap en elke
+    schrijfactie en breekt af (LeaseLost) als de job niet meer van deze runner is.
+    """
+
+    def __init__(self, database: str, job_id: int, owner: str):
+        self.database = database
+        self.job_id = job_id
+        self.owner = owner
+        self.lost = threading.Event()
+        self.abandoned = False      # afgebroken door dit proces (stop_workers), niet overgenomen
+
+    def abandon(self) -> None:
+        """Laat de runner bij zijn volgende controle afbreken; hij geeft de job dan zelf vrij."""
+        self.abandoned = True
+        self.lost.set()
+
+    def check(self, conn: sqlite3.Connection = None) -> None:
+        """Gooi LeaseLost als de lease kwijt is; met conn ook direct in de database gecontroleerd."""
+        if not self.lost.is_set() and conn is not None:
+            held = conn.execute(
+                "SELECT 1 FROM analysis_jobs WHERE id=? AND lease_owner=? AND status='running'",
+                (self.job_id, self.owner)
+            ).fetchone()
+            if held is None:
+                self.lost.set()
+        if self.lost.is_set():
+            raise LeaseLost(f"lease van job {self.job_id} kwijt (runner {self.owner})")
+
+
+# Lopende jobs van dit proces: job_id → JobLease (zie lease_for)
+_leases: dict = {}
+
+
+def lease_for(job_id):
+    """De JobLease van een job die in dit proces loopt, of None (geen job / buiten de wachtrij)."""
+    return _leases.get(job_id) if job_id is not None else None
+
+
+def _execute(job: dict, flask_app, database: str) -> None:
+    """Voer één job uit; een exception betekent een mislukte poging."""
+    import analysis_runner
+    payload = json.loads(job.get('payload') or '{}')
+    if job['kind'] == 'partial':
+        analysis_runner.run_partial_reanalysis_background(
+            job['document_id'], payload.get('section_names') or [],
+            bool(payload.get('include_doc_wide')), flask_app, database, job_id=job['id'],
+        )
+    elif job['kind'] == 'criterion':
+        reevaluations = payload.get('reevaluations') or \
+            [{'criteria_id': payload['criteria_id'], 'batch_id': payload.get('batch_id')}]
+        analysis_runner.run_criterion_reevaluation_background(
+            job['document_id'], reevaluations, flask_app, database, job_id=job['id'],
+        )
+    else:
+        analysis_runner.run_analysis_background(job['document_id'], flask_app, database,
+                                                job_id=job['id'])
+
+
+def run_job(job: dict, owner: str, flask_app, database: str) -> str:
+    """
+    Voer een geclaimde job uit met heartbeats en rond hem af.
+    Retourneert 'done', 'queued' (nieuwe poging ingepland), 'failed', 'lost' of 'released'.
+    Mislukt een heartbeat, dan breekt de runner bij zijn volgende lease-controle af
+    (LeaseLost) en wordt de job niet door deze runner afgerond. Na abandon() (stoppen
+    van het proces) geeft de runner de job zelf terug aan de wachtrij zodra hij gestopt is.
+    """
+    from config import Config
+    stop = threading.Event()
+    lease = _leases[job['id']] = JobLease(database, job['id'], owner)
+
+    def _beat():
+        while not stop.wait(max(1.0, Config.ANALYSIS_JOB_LEASE_S / 3)):
+            if lease.lost.is_set():
+                return
+            if not heartbeat(database, job['id'], owner):
+                lease.lost.set()
+                _logger.warning(f"[WACHTRIJ] Lease kwijt voor job {job['id']} "
+                                f"(document {job['document_id']}); analyse wordt afgebroken")
+                return
+
+    beater = threading.Thread(target=_beat, daemon=True, name=f"job-{job['id']}-heartbeat")
+    beater.start()
+    error = None
+    try:
+        _execute(job, flask_app, database)
+    except LeaseLost as exc:
+        if lease.abandoned:
+            # De uitvoering is gestopt: nu pas veilig om de job vrij te geven
+            return 'released' if release(database, job['id'], owner) else 'lost'
+        _logger.warning(f"[WACHTRIJ] Job {job['id']} (document {job['document_id']}) afgebroken: {exc}")
+        return 'lost'
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"
+        traceback.print_exc()
+    finally:
+        stop.set()
+        beater.join()
+        _leases.pop(job['id'], None)
+
+    # complete() en fail() schrijven alleen zolang deze runner de lease nog heeft
+    if error is None:
+        result = 'done' if complete(database, job['id'], owner) else 'lost'
+    else:
+        result = fail(database, job['id'], owner, error) or 'lost'
+    _logger.info(f"[WACHTRIJ] Job {job['id']} (document {job['document_id']}, {job['kind']}, "
+                 f"poging {job['attempts']}/{job['max_attempts']}) → {result}")
+    return result
+
+
+def work_once(flask_app, database: str, worker=None) -> bool:
+    """Claim en voer hoogstens één job uit; False als er niets te doen was."""
+    owner = _owner_id()
+    job = claim(database, owner)
+    if job is None:
+        return False
+    if worker is not None:
+        worker.current = (job, owner)
+    try:
+        if run_job(job, owner, flask_app, database) == 'released' and worker is not None:
+            worker.released.append(job)
+    finally:
+        if worker is not None:
+            worker.current = None
+    return True
+
+
+class AnalysisWorker(threading.Thread):
+    """Runner-thread: claimt jobs tot stop() wordt aangeroepen (een lopende job loopt uit)."""
+
+    def __init__(self, flask_app, database: str, name: str):
+        super().__init__(daemon=True, name=name)
+        self.flask_app = flask_app
+        self.database = database
+        self.current = None     # (job, owner) zolang er een job loopt
+        self.released = []      # jobs die na abandon() zijn teruggegeven aan de wachtrij
+        self._stop_event = threading.Event()
+        self._wake = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._wake.set()
+
+    def run(self) -> None:
+        from config import Config
+        with _wake_lock:
+            _wake_events.add(self._wake)
+        try:
+            while not self._stop_event.is_set():
+                # Vóór het claimen wissen: een enqueue tijdens de claim wekt de volgende wait
+                self._wake.clear()
+                try:
+                    busy = work_once(self.flask_app, self.database, worker=self)
+                except Exception as exc:
+                    _logger.warning(f"[WACHTRIJ] {self.name}: claimen mislukt: {exc}")
+                    busy = False
+                if not busy and not self._stop_event.is_set():
+                    self._wake.wait(timeout=Config.ANALYSIS_JOB_POLL_S)
+        finally:
+            with _wake_lock:
+                _wake_events.discard(self._wake)
+
+
+_workers: list = []
+_workers_lock = threading.Lock()
+
+
+def start_workers(flask_app, database: str, count: int = None) -> list:
+    """Start de runner-threads van dit proces (idempotent)."""
+    from config import Config
+    count = Config.ANALYSIS_WORKERS if count is None else count
+    with _workers_lock:
+        if not _workers:
+            for i in range(max(0, count)):
+                worker = AnalysisWorker(flask_app, database, name=f'analysis-worker-{i + 1}')
+                worker.start()
+                _workers.append(worker)
+        return list(_workers)
+
+
+def stop_workers(timeout: float = None, abort_timeout: float = 10.0) -> list:
+    """
+    Stop de runner-threads: geen nieuwe claims meer, lopende jobs mogen uitlopen.
+    Na `timeout` seconden worden lopende jobs afgebroken (JobLease.abandon); een runner
+    geeft zijn job pas terug aan de wachtrij als hij bij een lease-controle gestopt is.
+    Runners die ook na `abort_timeout` seconden nog lopen (bijv. midden in een lange
+    LLM-call) worden niet vrijgegeven: hun heartbeat stopt en de job wordt na het
+    verlopen van de lease door een andere runner overgenomen.
+    Retourneert de vrijgegeven jobs.
+    """
+    import time
+    with _workers_lock:
+        workers = list(_workers)
+        _workers.clear()
+    for worker in workers:
+        worker.stop()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for worker in workers:
+        worker.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+    running = [worker for worker in workers if worker.is_alive()]
+    for worker in running:
+        current = worker.current
+        lease = lease_for(current[0]['id']) if current is not None else None
+        if lease is not None:
+            lease.abandon()
+    deadline = time.monotonic() + abort_timeout
+    for worker in running:
+        worker.join(max(0.0, deadline - time.monotonic()))
+    released = []
+    for worker in workers:
+        for job in worker.released:
+            released.append(job)
+            _logger.warning(f"[WACHTRIJ] Job {job['id']} (document {job['document_id']}) "
+                            f"teruggegeven aan de wachtrij bij het stoppen")
+        if worker.is_alive() and worker.current is not None:
+            job = worker.current[0]
+            _logger.warning(f"[WACHTRIJ] Job {job['id']} (document {job['document_id']}) loopt nog; "
+                            f"wordt na het verlopen van de lease opnieuw opgepakt")
+    return released
@@ -1,26 +1,236 @@
 # src/analysis_runner.py
-"""Achtergrond-analyserunner: threading state + run_analysis_background()."""
+"""Achtergrond-analyserunner: run_analysis_background() en run_partial_reanalysis_background().
+
+Wordt uitgevoerd door de runners van analysis_queue; een exception betekent een mislukte
+poging (de wachtrij plant een nieuwe poging in of zet het document op 'failed').
+Met een job_id worden tussenresultaten vastgelegd (analysis/checkpoints.py): een nieuwe
+poging van dezelfde job slaat afgeronde stappen en LLM-taken over. Vóór elke stap en
+elke schrijfactie wordt de lease van de job gecontroleerd; is die kwijt (een andere
+runner kan de job al uitvoeren), dan breekt de runner af met LeaseLost zonder te schrijven.
+"""
 
 import sqlite3
 import threading
 import json
-import traceback
+import time
 from datetime import datetime
 
+import analysis_queue
 import db_utils
-from analysis import document_parsing, section_recognition, criterion_checking
+from concurrent.futures import ThreadPoolExecutor, wait as _wait_futures
+from analysis import document_parsing, section_recognition, criterion_checking, document_digest
+from analysis import checkpoints, config_fingerprint, recognition_cache, reevaluation, versioning
+from analysis.progress import ProgressReporter
+from analysis.llm_scheduler import PRIORITY_LOW
 from database_optimizations import batch_save_section_content
 
-# Bijhouder van lopende analyses (gedeeld met routes)
-_analysis_in_progress: set = set()
-_analysis_lock = threading.Lock()
+class LiveFeedWriter:
+    """
+    Ontvangt voorlopige feedback-items tijdens de analyse (gestreamde LLM-problemen)
+    en schrijft ze naar analysis_data['live_feedback'] terwijl de run doorloopt.
+
+    Schrijven gebeurt via een eigen DB-verbinding (de callback wordt vanuit
+    LLM-worker-threads aangeroepen) en maximaal eens per min_interval seconden.
+    Flushes lopen na elkaar (snapshot én schrijven), zodat een oudere lijst nooit
+    een nieuwere overschrijft. De runner flusht aan het eind van de LLM-fase en bij
+    een fout; de definitieve analyse overschrijft analysis_data en daarmee ook deze lijst.
+    """
+
+    def __init__(self, database: str, document_id: int, min_interval: float = 1.5):
+        self.database = database
+        self.document_id = document_id
+        self.min_interval = min_interval
+        self.items: list = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = 0.0
+        self._dirty = False
+
+    def __call__(self, item: dict) -> None:
+        with self._lock:
+            self.items.append(item)
+            self._dirty = True
+            due = time.time() - self._last_flush >= self.min_interval
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                payload = json.dumps(self.items)
+                self._dirty = False
+                self._last_flush = time.time()
+            try:
+                conn = sqlite3.connect(self.database, timeout=30.0)
+                try:
+                    conn.execute(
+                        "UPDATE documents SET analysis_data = "
+                        "json_set(COALESCE(analysis_data, '{}'), '$.live_feedback', json(?)) "
+                        "WHERE id=?",
+                        (payload, self.document_id)
+                    )
+                    conn.commit()
+                finally:
+                    conn.close()
+            except sqlite3.Error as exc:
+                print(f"[LIVE] Live feedback opslaan mislukt voor document {self.document_id}: {exc}")
+
+
+def _log_token_usage(logger, document_id: int) -> None:
+    """Log het totale token-gebruik en de cache-ratio's van één analyse."""
+    usage = criterion_checking.get_token_usage_summary(document_id)
+    if not usage['calls']:
+        return
+    logger.info(
+        f"TOKEN-GEBRUIK ANALYSE | document={document_id} | calls={usage['calls']} | "
+        f"input={usage['input_tokens']} | output={usage['output_tokens']} | "
+        f"cache_created={usage['cache_created']} | cache_read={usage['cache_read']} | "
+        f"cache_hit_ratio={usage['cache_hit_ratio']:.0%} | "
+        f"cached_input_share={usage['cached_input_share']:.0%} | "
+        f"kosten≈${usage['cost_usd']:.4f}"
+        + (f" | failover={usage['failover_calls']} | hedged={usage['hedged_calls']}"
+           if usage['failover_calls'] or usage['hedged_calls'] else '')
+    )
+    if usage['routed_reviews']:
+        tiers = ' | '.join(
+            f"{name}: {t['calls']} calls, gem. {t['avg_latency_s']:.1f}s, ${t['cost_usd']:.4f} "
+            f"({', '.join(t['models'])})"
+            for name, t in sorted(usage['tiers'].items())
+        )
+        logger.info(
+            f"MODELROUTERING | document={document_id} | reviews={usage['routed_reviews']} | "
+            f"escalaties={usage['escalations']} ({usage['escalation_rate']:.0%}) "
+            f"{usage['escalation_reasons']} | {tiers}"
+        )
+
+
+def _build_digest(recognized_sections: list, full_text: str, document_id: int):
+    """
+    Documentdigest voor de LLM-context (None als LLM_DOCUMENT_DIGEST uit staat of faalt).
+    Een mislukte digest breekt de analyse niet: de calls vallen terug op de ruwe tekst.
+    """
+    from config import Config
+    if not Config.LLM_DOCUMENT_DIGEST:
+        return None
+    try:
+        return document_digest.build_document_digest(
+            recognized_sections, full_text, document_id=document_id
+        )
+    except Exception as exc:
+        import logging as _log
+        _log.getLogger('docucheck').warning(
+            f"[DIGEST] Maken van de documentdigest mislukt voor document {document_id}: {exc}"
+        )
+        return None
+
+
+def _stage(checkpoint, stage: str, compute):
+    """Resultaat van een stap: uit het checkpoint als die al klaar was, anders berekenen en vastleggen."""
+    if checkpoint is not None and checkpoint.has(stage):
+        return checkpoint.get(stage)
+    value = compute()
+    if checkpoint is not None and value is not None:
+        checkpoint.put(stage, value)
+    return value
+
+
+def _check_lease(lease, db=None) -> None:
+    """LeaseLost als deze runner de job kwijt is (lease is None buiten de wachtrij)."""
+    if lease is not None:
+        lease.check(db)
+
+
+def _add_footnotes(sections: list, full_text: str) -> None:
+    """
+    Voetnoten-blok extraheren uit full_text en toevoegen aan de content van elke
+    gevonden sectie — zodat de LLM altijd bronnen ziet.
+    """
+    if '[VOETNOTEN/EINDNOTEN]' not in full_text:
+        return
+    voetnoten_blok = full_text[full_text.index('[VOETNOTEN/EINDNOTEN]'):].strip()
+    if voetnoten_blok:
+        for sec in sections:
+            if sec.get('found') and sec.get('content'):
+                sec['content'] = sec['content'].rstrip() + '\n\n' + voetnoten_blok
+
+
+def _file_hash(document):
+    """Bestandshash van een document (kolom file_hash, anders berekend; None zonder bestand)."""
+    from analysis import dedupe
+    if document['file_hash']:
+        return document['file_hash']
+    try:
+        return dedupe.file_hash(document['file_path'])
+    except (OSError, TypeError):
+        return None
+
+
+def _holistic_result(future, checkpoint) -> tuple:
+    """(items, duur) van de holistische reviews; future None = al klaar in een eerdere poging."""
+    if future is None:
+        return checkpoint.get('holistic') or [], 0.0
+    items, duration = future.result()
+    if checkpoint is not None:
+        checkpoint.put('holistic', items)
+    return items, duration
+
+
+def _start_holistic_reviews(recognized_sections: list, full_text: str, **kwargs):
+    """
+    Start de holistische reviews op de achtergrond, gelijktijdig met de criteria.
+
+    Beide fases delen de LLM-planner; de holistische calls krijgen PRIORITY_LOW zodat
+    criteria-calls bij drukte voorgaan en de criteria-resultaten als eerste klaar zijn.
+    Werkt op een kopie van de secties: generate_feedback voegt tijdens het lopen
+    sleutels toe aan de sectie-dicts.
+
+    Retourneert een future met (items, duur_in_seconden); future.cancel_event breekt
+    de reviews af (zie _stop_holistic_reviews).
+    """
+    snapshot = [dict(s) for s in recognized_sections]
+    cancel_event = threading.Event()
+
+    def _run():
+        t0 = time.time()
+        items = criterion_checking.run_holistic_section_reviews(
+            snapshot, full_text, priority=PRIORITY_LOW, cancel_event=cancel_event, **kwargs
+        )
+        return items, time.time() - t0
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(_run)
+    future.cancel_event = cancel_event
+    executor.shutdown(wait=False)
+    return future
+
 
+def _stop_holistic_reviews(future) -> None:
+    """
+    Breek de holistische reviews af en wacht tot de thread klaar is.
+
+    Voor elk eindpunt van een runner (ook een fout of LeaseLost): zonder dit blijven
+    de calls van een afgebroken job doorlopen (en kosten maken) terwijl een nieuwe
+    poging ze opnieuw start, en telt de thread nog token-gebruik op na
+    reset_token_usage. Een al begonnen call loopt af; nieuwe secties starten niet meer.
+    """
+    if future is None:
+        return
+    future.cancel_event.set()
+    _wait_futures([future])
 
-def run_analysis_background(document_id: int, flask_app, database: str) -> None:
-    """Voert de volledige analyse uit in een achtergrond-thread met eigen DB-verbinding."""
+
+def run_analysis_background(document_id: int, flask_app, database: str, job_id: int = None) -> None:
+    """
+    Voert de volledige analyse uit in een achtergrond-thread met eigen DB-verbinding.
+    job_id: de job uit analysis_queue; schakelt checkpoints per stap in.
+    """
     with flask_app.app_context():
         db = sqlite3.connect(database)
         db.row_factory = sqlite3.Row
+        live_feed = None
+        holistic_future = None
         try:
             document = db.execute(
                 'SELECT * FROM documents WHERE id=?', (document_id,)
@@ -31,55 +241,47 @@ def run_analysis_background(document_id: int, flask_app, database: str) -> None:
             ).fetchone()
 
             print(f"[ACHTERGROND] Start analyse voor document ID: {document_id}")
+            criterion_checking.reset_token_usage(document_id)
+            live_feed = LiveFeedWriter(database, document_id)
+            checkpoint = checkpoints.open_checkpoint(database, document_id, job_id)
+            lease = analysis_queue.lease_for(job_id)
+            progress = ProgressReporter(database, document_id, job_id)
+            # Criteria en verwachte secties: gedeeld met andere analyses van dit documenttype
+            # (bijv. de rest van een batch) zolang de configuratie-fingerprint gelijk blijft
+            fingerprint, criteria_for_analysis, expected_sections_metadata = \
+                config_fingerprint.load_settings(db, document_type['id'])
 
             # 1. Document parsen
-            full_document_text, document_paragraphs, headings_in_document = \
-                document_parsing.parse_document(document['file_path'])
+            progress.stage('parse')
+            full_document_text, document_paragraphs, headings_in_document = _stage(
+                checkpoint, 'parsed', lambda: document_parsing.parse_document(document['file_path'])
+            )
 
             print(
                 f"[ACHTERGROND] Paragrafen: {len(document_paragraphs)}, "
                 f"headings: {len(headings_in_document)}"
             )
 
-            # 2. Sectieherkenning
-            expected_sections_metadata = db.execute(
-                '''SELECT DISTINCT s.id, s.name, s.level, s.identifier, s.is_required,
-                          s.parent_id, s.alternative_names, s.order_index
-                   FROM sections s
-                   LEFT JOIN document_type_sections dts ON s.id = dts.section_id
-                   WHERE s.document_type_id = :dt_id
-                      OR dts.document_type_id = :dt_id
-                      OR (s.document_type_id IS NULL
-                          AND NOT EXISTS (
-                              SELECT 1 FROM document_type_sections dts2
-                              WHERE dts2.section_id = s.id
-                          ))
-                   ORDER BY
-                       CASE WHEN s.document_type_id IS NULL THEN 0 ELSE 1 END,
-                       s.order_index''',
-                {'dt_id': document_type['id']}
-            ).fetchall()
+            # 2. Sectieherkenning (met voetnoten in de sectie-content)
+            progress.stage('recognize')
 
-            recognized_sects_raw, formatting_warnings = \
-                section_recognition.recognize_and_enrich_sections(
+            def _recognize():
+                sections, warnings = section_recognition.recognize_and_enrich_sections(
                     full_document_text, document_paragraphs,
                     headings_in_document, expected_sections_metadata
                 )
-
-            # Voetnoten-blok extraheren uit full_document_text en toevoegen
-            # aan de content van elke sectie — zodat de LLM altijd bronnen ziet.
-            _voetnoten_blok = ''
-            if '[VOETNOTEN/EINDNOTEN]' in full_document_text:
-                _start = full_document_text.index('[VOETNOTEN/EINDNOTEN]')
-                _voetnoten_blok = full_document_text[_start:].strip()
-
-            if _voetnoten_blok:
-                for sec in recognized_sects_raw:
-                    if sec.get('found') and sec.get('content'):
-                        sec['content'] = sec['content'].rstrip() + \
-                            '\n\n' + _voetnoten_blok
-
-            batch_save_section_content(db, recognized_sects_raw)
+                _add_footnotes(sections, full_document_text)
+                _check_lease(lease, db)
+                batch_save_section_content(db, sections)
+                return sections, warnings
+
+            recognized_sects_raw, formatting_warnings = _stage(checkpoint, 'recognized', _recognize)
+            # Bewaren voor latere herbeoordelingen van één criterium (analysis/reevaluation.py)
+            recognition_cache.store(
+                database, document_id, _file_hash(document),
+                recognition_cache.sections_key(expected_sections_metadata),
+                full_document_text, recognized_sects_raw,
+            )
 
             all_db_sections = db.execute(
                 '''SELECT DISTINCT s.id, s.name, s.level, s.identifier, s.order_index
@@ -127,14 +329,64 @@ def run_analysis_background(document_id: int, flask_app, database: str) -> None:
                 s['_order_index'],                           # niet-gevonden: DB volgorde
             ))
 
-            # 3. Feedback genereren (LLM-calls lopen parallel in generate_feedback)
-            criteria_for_analysis = db_utils.get_criteria_for_document_type(
-                db, document_type['id']
-            )
+            # 3. Documentdigest: één keer per document, gedeelde context voor alle LLM-calls
+            progress.stage('digest')
+            digest = _stage(checkpoint, 'digest',
+                            lambda: _build_digest(recognized_sects_raw, full_document_text, document_id))
+            digest_text = digest['text'] if digest else None
+
+            # Nieuwe versie van een eerder geanalyseerd document: alleen gewijzigde secties
+            # opnieuw checken, feedback van ongewijzigde secties hergebruiken
+            from config import Config
+            hashes = versioning.section_hashes(recognized_sects_raw)
+            document_hash = versioning.text_hash(full_document_text)
+            reuse = versioning.plan_reuse(db, document_id, hashes, fingerprint, document_hash) \
+                if Config.ANALYSIS_INCREMENTAL else None
+            if reuse is not None:
+                print(
+                    f"[ACHTERGROND] Nieuwe versie van document {reuse['previous_id']}: "
+                    f"{len(reuse['changed'])} gewijzigde sectie(s) opnieuw, "
+                    f"{len(reuse['unchanged'])} ongewijzigd ({len(reuse['feedback'])} items hergebruikt)"
+                )
+
+            # 4. Holistische reviews starten — lopen gelijktijdig met de criteria (stap 5)
+            # onder dezelfde LLM-planner, met lagere prioriteit.
+            _show_sugg = bool(document_type['show_suggestions']) \
+                if 'show_suggestions' in document_type.keys() else True
+            _token_budget = document_type['llm_token_budget'] \
+                if 'llm_token_budget' in document_type.keys() else None
+            holistic_future = None if checkpoint is not None and checkpoint.has('holistic') \
+                else _start_holistic_reviews(
+                    recognized_sects_raw if reuse is None else
+                    [s for s in recognized_sects_raw if s.get('name') in reuse['changed']],
+                    full_document_text,
+                    llm_model='claude-haiku-4-5',
+                    show_suggestions=_show_sugg,
+                    document_id=document_id,
+                    token_budget=_token_budget,
+                    digest_text=digest_text,
+                )
+
+            # 5. Feedback genereren (LLM-calls lopen parallel in generate_feedback)
+            _check_lease(lease)
+            progress.stage('criteria')
+            _t_criteria = time.time()
             generated_feedback_items = criterion_checking.generate_feedback(
                 full_document_text, recognized_sects_raw,
-                criteria_for_analysis, db, document_id, document_type['id']
+                criteria_for_analysis, db, document_id, document_type['id'],
+                only_section_names=None if reuse is None else reuse['changed'],
+                include_doc_wide=True if reuse is None else reuse['doc_wide'],
+                live_feed=live_feed,
+                digest_text=digest_text,
+                checkpoint=checkpoint,
+                progress=progress,
+                # Batchjobs met lagere prioriteit in de LLM-planner: interactief gaat voor
+                priority=analysis_queue.llm_priority(db, job_id),
             )
+            criteria_duration = time.time() - _t_criteria
+            live_feed.flush()   # laatste gestreamde items vóór de (lange) afronding
+            if reuse is not None:
+                generated_feedback_items = reuse['feedback'] + generated_feedback_items
 
             # Opmaakwaarschuwingen toevoegen
             for fw in formatting_warnings:
@@ -162,7 +414,7 @@ def run_analysis_background(document_id: int, flask_app, database: str) -> None:
                         'check_type':        'formatting',
                     })
 
-            # 4. Hoofdresultaten direct opslaan — VOOR holistische reviews.
+            # 6. Hoofdresultaten direct opslaan — VOOR de holistische resultaten.
             # Zo is de analyse altijd beschikbaar, ook als holistische reviews crashen
             # of worden onderbroken door een Flask-herstart.
             import logging as _log
@@ -182,28 +434,44 @@ def run_analysis_background(document_id: int, flask_app, database: str) -> None:
                 ],
                 'feedback':           generated_feedback_items,
                 'analysis_timestamp': _timestamp,
+                'token_usage':        criterion_checking.get_token_usage_summary(document_id),
             }
+            if digest:
+                analysis_summary['document_digest'] = digest
+            analysis_summary['section_hashes'] = hashes
+            analysis_summary['document_hash'] = document_hash
+            analysis_summary['config_fingerprint'] = fingerprint
+            if reuse is not None:
+                analysis_summary['incremental'] = {
+                    'previous_version_id': reuse['previous_id'],
+                    'changed_sections':    sorted(reuse['changed']),
+                    'reused_sections':     sorted(reuse['unchanged']),
+                    'reused_items':        len(reuse['feedback']),
+                }
+            _check_lease(lease, db)
+            progress.stage('save')
             db.execute(
-                'UPDATE documents SET analysis_status=?, analysis_data=? WHERE id=?',
-                ('completed', json.dumps(analysis_summary), document_id)
+                'UPDATE documents SET analysis_status=?, analysis_data=?, config_fingerprint=? WHERE id=?',
+                ('completed', json.dumps(analysis_summary), fingerprint, document_id)
             )
             db.commit()
             _logger.info(f"Analyse voltooid (hoofdresultaten) voor document ID: {document_id}")
 
-            # 5. Holistische reviews — optionele tweede pass.
+            # 7. Holistische reviews — optionele tweede pass, liep al sinds stap 4.
             # Fouten hier breken de analyse NIET; status blijft 'completed'.
             try:
-                _show_sugg = bool(document_type['show_suggestions']) \
-                    if 'show_suggestions' in document_type.keys() else True
-                holistic_items = criterion_checking.run_holistic_section_reviews(
-                    recognized_sects_raw,
-                    full_document_text,
-                    llm_model='claude-haiku-4-5',
-                    show_suggestions=_show_sugg,
+                holistic_items, holistic_duration = _holistic_result(holistic_future, checkpoint)
+                _logger.info(
+                    f"[PIPELINE] document={document_id} | criteria={criteria_duration:.1f}s | "
+                    f"holistisch={holistic_duration:.1f}s | "
+                    f"totaal na digest={time.time() - _t_criteria:.1f}s"
                 )
                 if holistic_items:
                     generated_feedback_items.extend(holistic_items)
                     analysis_summary['feedback'] = generated_feedback_items
+                    analysis_summary['token_usage'] = \
+                        criterion_checking.get_token_usage_summary(document_id)
+                    _check_lease(lease, db)
                     db.execute(
                         'UPDATE documents SET analysis_data=? WHERE id=?',
                         (json.dumps(analysis_summary), document_id)
@@ -213,27 +481,28 @@ def run_analysis_background(document_id: int, flask_app, database: str) -> None:
                         f"Holistische reviews toegevoegd voor document ID: {document_id} "
                         f"({len(holistic_items)} items)"
                     )
+            except analysis_queue.LeaseLost:
+                raise
             except Exception as hol_exc:
                 _logger.warning(
                     f"Holistische reviews mislukt voor document {document_id} "
                     f"(hoofdresultaten zijn al opgeslagen): {hol_exc}"
                 )
 
+            _log_token_usage(_logger, document_id)
+
+        except analysis_queue.LeaseLost:
+            raise               # niets meer schrijven: de job is van een andere runner
         except Exception as exc:
             print(f"[ACHTERGROND] Fout tijdens analyse van document {document_id}: {exc}")
-            traceback.print_exc()
-            try:
-                db.execute(
-                    'UPDATE documents SET analysis_status=? WHERE id=?',
-                    ('failed', document_id)
-                )
-                db.commit()
-            except Exception:
-                pass
+            if live_feed is not None:
+                live_feed.flush()   # gestreamde items tot de fout blijven zichtbaar
+            raise
         finally:
+            _stop_holistic_reviews(holistic_future)
+            # Tellingen zijn gelogd en opgeslagen: niet laten staan in een langlopende worker
+            criterion_checking.reset_token_usage(document_id)
             db.close()
-            with _analysis_lock:
-                _analysis_in_progress.discard(document_id)
 
 
 def run_partial_reanalysis_background(
@@ -242,6 +511,7 @@ def run_partial_reanalysis_background(
     include_doc_wide: bool,
     flask_app,
     database: str,
+    job_id: int = None,
 ) -> None:
     """
     Heranalyseer uitsluitend de opgegeven secties en vervang alleen hun feedback
@@ -249,6 +519,7 @@ def run_partial_reanalysis_background(
 
     section_names  : lijst van sectienamen die hergeanalyseerd moeten worden
     include_doc_wide: als True, ook document-brede criteria (taalcheck e.d.) opnieuw draaien
+    job_id         : de job uit analysis_queue; schakelt checkpoints per stap in
     """
     import logging as _log
     _logger = _log.getLogger('docucheck')
@@ -256,6 +527,8 @@ def run_partial_reanalysis_background(
     with flask_app.app_context():
         db = sqlite3.connect(database)
         db.row_factory = sqlite3.Row
+        live_feed = None
+        holistic_future = None
         try:
             document = db.execute(
                 'SELECT * FROM documents WHERE id=?', (document_id,)
@@ -269,43 +542,29 @@ def run_partial_reanalysis_background(
                 f"[HERANALYSE] Start gedeeltelijke heranalyse document {document_id} | "
                 f"secties: {section_names} | doc-breed: {include_doc_wide}"
             )
+            criterion_checking.reset_token_usage(document_id)
+            checkpoint = checkpoints.open_checkpoint(database, document_id, job_id)
+            lease = analysis_queue.lease_for(job_id)
+            progress = ProgressReporter(database, document_id, job_id)
 
             # 1. Document opnieuw parsen (nodig voor full_doc_text en sectieherkenning)
-            full_doc_text, doc_paragraphs, headings = \
-                document_parsing.parse_document(document['file_path'])
+            progress.stage('parse')
+            full_doc_text, doc_paragraphs, headings = _stage(
+                checkpoint, 'parsed', lambda: document_parsing.parse_document(document['file_path'])
+            )
 
-            # 2. Sectieherkenning
-            expected_sections_metadata = db.execute(
-                '''SELECT DISTINCT s.id, s.name, s.level, s.identifier, s.is_required,
-                          s.parent_id, s.alternative_names, s.order_index
-                   FROM sections s
-                   LEFT JOIN document_type_sections dts ON s.id = dts.section_id
-                   WHERE s.document_type_id = :dt_id
-                      OR dts.document_type_id = :dt_id
-                      OR (s.document_type_id IS NULL
-                          AND NOT EXISTS (
-                              SELECT 1 FROM document_type_sections dts2
-                              WHERE dts2.section_id = s.id
-                          ))
-                   ORDER BY
-                       CASE WHEN s.document_type_id IS NULL THEN 0 ELSE 1 END,
-                       s.order_index''',
-                {'dt_id': document_type['id']}
-            ).fetchall()
+            # 2. Sectieherkenning (met voetnoten in de sectie-content)
+            progress.stage('recognize')
 
-            recognized_sects_raw, _ = section_recognition.recognize_and_enrich_sections(
-                full_doc_text, doc_paragraphs, headings, expected_sections_metadata
-            )
+            def _recognize():
+                expected_sections_metadata = db_utils.get_expected_sections(db, document_type['id'])
+                sections, warnings = section_recognition.recognize_and_enrich_sections(
+                    full_doc_text, doc_paragraphs, headings, expected_sections_metadata
+                )
+                _add_footnotes(sections, full_doc_text)
+                return sections, warnings
 
-            # Voetnoten toevoegen aan sectie-content
-            _voetnoten_blok = ''
-            if '[VOETNOTEN/EINDNOTEN]' in full_doc_text:
-                _start = full_doc_text.index('[VOETNOTEN/EINDNOTEN]')
-                _voetnoten_blok = full_doc_text[_start:].strip()
-            if _voetnoten_blok:
-                for sec in recognized_sects_raw:
-                    if sec.get('found') and sec.get('content'):
-                        sec['content'] = sec['content'].rstrip() + '\n\n' + _voetnoten_blok
+            recognized_sects_raw, _ = _stage(checkpoint, 'recognized', _recognize)
 
             # 3. Bestaande analysis_data laden
             existing_data = json.loads(document['analysis_data'] or '{}')
@@ -317,14 +576,49 @@ def run_partial_reanalysis_background(
                 sn = fi.get('section_name') or ''
                 if sn in section_names_set:
                     return True
+                # Resultaat van een subsectie dat ook voor een geselecteerde parent gold
+                if any(n in section_names_set for n in fi.get('also_in_sections') or []):
+                    return True
                 # Document-brede items hebben section_name='' of 'Hele Document'
                 if include_doc_wide and sn in ('', 'Hele Document'):
                     return True
                 return False
 
             kept_feedback = [fi for fi in old_feedback if not _should_remove(fi)]
+            existing_data.pop('live_feedback', None)
+            live_feed = LiveFeedWriter(database, document_id)
+
+            # Digest van de volledige analyse hergebruiken; alleen maken als die ontbreekt
+            digest = existing_data.get('document_digest') or _stage(
+                checkpoint, 'digest',
+                lambda: _build_digest(recognized_sects_raw, full_doc_text, document_id))
+            digest_text = digest['text'] if digest else None
+            if digest:
+                existing_data['document_digest'] = digest
+
+            # 4. Holistische reviews voor de geselecteerde secties — gelijktijdig met de criteria
+            _show_sugg = bool(document_type['show_suggestions']) \
+                if 'show_suggestions' in document_type.keys() else True
+            _token_budget = document_type['llm_token_budget'] \
+                if 'llm_token_budget' in document_type.keys() else None
+            filtered_for_holistic = [
+                s for s in recognized_sects_raw if s.get('name') in section_names_set
+            ]
+            holistic_future = None if checkpoint is not None and checkpoint.has('holistic') \
+                else _start_holistic_reviews(
+                    filtered_for_holistic,
+                    full_doc_text,
+                    llm_model    = 'claude-haiku-4-5',
+                    show_suggestions = _show_sugg,
+                    document_id  = document_id,
+                    live_feed    = live_feed,
+                    token_budget = _token_budget,
+                    digest_text  = digest_text,
+                )
 
-            # 4. Nieuwe criteria-feedback genereren voor alleen de geselecteerde secties
+            # 5. Nieuwe criteria-feedback genereren voor alleen de geselecteerde secties
+            _check_lease(lease)
+            progress.stage('criteria')
             criteria_for_analysis = db_utils.get_criteria_for_document_type(
                 db, document_type['id']
             )
@@ -337,33 +631,34 @@ def run_partial_reanalysis_background(
                 document_type['id'],
                 only_section_names  = section_names_set,
                 include_doc_wide    = include_doc_wide,
+                live_feed           = live_feed,
+                digest_text         = digest_text,
+                checkpoint          = checkpoint,
+                progress            = progress,
             )
 
-            # 5. Holistische reviews voor de geselecteerde secties
-            _show_sugg = bool(document_type['show_suggestions']) \
-                if 'show_suggestions' in document_type.keys() else True
-            filtered_for_holistic = [
-                s for s in recognized_sects_raw if s.get('name') in section_names_set
-            ]
+            # 6. Wachten op de holistische reviews
+            progress.stage('holistic')
             holistic_items = []
             try:
-                holistic_items = criterion_checking.run_holistic_section_reviews(
-                    filtered_for_holistic,
-                    full_doc_text,
-                    llm_model    = 'claude-haiku-4-5',
-                    show_suggestions = _show_sugg,
-                )
+                holistic_items, _ = _holistic_result(holistic_future, checkpoint)
             except Exception as hol_exc:
                 _logger.warning(f"[HERANALYSE] Holistische reviews mislukt: {hol_exc}")
 
-            # 6. Alles samenvoegen en opslaan
+            live_feed.flush()
+
+            # 7. Alles samenvoegen en opslaan
             all_new_feedback = new_feedback + holistic_items
             combined_feedback = kept_feedback + all_new_feedback
 
             existing_data['feedback'] = combined_feedback
             existing_data['partial_reanalysis_timestamp'] = datetime.now().isoformat()
             existing_data['partial_reanalysis_sections']  = section_names
+            existing_data['partial_reanalysis_token_usage'] = \
+                criterion_checking.get_token_usage_summary(document_id)
 
+            _check_lease(lease, db)
+            progress.stage('save')
             db.execute(
                 'UPDATE documents SET analysis_status=?, analysis_data=? WHERE id=?',
                 ('completed', json.dumps(existing_data), document_id)
@@ -373,19 +668,163 @@ def run_partial_reanalysis_background(
                 f"[HERANALYSE] Voltooid voor document {document_id} | "
                 f"nieuw: {len(all_new_feedback)} items | behouden: {len(kept_feedback)} items"
             )
+            _log_token_usage(_logger, document_id)
 
+        except analysis_queue.LeaseLost:
+            raise
         except Exception as exc:
+            # Bij definitief falen zet de wachtrij het document terug op 'completed'
             _logger.error(f"[HERANALYSE] Fout document {document_id}: {exc}")
-            traceback.print_exc()
-            try:
-                db.execute(
-                    'UPDATE documents SET analysis_status=? WHERE id=?',
-                    ('completed', document_id)   # terug naar completed, niet naar failed
+            if live_feed is not None:
+                live_feed.flush()
+            raise
+        finally:
+            _stop_holistic_reviews(holistic_future)
+            # Tellingen zijn gelogd en opgeslagen: niet laten staan in een langlopende worker
+            criterion_checking.reset_token_usage(document_id)
+            db.close()
+
+
+def run_criterion_reevaluation_background(
+    document_id: int,
+    reevaluations: list,
+    flask_app,
+    database: str,
+    job_id: int = None,
+) -> None:
+    """
+    Check de criteria van een of meer herbeoordelingen opnieuw voor een voltooide analyse
+    en vervang alleen de feedback van die criteria (zie analysis/reevaluation.py).
+    reevaluations: [{'criteria_id', 'batch_id'}], in de volgorde waarin ze zijn gestart.
+
+    Tekst en secties komen uit de herkenningscache van de laatste volledige analyse
+    (analysis/recognition_cache.py); alleen als die ontbreekt of verouderd is wordt het
+    document opnieuw geparst en herkend. De LLM-calls krijgen PRIORITY_LOW, zodat
+    analyses van gebruikers voorgaan. Het document blijft 'completed'. Is de
+    herbeoordeling geannuleerd, dan slaat de runner haar criterium over; zijn alle
+    herbeoordelingen geannuleerd, dan stopt hij zonder te schrijven.
+    """
+    import logging as _log
+    _logger = _log.getLogger('docucheck')
+
+    with flask_app.app_context():
+        db = sqlite3.connect(database)
+        db.row_factory = sqlite3.Row
+        try:
+            def _active():
+                return [r for r in reevaluations if not reevaluation.is_cancelled(db, r.get('batch_id'))]
+
+            active = _active()
+            batch_ids = [r.get('batch_id') for r in reevaluations]
+            if not active:
+                _logger.info(f"[HERBEOORDELING] {batch_ids}: geannuleerd, document {document_id} overgeslagen")
+                return
+            criteria_ids = {int(r['criteria_id']) for r in active}
+            document = db.execute('SELECT * FROM documents WHERE id=?', (document_id,)).fetchone()
+            if document is None or document['analysis_status'] != 'completed':
+                _logger.info(f"[HERBEOORDELING] Document {document_id} heeft geen voltooide analyse; overgeslagen")
+                return
+            document_type_id = document['document_type_id']
+            criterion_checking.reset_token_usage(document_id)
+            checkpoint = checkpoints.open_checkpoint(database, document_id, job_id)
+            lease = analysis_queue.lease_for(job_id)
+            progress = ProgressReporter(database, document_id, job_id)
+
+            # 1. Tekst en secties: uit de cache, anders opnieuw parsen en herkennen
+            expected = db_utils.get_expected_sections(db, document_type_id)
+            cache_key = recognition_cache.sections_key(expected)
+            content_hash = _file_hash(document)
+            cached = recognition_cache.load(db, document_id, content_hash, cache_key)
+            if cached is not None:
+                full_doc_text, recognized_sects_raw = cached
+            else:
+                progress.stage('parse')
+                full_doc_text, doc_paragraphs, headings = _stage(
+                    checkpoint, 'parsed', lambda: document_parsing.parse_document(document['file_path'])
                 )
-                db.commit()
-            except Exception:
-                pass
+                progress.stage('recognize')
+
+                def _recognize():
+                    sections, warnings = section_recognition.recognize_and_enrich_sections(
+                        full_doc_text, doc_paragraphs, headings, expected
+                    )
+                    _add_footnotes(sections, full_doc_text)
+                    return sections, warnings
+
+                recognized_sects_raw, _ = _stage(checkpoint, 'recognized', _recognize)
+                recognition_cache.store(database, document_id, content_hash, cache_key,
+                                        full_doc_text, recognized_sects_raw)
+
+            # 2. Alleen deze criteria checken (uitgeschakeld of ontkoppeld: feedback vervalt)
+            _check_lease(lease)
+            progress.stage('criteria')
+            criteria = [c for c in db_utils.get_criteria_for_document_type(db, document_type_id)
+                        if c['id'] in criteria_ids]
+            existing_data = json.loads(document['analysis_data'] or '{}')
+            digest = existing_data.get('document_digest')
+            new_feedback = criterion_checking.generate_feedback(
+                full_doc_text,
+                [dict(s) for s in recognized_sects_raw],
+                criteria,
+                db,
+                document_id,
+                document_type_id,
+                digest_text = digest['text'] if digest else None,
+                checkpoint  = checkpoint,
+                progress    = progress,
+                priority    = PRIORITY_LOW,
+            ) if criteria else []
+
+            # 3. Feedback van deze criteria vervangen, de rest blijft staan
+            active = _active()
+            if not active:
+                _logger.info(f"[HERBEOORDELING] {batch_ids}: geannuleerd, resultaat van document "
+                             f"{document_id} niet opgeslagen")
+                return
+            criteria_ids = {int(r['criteria_id']) for r in active}
+            new_feedback = [fi for fi in new_feedback if fi.get('criteria_id') in criteria_ids]
+            document = db.execute('SELECT analysis_status, analysis_data, config_fingerprint '
+                                  'FROM documents WHERE id=?', (document_id,)).fetchone()
+            if document['analysis_status'] != 'completed':
+                return      # inmiddels opnieuw geanalyseerd
+            existing_data = json.loads(document['analysis_data'] or '{}')
+            kept = [fi for fi in existing_data.get('feedback', []) if fi.get('criteria_id') not in criteria_ids]
+            existing_data['feedback'] = kept + new_feedback
+            usage = criterion_checking.get_token_usage_summary(document_id)
+            fingerprint = document['config_fingerprint']
+            for r in active:
+                existing_data.setdefault('criterion_reevaluations', {})[str(r['criteria_id'])] = {
+                    'timestamp':   datetime.now().isoformat(),
+                    'batch_id':    r.get('batch_id'),
+                    'token_usage': usage,
+                }
+                # Was het document bij tot deze wijziging, dan is het dat nu weer
+                # (opeenvolgende wijzigingen: oud → tussenstand → nieuw)
+                pair = reevaluation.fingerprint_after(db, r.get('batch_id'), document_type_id)
+                if pair is not None and fingerprint == pair[0]:
+                    fingerprint = pair[1]
+                    existing_data['config_fingerprint'] = fingerprint
+
+            _check_lease(lease, db)
+            progress.stage('save')
+            db.execute(
+                "UPDATE documents SET analysis_data=?, config_fingerprint=? "
+                "WHERE id=? AND analysis_status='completed'",
+                (json.dumps(existing_data), fingerprint, document_id)
+            )
+            db.commit()
+            _logger.info(
+                f"[HERBEOORDELING] Document {document_id} | criteria {sorted(criteria_ids)} | "
+                f"{'cache' if cached is not None else 'opnieuw geparst'} | "
+                f"nieuw: {len(new_feedback)} items | behouden: {len(kept)} items"
+            )
+            _log_token_usage(_logger, document_id)
+
+        except analysis_queue.LeaseLost:
+            raise
+        except Exception as exc:
+            _logger.error(f"[HERBEOORDELING] Fout document {document_id}: {exc}")
+            raise
         finally:
+            criterion_checking.reset_token_usage(document_id)
             db.close()
-            with _analysis_lock:
-                _analysis_in_progress.discard(document_id)
@@ -0,0 +1,126 @@
+"""
+analysis_worker.py  -  Losstaand analyseproces naast de webserver
+
+Claimt jobs uit de analysewachtrij (analysis_jobs) en voert ze uit; de webserver
+zet alleen jobs in de wachtrij en leest resultaten. Zet in dat geval
+ANALYSIS_RUN_IN_WEB=false voor het webproces, zodat gunicorn-workers geen
+analyses meer draaien.
+
+Gelijktijdigheid:
+    --concurrency    documenten tegelijk (runner-threads; standaard ANALYSIS_WORKERS)
+    --llm-workers    LLM-calls tegelijk per document (standaard LLM_MAX_WORKERS)
+    --max-llm-calls  LLM-calls tegelijk in dit proces, over alle documenten heen
+                     (standaard LLM_MAX_CONCURRENT_CALLS)
+
+Stoppen (SIGTERM / Ctrl+C): er worden geen nieuwe jobs meer geclaimd en lopende
+analyses krijgen ANALYSIS_WORKER_GRACE_S seconden om af te ronden. Daarna breken ze
+af bij de volgende stap; een afgebroken job gaat terug naar de wachtrij zonder dat
+het als poging telt. Een analyse die dan nog loopt (bijv. in een LLM-call) wordt na
+het verlopen van zijn lease door een andere worker (of deze na herstart) opgepakt.
+
+Draait het webproces met ANALYSIS_RUN_IN_WEB=false, dan moet dit proces altijd
+meedraaien: zonder worker blijven jobs voor altijd in de wachtrij staan.
+
+Gebruik:
+    python src/analysis_worker.py
+    python src/analysis_worker.py --concurrency 4 --llm-workers 2 --max-llm-calls 8
+"""
+
+import argparse
+import logging
+import os
+import signal
+import sys
+import threading
+
+# Pad instellen zodat imports werken (zelfde als main.py)
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, THIS_DIR)
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+from flask import Flask
+
+import analysis_queue
+from config import Config
+
+INSTANCE_PATH = os.environ.get('INSTANCE_PATH', os.path.join(THIS_DIR, '..', 'instance'))
+DB_PATH       = os.path.join(INSTANCE_PATH, 'documents.db')
+
+_logger = logging.getLogger('docucheck')
+
+
+def create_app(database: str) -> Flask:
+    """Minimale Flask-app voor de app_context van de runners (geen routes)."""
+    upload_folder = os.path.join(os.path.dirname(os.path.abspath(database)), 'uploads')
+    app = Flask(__name__)
+    app.config.from_mapping(DATABASE=database, UPLOAD_FOLDER=upload_folder)
+    return app
+
+
+def run(database: str, concurrency: int, stop_event: threading.Event, grace_s: float) -> list:
+    """
+    Start de runners en blokkeer tot stop_event gezet wordt; daarna netjes afsluiten.
+    Retourneert de jobs die na de grace-periode aan de wachtrij zijn teruggegeven.
+    """
+    from analysis import llm_telemetry
+    flask_app = create_app(database)
+    requeued = analysis_queue.recover_interrupted(database)
+    if requeued:
+        _logger.info(f"[WORKER] {requeued} onderbroken analyse(s) opnieuw in de wachtrij gezet")
+    llm_telemetry.start_writer(database)
+
+    analysis_queue.start_workers(flask_app, database, concurrency)
+    _logger.info(f"[WORKER] Gestart (pid {os.getpid()}): {concurrency} document(en) tegelijk, "
+                 f"{Config.LLM_MAX_WORKERS} LLM-call(s) per document, "
+                 f"max {Config.LLM_MAX_CONCURRENT_CALLS} in dit proces")
+    stop_event.wait()
+
+    _logger.info(f"[WORKER] Stoppen: geen nieuwe jobs meer, lopende analyses krijgen {grace_s:g}s")
+    released = analysis_queue.stop_workers(timeout=grace_s)
+    llm_telemetry.stop_writer()
+    _logger.info(f"[WORKER] Gestopt ({len(released)} job(s) teruggegeven aan de wachtrij)")
+    return released
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyseworker: voert jobs uit de analysewachtrij uit.')
+    parser.add_argument('--concurrency', type=int, default=Config.ANALYSIS_WORKERS,
+                        help='documenten tegelijk (runner-threads)')
+    parser.add_argument('--llm-workers', type=int, default=Config.LLM_MAX_WORKERS,
+                        help='LLM-calls tegelijk per document')
+    parser.add_argument('--max-llm-calls', type=int, default=Config.LLM_MAX_CONCURRENT_CALLS,
+                        help='LLM-calls tegelijk in dit proces')
+    parser.add_argument('--grace', type=float, default=Config.ANALYSIS_WORKER_GRACE_S,
+                        help='seconden om lopende analyses af te ronden bij stoppen')
+    parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    for noisy in ('httpcore', 'httpx', 'anthropic._base_client', 'anthropic', 'urllib3'):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+
+    # Vóór de eerste analyse zetten: de LLM-planner leest LLM_MAX_CONCURRENT_CALLS bij aanmaak
+    Config.LLM_MAX_WORKERS = max(1, args.llm_workers)
+    Config.LLM_MAX_CONCURRENT_CALLS = max(1, args.max_llm_calls)
+
+    stop_event = threading.Event()
+
+    def _on_signal(signum, _frame):
+        if stop_event.is_set():
+            _logger.warning('[WORKER] Tweede stopsignaal: direct afsluiten')
+            os._exit(1)
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, _on_signal)
+    signal.signal(signal.SIGINT, _on_signal)
+
+    run(os.path.abspath(args.db), max(1, args.concurrency), stop_event, args.grace)
+
+
+if __name__ == '__main__':
+    main()
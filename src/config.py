@@ -23,6 +23,130 @@ class Config:
     # AI Feedback configuratie
     GEMINI_API_KEY    = os.getenv('GEMINI_API_KEY')
     ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')  # voor llm_review (Claude)
+    # Alternatieve API-adressen, bijv. de lokale stub (llm_stub_server.py) voor loadtests.
+    # Leeg = de echte API's.
+    ANTHROPIC_BASE_URL = os.getenv('ANTHROPIC_BASE_URL', '')
+    GEMINI_BASE_URL    = os.getenv('GEMINI_BASE_URL', '')
+
+    # LLM-uitvoering
+    # Aantal gelijktijdige LLM-calls per analysefase (criteria / holistisch).
+    # Standaard 1: serieel uitvoeren voorkomt token-per-minuut rate limits bij Anthropic;
+    # met prompt-caching is de overhead per call klein genoeg. Verhoog per deployment
+    # als de rate limits van het account het toelaten.
+    LLM_MAX_WORKERS   = int(os.getenv('LLM_MAX_WORKERS', '1'))
+    # Eerste LLM-taak per document alleen uitvoeren zodat die de prompt-cache aanmaakt;
+    # pas daarna de overige taken parallel starten (die lezen dan uit de cache).
+    LLM_CACHE_WARMUP  = os.getenv('LLM_CACHE_WARMUP', 'true').lower() == 'true'
+    # Maximale wachttijd (s) van een gelijktijdige fase op de warming-taak van hetzelfde document.
+    LLM_CACHE_WARMUP_WAIT_S = int(os.getenv('LLM_CACHE_WARMUP_WAIT_S', '300'))
+    # LLM-antwoorden streamen zodat voltooide feedback-items live zichtbaar worden.
+    LLM_STREAMING     = os.getenv('LLM_STREAMING', 'true').lower() == 'true'
+    # Provider-native gestructureerde output (tool-use / JSON-modus) i.p.v. JSON uit vrije tekst vissen.
+    LLM_STRUCTURED_OUTPUT = os.getenv('LLM_STRUCTURED_OUTPUT', 'true').lower() == 'true'
+    # Tokenbudget per LLM-call voor documentcontext + sectie (per documenttype te overschrijven).
+    LLM_CONTEXT_TOKEN_BUDGET   = int(os.getenv('LLM_CONTEXT_TOKEN_BUDGET', '16000'))
+    # Minimum dat binnen dat budget altijd voor de te beoordelen sectie vrij blijft.
+    LLM_SECTION_TOKEN_BUDGET   = int(os.getenv('LLM_SECTION_TOKEN_BUDGET', '3000'))
+    # Maximum voor buursecties wanneer de documentcontext niet volledig past.
+    LLM_NEIGHBOUR_TOKEN_BUDGET = int(os.getenv('LLM_NEIGHBOUR_TOKEN_BUDGET', '1500'))
+    # Maximum aantal gelijktijdige LLM-calls in dit proces (over alle analyses heen).
+    LLM_MAX_CONCURRENT_CALLS   = int(os.getenv('LLM_MAX_CONCURRENT_CALLS', '8'))
+    # Secties groter dan dit (tokens) worden in delen parallel beoordeeld; 0 = uit.
+    LLM_MAP_REDUCE_THRESHOLD_TOKENS = int(os.getenv('LLM_MAP_REDUCE_THRESHOLD_TOKENS', '4000'))
+    # Grootte van één deel bij map-reduce (tokens, op alinea-grenzen).
+    LLM_MAP_REDUCE_CHUNK_TOKENS     = int(os.getenv('LLM_MAP_REDUCE_CHUNK_TOKENS', '2500'))
+    # Documentdigest (opbouw, samenvattingen, definities, onderzoeksvragen) als gedeelde
+    # LLM-context in plaats van de ruwe documenttekst. Kost één extra LLM-call per analyse,
+    # dus standaard uit; per deployment aanzetten.
+    LLM_DOCUMENT_DIGEST            = os.getenv('LLM_DOCUMENT_DIGEST', 'false').lower() == 'true'
+    # Maximaal aantal tokens documenttekst dat de digest-call te zien krijgt.
+    LLM_DIGEST_INPUT_TOKEN_BUDGET  = int(os.getenv('LLM_DIGEST_INPUT_TOKEN_BUDGET', '50000'))
+    # Modelroutering voor llm_review (per documenttype en criterium te overschrijven):
+    # eerste beoordeling met het snelle model, escalatie naar het sterke model bij een
+    # zwak oordeel of ongeldig antwoord. Leeg sterk model = nooit escaleren.
+    LLM_FAST_MODEL   = os.getenv('LLM_FAST_MODEL', 'claude-haiku-4-5')
+    LLM_STRONG_MODEL = os.getenv('LLM_STRONG_MODEL', '')
+    # Oordelen waarbij het sterke model de sectie opnieuw beoordeelt.
+    LLM_ESCALATE_ON  = os.getenv('LLM_ESCALATE_ON', 'onvoldoende,matig')
+    # Secties groter dan dit (tokens) gaan direct naar het sterke model; 0 = uit.
+    LLM_ESCALATE_ABOVE_TOKENS = int(os.getenv('LLM_ESCALATE_ABOVE_TOKENS', '6000'))
+    # Maximale duur van één LLM-call (seconden) voordat de SDK afbreekt.
+    LLM_CALL_TIMEOUT_S      = float(os.getenv('LLM_CALL_TIMEOUT_S', '120'))
+    # Circuit breaker per provider: open na zoveel opeenvolgende fouten of trage calls,
+    # na de cooldown één proef-call.
+    LLM_BREAKER_FAILURES    = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+    LLM_BREAKER_COOLDOWN_S  = float(os.getenv('LLM_BREAKER_COOLDOWN_S', '30'))
+    LLM_BREAKER_SLOW_CALL_S = float(os.getenv('LLM_BREAKER_SLOW_CALL_S', '90'))
+    # Alternatief model per provider bij open breaker en voor hedging, bijv.
+    # 'anthropic=gemini-2.5-flash,gemini=claude-haiku-4-5'. Standaard leeg: uitwijken naar
+    # een andere provider (andere sleutel, andere outputkwaliteit) is een bewuste keuze.
+    LLM_FAILOVER_MODELS     = os.getenv('LLM_FAILOVER_MODELS', '')
+    # Hedged requests: na de p95-latency een duplicaat naar het alternatieve model.
+    LLM_HEDGING             = os.getenv('LLM_HEDGING', 'false').lower() == 'true'
+    LLM_HEDGE_MIN_SAMPLES   = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20'))
+    LLM_HEDGE_MIN_DELAY_S   = float(os.getenv('LLM_HEDGE_MIN_DELAY_S', '5'))
+    # Telemetrie per LLM-call (tabel llm_calls), gebundeld weggeschreven door een achtergrondthread.
+    LLM_TELEMETRY           = os.getenv('LLM_TELEMETRY', 'true').lower() == 'true'
+    LLM_TELEMETRY_BATCH     = int(os.getenv('LLM_TELEMETRY_BATCH', '50'))
+    LLM_TELEMETRY_FLUSH_S   = float(os.getenv('LLM_TELEMETRY_FLUSH_S', '2'))
+    # Limieten van het provider-account (requests en tokens per minuut); alleen gebruikt
+    # door de dry-run-planner om de doorlooptijd te schatten. 0 = onbekend / geen limiet.
+    LLM_RATE_LIMIT_RPM        = int(os.getenv('LLM_RATE_LIMIT_RPM', '0'))
+    LLM_RATE_LIMIT_INPUT_TPM  = int(os.getenv('LLM_RATE_LIMIT_INPUT_TPM', '0'))
+    LLM_RATE_LIMIT_OUTPUT_TPM = int(os.getenv('LLM_RATE_LIMIT_OUTPUT_TPM', '0'))
+    # Profilering per criterium × sectie (tabel criterion_profile, zichtbaar op de criterialijst):
+    # wandkloktijd, CPU-tijd, LLM-latency, tokens en retries; gemiddeld over de laatste N analyses.
+    # Profileermodus: standaard uit, aanzetten om een trage analyse te onderzoeken.
+    CRITERION_PROFILING     = os.getenv('CRITERION_PROFILING', 'false').lower() == 'true'
+    CRITERION_PROFILE_RUNS  = int(os.getenv('CRITERION_PROFILE_RUNS', '20'))
+
+    # Analysewachtrij (tabel analysis_jobs, zie analysis_queue.py)
+    # Runner-threads per proces die jobs claimen; een claim is een lease die met
+    # heartbeats wordt verlengd. Verloopt de lease (proces weg), dan neemt een
+    # andere runner de job over. Mislukte jobs worden met backoff opnieuw geprobeerd.
+    ANALYSIS_WORKERS          = int(os.getenv('ANALYSIS_WORKERS', '2'))
+    ANALYSIS_JOB_LEASE_S      = int(os.getenv('ANALYSIS_JOB_LEASE_S', '120'))
+    ANALYSIS_JOB_MAX_ATTEMPTS = int(os.getenv('ANALYSIS_JOB_MAX_ATTEMPTS', '3'))
+    ANALYSIS_JOB_RETRY_BASE_S = int(os.getenv('ANALYSIS_JOB_RETRY_BASE_S', '30'))
+    ANALYSIS_JOB_POLL_S       = float(os.getenv('ANALYSIS_JOB_POLL_S', '2'))
+    # Tussenresultaten per job vastleggen (parse, herkenning, digest, checks, elke LLM-taak),
+    # zodat een nieuwe poging na een crash of deploy verdergaat i.p.v. opnieuw begint.
+    ANALYSIS_CHECKPOINTS      = os.getenv('ANALYSIS_CHECKPOINTS', 'true').lower() == 'true'
+    # Runners in het webproces starten (één proces, handig lokaal). Op false zetten zodra
+    # er een losse worker draait (python src/analysis_worker.py): het web zet dan alleen
+    # jobs in de wachtrij en leest resultaten.
+    ANALYSIS_RUN_IN_WEB       = os.getenv('ANALYSIS_RUN_IN_WEB', 'true').lower() == 'true'
+    # Seconden die lopende analyses krijgen als de worker stopt; daarna terug naar de wachtrij.
+    ANALYSIS_WORKER_GRACE_S   = float(os.getenv('ANALYSIS_WORKER_GRACE_S', '60'))
+    # Nieuwe versie van een eerder geanalyseerd document (zelfde gebruiker en type, vergelijkbare
+    # naam of indeling): alleen gewijzigde secties opnieuw checken, zie analysis/versioning.py.
+    ANALYSIS_INCREMENTAL      = os.getenv('ANALYSIS_INCREMENTAL', 'true').lower() == 'true'
+    # Identiek bestand (SHA-256) al geanalyseerd voor hetzelfde type met dezelfde criteria:
+    # analyse overnemen in plaats van opnieuw uitvoeren, zie analysis/dedupe.py.
+    ANALYSIS_DEDUPE           = os.getenv('ANALYSIS_DEDUPE', 'true').lower() == 'true'
+    # Voortgangsstream (SSE, /api/analysis/<id>/events): interval waarmee de stream de
+    # database leest, en maximale duur van één verbinding (de browser verbindt daarna
+    # zelf opnieuw). Een open stream bezet een gunicorn-thread, zie Procfile (--threads).
+    ANALYSIS_SSE_INTERVAL_S   = float(os.getenv('ANALYSIS_SSE_INTERVAL_S', '0.5'))
+    ANALYSIS_SSE_MAX_S        = float(os.getenv('ANALYSIS_SSE_MAX_S', '120'))
+    # Batches (een klas inzendingen als ZIP of losse bestanden, zie analysis/batches.py):
+    # maximaal aantal bestanden en uitgepakte megabytes per batch, en het aantal jobs van
+    # één batch dat tegelijk mag lopen (0 = ANALYSIS_WORKERS - 1, zodat losse uploads niet
+    # achter een hele klas wachten). Het tempo wordt verder bepaald door de LLM-planner
+    # (LLM_MAX_CONCURRENT_CALLS, rate limits): verhoog ANALYSIS_WORKERS om die te benutten.
+    BATCH_MAX_FILES           = int(os.getenv('BATCH_MAX_FILES', '300'))
+    BATCH_MAX_UNPACKED_MB     = int(os.getenv('BATCH_MAX_UNPACKED_MB', '500'))
+    ANALYSIS_BATCH_MAX_RUNNING = int(os.getenv('ANALYSIS_BATCH_MAX_RUNNING', '0'))
+    # Planning van de wachtrij: een wachtende job schuift per zoveel seconden een
+    # prioriteitsklasse op (achtergrond → batch → interactief; 0 = nooit). Quota per
+    # organisatie (0 = onbeperkt, per organisatie te overschrijven in het beheer):
+    # gelijktijdig lopende jobs en tokens per uur (vereist LLM_TELEMETRY).
+    ANALYSIS_PRIORITY_AGING_S = float(os.getenv('ANALYSIS_PRIORITY_AGING_S', '900'))
+    ORG_MAX_RUNNING_JOBS      = int(os.getenv('ORG_MAX_RUNNING_JOBS', '0'))
+    ORG_MAX_TOKENS_PER_HOUR   = int(os.getenv('ORG_MAX_TOKENS_PER_HOUR', '0'))
+    # Criteria en verwachte secties per documenttype worden tussen analyses gedeeld zolang
+    # de configuratie-fingerprint gelijk is, maximaal zoveel seconden (0 = niet delen).
+    ANALYSIS_CONFIG_CACHE_S   = float(os.getenv('ANALYSIS_CONFIG_CACHE_S', '60'))
     
     # Export configuratie
     EXPORT_FOLDER = os.path.join(UPLOAD_FOLDER, 'exports')
@@ -412,12 +412,206 @@ def migrate_db(conn: sqlite3.Connection):
         cursor.execute("ALTER TABLE document_types ADD COLUMN organization_id INTEGER REFERENCES organizations(id)")
     if 'default_llm_role_prompt' not in dt_columns:
         cursor.execute("ALTER TABLE document_types ADD COLUMN default_llm_role_prompt TEXT")
+    if 'llm_token_budget' not in dt_columns:
+        # NULL = Config.LLM_CONTEXT_TOKEN_BUDGET
+        cursor.execute("ALTER TABLE document_types ADD COLUMN llm_token_budget INTEGER")
+    if 'llm_fast_model' not in dt_columns:
+        # NULL = Config.LLM_FAST_MODEL / Config.LLM_STRONG_MODEL
+        cursor.execute("ALTER TABLE document_types ADD COLUMN llm_fast_model TEXT")
+    if 'llm_strong_model' not in dt_columns:
+        cursor.execute("ALTER TABLE document_types ADD COLUMN llm_strong_model TEXT")
+
+    # --- Migratie: llm_calls tabel (telemetrie per LLM-call, zie analysis/llm_telemetry.py) ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS llm_calls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at DATETIME NOT NULL,
+            document_id INTEGER,
+            criterion_id INTEGER,
+            section_name TEXT,
+            label TEXT,
+            model TEXT,
+            tier TEXT,                       -- 'snel' / 'sterk' bij modelroutering
+            latency_ms INTEGER,
+            input_tokens INTEGER DEFAULT 0,
+            output_tokens INTEGER DEFAULT 0,
+            cache_created INTEGER DEFAULT 0,
+            cache_read INTEGER DEFAULT 0,
+            cost_usd REAL DEFAULT 0,
+            attempts INTEGER DEFAULT 1,
+            outcome TEXT,                    -- 'ok', 'rate_limit', 'fout', 'breaker_open'
+            failover INTEGER DEFAULT 0,
+            hedged INTEGER DEFAULT 0
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_calls_created_at ON llm_calls(created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_calls_document ON llm_calls(document_id)")
+
+    # --- Migratie: criterion_profile tabel (meetwaarden per criterium × sectie, zie analysis/criterion_profiler.py) ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS criterion_profile (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_at DATETIME NOT NULL,        -- starttijd van de generate_feedback-run
+            document_id INTEGER,
+            criterion_id INTEGER NOT NULL,
+            section_name TEXT,
+            check_type TEXT,
+            wall_ms REAL DEFAULT 0,
+            cpu_ms REAL DEFAULT 0,
+            llm_calls INTEGER DEFAULT 0,
+            llm_latency_ms REAL DEFAULT 0,
+            input_tokens INTEGER DEFAULT 0,
+            output_tokens INTEGER DEFAULT 0,
+            cache_tokens INTEGER DEFAULT 0,
+            retries INTEGER DEFAULT 0,
+            failed_calls INTEGER DEFAULT 0
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_criterion_profile_run ON criterion_profile(run_at)")
+
+    # --- Migratie: analysis_jobs tabel (duurzame analysewachtrij, zie analysis_queue.py) ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER NOT NULL,
+            kind TEXT NOT NULL DEFAULT 'full',       -- 'full' / 'partial' / 'criterion'
+            payload TEXT DEFAULT '{}',               -- JSON, bijv. secties bij 'partial'
+            status TEXT NOT NULL DEFAULT 'queued',   -- 'queued', 'running', 'done', 'failed', 'cancelled'
+            attempts INTEGER DEFAULT 0,
+            max_attempts INTEGER DEFAULT 3,
+            run_after DATETIME DEFAULT CURRENT_TIMESTAMP,   -- backoff: niet eerder claimen
+            lease_owner TEXT,                        -- host:pid:thread van de runner
+            lease_expires_at DATETIME,
+            heartbeat_at DATETIME,
+            last_error TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            started_at DATETIME,
+            finished_at DATETIME,
+            FOREIGN KEY (document_id) REFERENCES documents(id)
+        )
+    """)
+    # Eén actieve job per document: maakt enqueue idempotent en garandeert één runner
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_analysis_jobs_active ON analysis_jobs(document_id) "
+        "WHERE status IN ('queued', 'running')"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_analysis_jobs_status ON analysis_jobs(status, run_after)")
+
+    # --- Migratie: analysis_checkpoints tabel (tussenresultaten per job, zie analysis/checkpoints.py) ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_checkpoints (
+            job_id INTEGER NOT NULL,
+            document_id INTEGER NOT NULL,
+            stage TEXT NOT NULL,                     -- 'parsed', 'recognized', 'digest', 'fast', 'llm', 'holistic'
+            key TEXT NOT NULL DEFAULT '',            -- bij 'llm': criterium|sectie
+            payload TEXT NOT NULL,                   -- JSON
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (job_id, stage, key),
+            FOREIGN KEY (job_id) REFERENCES analysis_jobs(id)
+        )
+    """)
+
+    # --- Migratie: analysis_progress tabel (voortgang per document, zie analysis/progress.py) ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_progress (
+            document_id INTEGER PRIMARY KEY,
+            job_id INTEGER,
+            stage TEXT,                              -- 'parse', 'recognize', ..., 'save'
+            done INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            eta_s REAL,                              -- geschatte resterende seconden van de stap
+            seq INTEGER NOT NULL DEFAULT 0,          -- verhoogd bij elke update (SSE-endpoint)
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (document_id) REFERENCES documents(id)
+        )
+    """)
 
     # --- Migratie: uploaded_by kolom in documents ---
     existing_columns = [row[1] for row in cursor.execute("PRAGMA table_info(documents)").fetchall()]
     if 'uploaded_by' not in existing_columns:
         cursor.execute("ALTER TABLE documents ADD COLUMN uploaded_by INTEGER REFERENCES users(id)")
 
+    # --- Migratie: previous_version_id kolom in documents (versies, zie analysis/versioning.py) ---
+    if 'previous_version_id' not in existing_columns:
+        cursor.execute("ALTER TABLE documents ADD COLUMN previous_version_id INTEGER REFERENCES documents(id)")
+
+    # --- Migratie: file_hash en duplicate_of kolommen in documents (zie analysis/dedupe.py) ---
+    if 'file_hash' not in existing_columns:
+        cursor.execute("ALTER TABLE documents ADD COLUMN file_hash TEXT")
+    if 'duplicate_of' not in existing_columns:
+        cursor.execute("ALTER TABLE documents ADD COLUMN duplicate_of INTEGER REFERENCES documents(id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_file_hash ON documents(file_hash, document_type_id)")
+
+    # --- Migratie: configuratie-fingerprints (zie analysis/config_fingerprint.py) ---
+    if 'config_fingerprint' not in existing_columns:
+        cursor.execute("ALTER TABLE documents ADD COLUMN config_fingerprint TEXT")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS config_fingerprints (
+            document_type_id INTEGER PRIMARY KEY,
+            fingerprint TEXT NOT NULL,               -- hash over criteria, secties, mappings en prompts
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (document_type_id) REFERENCES document_types(id)
+        )
+    """)
+
+    # --- Migratie: herbeoordelingen van één criterium (zie analysis/reevaluation.py) ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS criterion_reevaluations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            criteria_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',  -- 'running', 'done', 'cancelled'
+            fingerprints TEXT DEFAULT '{}',          -- JSON {documenttype: [oud, nieuw]}
+            total INTEGER NOT NULL DEFAULT 0,        -- aantal jobs in de wachtrij gezet
+            skipped INTEGER NOT NULL DEFAULT 0,      -- documenten met al een actieve analyse
+            created_by INTEGER,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            finished_at DATETIME,
+            FOREIGN KEY (criteria_id) REFERENCES criteria(id)
+        )
+    """)
+
+    # --- Migratie: gecachete tekst en sectieherkenning (zie analysis/recognition_cache.py) ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS document_recognition_cache (
+            document_id INTEGER PRIMARY KEY,
+            file_hash TEXT NOT NULL,
+            sections_key TEXT NOT NULL,              -- hash van de verwachte secties
+            full_text TEXT,
+            sections TEXT,                           -- JSON: herkende secties incl. voetnoten
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (document_id) REFERENCES documents(id)
+        )
+    """)
+
+    # --- Migratie: batches van inzendingen (zie analysis/batches.py) ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_batches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            document_type_id INTEGER NOT NULL,
+            organization_id INTEGER,
+            skipped TEXT DEFAULT '[]',               -- JSON: bestanden uit het archief die niet zijn opgenomen
+            created_by INTEGER,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (document_type_id) REFERENCES document_types(id)
+        )
+    """)
+    if 'batch_id' not in existing_columns:
+        cursor.execute("ALTER TABLE documents ADD COLUMN batch_id INTEGER REFERENCES analysis_batches(id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_batch ON documents(batch_id)")
+
+    # --- Migratie: prioriteitsklassen en quota per organisatie (zie analysis_queue.py) ---
+    job_columns = [row[1] for row in cursor.execute("PRAGMA table_info(analysis_jobs)").fetchall()]
+    if 'priority' not in job_columns:
+        # 0 = interactief, 1 = batch, 2 = achtergrond
+        cursor.execute("ALTER TABLE analysis_jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("UPDATE analysis_jobs SET priority=2 WHERE kind='criterion'")
+    org_columns = [row[1] for row in cursor.execute("PRAGMA table_info(organizations)").fetchall()]
+    if org_columns and 'max_running_jobs' not in org_columns:
+        cursor.execute("ALTER TABLE organizations ADD COLUMN max_running_jobs INTEGER")      # NULL = standaard
+    if org_columns and 'max_tokens_per_hour' not in org_columns:
+        cursor.execute("ALTER TABLE organizations ADD COLUMN max_tokens_per_hour INTEGER")   # NULL = standaard
+
     # --- Migratie: check_type en parameters kolommen ---
     existing_columns = [row[1] for row in cursor.execute("PRAGMA table_info(criteria)").fetchall()]
 
@@ -481,6 +675,29 @@ def get_or_create_document(conn: sqlite3.Connection, name: str, file_path: str):
         conn.commit()
         return cursor.lastrowid
 
+def get_expected_sections(conn: sqlite3.Connection, document_type_id: int) -> list:
+    """
+    Secties die de sectieherkenning voor dit documenttype verwacht: eigen secties,
+    gekoppelde secties en algemene secties die aan geen enkel type gekoppeld zijn.
+    """
+    return conn.execute(
+        '''SELECT DISTINCT s.id, s.name, s.level, s.identifier, s.is_required,
+                  s.parent_id, s.alternative_names, s.order_index
+           FROM sections s
+           LEFT JOIN document_type_sections dts ON s.id = dts.section_id
+           WHERE s.document_type_id = :dt_id
+              OR dts.document_type_id = :dt_id
+              OR (s.document_type_id IS NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM document_type_sections dts2
+                      WHERE dts2.section_id = s.id
+                  ))
+           ORDER BY
+               CASE WHEN s.document_type_id IS NULL THEN 0 ELSE 1 END,
+               s.order_index''',
+        {'dt_id': document_type_id}
+    ).fetchall()
+
 def get_document_type_by_identifier(conn: sqlite3.Connection, identifier: str):
     """Haalt documenttype metadata op basis van identifier."""
     cursor = conn.cursor()
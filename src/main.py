@@ -83,28 +83,31 @@ print("[INIT] Initialiseren van database optimalisaties...")
 initialize_sqlite_optimizer(DATABASE)
 optimize_database_for_multiple_users()
 
-# ── Stuck-analyse reset bij opstarten ────────────────────────────────────────
-# Documenten die bij een vorige run op 'analyzing' bleven staan (bijv. door
-# een herstart midden in de analyse) worden teruggedraaid naar 'failed'.
-# De gebruiker kan ze daarna met één klik heranalyseren.
-import sqlite3 as _sqlite3
-def _reset_stuck_analyses():
+# Telemetrie per LLM-call (tabel llm_calls) gebundeld op de achtergrond wegschrijven
+from analysis import llm_telemetry
+llm_telemetry.start_writer(DATABASE)
+
+# ── Analysewachtrij ──────────────────────────────────────────────────────────
+# Analyses lopen via de duurzame wachtrij (analysis_jobs, zie analysis_queue.py).
+# Bij opstarten worden analyses die bij een vorige run op 'analyzing' bleven staan
+# opnieuw ingepland; jobs van een gestopt proces worden na hun lease overgenomen.
+import analysis_queue
+
+# Alleen uitvoeren in de werkelijke worker-process (niet in de reloader-parent), en
+# niet als de analyses in een los proces draaien (ANALYSIS_RUN_IN_WEB=false,
+# zie analysis_worker.py): dat proces doet het herstel dan zelf bij het opstarten.
+from config import Config as _Config
+if _Config.ANALYSIS_RUN_IN_WEB and (os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not app.debug):
     try:
-        _db = _sqlite3.connect(DATABASE)
-        result = _db.execute(
-            "UPDATE documents SET analysis_status='failed' "
-            "WHERE analysis_status='analyzing'"
-        )
-        if result.rowcount:
-            print(f"[INIT] {result.rowcount} vastgelopen analyse(s) teruggezet naar 'failed'.")
-        _db.commit()
-        _db.close()
+        _requeued = analysis_queue.recover_interrupted(DATABASE)
+        if _requeued:
+            print(f"[INIT] {_requeued} onderbroken analyse(s) opnieuw in de wachtrij gezet.")
     except Exception as _e:
-        print(f"[INIT] Waarschuwing: stuck-reset mislukt: {_e}")
-
-# Alleen uitvoeren in de werkelijke worker-process (niet in de reloader-parent)
-if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not app.debug:
-    _reset_stuck_analyses()
+        print(f"[INIT] Waarschuwing: herstel van onderbroken analyses mislukt: {_e}")
+    analysis_queue.start_workers(app, DATABASE)
+elif not _Config.ANALYSIS_RUN_IN_WEB:
+    print("[INIT] ANALYSIS_RUN_IN_WEB=false: analyses worden alleen uitgevoerd door "
+          "src/analysis_worker.py; zonder draaiende worker blijven jobs in de wachtrij.")
 
 # ── Context processor ─────────────────────────────────────────────────────────
 @app.context_processor
@@ -114,13 +117,13 @@ def inject_global_data():
 # ── Route-functies importeren ─────────────────────────────────────────────────
 from routes.auth import login, logout, index, demo_loader
 from routes.documents import (
-    upload_document, api_upload_document, list_documents,
-    analysis_status_api, document_analysis, export_document, export_select,
+    upload_document, api_upload_document, api_create_batch, api_batch_status, export_batch, list_documents,
+    analysis_status_api, analysis_events_api, analysis_queue_api, document_analysis, export_document, export_select,
     reanalyze_partial, reanalyze_document,
 )
 from routes.criteria import (
     list_criteria, add_criterion, edit_criterion, delete_criterion,
-    map_criteria_to_sections,
+    map_criteria_to_sections, criterion_reevaluation_api, cancel_criterion_reevaluation,
     list_criteria_templates, add_criteria_template,
     list_document_type_criteria, add_criteria_to_document_type,
     edit_criteria_instance, delete_criteria_instance,
@@ -130,6 +133,7 @@ from routes.sections import (
 )
 from routes.document_types import (
     list_document_types, add_document_type, edit_document_type, delete_document_type,
+    plan_document_type, document_type_fingerprint_api,
     list_organization_document_types, add_organization_document_type,
     manage_document_type_sections, add_section_to_document_type,
     remove_section_from_document_type,
@@ -156,8 +160,13 @@ R('/demo_loader', 'demo_loader', demo_loader)
 # Documenten
 R('/upload',                              'upload_document',    upload_document,    methods=['GET', 'POST'])
 R('/api/upload',                          'api_upload_document', api_upload_document, methods=['POST'])
+R('/api/batches',                         'api_create_batch',   api_create_batch, methods=['POST'])
+R('/api/batches/<int:batch_id>',          'api_batch_status',   api_batch_status)
+R('/api/batches/<int:batch_id>/export',   'export_batch',       export_batch)
 R('/documents',                           'list_documents',     list_documents)
 R('/api/analysis/<int:document_id>/status', 'analysis_status_api', analysis_status_api)
+R('/api/analysis/<int:document_id>/events', 'analysis_events_api', analysis_events_api)
+R('/api/analysis/queue',                  'analysis_queue_api', analysis_queue_api)
 R('/analysis/<int:document_id>',          'document_analysis',  document_analysis)
 R('/documents/<int:document_id>/export',            'export_document',   export_document)
 R('/documents/<int:document_id>/export-select',    'export_select',     export_select,     methods=['GET', 'POST'])
@@ -170,6 +179,8 @@ R('/criteria/add',                      'add_criterion',         add_criterion,
 R('/criteria/edit/<int:id>',            'edit_criterion',        edit_criterion,       methods=['GET', 'POST'])
 R('/criteria/delete/<int:id>',          'delete_criterion',      delete_criterion,     methods=['POST'])
 R('/criteria/<int:id>/map_sections',    'map_criteria_to_sections', map_criteria_to_sections, methods=['GET', 'POST'])
+R('/criteria/reevaluations/<int:batch_id>/cancel', 'cancel_criterion_reevaluation', cancel_criterion_reevaluation, methods=['POST'])
+R('/api/criteria/reevaluations/<int:batch_id>',    'criterion_reevaluation_api',    criterion_reevaluation_api)
 R('/criteria_templates',                'list_criteria_templates',  list_criteria_templates)
 R('/criteria_templates/add',            'add_criteria_template',    add_criteria_template, methods=['GET', 'POST'])
 
@@ -190,6 +201,8 @@ R('/document_types',                     'list_document_types',  list_document_t
 R('/document_types/add',                 'add_document_type',    add_document_type,   methods=['GET', 'POST'])
 R('/document_types/edit/<int:id>',       'edit_document_type',   edit_document_type,  methods=['GET', 'POST'])
 R('/document_types/delete/<int:id>',     'delete_document_type', delete_document_type, methods=['POST'])
+R('/document_types/<int:id>/plan',       'plan_document_type',   plan_document_type,  methods=['GET', 'POST'])
+R('/api/document_types/<int:id>/fingerprint', 'document_type_fingerprint_api', document_type_fingerprint_api)
 R('/document_types/organization/<int:org_id>',      'list_organization_document_types',  list_organization_document_types)
 R('/document_types/organization/<int:org_id>/add',  'add_organization_document_type',    add_organization_document_type, methods=['GET', 'POST'])
 R('/document_types/<int:doc_type_id>/sections/manage', 'manage_document_type_sections',  manage_document_type_sections)
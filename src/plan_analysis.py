@@ -0,0 +1,117 @@
+"""
+plan_analysis.py  -  Dry-run van een analyse: LLM-calls, tokens, kosten en doorlooptijd (CLI)
+
+Roept geen enkele LLM-provider aan. Zie analysis/dry_run.py voor de rekenwijze.
+
+Gebruik:
+    python src/plan_analysis.py --type 3                      # meest recente document van type 3
+    python src/plan_analysis.py --type 3 --file voorbeeld.docx --count 300
+    python src/plan_analysis.py --document 17 --count 300 --calls
+    python src/plan_analysis.py --type 3 --json               # volledige planning als JSON
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+# Pad instellen zodat imports werken (zelfde als main.py)
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, THIS_DIR)
+
+from analysis import dry_run
+
+DB_PATH = os.path.join(os.environ.get('INSTANCE_PATH', os.path.join(THIS_DIR, '..', 'instance')), 'documents.db')
+
+SEP = '-' * 72
+
+
+def _duration(seconds: float) -> str:
+    minutes, sec = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}u {minutes:02d}m" if hours else f"{minutes}m {sec:02d}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dry-run van een analyse (geen LLM-calls).')
+    parser.add_argument('--type', type=int, help='documenttype-ID')
+    parser.add_argument('--document', type=int, help='bestaand document als voorbeeld (ID)')
+    parser.add_argument('--file', help='voorbeeldbestand (.docx) in plaats van een bestaand document')
+    parser.add_argument('--count', type=int, default=1, help='aantal inzendingen voor de batch-projectie')
+    parser.add_argument('--calls', action='store_true', help='elke geplande call tonen')
+    parser.add_argument('--json', action='store_true', help='volledige planning als JSON')
+    parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    conn.row_factory = sqlite3.Row
+
+    file_path, doc_type_id = args.file, args.type
+    if not file_path:
+        if args.document:
+            doc = conn.execute('SELECT * FROM documents WHERE id=?', (args.document,)).fetchone()
+        elif doc_type_id:
+            doc = conn.execute('SELECT * FROM documents WHERE document_type_id=? ORDER BY id DESC LIMIT 1',
+                               (doc_type_id,)).fetchone()
+        else:
+            parser.error('geef --type, --document of --file op')
+        if not doc:
+            print('Geen voorbeelddocument gevonden; geef er een op met --file.')
+            sys.exit(1)
+        file_path = doc['file_path']
+        doc_type_id = doc_type_id or doc['document_type_id']
+    if not doc_type_id:
+        parser.error('--type is verplicht bij --file')
+    if not os.path.exists(file_path):
+        print(f'BESTAND NIET GEVONDEN: {file_path}')
+        sys.exit(1)
+
+    plan = dry_run.plan_for_file(conn, doc_type_id, file_path, documents=args.count)
+
+    if args.json:
+        print(json.dumps(plan, indent=2, ensure_ascii=False))
+        return
+
+    t, d = plan['totals'], plan['duration']
+    print(f'\n=== Dry-run documenttype {doc_type_id} ===')
+    print(f'Voorbeeld : {file_path}')
+    print(SEP)
+    print(f"LLM-calls per document : {t['calls']}  (+ {t['fast_checks']} lokale checks, "
+          f"{t['overlap_saved']} overlappende beoordelingen samengevoegd)")
+    for phase, p in plan['per_phase'].items():
+        if p['calls']:
+            print(f"  {phase:<11}: {p['calls']:>4} calls  input {p['input_tokens']:>8}  "
+                  f"cache w/r {p['cache_created']:>7}/{p['cache_read']:>8}  output {p['output_tokens']:>7}  "
+                  f"${p['cost_usd']:.4f}")
+    print(f"Cache-hit ratio        : {t['cache_hit_ratio']:.0%}")
+    print(f"Kosten per document    : ${t['cost_usd']:.4f}")
+    if plan['escalation']['max_calls']:
+        print(f"Escalaties (bovengrens): {plan['escalation']['max_calls']} calls, "
+              f"+${plan['escalation']['max_cost_usd']:.4f} per document")
+    print(f"Doorlooptijd document  : {_duration(d['per_document_s'])}  "
+          f"({d['workers']} workers, {d['concurrent_calls']} gelijktijdige calls)")
+    print(SEP)
+    print(f"Batch van {plan['documents']} : ${plan['batch_cost_usd']:.2f}, {_duration(d['batch_s'])}"
+          + ('  (begrensd door de rate limits van het account)' if d['rate_limited'] else ''))
+    if not plan['assumptions']['measured_models']:
+        print(f"Let op: geen gemeten latency/output (llm_calls); aanname "
+              f"{plan['assumptions']['default_output_tokens']} output-tokens, "
+              f"{plan['assumptions']['default_latency']} per call.")
+
+    print(f'\nDuurste criteria:')
+    for c in plan['per_criterion'][:10]:
+        print(f"  [{c['criterion_id']:>4}] {c['name'][:40]:<40} {c['calls']:>3} calls  "
+              f"{c['sections']:>2} secties  ${c['cost_usd']:.4f}")
+
+    if args.calls:
+        print(f'\nGeplande calls:')
+        for c in plan['calls']:
+            print(f"  {c['phase']:<10} {c['model']:<20} prefix {c['prefix_tokens']:>6}  "
+                  f"rest {c['uncached_tokens']:>5}  "
+                  f"{'cache-write' if c['cache_created'] else 'cache-read ' if c['cache_read'] else 'geen cache '}  "
+                  f"{c['label']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,13 @@
 import json
 import traceback
 
-from flask import render_template, request, redirect, url_for, flash
+from flask import render_template, request, redirect, url_for, flash, jsonify
 
 from database import get_db
-from auth import admin_required
+from auth import admin_required, current_user_id
+from config import Config
+from analysis import criterion_profiler
+from analysis import config_fingerprint, reevaluation
 
 
 @admin_required
@@ -20,7 +23,11 @@ def list_criteria():
         LEFT JOIN organizations o ON c.organization_id = o.id
         ORDER BY c.name
     ''').fetchall()
-    return render_template('criteria_list.html', criteria=criteria)
+    # Kosten per criterium over de laatste analyses (CRITERION_PROFILING)
+    profile = criterion_profiler.get_criteria_profile(db, Config.CRITERION_PROFILE_RUNS)
+    return render_template('criteria_list.html', criteria=criteria, profile=profile,
+                           profile_runs=Config.CRITERION_PROFILE_RUNS,
+                           reevaluations=reevaluation.recent(db))
 
 
 def _build_parameters(check_type, form):
@@ -34,12 +41,17 @@ def _build_parameters(check_type, form):
             ensure_ascii=False
         ) if kw_list else json.dumps({'show_suggestion': show_suggestion})
     elif check_type == 'llm_review':
-        return json.dumps({
+        params = {
             'llm_role_prompt':     form.get('llm_role_prompt', '').strip(),
             'llm_criteria_prompt': form.get('llm_criteria_prompt', '').strip(),
             'llm_check_ai_style':  bool(form.get('llm_check_ai_style')),
             'show_suggestion':     show_suggestion,
-        }, ensure_ascii=False)
+        }
+        # Modelroutering: leeg = instelling van het documenttype / Config
+        for key in ('llm_fast_model', 'llm_strong_model'):
+            if form.get(key, '').strip():
+                params[key] = form.get(key).strip()
+        return json.dumps(params, ensure_ascii=False)
     else:
         return json.dumps({'show_suggestion': show_suggestion})
 
@@ -88,6 +100,7 @@ def add_criterion():
                      check_type, parameters)
                 )
                 db.commit()
+                config_fingerprint.refresh_all(db)
                 flash('Criterium succesvol toegevoegd!', 'success')
                 return redirect(url_for('list_criteria'))
             except Exception as e:
@@ -134,6 +147,10 @@ def edit_criterion(id):
             flash('Naam is verplicht!', 'danger')
         else:
             try:
+                # Fingerprints van vóór de wijziging: documenten die daarmee bij waren, zijn
+                # na een herbeoordeling weer bij (zie analysis/reevaluation.py)
+                before = {t: config_fingerprint.current(db, t)
+                          for t in reevaluation.affected_document_types(db, id)}
                 db.execute(
                     '''UPDATE criteria
                        SET name=?, description=?, organization_id=?,
@@ -151,7 +168,14 @@ def edit_criterion(id):
                      check_type, parameters, id)
                 )
                 db.commit()
+                after = config_fingerprint.refresh_all(db)
                 flash('Criterium succesvol bijgewerkt!', 'success')
+                if request.form.get('reevaluate_existing'):
+                    batch_id = reevaluation.start(
+                        db, id, {t: (fp, after.get(t)) for t, fp in before.items()}, current_user_id())
+                    total = reevaluation.status(db, batch_id)['total']
+                    flash(f'Herbeoordeling gestart voor {total} document(en); '
+                          f'de voortgang staat bovenaan deze pagina.', 'success')
                 return redirect(url_for('list_criteria'))
             except Exception as e:
                 flash(f'Fout bij bijwerken: {e}', 'danger')
@@ -163,6 +187,8 @@ def edit_criterion(id):
     llm_role_prompt     = ''
     llm_criteria_prompt = ''
     llm_check_ai_style  = False
+    llm_fast_model      = ''
+    llm_strong_model    = ''
     show_suggestion     = True
     try:
         params = json.loads(dict(criterion).get('parameters') or '{}')
@@ -170,6 +196,8 @@ def edit_criterion(id):
         llm_role_prompt     = params.get('llm_role_prompt', '')
         llm_criteria_prompt = params.get('llm_criteria_prompt', '')
         llm_check_ai_style  = bool(params.get('llm_check_ai_style', False))
+        llm_fast_model      = params.get('llm_fast_model', '')
+        llm_strong_model    = params.get('llm_strong_model', '')
         show_suggestion     = params.get('show_suggestion', True)
     except (json.JSONDecodeError, TypeError, KeyError):
         pass
@@ -181,6 +209,8 @@ def edit_criterion(id):
                            llm_role_prompt=llm_role_prompt,
                            llm_criteria_prompt=llm_criteria_prompt,
                            llm_check_ai_style=llm_check_ai_style,
+                           llm_fast_model=llm_fast_model,
+                           llm_strong_model=llm_strong_model,
                            show_suggestion=show_suggestion,
                            current_doc_type_id=None)
 
@@ -197,6 +227,7 @@ def delete_criterion(id):
         try:
             db.execute('DELETE FROM criteria WHERE id=?', (id,))
             db.commit()
+            config_fingerprint.refresh_all(db)
             flash('Criterium succesvol verwijderd!', 'success')
         except Exception as e:
             flash(f'Fout bij verwijderen: {e}', 'danger')
@@ -238,6 +269,7 @@ def map_criteria_to_sections(id):
                         (id, section_id)
                     )
             db.commit()
+            config_fingerprint.refresh_all(db)
             flash('Sectie mappings en toepassingsgebied succesvol bijgewerkt!', 'success')
             return redirect(url_for('list_criteria'))
         except Exception as e:
@@ -420,3 +452,21 @@ def delete_criteria_instance(instance_id):
             traceback.print_exc()
 
     return redirect(url_for('list_document_types'))
+
+
+@admin_required
+def criterion_reevaluation_api(batch_id):
+    """JSON: voortgang van een herbeoordeling."""
+    state = reevaluation.status(get_db(), batch_id)
+    if state is None:
+        return jsonify({'error': 'not_found'}), 404
+    return jsonify(state)
+
+
+@admin_required
+def cancel_criterion_reevaluation(batch_id):
+    """Annuleer een lopende herbeoordeling."""
+    db = get_db()
+    removed = reevaluation.cancel(db, batch_id)
+    flash(f'Herbeoordeling geannuleerd ({removed} wachtende document(en) niet meer beoordeeld).', 'success')
+    return redirect(url_for('list_criteria'))
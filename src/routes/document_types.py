@@ -1,12 +1,16 @@
 # src/routes/document_types.py
 """Document types management routes."""
 
+import os
+import tempfile
 import traceback
 
-from flask import render_template, request, redirect, url_for, flash
+from flask import render_template, request, redirect, url_for, flash, jsonify
+from werkzeug.utils import secure_filename
 
 from database import get_db
 from auth import admin_required
+from analysis import config_fingerprint
 
 
 @admin_required
@@ -60,23 +64,97 @@ def edit_document_type(id):
         identifier              = request.form['identifier']
         default_llm_role_prompt = request.form.get('default_llm_role_prompt', '').strip()
         show_suggestions        = 1 if request.form.get('show_suggestions') else 0
+        llm_token_budget        = request.form.get('llm_token_budget', type=int)
+        llm_fast_model          = request.form.get('llm_fast_model', '').strip()
+        llm_strong_model        = request.form.get('llm_strong_model', '').strip()
 
         if not name or not identifier:
             flash('Naam en identifier zijn verplicht!', 'danger')
+        elif llm_token_budget is not None and llm_token_budget < 1000:
+            flash('Tokenbudget moet minimaal 1000 zijn (of leeg voor de standaard).', 'danger')
         else:
             try:
                 db.execute(
-                    'UPDATE document_types SET name=?, identifier=?, default_llm_role_prompt=?, show_suggestions=? WHERE id=?',
-                    (name, identifier, default_llm_role_prompt or None, show_suggestions, id)
+                    'UPDATE document_types SET name=?, identifier=?, default_llm_role_prompt=?, show_suggestions=?, '
+                    'llm_token_budget=?, llm_fast_model=?, llm_strong_model=? WHERE id=?',
+                    (name, identifier, default_llm_role_prompt or None, show_suggestions,
+                     llm_token_budget, llm_fast_model or None, llm_strong_model or None, id)
                 )
                 db.commit()
+                config_fingerprint.refresh(db, id)
                 flash('Document type succesvol bijgewerkt!', 'success')
                 return redirect(url_for('list_document_types'))
             except Exception as e:
                 flash(f'Fout bij bijwerken: {e}', 'danger')
                 traceback.print_exc()
 
-    return render_template('edit_document_type.html', document_type=document_type)
+    from config import Config
+    return render_template('edit_document_type.html', document_type=document_type,
+                           default_token_budget=Config.LLM_CONTEXT_TOKEN_BUDGET,
+                           default_fast_model=Config.LLM_FAST_MODEL,
+                           default_strong_model=Config.LLM_STRONG_MODEL)
+
+
+@admin_required
+def plan_document_type(id):
+    """Dry-run: geplande LLM-calls, tokens, kosten en doorlooptijd voor dit documenttype."""
+    from analysis import dry_run
+
+    db = get_db()
+    document_type = db.execute('SELECT * FROM document_types WHERE id=?', (id,)).fetchone()
+    if document_type is None:
+        flash('Document type niet gevonden.', 'danger')
+        return redirect(url_for('list_document_types'))
+
+    # Voorbeelden: eerdere inzendingen van dit type waarvan het bestand nog bestaat
+    samples = [d for d in db.execute(
+        'SELECT id, original_filename, file_path, uploaded_at FROM documents '
+        'WHERE document_type_id=? ORDER BY id DESC LIMIT 20', (id,)
+    ).fetchall() if d['file_path'] and os.path.exists(d['file_path'])]
+
+    count = max(1, request.values.get('count', 1, type=int) or 1)
+    plan, sample_name, tmp_path = None, None, None
+    try:
+        upload = request.files.get('sample')
+        if request.method == 'POST' and upload and upload.filename:
+            sample_name = upload.filename
+            fd, tmp_path = tempfile.mkstemp(suffix='_' + secure_filename(upload.filename))
+            os.close(fd)
+            upload.save(tmp_path)
+            file_path = tmp_path
+        else:
+            document_id = request.values.get('document_id', type=int)
+            sample = next((d for d in samples if d['id'] == document_id), samples[0] if samples else None)
+            file_path = sample['file_path'] if sample else None
+            sample_name = sample['original_filename'] if sample else None
+
+        if file_path:
+            plan = dry_run.plan_for_file(db, id, file_path, documents=count)
+        elif request.method == 'POST':
+            flash('Kies een voorbeelddocument of upload een bestand.', 'danger')
+    except Exception as e:
+        flash(f'Fout bij dry-run: {e}', 'danger')
+        traceback.print_exc()
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return render_template('plan_document_type.html', document_type=document_type,
+                           samples=samples, sample_name=sample_name, count=count, plan=plan)
+
+
+@admin_required
+def document_type_fingerprint_api(id):
+    """JSON: configuratie-fingerprint van een documenttype en de analyses die daardoor verouderd zijn."""
+    db = get_db()
+    if db.execute('SELECT 1 FROM document_types WHERE id=?', (id,)).fetchone() is None:
+        return jsonify({'error': 'not_found'}), 404
+    fingerprint = config_fingerprint.current(db, id)
+    updated_at = db.execute('SELECT updated_at FROM config_fingerprints WHERE document_type_id=?',
+                            (id,)).fetchone()[0]
+    stale = config_fingerprint.stale_documents(db, id)
+    return jsonify({'document_type_id': id, 'fingerprint': fingerprint, 'updated_at': updated_at,
+                    'stale_count': len(stale), 'stale_documents': stale})
 
 
 @admin_required
@@ -90,6 +168,7 @@ def delete_document_type(id):
     else:
         try:
             db.execute('DELETE FROM document_types WHERE id=?', (id,))
+            db.execute('DELETE FROM config_fingerprints WHERE document_type_id=?', (id,))
             db.commit()
             flash('Document type succesvol verwijderd!', 'success')
         except Exception as e:
@@ -188,6 +267,7 @@ def add_section_to_document_type(doc_type_id):
                 (doc_type_id, section_id)
             )
             db.commit()
+            config_fingerprint.refresh(db, doc_type_id)
             flash('Sectie succesvol toegevoegd aan document type!', 'success')
         except Exception as e:
             flash(f'Fout bij toevoegen: {e}', 'danger')
@@ -205,6 +285,7 @@ def remove_section_from_document_type(doc_type_id, section_id):
             (doc_type_id, section_id)
         )
         db.commit()
+        config_fingerprint.refresh(db, doc_type_id)
         flash('Sectie succesvol verwijderd van document type!', 'success')
     except Exception as e:
         flash(f'Fout bij verwijderen: {e}', 'danger')
@@ -1,27 +1,26 @@
 # src/routes/documents.py
-"""Document-routes: upload, overzicht, analyse, export, heranalyse, status-API."""
+"""Document-routes: upload, batches, overzicht, analyse, export, heranalyse, status-API en voortgangsstream."""
 
 import os
 import re
 import json
+import time
 import sqlite3
-import threading
 import traceback
 import uuid as _uuid
 
 from flask import (
     render_template, request, redirect, url_for, flash,
-    session, jsonify, send_file, current_app
+    session, jsonify, send_file, current_app, Response, stream_with_context
 )
 from werkzeug.utils import secure_filename
 
 from database import get_db
 from auth import login_required, admin_required, current_user_id, is_admin
-from analysis_runner import (
-    _analysis_in_progress, _analysis_lock,
-    run_analysis_background, run_partial_reanalysis_background,
-)
+import analysis_queue
 from analysis.inline_word_comments import add_inline_comments
+from analysis.progress import read_progress
+from analysis import batches, config_fingerprint, dedupe, versioning
 import db_utils
 
 
@@ -64,6 +63,8 @@ def upload_document():
                 file.save(file_path)
 
                 document_id = db_utils.get_or_create_document(db, original_filename, file_path)
+                # Identiek bestand al geanalyseerd (zelfde type en criteria): resultaat overnemen
+                source_id = dedupe.dedupe_upload(db, document_id, file_path, document_type_id)
 
                 file_size = os.path.getsize(file_path)
                 db.execute(
@@ -71,10 +72,14 @@ def upload_document():
                     'file_size=?, analysis_status=?, uploaded_by=?, '
                     'uploaded_at=CURRENT_TIMESTAMP WHERE id=?',
                     (document_type_id, organization_id, file_size,
-                     'pending', current_user_id(), document_id)
+                     'pending' if source_id is None else 'completed', current_user_id(), document_id)
                 )
                 db.commit()
+                versioning.link_previous_version(db, document_id)
 
+                if source_id is not None:
+                    flash('Dit bestand is al eerder geanalyseerd; de resultaten zijn overgenomen.', 'success')
+                    return redirect(url_for('document_analysis', document_id=document_id))
                 flash('Document succesvol geupload! Starten met analyse...', 'success')
                 return redirect(url_for('document_analysis', document_id=document_id))
 
@@ -88,6 +93,34 @@ def upload_document():
                            form_data=form_data)
 
 
+def _register_upload(db, original_filename, file_path, document_type_id, organization_id,
+                     batch_id=None):
+    """
+    Leg een opgeslagen upload vast als document (versies, dedupe) en zet het zo nodig in
+    de wachtrij. Retourneert (document_id, source_id); source_id is het document waarvan
+    de analyse is overgenomen, of None.
+    """
+    db.execute(
+        '''INSERT INTO documents
+           (name, original_filename, file_path, file_size,
+            document_type_id, organization_id, analysis_status, uploaded_by, batch_id)
+           VALUES (?,?,?,?,?,?,?,?,?)''',
+        (original_filename, original_filename, file_path,
+         os.path.getsize(file_path),
+         document_type_id, organization_id or None,
+         'pending', current_user_id(), batch_id)
+    )
+    db.commit()
+    document_id = db.execute('SELECT last_insert_rowid()').fetchone()[0]
+    versioning.link_previous_version(db, document_id)
+
+    # Identiek bestand al geanalyseerd: resultaat overnemen, anders direct in de wachtrij
+    source_id = dedupe.dedupe_upload(db, document_id, file_path, document_type_id)
+    if source_id is None:
+        analysis_queue.enqueue(db, document_id, 'full')
+    return document_id, source_id
+
+
 @login_required
 def api_upload_document():
     """JSON-endpoint voor de watcher: upload document, geef direct het document_id terug."""
@@ -109,34 +142,10 @@ def api_upload_document():
         file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
         file.save(file_path)
 
-        db.execute(
-            '''INSERT INTO documents
-               (name, original_filename, file_path, file_size,
-                document_type_id, organization_id, analysis_status, uploaded_by)
-               VALUES (?,?,?,?,?,?,?,?)''',
-            (original_filename, original_filename, file_path,
-             os.path.getsize(file_path),
-             document_type_id, organization_id or None,
-             'pending', current_user_id())
-        )
-        db.commit()
-        document_id = db.execute('SELECT last_insert_rowid()').fetchone()[0]
-
-        # Start achtergrond-analyse direct
-        flask_app = current_app._get_current_object()
-        database  = current_app.config['DATABASE']
-        with _analysis_lock:
-            if document_id not in _analysis_in_progress:
-                _analysis_in_progress.add(document_id)
-                db.execute('UPDATE documents SET analysis_status=? WHERE id=?',
-                           ('analyzing', document_id))
-                db.commit()
-                threading.Thread(
-                    target=run_analysis_background,
-                    args=(document_id, flask_app, database),
-                    daemon=True,
-                ).start()
-
+        document_id, source_id = _register_upload(db, original_filename, file_path,
+                                                  document_type_id, organization_id)
+        if source_id is not None:
+            return jsonify({'document_id': document_id, 'duplicate_of': source_id}), 201
         return jsonify({'document_id': document_id}), 201
 
     except Exception as exc:
@@ -144,6 +153,99 @@ def api_upload_document():
         return jsonify({'error': str(exc)}), 500
 
 
+def _batch_or_404(db, batch_id):
+    """De batch als de gebruiker hem mag zien (admin of aanmaker), anders None."""
+    batch = batches.get(db, batch_id)
+    if batch is None or not (is_admin() or batch['created_by'] == current_user_id()):
+        return None
+    return batch
+
+
+@login_required
+def api_create_batch():
+    """
+    JSON-endpoint: een batch inzendingen als ZIP-archief ('archive') en/of meerdere
+    bestanden ('files'). Elk .docx-bestand wordt een document in de wachtrij.
+    """
+    document_type_id = request.form.get('document_type_id') or request.form.get('document_type')
+    organization_id  = request.form.get('organization_id')  or request.form.get('organization')
+    archive = request.files.get('archive')
+    files = [f for f in request.files.getlist('files') if f and f.filename]
+
+    if not document_type_id:
+        return jsonify({'error': 'document_type_id vereist'}), 400
+    if not (archive and archive.filename) and not files:
+        return jsonify({'error': 'Geen bestanden (archive of files)'}), 400
+
+    db = get_db()
+    folder = current_app.config['UPLOAD_FOLDER']
+    saved, skipped = [], []
+    try:
+        if archive and archive.filename:
+            saved, skipped = batches.extract_archive(archive.stream, folder)
+        batches.save_uploads(files, folder, saved, skipped)
+    except batches.BatchError as exc:
+        batches.discard(saved)
+        return jsonify({'error': str(exc)}), 400
+    if not saved:
+        return jsonify({'error': 'Geen .docx-bestanden gevonden',
+                        'skipped': [{'name': n, 'reason': r} for n, r in skipped]}), 400
+
+    try:
+        batch_id = batches.create(db, document_type_id, organization_id,
+                                  request.form.get('name') or (archive.filename if archive else None),
+                                  current_user_id(), skipped)
+        for original_filename, path in saved:
+            _register_upload(db, original_filename, path, document_type_id, organization_id, batch_id)
+    except Exception as exc:
+        traceback.print_exc()
+        return jsonify({'error': str(exc)}), 500
+    return jsonify(batches.status(db, batch_id)), 201
+
+
+@login_required
+def api_batch_status(batch_id):
+    """JSON-endpoint: samengevoegde status van een batch."""
+    db = get_db()
+    if _batch_or_404(db, batch_id) is None:
+        return jsonify({'error': 'Batch niet gevonden'}), 404
+    return jsonify(batches.status(db, batch_id))
+
+
+@login_required
+def export_batch(batch_id):
+    """Eén ZIP met de gecommentarieerde Word-bestanden van de batch (409 zolang hij loopt)."""
+    db = get_db()
+    if _batch_or_404(db, batch_id) is None:
+        return jsonify({'error': 'Batch niet gevonden'}), 404
+    state = batches.status(db, batch_id)
+    if state['status'] != 'done' and request.args.get('partial') != '1':
+        return jsonify({'error': 'Batch is nog niet klaar', **state}), 409
+    export_filename = f"batch_{batch_id}_gecommentarieerd.zip"
+    export_path = os.path.join(current_app.config['UPLOAD_FOLDER'], export_filename)
+    batches.export_zip(db, batch_id, export_path)
+    return send_file(export_path, as_attachment=True, download_name=export_filename)
+
+
+@admin_required
+def analysis_queue_api():
+    """JSON-endpoint (admin): wachtrij per prioriteitsklasse en gebruik en quota per organisatie."""
+    db = get_db()
+    classes = {name: {'queued': 0, 'running': 0} for name in analysis_queue.PRIORITY_CLASSES.values()}
+    for priority, status, count in db.execute(
+        "SELECT priority, status, COUNT(*) FROM analysis_jobs WHERE status IN ('queued', 'running') "
+        "GROUP BY priority, status"
+    ).fetchall():
+        classes[analysis_queue.PRIORITY_CLASSES.get(priority, 'interactive')][status] += count
+    names = dict(db.execute('SELECT id, name FROM organizations').fetchall())
+    organizations = [
+        {'id': org_id, 'name': names.get(org_id), **usage}
+        for org_id, usage in sorted(analysis_queue.organization_usage(db).items(),
+                                    key=lambda item: (item[0] is None, item[0] or 0))
+    ]
+    return jsonify({'classes': classes, 'organizations': organizations})
+
+
 @login_required
 def list_documents():
     """Overzichtspagina van geuploadde documenten.
@@ -175,14 +277,119 @@ def list_documents():
 
 @login_required
 def analysis_status_api(document_id):
-    """JSON-endpoint: geeft de huidige analysestatus terug (voor polling)."""
+    """JSON-endpoint: geeft de huidige analysestatus terug (voor polling).
+
+    Tijdens de analyse bevat het antwoord ook de voorlopige feedback-items die al
+    gestreamd binnen zijn. Met ?since=N worden alleen items vanaf index N teruggegeven.
+    """
     db = get_db()
     row = db.execute(
-        'SELECT analysis_status FROM documents WHERE id=?', (document_id,)
+        'SELECT analysis_status, analysis_data FROM documents WHERE id=?', (document_id,)
     ).fetchone()
     if not row:
         return jsonify({'status': 'not_found'}), 404
-    return jsonify({'status': row['analysis_status']})
+    payload = {'status': row['analysis_status']}
+    if row['analysis_status'] == 'analyzing' and row['analysis_data']:
+        try:
+            live = json.loads(row['analysis_data']).get('live_feedback') or []
+        except (json.JSONDecodeError, TypeError, AttributeError):
+            live = []
+        since = request.args.get('since', 0, type=int)
+        payload['live_count'] = len(live)
+        payload['live_feedback'] = live[since:]
+    elif row['analysis_status'] == 'pending':
+        # Plaats in de wachtrij en geschatte wachttijd tot de analyse start
+        payload['queue'] = analysis_queue.queue_position(db, document_id)
+    elif row['analysis_status'] == 'completed':
+        # Cachesleutel (bestandshash + configuratie-fingerprint) en of de criteria sindsdien
+        # gewijzigd zijn, zodat clients hun kopie van het resultaat kunnen valideren
+        payload['cache_key'] = config_fingerprint.cache_key(db, document_id)
+        payload['stale'] = config_fingerprint.is_stale(db, document_id)
+    return jsonify(payload)
+
+
+def _sse(event: str, data: dict, event_id=None) -> str:
+    """Eén Server-Sent Event."""
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+@login_required
+def analysis_events_api(document_id):
+    """Server-Sent Events met de voortgang van een analyse (vervangt polling van de status-API).
+
+    Events:
+      progress : {stage, done, total, eta_s} bij elke voortgangsupdate van de runner
+                 (stage 'queued' zolang de job in de wachtrij staat, met position en
+                 blocked uit analysis_queue.queue_position)
+      feedback : {items, live_count} met nieuw binnengekomen voorlopige feedback-items
+      status   : {status} bij 'completed' of 'failed'; daarna sluit de stream
+
+    De event-id is het aantal al verstuurde feedback-items: na een herverbinding gaat de
+    stream verder vanaf Last-Event-ID (of ?since=N). De stream leest de database via één
+    eigen verbinding en sluit na ANALYSIS_SSE_MAX_S; de browser verbindt dan opnieuw.
+    """
+    from config import Config
+    database = current_app.config['DATABASE']
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', 0, type=int)
+
+    def _stream():
+        conn = sqlite3.connect(database, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        seen, last_seq, last_queue = since, None, None
+        deadline = time.monotonic() + Config.ANALYSIS_SSE_MAX_S
+        try:
+            yield f'retry: {int(max(1.0, Config.ANALYSIS_SSE_INTERVAL_S * 4) * 1000)}\n\n'
+            while True:
+                row = conn.execute(
+                    "SELECT analysis_status, CASE WHEN json_valid(analysis_data) "
+                    "THEN json_array_length(analysis_data, '$.live_feedback') END "
+                    "FROM documents WHERE id=?",
+                    (document_id,)
+                ).fetchone()
+                if row is None:
+                    yield _sse('status', {'status': 'not_found'})
+                    return
+                status, live_count = row[0], row[1] or 0
+
+                if status in ('completed', 'failed'):
+                    yield _sse('status', {'status': status}, seen)
+                    return
+                if status == 'pending':
+                    queue = analysis_queue.queue_position(conn, document_id) or {}
+                    current = (queue.get('position'), queue.get('eta_s'), queue.get('blocked'))
+                    if current != last_queue:
+                        last_queue = current
+                        yield _sse('progress', {'stage': 'queued', 'done': 0, 'total': 0,
+                                                'eta_s': queue.get('eta_s'), 'position': queue.get('position'),
+                                                'blocked': queue.get('blocked')}, seen)
+                else:
+                    last_queue = None
+                    progress = read_progress(conn, document_id)
+                    if progress is not None and progress['seq'] != last_seq:
+                        last_seq = progress.pop('seq')
+                        yield _sse('progress', progress, seen)
+                    if live_count > seen:
+                        items = json.loads(conn.execute(
+                            "SELECT json_extract(analysis_data, '$.live_feedback') FROM documents WHERE id=?",
+                            (document_id,)
+                        ).fetchone()[0] or '[]')[seen:]
+                        seen += len(items)
+                        yield _sse('feedback', {'items': items, 'live_count': seen}, seen)
+
+                if time.monotonic() >= deadline:
+                    return
+                conn.rollback()     # nieuwe leestransactie: wijzigingen van de runner zien
+                time.sleep(Config.ANALYSIS_SSE_INTERVAL_S)
+        finally:
+            conn.close()
+
+    response = Response(stream_with_context(_stream()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'     # geen buffering achter nginx/proxies
+    return response
 
 
 @login_required
@@ -217,25 +424,16 @@ def document_analysis(document_id):
         or bool(request.args.get('reanalyze'))
     )
 
-    if needs_analysis:
-        flask_app = current_app._get_current_object()
-        database  = current_app.config['DATABASE']
-        with _analysis_lock:
-            if document_id not in _analysis_in_progress:
-                _analysis_in_progress.add(document_id)
-                db.execute('UPDATE documents SET analysis_status=? WHERE id=?',
-                           ('analyzing', document_id))
-                db.commit()
-                t = threading.Thread(
-                    target=run_analysis_background,
-                    args=(document_id, flask_app, database),
-                    daemon=True,
-                )
-                t.start()
-                print(f"[ASYNC] Achtergrond-thread gestart voor document {document_id}")
+    active = analysis_queue.active_job(db, document_id)
+    if active is not None and active['kind'] in analysis_queue.BACKGROUND_KINDS:
+        active = None       # herbeoordeling: de bestaande analyse blijft zichtbaar (en wijkt voor een nieuwe)
+    if needs_analysis and active is None:
+        job_id, _ = analysis_queue.enqueue(db, document_id, 'full')
+        active = True
+        print(f"[ASYNC] Analyse in de wachtrij gezet voor document {document_id} (job {job_id})")
 
-    # Laadpagina zolang analyse bezig is
-    if document['analysis_status'] in ('analyzing', 'pending') or document_id in _analysis_in_progress:
+    # Laadpagina zolang analyse wacht of bezig is
+    if document['analysis_status'] in ('analyzing', 'pending') or active is not None:
         return render_template('analysis_loading.html',
                                document=document,
                                document_type=document_type,
@@ -253,6 +451,12 @@ def document_analysis(document_id):
     # Resultaten laden
     try:
         analysis_data = json.loads(document['analysis_data'] or '{}')
+        if analysis_data.get('duplicate_of'):
+            flash(f"Identiek aan document {analysis_data['duplicate_of']}: de analyse is overgenomen "
+                  f"in plaats van opnieuw uitgevoerd.", 'info')
+        if config_fingerprint.is_stale(db, document_id):
+            flash('De criteria of secties van dit documenttype zijn gewijzigd sinds deze analyse. '
+                  'Heranalyseer het document voor feedback volgens de huidige instellingen.', 'warning')
         display_sections       = analysis_data.get('sections', [])
         generated_feedback_items = analysis_data.get('feedback', [])
     except (json.JSONDecodeError, TypeError):
@@ -300,6 +504,10 @@ def document_analysis(document_id):
         sname = fb.get('section_name')
         if sname:
             feedback_by_section.setdefault(sname, []).append(fb)
+            # Eén beoordeling van overlappende tekst geldt ook voor de omvattende secties
+            for other in fb.get('also_in_sections') or []:
+                if other != sname:
+                    feedback_by_section.setdefault(other, []).append(fb)
         else:
             non_section_feedback.append(fb)
 
@@ -382,7 +590,8 @@ def export_select(document_id):
     for fi in feedback_items:
         sn = fi.get('section_name', '')
         if sn:
-            counts[sn] = counts.get(sn, 0) + (1 if fi.get('status') not in ('ok',) else 0)
+            for name in {sn, *(fi.get('also_in_sections') or [])}:
+                counts[name] = counts.get(name, 0) + (1 if fi.get('status') not in ('ok',) else 0)
 
     # Voeg document-brede feedback samen onder een aparte sleutel
     doc_wide = [fi for fi in feedback_items if not fi.get('section_name')]
@@ -401,7 +610,8 @@ def export_select(document_id):
         if include_doc_wide:
             filtered += doc_wide
         for fi in feedback_items:
-            if fi.get('section_name') in selected:
+            if fi.get('section_name') in selected or \
+                    any(name in selected for name in fi.get('also_in_sections') or []):
                 filtered.append(fi)
 
         try:
@@ -461,26 +671,13 @@ def reanalyze_partial(document_id):
         flash('Selecteer minimaal één sectie of de document-brede feedback.', 'warning')
         return redirect(url_for('export_select', document_id=document_id))
 
-    with _analysis_lock:
-        if document_id in _analysis_in_progress:
-            flash('Er loopt al een analyse voor dit document. Wacht tot die klaar is.', 'warning')
-            return redirect(url_for('document_analysis', document_id=document_id))
-        _analysis_in_progress.add(document_id)
-
-    db.execute(
-        'UPDATE documents SET analysis_status=? WHERE id=?',
-        ('analyzing', document_id)
+    _, created = analysis_queue.enqueue(
+        db, document_id, 'partial',
+        {'section_names': selected, 'include_doc_wide': include_doc_wide},
     )
-    db.commit()
-
-    flask_app = current_app._get_current_object()
-    database  = current_app.config['DATABASE']
-    t = threading.Thread(
-        target=run_partial_reanalysis_background,
-        args=(document_id, selected, include_doc_wide, flask_app, database),
-        daemon=True,
-    )
-    t.start()
+    if not created:
+        flash('Er loopt al een analyse voor dit document. Wacht tot die klaar is.', 'warning')
+        return redirect(url_for('document_analysis', document_id=document_id))
     flash(
         f'Heranalyse gestart voor {len(selected)} sectie(s)'
         + (' + document-brede checks' if include_doc_wide else '')
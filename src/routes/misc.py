@@ -1,9 +1,11 @@
 # src/routes/misc.py
 """Overige routes: performance stats."""
 
-from flask import render_template
+from flask import render_template, request
 
 from auth import admin_required
+from analysis import dedupe, llm_resilience, llm_telemetry
+from database import get_db
 from database_optimizations import performance_monitor
 
 
@@ -11,4 +13,9 @@ from database_optimizations import performance_monitor
 def performance_stats():
     """Toont performance statistieken."""
     stats = performance_monitor.get_performance_summary()
-    return render_template('performance.html', stats=stats)
+    days = request.args.get('days', 7, type=int) or 7
+    llm_telemetry.flush()
+    return render_template('performance.html', stats=stats,
+                           llm_breakers=llm_resilience.breaker_stats(),
+                           upload_dedupe=dedupe.stats(get_db()),
+                           llm_dashboard=llm_telemetry.get_dashboard(get_db(), days=days))
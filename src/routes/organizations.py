@@ -7,6 +7,7 @@ from flask import render_template, request, redirect, url_for, flash
 
 from database import get_db
 from auth import admin_required
+import analysis_queue
 
 
 @admin_required
@@ -14,7 +15,8 @@ def list_organizations():
     """Overzichtspagina van alle organisaties."""
     db = get_db()
     organizations = db.execute('SELECT * FROM organizations ORDER BY name').fetchall()
-    return render_template('organizations_list.html', organizations=organizations)
+    return render_template('organizations_list.html', organizations=organizations,
+                           usage=analysis_queue.organization_usage(db))
 
 
 @admin_required
@@ -57,6 +59,10 @@ def edit_organization(id):
     if request.method == 'POST':
         name        = request.form['name']
         description = request.form.get('description', '')
+        # Quota voor de analysewachtrij (alleen als het formulier ze meestuurt);
+        # leeg = standaard uit de configuratie, 0 = onbeperkt
+        quotas = {field: request.form.get(field, type=int)
+                  for field in ('max_running_jobs', 'max_tokens_per_hour') if field in request.form}
 
         if not name:
             flash('Naam is verplicht!', 'danger')
@@ -66,6 +72,8 @@ def edit_organization(id):
                     'UPDATE organizations SET name=?, description=? WHERE id=?',
                     (name, description, id)
                 )
+                for field, value in quotas.items():
+                    db.execute(f'UPDATE organizations SET {field}=? WHERE id=?', (value, id))
                 db.commit()
                 flash('Organisatie succesvol bijgewerkt!', 'success')
                 return redirect(url_for('list_organizations'))
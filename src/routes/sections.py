@@ -8,6 +8,7 @@ from flask import render_template, request, redirect, url_for, flash
 
 from database import get_db
 from auth import admin_required
+from analysis import config_fingerprint
 
 
 @admin_required
@@ -47,6 +48,7 @@ def add_section():
                     (name, identifier, level, order_index, document_type_id, alternative_names_json)
                 )
                 db.commit()
+                config_fingerprint.refresh_all(db)
                 flash('Sectie succesvol toegevoegd!', 'success')
                 return redirect(url_for('list_sections'))
             except Exception as e:
@@ -87,6 +89,7 @@ def edit_section(id):
                     (name, identifier, level, order_index, document_type_id, alternative_names_json, id)
                 )
                 db.commit()
+                config_fingerprint.refresh_all(db)
                 flash('Sectie succesvol bijgewerkt!', 'success')
                 return redirect(url_for('list_sections'))
             except Exception as e:
@@ -120,6 +123,7 @@ def delete_section(id):
         try:
             db.execute('DELETE FROM sections WHERE id=?', (id,))
             db.commit()
+            config_fingerprint.refresh_all(db)
             flash('Sectie succesvol verwijderd!', 'success')
         except Exception as e:
             flash(f'Fout bij verwijderen: {e}', 'danger')
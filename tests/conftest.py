@@ -115,6 +115,15 @@ CREATE TABLE IF NOT EXISTS recognized_sections (
 """
 
 
+@pytest.fixture(autouse=True)
+def _verse_llm_breakers():
+    """Circuit breakers zijn procesbreed: elke test begint met gesloten breakers."""
+    from analysis import llm_resilience
+    llm_resilience.reset_breakers()
+    yield
+    llm_resilience.reset_breakers()
+
+
 @pytest.fixture
 def db_path(tmp_path):
     """Tijdelijk SQLite-bestand met het volledige schema."""
@@ -0,0 +1,250 @@
+"""
+Unit-tests voor src/analysis_queue.py (duurzame analysewachtrij)
+
+Dekt:
+1. Idempotente enqueue per document
+2. Atomaire claim: één runner per job, ook met meerdere runners tegelijk
+3. Heartbeats en lease-verloop: overname door een andere runner
+4. Retry met backoff en definitief falen na max_attempts
+5. run_job: uitvoeren, afronden en documentstatus
+6. Lease kwijt: de runner breekt af en schrijft niets meer
+"""
+import os
+import sqlite3
+import sys
+import threading
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import analysis_queue
+import db_utils
+from config import Config
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'ANALYSIS_JOB_MAX_ATTEMPTS', 2)
+    monkeypatch.setattr(Config, 'ANALYSIS_JOB_RETRY_BASE_S', 30)
+    path = str(tmp_path / 'wachtrij.db')
+    conn = sqlite3.connect(path)
+    db_utils.initialize_db(conn)
+    db_utils.migrate_db(conn)
+    for i in (1, 2):
+        conn.execute("INSERT INTO documents (id, name, original_filename, file_path) VALUES (?,?,?,?)",
+                     (i, f'doc{i}', f'doc{i}.docx', f'/tmp/doc{i}.docx'))
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def conn(database):
+    connection = sqlite3.connect(database)
+    connection.row_factory = sqlite3.Row
+    yield connection
+    connection.close()
+
+
+def _job(conn, job_id):
+    return dict(conn.execute('SELECT * FROM analysis_jobs WHERE id=?', (job_id,)).fetchone())
+
+
+def _doc_status(conn, document_id):
+    return conn.execute('SELECT analysis_status FROM documents WHERE id=?', (document_id,)).fetchone()[0]
+
+
+class TestEnqueue:
+
+    def test_idempotent_per_document(self, conn):
+        job_id, created = analysis_queue.enqueue(conn, 1)
+        again, created_again = analysis_queue.enqueue(conn, 1, 'partial', {'section_names': ['Inleiding']})
+        assert created and not created_again and again == job_id
+        assert _doc_status(conn, 1) == 'pending'
+        other, _ = analysis_queue.enqueue(conn, 2)
+        assert other != job_id
+
+    def test_nieuwe_job_na_afronden(self, conn, database):
+        job_id, _ = analysis_queue.enqueue(conn, 1)
+        job = analysis_queue.claim(database, 'runner-a')
+        analysis_queue.complete(database, job['id'], 'runner-a')
+        nieuw, created = analysis_queue.enqueue(conn, 1)
+        assert created and nieuw != job_id
+
+    def test_bestaande_job_laat_wijzigingen_van_aanroeper_staan(self, conn):
+        analysis_queue.enqueue(conn, 1)
+        conn.execute("UPDATE documents SET name='hernoemd' WHERE id=1")      # nog niet gecommit
+        _, created = analysis_queue.enqueue(conn, 1)
+        assert not created
+        conn.rollback()     # enqueue heeft gecommit; er valt niets meer terug te draaien
+        assert conn.execute('SELECT name FROM documents WHERE id=1').fetchone()[0] == 'hernoemd'
+
+
+class TestClaim:
+
+    def test_lege_wachtrij_zonder_schrijfslot(self, conn, database):
+        # Een andere schrijver houdt het slot vast: pollen van een lege wachtrij wacht er niet op
+        conn.execute("UPDATE documents SET name='bezig' WHERE id=1")
+        with patch.object(analysis_queue, '_select_job', side_effect=AssertionError('schrijfslot')):
+            assert analysis_queue.claim(database, 'runner-a') is None
+        conn.rollback()
+
+    def test_wekken_per_runner(self, conn):
+        mine, other = threading.Event(), threading.Event()
+        with patch.object(analysis_queue, '_wake_events', {mine, other}):
+            analysis_queue.enqueue(conn, 1)
+        assert mine.is_set() and other.is_set()
+        mine.clear()            # de ene runner wist alleen zijn eigen event
+        assert other.is_set()
+
+    def test_een_runner_per_job(self, conn, database):
+        analysis_queue.enqueue(conn, 1)
+        claims, lock = [], threading.Lock()
+
+        def _claim(owner):
+            job = analysis_queue.claim(database, owner)
+            with lock:
+                claims.append(job)
+
+        threads = [threading.Thread(target=_claim, args=(f'runner-{i}',)) for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        won = [job for job in claims if job is not None]
+        assert len(won) == 1
+        assert won[0]['status'] == 'running' and won[0]['attempts'] == 1
+        assert _doc_status(conn, 1) == 'analyzing'
+
+    def test_verlopen_lease_wordt_overgenomen(self, conn, database):
+        analysis_queue.enqueue(conn, 1)
+        job = analysis_queue.claim(database, 'runner-a')
+        assert analysis_queue.heartbeat(database, job['id'], 'runner-a')
+        assert analysis_queue.claim(database, 'runner-b') is None      # lease nog geldig
+
+        conn.execute("UPDATE analysis_jobs SET lease_expires_at=datetime('now', '-1 seconds')")
+        conn.commit()
+        overgenomen = analysis_queue.claim(database, 'runner-b')
+        assert overgenomen['id'] == job['id'] and overgenomen['attempts'] == 2
+        assert overgenomen['lease_owner'] == 'runner-b'
+        # De oude runner is zijn lease kwijt: heartbeat en afronden hebben geen effect
+        assert not analysis_queue.heartbeat(database, job['id'], 'runner-a')
+        assert not analysis_queue.complete(database, job['id'], 'runner-a')
+
+    def test_laatste_poging_verlopen_wordt_failed(self, conn, database):
+        analysis_queue.enqueue(conn, 1)
+        for owner in ('runner-a', 'runner-b'):
+            analysis_queue.claim(database, owner)
+            conn.execute("UPDATE analysis_jobs SET lease_expires_at=datetime('now', '-1 seconds')")
+            conn.commit()
+        assert analysis_queue.claim(database, 'runner-c') is None
+        [row] = conn.execute('SELECT status, last_error FROM analysis_jobs').fetchall()
+        assert row['status'] == 'failed' and 'lease' in row['last_error']
+        assert _doc_status(conn, 1) == 'failed'
+
+
+class TestRetry:
+
+    def test_backoff_en_definitief_falen(self, conn, database):
+        job_id, _ = analysis_queue.enqueue(conn, 1)
+        analysis_queue.claim(database, 'runner-a')
+        assert analysis_queue.fail(database, job_id, 'runner-a', 'RuntimeError: kapot') == 'queued'
+        job = _job(conn, job_id)
+        assert job['status'] == 'queued' and job['last_error'] == 'RuntimeError: kapot'
+        assert _doc_status(conn, 1) == 'pending'
+        assert analysis_queue.claim(database, 'runner-a') is None      # backoff loopt nog
+
+        conn.execute("UPDATE analysis_jobs SET run_after=datetime('now')")
+        conn.commit()
+        analysis_queue.claim(database, 'runner-a')
+        assert analysis_queue.fail(database, job_id, 'runner-a', 'RuntimeError: weer kapot') == 'failed'
+        assert _job(conn, job_id)['status'] == 'failed'
+        assert _doc_status(conn, 1) == 'failed'
+
+    def test_gedeeltelijke_heranalyse_valt_terug_op_completed(self, conn, database, monkeypatch):
+        monkeypatch.setattr(Config, 'ANALYSIS_JOB_MAX_ATTEMPTS', 1)
+        job_id, _ = analysis_queue.enqueue(conn, 2, 'partial', {'section_names': ['Inleiding']})
+        analysis_queue.claim(database, 'runner-a')
+        analysis_queue.fail(database, job_id, 'runner-a', 'kapot')
+        assert _doc_status(conn, 2) == 'completed'
+
+
+class TestRunJob:
+
+    def test_geslaagde_job(self, conn, database):
+        analysis_queue.enqueue(conn, 2, 'partial', {'section_names': ['Inleiding'], 'include_doc_wide': True})
+        with patch('analysis_runner.run_partial_reanalysis_background') as partial:
+            assert analysis_queue.work_once(None, database)
+        partial.assert_called_once_with(2, ['Inleiding'], True, None, database, job_id=1)
+        [row] = conn.execute('SELECT status, finished_at FROM analysis_jobs').fetchall()
+        assert row['status'] == 'done' and row['finished_at']
+        assert not analysis_queue.work_once(None, database)             # wachtrij leeg
+
+    def test_exception_plant_nieuwe_poging_in(self, conn, database):
+        analysis_queue.enqueue(conn, 1)
+        with patch('analysis_runner.run_analysis_background', side_effect=RuntimeError('parser')):
+            analysis_queue.work_once(None, database)
+        [row] = conn.execute('SELECT status, attempts, last_error FROM analysis_jobs').fetchall()
+        assert (row['status'], row['attempts']) == ('queued', 1)
+        assert row['last_error'] == 'RuntimeError: parser'
+
+    def test_heartbeat_tijdens_lange_job(self, conn, database, monkeypatch):
+        monkeypatch.setattr(Config, 'ANALYSIS_JOB_LEASE_S', 3)   # heartbeat elke seconde
+        analysis_queue.enqueue(conn, 1)
+        beats = []
+        real_heartbeat = analysis_queue.heartbeat
+
+        def _heartbeat(*args, **kwargs):
+            beats.append(args[1])
+            return real_heartbeat(*args, **kwargs)
+
+        monkeypatch.setattr(analysis_queue, 'heartbeat', _heartbeat)
+        with patch('analysis_runner.run_analysis_background', side_effect=lambda *a, job_id=None: threading.Event().wait(1.5)):
+            analysis_queue.work_once(None, database)
+        assert beats
+        assert conn.execute('SELECT status FROM analysis_jobs').fetchone()[0] == 'done'
+
+
+class TestLeaseKwijt:
+
+    def test_runner_breekt_af_zonder_te_schrijven(self, conn, database):
+        analysis_queue.enqueue(conn, 1)
+        seen = []
+
+        def _analyse(document_id, flask_app, db_path, job_id=None):
+            lease = analysis_queue.lease_for(job_id)
+            # Lease verloopt en een andere runner neemt de job over
+            conn.execute("UPDATE analysis_jobs SET lease_owner='runner-b' WHERE id=?", (job_id,))
+            conn.commit()
+            check = sqlite3.connect(db_path)
+            try:
+                lease.check(check)
+            except analysis_queue.LeaseLost:
+                seen.append(job_id)
+                raise
+            finally:
+                check.close()
+
+        with patch('analysis_runner.run_analysis_background', side_effect=_analyse):
+            job = analysis_queue.claim(database, 'runner-a')
+            assert analysis_queue.run_job(job, 'runner-a', None, database) == 'lost'
+        assert seen == [1] and analysis_queue.lease_for(1) is None
+        row = _job(conn, 1)
+        assert (row['status'], row['lease_owner'], row['last_error']) == ('running', 'runner-b', None)
+        assert _doc_status(conn, 1) == 'analyzing'
+
+    def test_mislukte_heartbeat_zet_lease_kwijt(self, conn, database, monkeypatch):
+        monkeypatch.setattr(Config, 'ANALYSIS_JOB_LEASE_S', 3)   # heartbeat elke seconde
+        monkeypatch.setattr(analysis_queue, 'heartbeat', lambda *a, **kw: False)
+        analysis_queue.enqueue(conn, 1)
+
+        def _analyse(*args, job_id=None):
+            lease = analysis_queue.lease_for(job_id)
+            assert lease.lost.wait(5)
+            lease.check()
+
+        with patch('analysis_runner.run_analysis_background', side_effect=_analyse):
+            analysis_queue.work_once(None, database)
+        assert _job(conn, 1)['status'] == 'running'       # niet door deze runner afgerond
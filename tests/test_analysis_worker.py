@@ -0,0 +1,141 @@
+"""
+Unit-tests voor src/analysis_worker.py en het netjes stoppen van runners
+
+Dekt:
+1. release: een lopende job terug naar de wachtrij zonder dat het als poging telt
+2. stop_workers: lopende jobs mogen uitlopen; na de grace-periode worden ze afgebroken en
+   pas vrijgegeven als de runner gestopt is
+3. analysis_worker.run: runners starten, jobs uitvoeren en stoppen op het stopsignaal
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import analysis_queue
+import analysis_worker
+import db_utils
+from config import Config
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'ANALYSIS_JOB_POLL_S', 0.05)
+    monkeypatch.setattr(Config, 'LLM_TELEMETRY', False)
+    path = str(tmp_path / 'worker.db')
+    conn = sqlite3.connect(path)
+    db_utils.initialize_db(conn)
+    db_utils.migrate_db(conn)
+    for i in (1, 2):
+        conn.execute("INSERT INTO documents (id, name, original_filename, file_path) VALUES (?,?,?,?)",
+                     (i, f'doc{i}', f'doc{i}.docx', f'/tmp/doc{i}.docx'))
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def conn(database):
+    connection = sqlite3.connect(database)
+    connection.row_factory = sqlite3.Row
+    yield connection
+    connection.close()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+class TestRelease:
+
+    def test_telt_niet_als_poging(self, conn, database):
+        job_id, _ = analysis_queue.enqueue(conn, 1)
+        analysis_queue.claim(database, 'runner-a')
+        assert not analysis_queue.release(database, job_id, 'runner-b')     # niet de eigenaar
+        assert analysis_queue.release(database, job_id, 'runner-a')
+        job = conn.execute('SELECT status, attempts, lease_owner FROM analysis_jobs').fetchone()
+        assert (job['status'], job['attempts'], job['lease_owner']) == ('queued', 0, None)
+        assert conn.execute('SELECT analysis_status FROM documents WHERE id=1').fetchone()[0] == 'pending'
+        assert analysis_queue.claim(database, 'runner-b')['attempts'] == 1
+
+
+class TestNetjesStoppen:
+
+    def test_lopende_job_mag_uitlopen(self, conn, database):
+        analysis_queue.enqueue(conn, 1)
+        started, finish = threading.Event(), threading.Event()
+
+        def _analyse(*args, job_id=None):
+            started.set()
+            finish.wait(5)
+
+        with patch('analysis_runner.run_analysis_background', side_effect=_analyse):
+            analysis_queue.start_workers(None, database, 1)
+            assert started.wait(5)
+            threading.Timer(0.2, finish.set).start()
+            assert analysis_queue.stop_workers(timeout=5) == []
+        assert conn.execute('SELECT status FROM analysis_jobs').fetchone()[0] == 'done'
+
+    def test_na_grace_terug_naar_wachtrij(self, conn, database):
+        analysis_queue.enqueue(conn, 1)
+        started, finish = threading.Event(), threading.Event()
+
+        def _analyse(*args, job_id=None):
+            started.set()
+            while not finish.wait(0.02):
+                analysis_queue.lease_for(job_id).check()     # zoals de runner tussen stappen
+
+        with patch('analysis_runner.run_analysis_background', side_effect=_analyse):
+            analysis_queue.start_workers(None, database, 1)
+            assert started.wait(5)
+            released = analysis_queue.stop_workers(timeout=0.1)
+            assert [job['document_id'] for job in released] == [1]
+            job = conn.execute('SELECT status, attempts FROM analysis_jobs').fetchone()
+            assert (job['status'], job['attempts']) == ('queued', 0)
+            finish.set()
+
+    def test_lopende_runner_wordt_niet_vrijgegeven(self, conn, database):
+        analysis_queue.enqueue(conn, 1)
+        started, finish = threading.Event(), threading.Event()
+
+        def _analyse(*args, job_id=None):
+            started.set()
+            finish.wait(5)                                    # controleert de lease niet
+
+        with patch('analysis_runner.run_analysis_background', side_effect=_analyse):
+            [worker] = analysis_queue.start_workers(None, database, 1)
+            assert started.wait(5)
+            assert analysis_queue.stop_workers(timeout=0.1, abort_timeout=0.1) == []
+            job = conn.execute('SELECT status, lease_owner FROM analysis_jobs').fetchone()
+            assert job['status'] == 'running' and job['lease_owner']
+            finish.set()
+            worker.join(5)
+
+
+class TestWorkerProces:
+
+    def test_voert_jobs_uit_tot_stopsignaal(self, conn, database):
+        analysis_queue.enqueue(conn, 1)
+        analysis_queue.enqueue(conn, 2)
+        stop_event = threading.Event()
+        with patch('analysis_runner.run_analysis_background') as analyse:
+            worker = threading.Thread(target=analysis_worker.run, args=(database, 2, stop_event, 5))
+            worker.start()
+            assert _wait_for(lambda: conn.execute(
+                "SELECT COUNT(*) FROM analysis_jobs WHERE status='done'").fetchone()[0] == 2)
+            stop_event.set()
+            worker.join(5)
+        assert not worker.is_alive()
+        assert sorted(call.args[0] for call in analyse.call_args_list) == [1, 2]
+        assert analysis_queue._workers == []
@@ -0,0 +1,223 @@
+"""
+Unit-tests voor src/analysis/batches.py (batches van inzendingen)
+
+Dekt:
+1. ZIP uitpakken: alleen .docx, systeembestanden overslaan, limieten op aantal en grootte
+2. Samengevoegde status en één ZIP met gecommentarieerde exports
+3. Wachtrij: maximaal ANALYSIS_BATCH_MAX_RUNNING lopende jobs per batch
+4. Gedeelde criteria en secties per documenttype (config_fingerprint.load_settings)
+5. POST /api/batches en toegang tot de status
+"""
+import io
+import json
+import os
+import sqlite3
+import sys
+import zipfile
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import analysis_queue
+import db_utils
+from analysis import batches, config_fingerprint
+from config import Config
+from routes.documents import api_batch_status, api_create_batch
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / 'batches.db')
+    conn = sqlite3.connect(path)
+    db_utils.initialize_db(conn)
+    db_utils.migrate_db(conn)
+    if 'document_type_id' not in [r[1] for r in conn.execute('PRAGMA table_info(sections)')]:
+        conn.execute('ALTER TABLE sections ADD COLUMN document_type_id INTEGER')
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def conn(database):
+    connection = sqlite3.connect(database)
+    connection.row_factory = sqlite3.Row
+    yield connection
+    connection.close()
+
+
+def _zip(entries: dict) -> io.BytesIO:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as zf:
+        for name, content in entries.items():
+            zf.writestr(name, content)
+    buf.seek(0)
+    return buf
+
+
+def _add_document(conn, doc_id, batch_id, status='pending', name=None, feedback=None):
+    conn.execute(
+        "INSERT INTO documents (id, name, original_filename, file_path, document_type_id, analysis_status, "
+        "analysis_data, batch_id) VALUES (?,?,?,?,1,?,?,?)",
+        (doc_id, f'doc{doc_id}', name or f'doc{doc_id}.docx', f'/tmp/batch_{doc_id}.docx', status,
+         json.dumps({'feedback': feedback or [], 'sections': []}) if status == 'completed' else None,
+         batch_id)
+    )
+    conn.commit()
+
+
+class TestUitpakken:
+
+    def test_alleen_docx_en_mappen_platgeslagen(self, tmp_path):
+        archive = _zip({'klas/jan.docx': b'jan', 'klas/piet.DOCX': b'piet', 'klas/notities.txt': b'x',
+                        '__MACOSX/klas/._jan.docx': b'x', 'klas/~$jan.docx': b'x'})
+        saved, skipped = batches.extract_archive(archive, str(tmp_path))
+        assert [name for name, _ in saved] == ['jan.docx', 'piet.DOCX']
+        assert all(os.path.dirname(path) == str(tmp_path) for _, path in saved)
+        assert sorted(reason for _, reason in skipped) == ['geen .docx', 'systeembestand', 'systeembestand']
+
+    def test_te_veel_bestanden_laat_niets_achter(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(Config, 'BATCH_MAX_FILES', 1)
+        with pytest.raises(batches.BatchError):
+            batches.extract_archive(_zip({'a.docx': b'a', 'b.docx': b'b'}), str(tmp_path))
+        assert os.listdir(tmp_path) == []
+
+    def test_uitgepakte_grootte_begrensd(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(Config, 'BATCH_MAX_UNPACKED_MB', 0)
+        with pytest.raises(batches.BatchError):
+            batches.extract_archive(_zip({'a.docx': b'a'}), str(tmp_path))
+        assert os.listdir(tmp_path) == []
+
+    def test_geen_zip(self, tmp_path):
+        with pytest.raises(batches.BatchError):
+            batches.extract_archive(io.BytesIO(b'geen zip'), str(tmp_path))
+
+
+class TestStatusEnExport:
+
+    def test_samengevoegde_status(self, conn):
+        batch_id = batches.create(conn, 1, skipped=[('x.txt', 'geen .docx')])
+        _add_document(conn, 1, batch_id, 'completed')
+        _add_document(conn, 2, batch_id, 'analyzing')
+        _add_document(conn, 3, batch_id, 'failed')
+        state = batches.status(conn, batch_id)
+        assert (state['status'], state['total'], state['completed'], state['analyzing']) == ('running', 3, 1, 1)
+        assert state['progress'] == pytest.approx(2 / 3)
+        assert state['skipped'] == [{'name': 'x.txt', 'reason': 'geen .docx'}]
+
+        conn.execute("UPDATE documents SET analysis_status='completed' WHERE id=2")
+        assert batches.status(conn, batch_id)['status'] == 'done'
+
+    def test_export_zip(self, conn, tmp_path):
+        batch_id = batches.create(conn, 1)
+        _add_document(conn, 1, batch_id, 'completed', name='verslag.docx',
+                      feedback=[{'status': 'warning'}, {'status': 'ok'}])
+        _add_document(conn, 2, batch_id, 'completed', name='verslag.docx')
+        _add_document(conn, 3, batch_id, 'failed')
+
+        def _comments(original_docx_path, feedback_items, recognized_sections, output_path):
+            with open(output_path, 'wb') as f:
+                f.write(original_docx_path.encode())
+
+        output = str(tmp_path / 'batch.zip')
+        with patch('analysis.inline_word_comments.add_inline_comments', side_effect=_comments):
+            assert batches.export_zip(conn, batch_id, output) == 2
+        with zipfile.ZipFile(output) as zf:
+            assert sorted(zf.namelist()) == ['overzicht.csv', 'verslag_gecommentarieerd (2).docx',
+                                             'verslag_gecommentarieerd.docx']
+            rows = zf.read('overzicht.csv').decode().splitlines()
+        assert rows[1].split(';')[2:4] == ['completed', '1']
+        assert rows[3].split(';')[2:] == ['failed', '', '']
+
+
+class TestWachtrij:
+
+    def test_maximaal_lopende_jobs_per_batch(self, database, conn, monkeypatch):
+        monkeypatch.setattr(Config, 'ANALYSIS_BATCH_MAX_RUNNING', 2)
+        batch_id = batches.create(conn, 1)
+        for doc_id in (1, 2, 3):
+            _add_document(conn, doc_id, batch_id)
+            analysis_queue.enqueue(conn, doc_id, 'full')
+        _add_document(conn, 4, None)                 # losse upload: interactief, gaat voor
+        analysis_queue.enqueue(conn, 4, 'full')
+
+        claimed = [analysis_queue.claim(database, 'runner')['document_id'] for _ in range(3)]
+        assert claimed == [4, 1, 2]
+        assert analysis_queue.claim(database, 'runner') is None
+
+    def test_standaard_een_runner_vrij_voor_losse_uploads(self, monkeypatch):
+        monkeypatch.setattr(Config, 'ANALYSIS_BATCH_MAX_RUNNING', 0)
+        monkeypatch.setattr(Config, 'ANALYSIS_WORKERS', 8)
+        assert analysis_queue.batch_max_running() == 7
+        monkeypatch.setattr(Config, 'ANALYSIS_WORKERS', 1)
+        assert analysis_queue.batch_max_running() == 1
+
+
+class TestGedeeldeInstellingen:
+
+    def test_criteria_en_secties_een_keer_geladen(self, conn, monkeypatch):
+        monkeypatch.setattr(Config, 'ANALYSIS_CONFIG_CACHE_S', 60)
+        config_fingerprint.clear_settings_cache()
+        with patch('db_utils.get_criteria_for_document_type', wraps=db_utils.get_criteria_for_document_type) as spy:
+            first = config_fingerprint.load_settings(conn, 1)
+            second = config_fingerprint.load_settings(conn, 1)
+            assert spy.call_count == 1
+            assert first == second
+            second[2].append({'id': 'eigen kopie'})
+            assert config_fingerprint.load_settings(conn, 1)[2] == first[2]
+
+            # Wijziging in het beheer → nieuwe fingerprint → opnieuw laden
+            conn.execute("UPDATE document_types SET default_llm_role_prompt='Je bent een jurist.' WHERE id=1")
+            config_fingerprint.refresh(conn, 1)
+            loads = spy.call_count
+            assert config_fingerprint.load_settings(conn, 1)[0] != first[0]
+            assert spy.call_count == loads + 1
+        config_fingerprint.clear_settings_cache()
+
+
+class TestApi:
+
+    def _app(self, tmp_path):
+        app = Flask(__name__)
+        app.secret_key = 'test'
+        app.config['UPLOAD_FOLDER'] = str(tmp_path)
+        return app
+
+    def test_zip_wordt_batch_in_de_wachtrij(self, conn, tmp_path):
+        app = self._app(tmp_path)
+        data = {'document_type_id': '1', 'name': 'Klas 4B',
+                'archive': (_zip({'jan.docx': b'jan', 'piet.docx': b'piet', 'lees mij.txt': b'x'}), 'klas.zip')}
+        with app.test_request_context('/api/batches', method='POST', data=data,
+                                      content_type='multipart/form-data'), \
+             patch('routes.documents.get_db', return_value=conn):
+            from flask import session
+            session.update(user_id=7, user_role='user')
+            response, code = api_create_batch()
+        body = response.get_json()
+        assert code == 201
+        assert (body['name'], body['total'], body['pending']) == ('Klas 4B', 2, 2)
+        assert body['skipped'] == [{'name': 'lees mij.txt', 'reason': 'geen .docx'}]
+        jobs = conn.execute("SELECT document_id FROM analysis_jobs WHERE status='queued'").fetchall()
+        assert sorted(r[0] for r in jobs) == [d['id'] for d in body['documents']]
+
+        with app.test_request_context(), patch('routes.documents.get_db', return_value=conn):
+            from flask import session
+            session.update(user_id=8, user_role='user')
+            assert api_batch_status(body['id'])[1] == 404
+            session.update(user_id=7)
+            assert api_batch_status(body['id']).get_json()['total'] == 2
+
+    def test_zonder_docx_geen_batch(self, conn, tmp_path):
+        app = self._app(tmp_path)
+        data = {'document_type_id': '1', 'files': [(io.BytesIO(b'x'), 'notities.txt')]}
+        with app.test_request_context('/api/batches', method='POST', data=data,
+                                      content_type='multipart/form-data'), \
+             patch('routes.documents.get_db', return_value=conn):
+            from flask import session
+            session.update(user_id=7, user_role='user')
+            response, code = api_create_batch()
+        assert code == 400
+        assert conn.execute('SELECT COUNT(*) FROM analysis_batches').fetchone()[0] == 0
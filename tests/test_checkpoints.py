@@ -0,0 +1,149 @@
+"""
+Unit-tests voor src/analysis/checkpoints.py (hervatten van een analyse per stap)
+
+Dekt:
+1. generate_feedback: afgeronde LLM-taken en snelle checks worden bij een nieuwe poging
+   overgeslagen; mislukte LLM-calls worden opnieuw geprobeerd
+2. run_analysis_background: parse en sectieherkenning uit het checkpoint bij hervatten
+3. analysis_queue ruimt de checkpoints op zodra de job klaar is
+"""
+import json
+import os
+import sqlite3
+import sys
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import analysis.criterion_checking as cc
+import analysis_queue
+import analysis_runner
+import db_utils
+from analysis import checkpoints
+from config import Config
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'ANALYSIS_CHECKPOINTS', True)
+    monkeypatch.setattr(Config, 'CRITERION_PROFILING', False)
+    monkeypatch.setattr(Config, 'LLM_TELEMETRY', False)
+    monkeypatch.setattr(Config, 'LLM_DOCUMENT_DIGEST', False)
+    monkeypatch.setattr(Config, 'LLM_MAX_WORKERS', 1)
+    path = str(tmp_path / 'checkpoints.db')
+    conn = sqlite3.connect(path)
+    db_utils.initialize_db(conn)
+    db_utils.migrate_db(conn)
+    # De weergave-query van de runner filtert secties op document_type_id
+    if 'document_type_id' not in [r[1] for r in conn.execute('PRAGMA table_info(sections)')]:
+        conn.execute('ALTER TABLE sections ADD COLUMN document_type_id INTEGER')
+    conn.execute("INSERT INTO document_types (id, name, identifier) VALUES (7, 'Memo', 'memo')")
+    conn.execute("INSERT INTO documents (id, name, original_filename, file_path, document_type_id) "
+                 "VALUES (1, 'memo', 'memo.docx', '/tmp/memo.docx', 7)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _sections():
+    return [{'name': naam, 'identifier': naam.lower(), 'found': True, 'level': 1, 'db_id': None,
+             'content': f'{naam}: de huurder is beschermd tegen opzegging door de verhuurder. ' * 20,
+             'word_count': 200, 'headings': []}
+            for naam in ('Inleiding', 'Conclusie')]
+
+
+def _criteria():
+    return [
+        {'id': 201, 'name': 'Persoonlijk taalgebruik', 'rule_type': 'tekstueel',
+         'application_scope': 'all', 'check_type': 'keyword_forbidden', 'is_enabled': 1,
+         'severity': 'warning', 'color': '#F9C74F', 'max_mentions_per': 0,
+         'parameters': json.dumps({'keywords': ['ik']})},
+        {'id': 202, 'name': 'Argumentatie', 'rule_type': 'inhoudelijk',
+         'application_scope': 'all', 'check_type': 'llm_review', 'is_enabled': 1,
+         'severity': 'warning', 'color': '#84A98C', 'max_mentions_per': 0,
+         'parameters': json.dumps({'llm_criteria_prompt': 'Beoordeel de argumentatie.',
+                                   'llm_use_full_doc_context': False})},
+    ]
+
+
+def _fake_llm(calls, failing=()):
+    def _llm(model, system_prompt, cached_text, uncached_text, max_tokens=4096, on_text=None,
+             response_schema=None):
+        section = 'Inleiding' if 'Inleiding:' in uncached_text else 'Conclusie'
+        calls.append(section)
+        if section in failing:
+            raise RuntimeError('server overbelast')
+        return {'text': json.dumps({'oordeel': 'goed', 'problemen': [], 'samenvatting': section}),
+                'input_tokens': 100, 'output_tokens': 20, 'cache_created': 0, 'cache_read': 0}
+    return _llm
+
+
+class TestGenerateFeedback:
+
+    def test_hervat_alleen_mislukte_llm_taken(self, database):
+        conn = sqlite3.connect(database)
+        first, second = [], []
+        with patch.object(cc, '_call_llm', side_effect=_fake_llm(first, failing={'Conclusie'})), \
+             patch('time.sleep'):
+            cc.generate_feedback('doc', _sections(), _criteria(), conn, 1, 7,
+                                 checkpoint=checkpoints.AnalysisCheckpoint(database, 1, 99))
+        assert 'Inleiding' in first and 'Conclusie' in first
+
+        resumed = checkpoints.AnalysisCheckpoint(database, 1, 99)
+        assert resumed.resumed == ['fast', 'llm'] and resumed.count('llm') == 1
+        with patch.object(cc, '_call_llm', side_effect=_fake_llm(second)), \
+             patch.object(cc, 'check_keyword_forbidden') as fast_check:
+            feedback = cc.generate_feedback('doc', _sections(), _criteria(), conn, 1, 7,
+                                            checkpoint=resumed)
+        assert second == ['Conclusie']            # Inleiding kwam uit het checkpoint
+        fast_check.assert_not_called()
+        llm_items = [f for f in feedback if f['criteria_id'] == 202]
+        assert sorted(f['message'] for f in llm_items) == ['Conclusie', 'Inleiding']
+        conn.close()
+
+    def test_andere_job_begint_schoon(self, database):
+        checkpoints.AnalysisCheckpoint(database, 1, 99).put('llm', {'status': 'ok'}, '202|x|X')
+        assert not checkpoints.AnalysisCheckpoint(database, 1, 100).resumed
+        assert checkpoints.open_checkpoint(database, 1, None) is None
+
+
+class TestRunner:
+
+    def test_parse_en_herkenning_niet_opnieuw(self, database):
+        sections = _sections()
+        app = Flask(__name__)
+        with patch('analysis.document_parsing.parse_document',
+                   return_value=('tekst', ['tekst'], [])) as parse, \
+             patch('db_utils.get_expected_sections', return_value=[]), \
+             patch('analysis.section_recognition.recognize_and_enrich_sections',
+                   return_value=(sections, [])) as recognize, \
+             patch('analysis_runner.batch_save_section_content'), \
+             patch('db_utils.get_criteria_for_document_type', return_value=[]), \
+             patch.object(cc, 'run_holistic_section_reviews', return_value=[]), \
+             patch.object(cc, 'generate_feedback', side_effect=[RuntimeError('deploy'), []]) as feedback:
+            with pytest.raises(RuntimeError):
+                analysis_runner.run_analysis_background(1, app, database, job_id=5)
+            analysis_runner.run_analysis_background(1, app, database, job_id=5)
+
+        assert parse.call_count == 1 and recognize.call_count == 1
+        resumed = feedback.call_args.kwargs['checkpoint']
+        assert resumed.resumed[:2] == ['parsed', 'recognized']
+        assert [s['name'] for s in feedback.call_args.args[1]] == ['Inleiding', 'Conclusie']
+        conn = sqlite3.connect(database)
+        assert conn.execute('SELECT analysis_status FROM documents WHERE id=1').fetchone()[0] == 'completed'
+        conn.close()
+
+
+class TestOpruimen:
+
+    def test_complete_verwijdert_checkpoints(self, database):
+        conn = sqlite3.connect(database)
+        job_id, _ = analysis_queue.enqueue(conn, 1)
+        job = analysis_queue.claim(database, 'runner-a')
+        checkpoints.AnalysisCheckpoint(database, 1, job_id).put('parsed', ['tekst', [], []])
+        assert analysis_queue.complete(database, job['id'], 'runner-a')
+        assert conn.execute('SELECT COUNT(*) FROM analysis_checkpoints').fetchone()[0] == 0
+        conn.close()
@@ -0,0 +1,114 @@
+"""
+Unit-tests voor src/analysis/config_fingerprint.py (configuratie-fingerprint per documenttype)
+
+Dekt:
+1. De fingerprint verandert met criteria, parameters, sectie-aliassen, mappings en rolprompt
+2. Verouderde analyses vinden zonder analysis_data te laden; cachesleutel
+3. /api/document_types/<id>/fingerprint
+"""
+import json
+import os
+import sqlite3
+import sys
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import db_utils
+from analysis import config_fingerprint
+from routes.document_types import document_type_fingerprint_api
+
+
+@pytest.fixture
+def conn(tmp_path):
+    connection = sqlite3.connect(str(tmp_path / 'fingerprint.db'))
+    connection.row_factory = sqlite3.Row
+    db_utils.initialize_db(connection)
+    db_utils.migrate_db(connection)
+    # De verwachte secties worden op document_type_id gefilterd
+    if 'document_type_id' not in [r[1] for r in connection.execute('PRAGMA table_info(sections)')]:
+        connection.execute('ALTER TABLE sections ADD COLUMN document_type_id INTEGER')
+    connection.execute(
+        "INSERT INTO criteria (id, name, rule_type, application_scope, is_enabled, check_type, parameters) "
+        "VALUES (901, 'Argumentatie', 'inhoudelijk', 'all', 1, 'llm_review', ?)",
+        (json.dumps({'llm_criteria_prompt': 'Beoordeel de argumentatie.'}),)
+    )
+    connection.execute('INSERT INTO document_type_criteria_mappings (document_type_id, criteria_id) VALUES (1, 901)')
+    connection.commit()
+    yield connection
+    connection.close()
+
+
+def _add_document(conn, doc_id, fingerprint, document_type_id=1, status='completed'):
+    conn.execute(
+        "INSERT INTO documents (id, name, original_filename, file_path, document_type_id, analysis_status, "
+        "analysis_data, file_hash, config_fingerprint) VALUES (?,?,?,?,?,?,'{}','abc',?)",
+        (doc_id, f'doc{doc_id}', f'doc{doc_id}.docx', f'/tmp/fp_{doc_id}.docx', document_type_id,
+         status, fingerprint)
+    )
+    conn.commit()
+
+
+class TestCompute:
+
+    def test_stabiel(self, conn):
+        assert config_fingerprint.compute(conn, 1) == config_fingerprint.compute(conn, 1)
+        assert config_fingerprint.compute(conn, 1) != config_fingerprint.compute(conn, 2)
+
+    @pytest.mark.parametrize('wijziging', [
+        "UPDATE criteria SET parameters='{\"llm_criteria_prompt\": \"Streng beoordelen.\"}' WHERE id=901",
+        "UPDATE criteria SET severity='error' WHERE id=901",
+        "UPDATE sections SET alternative_names='[\"intro\"]' WHERE identifier='inleiding'",
+        "INSERT INTO criteria_section_mappings (criteria_id, section_id, is_excluded) VALUES (901, 1, 1)",
+        "UPDATE document_types SET default_llm_role_prompt='Je bent een jurist.' WHERE id=1",
+        "DELETE FROM document_type_criteria_mappings WHERE criteria_id=901",
+    ])
+    def test_wijziging_verandert_fingerprint(self, conn, wijziging):
+        before = config_fingerprint.compute(conn, 1)
+        conn.execute(wijziging)
+        assert config_fingerprint.compute(conn, 1) != before
+
+    def test_opmaak_van_parameters_telt_niet(self, conn):
+        before = config_fingerprint.compute(conn, 1)
+        conn.execute("UPDATE criteria SET parameters='{ \"llm_criteria_prompt\" :  \"Beoordeel de argumentatie.\" }' "
+                     "WHERE id=901")
+        assert config_fingerprint.compute(conn, 1) == before
+
+
+class TestVeroudering:
+
+    def test_verouderde_analyses(self, conn):
+        fingerprint = config_fingerprint.refresh(conn, 1)
+        _add_document(conn, 1, fingerprint)
+        _add_document(conn, 2, None)                       # analyse van vóór de fingerprint
+        _add_document(conn, 3, None, status='pending')     # nog niet geanalyseerd
+        assert config_fingerprint.stale_documents(conn) == [2]
+        assert not config_fingerprint.is_stale(conn, 1)
+
+        conn.execute("UPDATE criteria SET severity='error' WHERE id=901")
+        config_fingerprint.refresh_all(conn)
+        assert config_fingerprint.stale_documents(conn, 1) == [1, 2]
+        assert config_fingerprint.is_stale(conn, 1)
+
+    def test_cache_key(self, conn):
+        _add_document(conn, 1, 'f' * 32)
+        _add_document(conn, 2, None)
+        assert config_fingerprint.cache_key(conn, 1) == 'abc:' + 'f' * 32
+        assert config_fingerprint.cache_key(conn, 2) is None
+
+
+class TestApi:
+
+    def test_fingerprint_en_verouderde_documenten(self, conn):
+        _add_document(conn, 1, 'oud')
+        app = Flask(__name__)
+        app.secret_key = 'test'
+        with app.test_request_context(), patch('routes.document_types.get_db', return_value=conn):
+            from flask import session
+            session.update(user_id=1, user_role='admin')
+            body = document_type_fingerprint_api(1).get_json()
+        assert body['fingerprint'] == config_fingerprint.compute(conn, 1)
+        assert (body['stale_count'], body['stale_documents']) == (1, [1])
@@ -0,0 +1,162 @@
+"""
+Unit-tests voor src/analysis/context_budget.py
+
+Dekt:
+1. Lokale tokenschatting per modelfamilie
+2. Inkorten op alinea-grenzen met rapportage
+3. Verdeling documentcontext / sectie / buursecties binnen één budget
+"""
+import json
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from analysis.context_budget import (
+    estimate_tokens,
+    fit_to_budget,
+    plan_call_context,
+    select_document_context,
+    split_paragraphs,
+)
+from conftest import make_criterion, make_section
+
+
+def _alineas(n, prefix='Alinea'):
+    return '\n\n'.join(f"{prefix} {i}: " + 'De onderzoeker beschrijft de juridische context. ' * 8
+                       for i in range(n))
+
+
+class TestEstimateTokens:
+
+    def test_leeg(self):
+        assert estimate_tokens('') == 0
+
+    def test_groeit_met_tekst(self):
+        kort = 'Dit is een korte zin.'
+        assert estimate_tokens(kort * 10) > estimate_tokens(kort)
+
+    def test_per_modelfamilie(self):
+        tekst = 'Aansprakelijkheidsverzekeringsovereenkomsten worden beoordeeld. ' * 20
+        assert estimate_tokens(tekst, 'gemini-2.5-flash') < estimate_tokens(tekst, 'claude-haiku-4-5')
+
+
+class TestFitToBudget:
+
+    def test_past_volledig(self):
+        tekst = _alineas(3)
+        out, report = fit_to_budget(tekst, 10_000)
+        assert out == tekst.strip()
+        assert report['truncated'] is False
+
+    def test_hele_alineas(self):
+        tekst = _alineas(20)
+        budget = estimate_tokens(_alineas(5)) + 10
+        out, report = fit_to_budget(tekst, budget)
+        assert report['truncated'] is True
+        assert report['tokens'] <= budget
+        # Alleen complete alinea's, in volgorde vanaf het begin
+        assert split_paragraphs(out) == split_paragraphs(tekst)[:report['kept_paragraphs']]
+
+    def test_te_lange_eerste_alinea_op_zinsgrens(self):
+        tekst = 'Een lange zin over het onderwerp. ' * 200
+        out, report = fit_to_budget(tekst, 50)
+        assert out.endswith('.')
+        assert 0 < report['tokens'] <= 50
+
+
+class TestDocumentContext:
+
+    def test_begin_en_einde_blijven_staan(self):
+        tekst = _alineas(60)
+        out, report = select_document_context(tekst, 'claude-haiku-4-5', 2000)
+        paragraphs = split_paragraphs(tekst)
+        assert report['truncated'] is True
+        assert report['tokens'] <= 2000
+        assert out.startswith(paragraphs[0])
+        assert out.endswith(paragraphs[-1])
+        assert 'weggelaten wegens contextbudget' in out
+
+    def test_identiek_voor_elke_call(self):
+        tekst = _alineas(60)
+        a, _ = select_document_context(tekst, 'claude-haiku-4-5', 2000)
+        b, _ = select_document_context(tekst, 'claude-haiku-4-5', 2000)
+        assert a == b
+
+
+class TestPlanCallContext:
+
+    def test_kort_document_geeft_sectie_meer_ruimte(self):
+        doc = _alineas(2)
+        sectie = _alineas(30, 'Sectie')
+        plan = plan_call_context(doc, sectie, 'claude-haiku-4-5', total_budget=6000, section_reserve=1000)
+        assert plan['report']['doc']['truncated'] is False
+        assert plan['report']['section']['tokens'] > 1000
+
+    def test_buren_alleen_bij_ingekorte_context(self):
+        buren = [('Inleiding', _alineas(2, 'Buur'))]
+        volledig = plan_call_context(_alineas(2), _alineas(1), 'claude-haiku-4-5',
+                                     total_budget=6000, section_reserve=1000,
+                                     neighbours=buren, neighbour_budget=500)
+        ingekort = plan_call_context(_alineas(80), _alineas(1), 'claude-haiku-4-5',
+                                     total_budget=4000, section_reserve=1500,
+                                     neighbours=buren, neighbour_budget=500)
+        assert volledig['neighbour_text'] == ''
+        assert "[BUURSECTIE: 'Inleiding']" in ingekort['neighbour_text']
+        assert ingekort['report']['truncated'] is True
+
+
+class TestCheckLlmReviewBudget:
+
+    def test_inkorting_wordt_geteld(self, monkeypatch):
+        import analysis.criterion_checking as cc
+        from config import Config
+        monkeypatch.setattr(Config, 'LLM_CONTEXT_TOKEN_BUDGET', 3000)
+        monkeypatch.setattr(Config, 'LLM_SECTION_TOKEN_BUDGET', 1000)
+        monkeypatch.setattr(Config, 'LLM_MAP_REDUCE_THRESHOLD_TOKENS', 0)
+
+        calls = []
+
+        def fake(model, system_prompt, cached_text, uncached_text, max_tokens=4096, response_schema=None):
+            calls.append(cached_text)
+            return {'text': '', 'input_tokens': 1, 'output_tokens': 1, 'cache_created': 0,
+                    'cache_read': 0, 'parsed': {'oordeel': 'goed', 'problemen': [], 'samenvatting': 'ok'}}
+
+        section = make_section(content=_alineas(40, 'Sectie'))
+        section['_full_doc_text'] = _alineas(100)
+        section['_document_id'] = 99
+        cc.reset_token_usage(99)
+        with patch.object(cc, '_call_llm', side_effect=fake):
+            cc.check_llm_review(make_criterion(check_type='llm_review', parameters=json.dumps({})), section)
+
+        assert estimate_tokens(calls[0]) < 3000
+        usage = cc.get_token_usage_summary(99)
+        assert usage['truncated_calls'] == 1
+        assert usage['context_tokens_dropped'] > 0
+
+
+class TestSplitIntoChunks:
+
+    def test_offsets_wijzen_naar_deeltekst(self):
+        from analysis.context_budget import split_into_chunks
+        tekst = _alineas(30)
+        chunks = split_into_chunks(tekst, 500)
+        assert len(chunks) > 1
+        for offset, chunk in chunks:
+            assert tekst[offset:offset + len(chunk)] == chunk
+            assert estimate_tokens(chunk) <= 500
+
+    def test_alle_alineas_komen_precies_een_keer_voor(self):
+        from analysis.context_budget import split_into_chunks
+        tekst = _alineas(30)
+        chunks = split_into_chunks(tekst, 500)
+        samengevoegd = [p for _, chunk in chunks for p in split_paragraphs(chunk)]
+        assert samengevoegd == split_paragraphs(tekst)
+
+    def test_te_grote_alinea_op_zinsgrenzen(self):
+        from analysis.context_budget import split_into_chunks
+        tekst = 'Een zin over het juridisch kader. ' * 300
+        chunks = split_into_chunks(tekst, 200)
+        assert len(chunks) > 1
+        assert all(chunk.endswith('.') for _, chunk in chunks)
@@ -290,3 +290,701 @@ class TestDocumentOnlyLlmRouting:
             "REGRESSIE: check_document_wide_criterion() mag NIET worden aangeroepen "
             "voor llm_review criteria (retourneert altijd None voor dat type)."
         )
+
+
+# ---------------------------------------------------------------------------
+# Prompt-indeling: alle LLM-calls op één document delen dezelfde cache-prefix
+# ---------------------------------------------------------------------------
+class TestPromptCachePrefix:
+
+    def _fake_llm(self, calls):
+        def fake(model, system_prompt, cached_text, uncached_text, max_tokens=4096, response_schema=None):
+            calls.append((system_prompt, cached_text, uncached_text))
+            return {
+                'text': json.dumps({'oordeel': 'goed', 'problemen': [], 'samenvatting': 'ok'}),
+                'input_tokens': 10, 'output_tokens': 5,
+                'cache_created': 0 if calls[:-1] else 100,
+                'cache_read': 100 if calls[:-1] else 0,
+            }
+        return fake
+
+    def test_persona_staat_niet_in_gedeelde_prefix(self):
+        """Criteria met eigen llm_role_prompt en de holistische review delen system + documentblok."""
+        import analysis.criterion_checking as cc
+
+        doc = 'Inleiding\n\n' + 'Dit is een alinea met voldoende inhoud voor de beoordeling. ' * 10
+        section = make_section(content='Dit is een alinea met voldoende inhoud voor de beoordeling. ' * 3)
+        section['_full_doc_text'] = doc
+        section['_document_id'] = 42
+
+        crit_a = make_criterion(check_type='llm_review',
+                                parameters=json.dumps({'llm_role_prompt': 'Je bent jurist.'}))
+        crit_b = make_criterion(check_type='llm_review',
+                                parameters=json.dumps({'llm_role_prompt': 'Je bent methodoloog.'}))
+
+        calls = []
+        cc.reset_token_usage(42)
+        with patch.object(cc, '_call_llm', side_effect=self._fake_llm(calls)):
+            cc.check_llm_review(crit_a, section)
+            cc.check_llm_review(crit_b, section)
+            cc.run_holistic_section_reviews([section], doc, document_id=42)
+
+        assert len(calls) == 3
+        systems = {c[0] for c in calls}
+        cached = {c[1] for c in calls}
+        assert len(systems) == 1, "Systeemprompt moet identiek zijn voor alle calls."
+        assert len(cached) == 1, "Gecacht documentblok moet identiek zijn voor alle calls."
+        assert 'Je bent jurist.' in calls[0][2]
+        assert 'Je bent methodoloog.' in calls[1][2]
+        assert 'jurist' not in calls[0][0]
+
+        usage = cc.get_token_usage_summary(42)
+        assert usage['calls'] == 3
+        assert usage['cache_read'] == 200
+        assert usage['cache_created'] == 100
+        assert usage['cache_hit_ratio'] == round(200 / 300, 3)
+
+
+# ---------------------------------------------------------------------------
+# Cache-warming: eerste LLM-taak draait alleen, daarna pas de fan-out
+# ---------------------------------------------------------------------------
+class TestCacheWarming:
+
+    def _patched(self, cc, warmer):
+        def fake(model, system_prompt, cached_text, uncached_text, max_tokens=4096, **kwargs):
+            return {'text': '{}', 'input_tokens': 1, 'output_tokens': 1,
+                    'cache_created': 50 if uncached_text == str(warmer) else 0,
+                    'cache_read': 0 if uncached_text == str(warmer) else 50}
+        return patch.object(cc, '_call_llm', side_effect=fake)
+
+    @staticmethod
+    def _call(cc, document_id, task):
+        cc._call_llm_with_retry('claude-haiku-4-5', 'systeem', 'document', str(task),
+                                max_tokens=10, label='TEST', document_id=document_id)
+
+    def test_eerste_taak_draait_voor_de_rest(self, monkeypatch):
+        import time
+        import analysis.criterion_checking as cc
+        from config import Config
+
+        monkeypatch.setattr(Config, 'LLM_MAX_WORKERS', 4)
+        monkeypatch.setattr(Config, 'LLM_CACHE_WARMUP', True)
+
+        events = []
+
+        def run_one(task):
+            events.append(('start', task))
+            time.sleep(0.02)
+            self._call(cc, 7, task)
+            events.append(('end', task))
+            return task * 10
+
+        cc.reset_token_usage(7)
+        with self._patched(cc, warmer=0):
+            results = cc._run_llm_tasks([0, 1, 2, 3], run_one, document_id=7, label='TEST')
+
+        assert sorted(r for _, r in results) == [0, 10, 20, 30]
+        # Taak 0 moet volledig klaar zijn voordat een andere taak start
+        assert events[0] == ('start', 0)
+        assert events[1] == ('end', 0)
+        assert cc.get_token_usage_summary(7)['cache_read'] == 150
+
+    def test_mislukte_warming_call_wordt_door_volgende_taak_overgenomen(self, monkeypatch):
+        import threading
+        import analysis.criterion_checking as cc
+        from config import Config
+
+        monkeypatch.setattr(Config, 'LLM_MAX_WORKERS', 4)
+        monkeypatch.setattr(Config, 'LLM_CACHE_WARMUP', True)
+
+        events = []
+
+        def run_one(task):
+            events.append(('start', task))
+            if task == 0:
+                # Een gelijktijdige call van hetzelfde document telt niet als antwoord
+                # op deze warming-call
+                other = threading.Thread(target=self._call, args=(cc, 6, 'ander'))
+                other.start()
+                other.join()
+                events.append(('end', task))
+                raise RuntimeError('overloaded')      # geen antwoord, geen cache
+            self._call(cc, 6, task)
+            events.append(('end', task))
+            return task
+
+        cc.reset_token_usage(6)
+        with self._patched(cc, warmer=1):
+            results = dict(cc._run_llm_tasks([0, 1, 2, 3], run_one, document_id=6, label='TEST'))
+
+        assert results == {0: None, 1: 1, 2: 2, 3: 3}
+        # Pas na de bevestigde cache-schrijf van taak 1 starten 2 en 3
+        assert events[:4] == [('start', 0), ('end', 0), ('start', 1), ('end', 1)]
+
+    def test_wachten_op_warming_begrensd(self, monkeypatch, caplog):
+        import threading
+        import analysis.criterion_checking as cc
+        from config import Config
+
+        monkeypatch.setattr(Config, 'LLM_MAX_WORKERS', 4)
+        monkeypatch.setattr(Config, 'LLM_CACHE_WARMUP', True)
+        monkeypatch.setattr(Config, 'LLM_CACHE_WARMUP_WAIT_S', 0)
+
+        cc.reset_token_usage(5)
+        cc._cache_warmed[5] = (threading.Event(), -1)      # warming van een andere fase loopt nog
+        with caplog.at_level('WARNING', logger='docucheck'):
+            results = cc._run_llm_tasks(['a', 'b'], str.upper, document_id=5, label='TEST')
+        cc.reset_token_usage(5)
+        assert sorted(r for _, r in results) == ['A', 'B']
+        assert 'niet klaar na 0s' in caplog.text
+
+    def test_geen_warming_bij_een_worker(self, monkeypatch):
+        import analysis.criterion_checking as cc
+        from config import Config
+
+        monkeypatch.setattr(Config, 'LLM_MAX_WORKERS', 1)
+        results = cc._run_llm_tasks(['a', 'b'], lambda t: t.upper(), label='TEST')
+        assert sorted(r for _, r in results) == ['A', 'B']
+
+    def test_gelijktijdige_fases_warmen_een_keer(self, monkeypatch):
+        import threading
+        import time
+        import analysis.criterion_checking as cc
+        from config import Config
+
+        monkeypatch.setattr(Config, 'LLM_MAX_WORKERS', 4)
+        monkeypatch.setattr(Config, 'LLM_CACHE_WARMUP', True)
+
+        events = []
+        lock = threading.Lock()
+
+        def run_one(task):
+            with lock:
+                events.append(('start', task))
+            time.sleep(0.05)
+            with lock:
+                events.append(('end', task))
+            return task
+
+        cc.reset_token_usage(8)
+        criteria = threading.Thread(
+            target=cc._run_llm_tasks, args=(['c0', 'c1', 'c2'], run_one),
+            kwargs={'document_id': 8, 'label': 'CRITERIA'},
+        )
+        criteria.start()
+        time.sleep(0.01)
+        cc._run_llm_tasks(['h0', 'h1'], run_one, document_id=8, label='HOLISTISCH')
+        criteria.join()
+
+        # Alleen c0 warmt; geen enkele andere taak (ook niet van de tweede fase)
+        # start voordat c0 klaar is, en de tweede fase warmt niet opnieuw.
+        assert events[:2] == [('start', 'c0'), ('end', 'c0')]
+        assert len(events) == 10
+
+    def test_geneste_aanroep_in_warming_taak_wacht_niet_op_zichzelf(self, monkeypatch):
+        import analysis.criterion_checking as cc
+        from config import Config
+
+        monkeypatch.setattr(Config, 'LLM_MAX_WORKERS', 4)
+        monkeypatch.setattr(Config, 'LLM_CACHE_WARMUP', True)
+
+        def run_one(task):
+            if task == 'lang':
+                # Zoals map-reduce: deel-calls via _run_llm_tasks binnen de warming-taak
+                parts = cc._run_llm_tasks(['d1', 'd2'], str.upper, document_id=9, label='MAP')
+                return sorted(r for _, r in parts)
+            return task
+
+        cc.reset_token_usage(9)
+        results = dict(cc._run_llm_tasks(['lang', 'kort'], run_one, document_id=9, label='TEST'))
+        assert results == {'lang': ['D1', 'D2'], 'kort': 'kort'}
+
+
+# ---------------------------------------------------------------------------
+# Streaming: incrementele parser + live feed
+# ---------------------------------------------------------------------------
+class TestStreamingLiveFeedback:
+
+    ANTWOORD = json.dumps({
+        'oordeel': 'matig',
+        'problemen': [
+            {'citaat': 'eerste citaat', 'probleem': 'Probleem {1}', 'suggestie': 'a'},
+            {'citaat': 'tweede "citaat"', 'probleem': 'Probleem 2', 'suggestie': 'b'},
+        ],
+        'samenvatting': 'Kan beter.',
+    })
+
+    def test_parser_geeft_entries_zodra_compleet(self):
+        from analysis.criterion_checking import _ProblemenStreamParser
+        parser = _ProblemenStreamParser()
+        emitted = []
+        for i in range(0, len(self.ANTWOORD), 7):
+            emitted.append(parser.feed(self.ANTWOORD[i:i + 7]))
+        flat = [p for chunk in emitted for p in chunk]
+        assert [p['probleem'] for p in flat] == ['Probleem {1}', 'Probleem 2']
+        assert parser.oordeel == 'matig'
+        # Het eerste probleem komt binnen vóór het einde van de stream
+        first_idx = next(i for i, chunk in enumerate(emitted) if chunk)
+        assert first_idx < len(emitted) - 1
+
+    def test_live_feed_ontvangt_items_tijdens_stream(self):
+        import analysis.criterion_checking as cc
+
+        def fake(model, system_prompt, cached_text, uncached_text, max_tokens=4096, on_text=None,
+                 response_schema=None):
+            assert on_text is not None, "Met live feed moet er gestreamd worden."
+            for i in range(0, len(self.ANTWOORD), 11):
+                on_text(self.ANTWOORD[i:i + 11])
+            return {'text': self.ANTWOORD, 'input_tokens': 1, 'output_tokens': 1,
+                    'cache_created': 0, 'cache_read': 0}
+
+        live = []
+        section = make_section(content='Voldoende lange sectie-inhoud om te beoordelen door het model.')
+        section['_live_feed'] = live.append
+        criterion = make_criterion(check_type='llm_review')
+
+        with patch.object(cc, '_call_llm', side_effect=fake):
+            result = cc.check_llm_review(criterion, section)
+
+        assert len(live) == 2
+        assert all(item['live'] for item in live)
+        assert live[0]['status'] == 'warning'
+        assert [r['message'] for r in result] == [i['message'] for i in live]
+
+    def test_live_feed_writer_flusht_laatste_items(self, tmp_path):
+        import sqlite3
+        from analysis_runner import LiveFeedWriter
+
+        path = str(tmp_path / 'live.db')
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE documents (id INTEGER PRIMARY KEY, analysis_data TEXT)')
+        conn.execute("INSERT INTO documents (id) VALUES (1)")
+        conn.commit()
+
+        writer = LiveFeedWriter(path, 1, min_interval=60)
+        writer({'message': 'een'})          # eerste item: direct weggeschreven
+        writer({'message': 'twee'})         # binnen min_interval: alleen gebufferd
+        stored = lambda: json.loads(conn.execute(
+            'SELECT analysis_data FROM documents WHERE id=1').fetchone()[0])['live_feedback']
+        assert [i['message'] for i in stored()] == ['een']
+        writer.flush()                      # laatste flush van de runner
+        assert [i['message'] for i in stored()] == ['een', 'twee']
+        conn.close()
+
+
+# ---------------------------------------------------------------------------
+# JSON-extractie uit vrije tekst + provider-native gestructureerde output
+# ---------------------------------------------------------------------------
+class TestExtractJson:
+
+    def test_preambule_en_code_fence(self):
+        from analysis.criterion_checking import _extract_json
+        raw = 'Eerst denk ik na {over dit}.\n```json\n{"oordeel": "goed", "problemen": [], "samenvatting": "x"}\n```'
+        assert _extract_json(raw)['oordeel'] == 'goed'
+
+    def test_voorkeur_voor_schema_object_boven_groter_object(self):
+        from analysis.criterion_checking import _extract_json
+        groot = json.dumps({'notities': ['a' * 200]})
+        klein = json.dumps({'oordeel': 'matig', 'problemen': [{'citaat': 'c', 'probleem': 'p'}]})
+        assert _extract_json(f'{groot} en dan {klein}')['oordeel'] == 'matig'
+
+    def test_genest_schema_object(self):
+        from analysis.criterion_checking import _extract_json
+        raw = 'Resultaat: ' + json.dumps({'resultaat': {'oordeel': 'goed', 'problemen': []}}) + ' klaar'
+        assert _extract_json(raw) == {'oordeel': 'goed', 'problemen': []}
+
+    def test_geen_json(self):
+        from analysis.criterion_checking import _extract_json
+        with pytest.raises(ValueError):
+            _extract_json('Geen object {hier')
+
+    def test_lineair_bij_veel_accolades(self):
+        """Veel losse '{' in de preambule mogen niet tot kwadratisch gedrag leiden."""
+        import time
+        from analysis.criterion_checking import _extract_json
+        obj = {'oordeel': 'goed', 'problemen': [{'citaat': 'x' * 50, 'probleem': 'y'}] * 200}
+        raw = 'denk {' * 2000 + json.dumps(obj)
+        start = time.perf_counter()
+        assert _extract_json(raw)['oordeel'] == 'goed'
+        assert time.perf_counter() - start < 1.0
+
+
+class TestStructuredOutput:
+
+    def _run(self, parameters, monkeypatch, structured=True):
+        import analysis.criterion_checking as cc
+        from config import Config
+        monkeypatch.setattr(Config, 'LLM_STRUCTURED_OUTPUT', structured)
+        seen = {}
+
+        def fake(model, system_prompt, cached_text, uncached_text, max_tokens=4096, response_schema=None):
+            seen['schema'] = response_schema
+            parsed = {'oordeel': 'goed', 'problemen': [], 'samenvatting': 'Gestructureerd.'}
+            if response_schema is not None:
+                return {'text': '', 'input_tokens': 1, 'output_tokens': 1,
+                        'cache_created': 0, 'cache_read': 0, 'parsed': parsed}
+            return {'text': 'Preambule. ' + json.dumps(parsed), 'input_tokens': 1, 'output_tokens': 1,
+                    'cache_created': 0, 'cache_read': 0}
+
+        section = make_section(content='Voldoende lange sectie-inhoud om te beoordelen door het model.')
+        criterion = make_criterion(check_type='llm_review', parameters=json.dumps(parameters))
+        with patch.object(cc, '_call_llm', side_effect=fake):
+            result = cc.check_llm_review(criterion, section)
+        return seen['schema'], result
+
+    def test_parsed_object_wordt_gebruikt(self, monkeypatch):
+        import analysis.criterion_checking as cc
+        schema, result = self._run({}, monkeypatch)
+        assert schema is cc._LLM_RESPONSE_JSON_SCHEMA
+        assert result['status'] == 'ok'
+        assert result['message'] == 'Gestructureerd.'
+
+    def test_per_criterium_uit_te_schakelen(self, monkeypatch):
+        schema, result = self._run({'llm_structured_output': False}, monkeypatch)
+        assert schema is None
+        assert result['message'] == 'Gestructureerd.'
+
+    def test_globaal_uit(self, monkeypatch):
+        schema, _ = self._run({}, monkeypatch, structured=False)
+        assert schema is None
+
+
+# ---------------------------------------------------------------------------
+# Map-reduce: lange secties in delen beoordelen i.p.v. afkappen
+# ---------------------------------------------------------------------------
+class TestMapReduceLongSections:
+
+    @staticmethod
+    def _lange_sectie():
+        return '\n\n'.join(
+            f"Alinea {i}: de wetgever regelt in artikel {i} de aansprakelijkheid. " * 6
+            for i in range(40)
+        )
+
+    def _run(self, monkeypatch, content, threshold=400):
+        import re
+        import analysis.criterion_checking as cc
+        from config import Config
+        monkeypatch.setattr(Config, 'LLM_MAP_REDUCE_THRESHOLD_TOKENS', threshold)
+        monkeypatch.setattr(Config, 'LLM_MAP_REDUCE_CHUNK_TOKENS', 600)
+        monkeypatch.setattr(Config, 'LLM_CACHE_WARMUP', False)
+        calls = []
+
+        def fake(model, system_prompt, cached_text, uncached_text, max_tokens=4096, response_schema=None):
+            calls.append(cached_text + '\n\n' + uncached_text)
+            eerste = re.search(r'Alinea (\d+):', calls[-1]).group(1)
+            parsed = {
+                'oordeel': 'matig',
+                'problemen': [
+                    {'citaat': f'in artikel {eerste} de aansprakelijkheid', 'probleem': 'Geen bron.'},
+                    # Hetzelfde probleem in elk deel → mag maar één keer in het resultaat
+                    {'citaat': 'de wetgever regelt', 'probleem': 'Vage formulering.'},
+                ],
+                'samenvatting': f'Deel vanaf alinea {eerste}.',
+            }
+            return {'text': '', 'input_tokens': 1, 'output_tokens': 1,
+                    'cache_created': 0, 'cache_read': 0, 'parsed': parsed}
+
+        section = make_section(content=content)
+        with patch.object(cc, '_call_llm', side_effect=fake):
+            result = cc.check_llm_review(make_criterion(check_type='llm_review'), section)
+        return calls, result
+
+    def test_lange_sectie_wordt_volledig_beoordeeld(self, monkeypatch):
+        content = self._lange_sectie()
+        calls, result = self._run(monkeypatch, content)
+
+        assert len(calls) > 1
+        assert all('DEEL VAN EEN LANGE SECTIE' in c for c in calls)
+        # De laatste alinea is in een van de delen terechtgekomen
+        assert any('Alinea 39:' in c for c in calls)
+
+        vaag = [r for r in result if r['message'] == 'Vage formulering.']
+        assert len(vaag) == 1
+        geen_bron = [r for r in result if r['message'] == 'Geen bron.']
+        assert len(geen_bron) == len(calls)
+        for item in geen_bron:
+            pos = item['citaat_offset']
+            assert content[pos:pos + len(item['offending_snippet'])] == item['offending_snippet']
+            assert item['chunk_offset'] <= pos
+
+    def test_korte_sectie_houdt_een_call(self, monkeypatch):
+        calls, result = self._run(monkeypatch, self._lange_sectie(), threshold=100_000)
+        assert len(calls) == 1
+        assert 'DEEL VAN EEN LANGE SECTIE' not in calls[0]
+        assert all('chunk_offset' not in r for r in result)
+
+
+# ---------------------------------------------------------------------------
+# Overlappende secties: parent met subsecties één keer per tekstbereik beoordelen
+# ---------------------------------------------------------------------------
+class TestOverlapAwareEvaluation:
+
+    DOC = ('1 Inleiding\nIk begin met een eigen inleidende tekst over het onderwerp.\n'
+           '1.1 Aanleiding\nIk beschrijf hier de aanleiding van het onderzoek.\n'
+           '1.2 Doelstelling\nIk formuleer hier het doel van het onderzoek.\n')
+
+    def _secties(self):
+        def sec(name, heading, start, end):
+            s = make_section(name=name, identifier=name.lower(),
+                             content=self.DOC[start:end].replace(heading, '', 1).strip())
+            s.update(start_char=start, end_char=end, heading_text=heading)
+            return s
+        a = self.DOC.index('1.1 Aanleiding')
+        d = self.DOC.index('1.2 Doelstelling')
+        return [
+            sec('Inleiding', '1 Inleiding', 0, len(self.DOC)),
+            sec('Aanleiding', '1.1 Aanleiding', a, d),
+            sec('Doelstelling', '1.2 Doelstelling', d, len(self.DOC)),
+        ]
+
+    def _run(self, criterion):
+        import analysis.criterion_checking as cc
+        return cc.generate_feedback(self.DOC, self._secties(), [criterion], None, 1, None)
+
+    def test_span_lokale_check_een_keer_per_tekstbereik(self):
+        crit = make_criterion(check_type='keyword_forbidden', application_scope='all',
+                              parameters=json.dumps({'keywords': ['ik']}))
+        items = [i for i in self._run(crit) if i['status'] != 'ok']
+        # Eén bevinding per tekstbereik: eigen tekst Inleiding + 2 subsecties
+        assert sorted(i['section_name'] for i in items) == ['Aanleiding', 'Doelstelling', 'Inleiding']
+        for item in items:
+            if item['section_name'] != 'Inleiding':
+                assert item['also_in_sections'] == ['Inleiding']
+
+    def _llm_review_secties(self, parameters='{}'):
+        import analysis.criterion_checking as cc
+        seen = {}
+
+        def fake_review(crit, sec, db_conn):
+            seen[sec['name']] = sec
+            return None
+
+        crit = make_criterion(check_type='llm_review', application_scope='all', parameters=parameters)
+        with patch.object(cc, 'check_llm_review', side_effect=fake_review):
+            self._run(crit)
+        return seen
+
+    def test_llm_review_parent_standaard_volledig(self):
+        seen = self._llm_review_secties()
+        assert set(seen) == {'Inleiding', 'Aanleiding', 'Doelstelling'}
+        assert 'aanleiding van het onderzoek' in seen['Inleiding']['content']
+        assert not seen['Inleiding'].get('_subsections_elsewhere')
+
+    def test_llm_review_parent_ziet_alleen_eigen_tekst(self):
+        seen = self._llm_review_secties(json.dumps({'overlap_dedupe': True}))
+
+        assert set(seen) == {'Inleiding', 'Aanleiding', 'Doelstelling'}
+        assert 'aanleiding van het onderzoek' not in seen['Inleiding']['content']
+        assert 'eigen inleidende tekst' in seen['Inleiding']['content']
+        assert seen['Inleiding']['_subsections_elsewhere'] == ['Aanleiding', 'Doelstelling']
+
+    def test_sectiebrede_check_beoordeelt_parent_volledig(self):
+        import analysis.criterion_checking as cc
+        units = cc._plan_overlap_units(self._secties(), self.DOC, span_local=False)
+        assert [(u[0]['name'], u[1]) for u in units] == [
+            ('Inleiding', []), ('Aanleiding', []), ('Doelstelling', []),
+        ]
+
+    def test_exact_zelfde_bereik_een_keer(self):
+        import analysis.criterion_checking as cc
+        secties = self._secties()
+        dubbel = dict(secties[1], name='Aanleiding (alias)', identifier='alias')
+        units = cc._plan_overlap_units(secties[1:2] + [dubbel], self.DOC, span_local=False)
+        assert len(units) == 1
+        assert units[0][1] == ['Aanleiding (alias)']
+
+
+# ---------------------------------------------------------------------------
+# Pipeline: holistische reviews gelijktijdig met de criteria
+# ---------------------------------------------------------------------------
+class TestHolisticPipelineOverlap:
+
+    def test_holistisch_loopt_gelijktijdig_met_lage_prioriteit(self):
+        import time
+        import analysis_runner
+        from analysis.llm_scheduler import PRIORITY_LOW
+
+        seen = {}
+
+        def fake_holistic(sections, full_text, **kwargs):
+            seen.update(kwargs)
+            sections[0]['_mutated'] = True
+            time.sleep(0.2)
+            return [{'criteria_name': 'Holistische review'}]
+
+        secties = [make_section()]
+        with patch.object(analysis_runner.criterion_checking, 'run_holistic_section_reviews',
+                          side_effect=fake_holistic):
+            t0 = time.time()
+            future = analysis_runner._start_holistic_reviews(secties, 'tekst', document_id=1)
+            time.sleep(0.2)                     # criteria-fase
+            items, duration = future.result()
+            elapsed = time.time() - t0
+
+        # Totale duur ≈ de langste fase, niet de som
+        assert elapsed < 0.35
+        assert duration >= 0.2
+        assert items == [{'criteria_name': 'Holistische review'}]
+        assert seen['priority'] == PRIORITY_LOW
+        # De holistische fase werkt op een kopie van de secties
+        assert '_mutated' not in secties[0]
+
+    def test_afbreken_stopt_en_wacht_op_holistisch(self):
+        """Bij een afgebroken job starten geen nieuwe secties meer en wacht de runner op de thread."""
+        import threading
+        import analysis_runner
+        import analysis.criterion_checking as cc
+
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def fake_llm(*args, **kwargs):
+            calls.append(kwargs.get('section_name'))
+            started.set()
+            release.wait(2)
+            return None, RuntimeError('afgebroken')
+
+        secties = [make_section(name=f'Sectie {i}', content='woord ' * 40) for i in range(3)]
+        with patch.object(cc, '_call_llm_with_retry', side_effect=fake_llm), \
+             patch('config.Config.LLM_MAX_WORKERS', 1):
+            future = analysis_runner._start_holistic_reviews(secties, 'tekst', document_id=77)
+            assert started.wait(2)
+            threading.Timer(0.1, release.set).start()
+            analysis_runner._stop_holistic_reviews(future)
+            assert future.done()
+        assert len(calls) == 1
+        analysis_runner._stop_holistic_reviews(None)
+
+
+# ---------------------------------------------------------------------------
+# Modelroutering: snel model eerst, escalatie naar het sterke model
+# ---------------------------------------------------------------------------
+class TestTieredRouting:
+
+    CONTENT = 'Voldoende lange sectie-inhoud om te beoordelen door het model.'
+
+    def _run(self, monkeypatch, replies, parameters=None, routing=None, strong='claude-sonnet-4-5',
+             content=None):
+        import analysis.criterion_checking as cc
+        from config import Config
+        monkeypatch.setattr(Config, 'LLM_FAST_MODEL', 'claude-haiku-4-5')
+        monkeypatch.setattr(Config, 'LLM_STRONG_MODEL', strong)
+        monkeypatch.setattr(Config, 'LLM_ESCALATE_ON', 'onvoldoende,matig')
+        monkeypatch.setattr(Config, 'LLM_ESCALATE_ABOVE_TOKENS', 1000)
+        models = []
+
+        def fake(model, system_prompt, cached_text, uncached_text, max_tokens=4096, response_schema=None):
+            models.append(model)
+            reply = replies[model]
+            result = {'text': reply if isinstance(reply, str) else '', 'input_tokens': 1000,
+                      'output_tokens': 100, 'cache_created': 0, 'cache_read': 0}
+            if isinstance(reply, dict):
+                result['parsed'] = reply
+            return result
+
+        section = make_section(content=content or self.CONTENT)
+        section['_document_id'] = 55
+        if routing:
+            section['_routing'] = routing
+        cc.reset_token_usage(55)
+        criterion = make_criterion(check_type='llm_review', parameters=json.dumps(parameters or {}))
+        with patch.object(cc, '_call_llm', side_effect=fake):
+            result = cc.check_llm_review(criterion, section)
+        return models, result, cc.get_token_usage_summary(55)
+
+    @staticmethod
+    def _reply(oordeel, probleem=None):
+        problemen = [{'citaat': 'sectie-inhoud om te beoordelen', 'probleem': probleem}] if probleem else []
+        return {'oordeel': oordeel, 'problemen': problemen, 'samenvatting': oordeel}
+
+    def test_geen_sterk_model_geen_escalatie(self, monkeypatch):
+        models, result, usage = self._run(
+            monkeypatch, {'claude-haiku-4-5': self._reply('matig', 'Vaag.')}, strong='')
+        assert models == ['claude-haiku-4-5']
+        assert result[0]['message'] == 'Vaag.'
+        assert usage['routed_reviews'] == 0
+
+    def test_zwak_oordeel_escaleert(self, monkeypatch):
+        models, result, usage = self._run(monkeypatch, {
+            'claude-haiku-4-5':  self._reply('matig', 'Snel oordeel.'),
+            'claude-sonnet-4-5': self._reply('onvoldoende', 'Sterk oordeel.'),
+        })
+        assert models == ['claude-haiku-4-5', 'claude-sonnet-4-5']
+        assert [i['message'] for i in result] == ['Sterk oordeel.']
+        assert usage['escalation_rate'] == 1.0
+        assert usage['escalation_reasons'] == {'oordeel=matig': 1}
+        assert usage['tiers']['snel']['models'] == ['claude-haiku-4-5']
+        assert usage['tiers']['sterk']['cost_usd'] > usage['tiers']['snel']['cost_usd'] > 0
+
+    def test_goed_oordeel_blijft_bij_snel_model(self, monkeypatch):
+        models, result, usage = self._run(monkeypatch, {'claude-haiku-4-5': self._reply('goed')})
+        assert models == ['claude-haiku-4-5']
+        assert result['status'] == 'ok'
+        assert usage['routed_reviews'] == 1
+        assert usage['escalations'] == 0
+
+    def test_ongeldige_json_escaleert(self, monkeypatch):
+        models, result, usage = self._run(monkeypatch, {
+            'claude-haiku-4-5':  'Geen JSON in dit antwoord.',
+            'claude-sonnet-4-5': self._reply('goed'),
+        }, parameters={'llm_structured_output': False})
+        assert models == ['claude-haiku-4-5', 'claude-sonnet-4-5']
+        assert result['status'] == 'ok'
+        assert usage['escalation_reasons'] == {'ongeldige JSON': 1}
+
+    def test_complexe_sectie_direct_naar_sterk_model(self, monkeypatch):
+        from config import Config
+        monkeypatch.setattr(Config, 'LLM_MAP_REDUCE_THRESHOLD_TOKENS', 0)
+        lang = 'Een uitgebreide juridische analyse van de aansprakelijkheid. ' * 200
+        models, _, usage = self._run(monkeypatch, {'claude-sonnet-4-5': self._reply('matig', 'X.')},
+                                     content=lang)
+        assert models == ['claude-sonnet-4-5']
+        assert usage['escalation_reasons'] == {'complexiteit': 1}
+
+    def _live(self, monkeypatch, replies, escalate_on='onvoldoende,matig'):
+        import analysis.criterion_checking as cc
+        from config import Config
+        monkeypatch.setattr(Config, 'LLM_FAST_MODEL', 'claude-haiku-4-5')
+        monkeypatch.setattr(Config, 'LLM_STRONG_MODEL', 'claude-sonnet-4-5')
+        monkeypatch.setattr(Config, 'LLM_ESCALATE_ON', escalate_on)
+        monkeypatch.setattr(Config, 'LLM_STREAMING', True)
+
+        def fake(model, system_prompt, cached_text, uncached_text, max_tokens=4096, on_text=None,
+                 response_schema=None):
+            text = json.dumps(replies[model])
+            for i in range(0, len(text), 13):
+                on_text(text[i:i + 13])
+            return {'text': text, 'input_tokens': 1, 'output_tokens': 1, 'cache_created': 0, 'cache_read': 0}
+
+        live = []
+        section = make_section(content=self.CONTENT)
+        section['_live_feed'] = live.append
+        with patch.object(cc, '_call_llm', side_effect=fake):
+            result = cc.check_llm_review(make_criterion(check_type='llm_review'), section)
+        return live, result
+
+    def test_live_feed_alleen_van_het_sterke_model_bij_escalatie(self, monkeypatch):
+        live, result = self._live(monkeypatch, {
+            'claude-haiku-4-5':  self._reply('matig', 'Snel oordeel.'),
+            'claude-sonnet-4-5': self._reply('onvoldoende', 'Sterk oordeel.'),
+        })
+        assert [i['message'] for i in live] == ['Sterk oordeel.']
+        assert [i['message'] for i in result] == ['Sterk oordeel.']
+
+    def test_live_feed_van_het_snelle_model_zonder_escalatie(self, monkeypatch):
+        live, result = self._live(monkeypatch, {'claude-haiku-4-5': self._reply('matig', 'Snel oordeel.')},
+                                  escalate_on='onvoldoende')
+        assert [i['message'] for i in live] == ['Snel oordeel.']
+        assert [i['message'] for i in result] == ['Snel oordeel.']
+
+    def test_documenttype_en_criterium_overschrijven(self, monkeypatch):
+        replies = {m: self._reply('matig', 'P.') for m in
+                   ('gemini-2.5-flash', 'claude-opus-4-1', 'claude-sonnet-4-5')}
+        routing = {'fast_model': 'gemini-2.5-flash', 'strong_model': 'claude-opus-4-1'}
+        models, _, _ = self._run(monkeypatch, replies, routing=routing)
+        assert models == ['gemini-2.5-flash', 'claude-opus-4-1']
+        # Criterium met vast llm_model: geen geërfde escalatie
+        models, _, _ = self._run(monkeypatch, replies, routing=routing,
+                                 parameters={'llm_model': 'claude-sonnet-4-5'})
+        assert models == ['claude-sonnet-4-5']
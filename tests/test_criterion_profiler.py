@@ -0,0 +1,124 @@
+"""
+Unit-tests voor src/analysis/criterion_profiler.py
+
+Dekt:
+1. generate_feedback legt per (criterium, sectie) tijd, CPU, LLM-calls, tokens en retries vast
+2. get_criteria_profile middelt per criterium over de laatste N analyses
+"""
+import json
+import os
+import sqlite3
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import analysis.criterion_checking as cc
+import db_utils
+from analysis import criterion_profiler
+from config import Config
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'CRITERION_PROFILING', True)
+    monkeypatch.setattr(Config, 'LLM_TELEMETRY', False)
+    connection = sqlite3.connect(str(tmp_path / 'profiel.db'))
+    db_utils.initialize_db(connection)
+    db_utils.migrate_db(connection)
+    yield connection
+    connection.close()
+
+
+def _sections():
+    return [{'name': naam, 'identifier': naam.lower(), 'found': True, 'level': 1, 'db_id': None,
+             'content': 'Ik beschrijf hier de bescherming van de huurder tegen opzegging. ' * 20,
+             'word_count': 200, 'headings': []}
+            for naam in ('Inleiding', 'Conclusie')]
+
+
+def _criteria():
+    return [
+        {'id': 201, 'name': 'Persoonlijk taalgebruik', 'rule_type': 'tekstueel',
+         'application_scope': 'all', 'check_type': 'keyword_forbidden', 'is_enabled': 1,
+         'severity': 'warning', 'color': '#F9C74F', 'max_mentions_per': 0,
+         'parameters': json.dumps({'keywords': ['ik']})},
+        {'id': 202, 'name': 'Argumentatie', 'rule_type': 'inhoudelijk',
+         'application_scope': 'all', 'check_type': 'llm_review', 'is_enabled': 1,
+         'severity': 'warning', 'color': '#84A98C', 'max_mentions_per': 0,
+         'parameters': json.dumps({'llm_criteria_prompt': 'Beoordeel de argumentatie.',
+                                   'llm_use_full_doc_context': False})},
+    ]
+
+
+_calls = []
+
+
+def _fake_llm(model, system_prompt, cached_text, uncached_text, max_tokens=4096, on_text=None,
+              response_schema=None):
+    _calls.append(model)
+    if len(_calls) == 1:
+        raise RuntimeError('429 rate_limit')     # eerste poging: retry
+    return {'text': json.dumps({'oordeel': 'goed', 'problemen': [], 'samenvatting': 'ok'}),
+            'input_tokens': 100, 'output_tokens': 20, 'cache_created': 0, 'cache_read': 0}
+
+
+class TestProfilering:
+
+    def test_meetwaarden_per_criterium_en_sectie(self, conn, monkeypatch):
+        monkeypatch.setattr(Config, 'LLM_MAX_WORKERS', 1)
+        _calls.clear()
+        with patch.object(cc, '_call_llm', side_effect=_fake_llm), \
+             patch('time.sleep'):
+            cc.generate_feedback('doc', _sections(), _criteria(), conn, 31, None)
+        assert 31 not in cc._profilers
+
+        conn.row_factory = sqlite3.Row
+        rows = {(r['criterion_id'], r['section_name']): dict(r)
+                for r in conn.execute('SELECT * FROM criterion_profile')}
+        assert set(rows) == {(201, 'Inleiding'), (201, 'Conclusie'),
+                             (202, 'Inleiding'), (202, 'Conclusie')}
+        assert len({r['run_at'] for r in rows.values()}) == 1
+
+        snel = rows[(201, 'Inleiding')]
+        assert snel['check_type'] == 'keyword_forbidden' and snel['llm_calls'] == 0
+        assert snel['wall_ms'] > 0
+
+        llm = [rows[(202, 'Inleiding')], rows[(202, 'Conclusie')]]
+        assert all(r['llm_calls'] == 1 and r['input_tokens'] == 100 and r['output_tokens'] == 20
+                   for r in llm)
+        assert sum(r['retries'] for r in llm) == 1
+        assert all(r['wall_ms'] > 0 and r['cpu_ms'] >= 0 for r in llm)
+
+    def test_uitgeschakeld(self, conn, monkeypatch):
+        monkeypatch.setattr(Config, 'CRITERION_PROFILING', False)
+        cc.generate_feedback('doc', _sections(), _criteria()[:1], conn, 32, None)
+        assert conn.execute('SELECT COUNT(*) FROM criterion_profile').fetchone()[0] == 0
+
+
+class TestAggregaat:
+
+    def _run(self, conn, document_id, wall_ms, llm_calls=0):
+        profile = criterion_profiler.CriterionProfile(document_id)
+        for section in ('Inleiding', 'Conclusie'):
+            with profile.measure(201, section, 'keyword_forbidden'):
+                pass
+            profile._entries[(201, section)]['wall_ms'] = wall_ms
+            for _ in range(llm_calls):
+                profile.add_llm_call(201, section, 2.0, 1, {'input_tokens': 50, 'output_tokens': 10})
+        criterion_profiler.save(conn, profile)
+
+    def test_gemiddelde_over_laatste_runs(self, conn):
+        self._run(conn, 1, wall_ms=1000, llm_calls=3)    # valt buiten de laatste 2
+        self._run(conn, 2, wall_ms=10, llm_calls=1)
+        self._run(conn, 3, wall_ms=30, llm_calls=1)
+
+        [(crit_id, p)] = criterion_profiler.get_criteria_profile(conn, last_n=2).items()
+        assert crit_id == 201
+        assert p['runs'] == 2 and p['evaluations'] == 4
+        assert p['wall_ms'] == 40.0           # (2×10 + 2×30) / 2 runs
+        assert p['max_wall_ms'] == 30.0
+        assert p['llm_calls'] == 2.0 and p['llm_latency_ms'] == 2000
+        assert p['tokens'] == 120 and p['share'] == 1.0
@@ -0,0 +1,110 @@
+"""
+Unit-tests voor src/analysis/dedupe.py (dubbele uploads herkennen)
+
+Dekt:
+1. Identiek bestand, zelfde type en criteria: analyse wordt overgenomen
+2. Andere criteria, ander type of gewijzigde inhoud: opnieuw analyseren
+3. stats: aantallen en bespaarde kosten voor /performance
+"""
+import json
+import os
+import sqlite3
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import db_utils
+from analysis import config_fingerprint, dedupe
+from config import Config
+
+CRITERIA = [{'id': 1, 'name': 'Bronvermelding', 'parameters': '{}'}]
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'ANALYSIS_DEDUPE', True)
+    connection = sqlite3.connect(str(tmp_path / 'dedupe.db'))
+    connection.row_factory = sqlite3.Row
+    db_utils.initialize_db(connection)
+    db_utils.migrate_db(connection)
+    # De verwachte secties (configuratie-fingerprint) worden op document_type_id gefilterd
+    if 'document_type_id' not in [r[1] for r in connection.execute('PRAGMA table_info(sections)')]:
+        connection.execute('ALTER TABLE sections ADD COLUMN document_type_id INTEGER')
+    yield connection
+    connection.close()
+
+
+@pytest.fixture(autouse=True)
+def _criteria():
+    with patch('db_utils.get_criteria_for_document_type', return_value=CRITERIA):
+        yield
+
+
+def _upload(conn, tmp_path, doc_id, content=b'scriptie', document_type_id=1, name=None):
+    path = tmp_path / (name or f'upload{doc_id}.docx')
+    path.write_bytes(content)
+    conn.execute("INSERT OR IGNORE INTO documents (id, name, original_filename, file_path, document_type_id) "
+                 "VALUES (?,?,?,?,?)", (doc_id, path.name, path.name, str(path), document_type_id))
+    conn.commit()
+    return dedupe.dedupe_upload(conn, doc_id, str(path), document_type_id)
+
+
+def _complete(conn, doc_id, cost=0.05, fingerprint=None):
+    data = {'feedback': [{'message': 'bron ontbreekt'}], 'live_feedback': [],
+            'token_usage': {'cost_usd': cost}}
+    type_id = conn.execute('SELECT document_type_id FROM documents WHERE id=?', (doc_id,)).fetchone()[0]
+    conn.execute("UPDATE documents SET analysis_status='completed', analysis_data=?, config_fingerprint=? "
+                 "WHERE id=?",
+                 (json.dumps(data), fingerprint or config_fingerprint.current(conn, type_id), doc_id))
+    conn.commit()
+
+
+class TestDedupeUpload:
+
+    def test_identiek_bestand_wordt_overgenomen(self, conn, tmp_path):
+        assert _upload(conn, tmp_path, 1) is None
+        _complete(conn, 1)
+        assert _upload(conn, tmp_path, 2) == 1
+        row = conn.execute('SELECT analysis_status, analysis_data, duplicate_of, file_hash FROM documents '
+                           'WHERE id=2').fetchone()
+        data = json.loads(row['analysis_data'])
+        assert (row['analysis_status'], row['duplicate_of']) == ('completed', 1)
+        assert data['feedback'] == [{'message': 'bron ontbreekt'}] and data['duplicate_of'] == 1
+        assert 'live_feedback' not in data
+        assert row['file_hash'] == dedupe.file_hash(str(tmp_path / 'upload2.docx'))
+        assert config_fingerprint.cache_key(conn, 2) == config_fingerprint.cache_key(conn, 1)
+
+    def test_andere_criteria_type_of_inhoud(self, conn, tmp_path):
+        _upload(conn, tmp_path, 1)
+        _complete(conn, 1, fingerprint='oude-configuratie')
+        assert _upload(conn, tmp_path, 2) is None                          # criteria gewijzigd
+        _complete(conn, 2)
+        assert _upload(conn, tmp_path, 3, document_type_id=2) is None      # ander documenttype
+        assert _upload(conn, tmp_path, 4, content=b'herzien') is None     # andere inhoud
+
+    def test_zelfde_pad_opnieuw_met_andere_inhoud(self, conn, tmp_path):
+        _upload(conn, tmp_path, 1, name='scriptie.docx')
+        _complete(conn, 1)
+        assert _upload(conn, tmp_path, 1, name='scriptie.docx') == 1      # ongewijzigd: eigen resultaat
+        assert _upload(conn, tmp_path, 1, content=b'herzien', name='scriptie.docx') is None
+
+    def test_uit_staat(self, conn, tmp_path, monkeypatch):
+        _upload(conn, tmp_path, 1)
+        _complete(conn, 1)
+        monkeypatch.setattr(Config, 'ANALYSIS_DEDUPE', False)
+        assert _upload(conn, tmp_path, 2) is None
+        assert conn.execute('SELECT file_hash FROM documents WHERE id=2').fetchone()[0]
+
+
+class TestStats:
+
+    def test_bespaarde_kosten(self, conn, tmp_path):
+        _upload(conn, tmp_path, 1)
+        _complete(conn, 1, cost=0.25)
+        _upload(conn, tmp_path, 2)
+        _upload(conn, tmp_path, 3, content=b'iets anders')
+        assert dedupe.stats(conn) == {'hashed_uploads': 3, 'duplicate_uploads': 1,
+                                      'hit_ratio': pytest.approx(1 / 3), 'saved_cost_usd': 0.25}
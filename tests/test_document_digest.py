@@ -0,0 +1,108 @@
+"""
+Unit-tests voor src/analysis/document_digest.py
+
+Dekt:
+1. Digest via (gemockte) LLM-call, met lokale aanvulling bij falen
+2. check_llm_review gebruikt de digest als gecachte context, tenzij llm_context_mode='full'
+"""
+import json
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import analysis.criterion_checking as cc
+from analysis import document_digest
+from analysis.context_budget import estimate_tokens
+from conftest import make_criterion, make_section
+
+
+def _secties():
+    inleiding = make_section(
+        name='Inleiding', identifier='inleiding',
+        content=('Dit onderzoek gaat over huurrecht. Onder huurbescherming wordt in dit onderzoek '
+                 'verstaan de wettelijke bescherming van de huurder. ' * 40),
+    )
+    inleiding['start_char'] = 0
+    probleem = make_section(
+        name='Probleemstelling', identifier='probleemstelling',
+        content=('De hoofdvraag luidt: in hoeverre beschermt het huurrecht de huurder tegen opzegging? '
+                 'Een deelvraag is: welke opzeggingsgronden kent de wet? ' + 'Toelichting. ' * 200),
+    )
+    probleem['start_char'] = 5000
+    return [probleem, inleiding]
+
+
+def _doc(secties):
+    return '\n\n'.join(s['content'] for s in sorted(secties, key=lambda s: s['start_char']))
+
+
+class TestBuildDocumentDigest:
+
+    def test_llm_digest(self):
+        secties = _secties()
+        parsed = {
+            'secties': [{'naam': 'Inleiding', 'samenvatting': 'Introductie huurrecht.'}],
+            'definities': [{'term': 'huurbescherming', 'omschrijving': 'wettelijke bescherming'}],
+            'onderzoeksvragen': ['In hoeverre beschermt het huurrecht de huurder?'],
+        }
+
+        def fake(model, system_prompt, cached_text, uncached_text, max_tokens=4096, response_schema=None):
+            assert 'OPBOUW VAN HET DOCUMENT' in uncached_text
+            return {'text': '', 'input_tokens': 1, 'output_tokens': 1,
+                    'cache_created': 0, 'cache_read': 0, 'parsed': parsed}
+
+        with patch.object(cc, '_call_llm', side_effect=fake):
+            digest = document_digest.build_document_digest(secties, _doc(secties))
+
+        assert digest['source'] == 'llm'
+        # Opbouw in documentvolgorde, ongeacht de volgorde van de invoerlijst
+        assert [o['naam'] for o in digest['outline']] == ['Inleiding', 'Probleemstelling']
+        assert 'Introductie huurrecht.' in digest['text']
+        assert 'huurbescherming: wettelijke bescherming' in digest['text']
+
+    def test_lokale_terugval(self):
+        secties = _secties()
+        with patch.object(cc, '_call_llm', side_effect=RuntimeError('geen API')):
+            digest = document_digest.build_document_digest(secties, _doc(secties))
+
+        assert digest['source'] == 'lokaal'
+        assert any('huurbescherming' in d['omschrijving'] for d in digest['definitions'])
+        assert any(q.startswith('De hoofdvraag luidt') for q in digest['research_questions'])
+        assert [s['naam'] for s in digest['sections']] == ['Inleiding', 'Probleemstelling']
+
+    def test_digest_veel_kleiner_dan_document(self):
+        secties = _secties()
+        with patch.object(cc, '_call_llm', side_effect=RuntimeError('geen API')):
+            digest = document_digest.build_document_digest(secties, _doc(secties))
+        assert digest['tokens'] * 3 < estimate_tokens(_doc(secties))
+
+
+class TestDigestAlsContext:
+
+    def _cached_text(self, parameters):
+        calls = []
+
+        def fake(model, system_prompt, cached_text, uncached_text, max_tokens=4096, response_schema=None):
+            calls.append((cached_text, uncached_text))
+            return {'text': '', 'input_tokens': 1, 'output_tokens': 1, 'cache_created': 0,
+                    'cache_read': 0, 'parsed': {'oordeel': 'goed', 'problemen': [], 'samenvatting': 'ok'}}
+
+        section = make_section(content='Voldoende lange sectie-inhoud om te beoordelen door het model.')
+        section['_full_doc_text'] = 'VOLLEDIGE TEKST van het document. ' * 20
+        section['_doc_digest_text'] = 'OPBOUW:\n- Inleiding (10 woorden)'
+        with patch.object(cc, '_call_llm', side_effect=fake):
+            cc.check_llm_review(make_criterion(check_type='llm_review', parameters=json.dumps(parameters)), section)
+        return calls[0]
+
+    def test_digest_is_standaard(self):
+        cached, uncached = self._cached_text({})
+        assert cached.startswith('[DOCUMENTSAMENVATTING — CONTEXT]')
+        assert 'VOLLEDIGE TEKST' not in cached
+        assert 'samenvatting van het hele document' in uncached
+
+    def test_per_criterium_terug_naar_volledige_tekst(self):
+        cached, _ = self._cached_text({'llm_context_mode': 'full'})
+        assert cached.startswith('[VOLLEDIG DOCUMENT — CONTEXT]')
+        assert 'VOLLEDIGE TEKST' in cached
@@ -0,0 +1,86 @@
+"""
+Unit-tests voor src/analysis/dry_run.py
+
+Dekt:
+1. De planner doorloopt de pijplijn zonder één LLM-call (_call_llm wordt niet aangeroepen)
+2. Aantal geplande calls: criteria × secties plus de holistische reviews
+3. Cache-boekhouding: de eerste call met een prefix schrijft, de volgende lezen
+4. Batch-projectie: kosten schalen met het aantal inzendingen, rate limits begrenzen de doorlooptijd
+"""
+import json
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import analysis.criterion_checking as cc
+from analysis import dry_run
+from config import Config
+
+_ZIN = "De verhuurder mag de huurovereenkomst alleen opzeggen op de gronden uit de wet. "
+
+
+def _sections(n=3):
+    return [{'name': f'Sectie {i}', 'identifier': f'sectie_{i}', 'found': True, 'level': 1,
+             'content': _ZIN * 60, 'word_count': 60 * 14}
+            for i in range(1, n + 1)]
+
+
+def _criteria(n=2):
+    return [{'id': 500 + i, 'name': f'LLM-criterium {i}', 'rule_type': 'inhoudelijk',
+             'application_scope': 'all', 'check_type': 'llm_review', 'is_enabled': 1,
+             'severity': 'warning', 'color': '#84A98C',
+             'parameters': json.dumps({'llm_criteria_prompt': 'Beoordeel de argumentatie.'})}
+            for i in range(n)]
+
+
+@pytest.fixture
+def geen_llm(monkeypatch):
+    monkeypatch.setattr(Config, 'LLM_DOCUMENT_DIGEST', False)
+    with patch.object(cc, '_call_llm', side_effect=AssertionError('dry-run mag geen LLM aanroepen')) as fake:
+        yield fake
+
+
+def _plan(documents=1, **kwargs):
+    secties = _sections()
+    doc = '\n\n'.join(s['content'] for s in secties)
+    return dry_run.plan_analysis(doc, secties, _criteria(), None, 1, documents=documents, history={}, **kwargs)
+
+
+class TestPlanning:
+
+    def test_geen_llm_calls(self, geen_llm):
+        _plan()
+        assert not geen_llm.called
+        assert not cc._dry_run_planners        # planner weer afgemeld
+
+    def test_aantal_calls(self, geen_llm):
+        plan = _plan()
+        assert plan['per_phase']['criteria']['calls'] == 2 * 3
+        assert plan['per_phase']['holistisch']['calls'] == 3
+        assert plan['totals']['calls'] == 9
+        assert {c['criterion_id'] for c in plan['per_criterion']} == {500, 501}
+        assert all(c['sections'] == 3 for c in plan['per_criterion'])
+
+    def test_cache_eerst_schrijven_dan_lezen(self, geen_llm):
+        calls = [c for c in _plan()['calls'] if c['phase'] == 'criteria']
+        eerste, *rest = calls
+        assert eerste['cache_created'] > 0 and eerste['cache_read'] == 0
+        assert all(c['cache_read'] == eerste['cache_created'] and c['cache_created'] == 0 for c in rest)
+
+
+class TestProjectie:
+
+    def test_batch_schaalt_met_aantal(self, geen_llm):
+        een, honderd = _plan(1), _plan(100)
+        assert honderd['batch_cost_usd'] == pytest.approx(een['totals']['cost_usd'] * 100, abs=0.01)
+        assert honderd['duration']['batch_s'] > een['duration']['batch_s']
+
+    def test_rate_limit_begrenst_doorlooptijd(self, geen_llm, monkeypatch):
+        monkeypatch.setattr(Config, 'LLM_RATE_LIMIT_RPM', 10)
+        plan = _plan(100)
+        assert plan['duration']['rate_limited']
+        assert plan['duration']['batch_s'] == pytest.approx(plan['totals']['calls'] * 100 / 10 * 60)
@@ -0,0 +1,188 @@
+"""
+Unit-tests voor de planning van src/analysis_queue.py (prioriteitsklassen en fair share)
+
+Dekt:
+1. Prioriteitsklassen: interactief vóór batch vóór achtergrond, veroudering van wachtende jobs
+2. Fair share: binnen een klasse de organisatie met de minste lopende jobs eerst
+3. Quota per organisatie: gelijktijdige jobs en tokens per uur, met eigen overschrijving
+4. queue_position en de status-API: plaats in de wachtrij en geschatte wachttijd
+"""
+import os
+import sqlite3
+import sys
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import analysis_queue
+import db_utils
+from analysis import batches
+from analysis.llm_scheduler import PRIORITY_LOW
+from config import Config
+from routes.documents import analysis_status_api
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'ANALYSIS_PRIORITY_AGING_S', 0)
+    monkeypatch.setattr(Config, 'ORG_MAX_RUNNING_JOBS', 0)
+    monkeypatch.setattr(Config, 'ORG_MAX_TOKENS_PER_HOUR', 0)
+    monkeypatch.setattr(Config, 'ANALYSIS_WORKERS', 2)
+    path = str(tmp_path / 'planning.db')
+    conn = sqlite3.connect(path)
+    db_utils.initialize_db(conn)
+    db_utils.migrate_db(conn)
+    conn.execute("INSERT INTO organizations (id, name) VALUES (901, 'School A'), (902, 'School B')")
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def conn(database):
+    connection = sqlite3.connect(database)
+    connection.row_factory = sqlite3.Row
+    yield connection
+    connection.close()
+
+
+def _add_document(conn, doc_id, organization_id=None, batch_id=None, status='pending'):
+    conn.execute(
+        "INSERT INTO documents (id, name, original_filename, file_path, document_type_id, organization_id, "
+        "analysis_status, batch_id) VALUES (?,?,?,?,1,?,?,?)",
+        (doc_id, f'doc{doc_id}', f'doc{doc_id}.docx', f'/tmp/planning_{doc_id}.docx', organization_id,
+         status, batch_id)
+    )
+    conn.commit()
+
+
+def _claim_all(database):
+    claimed = []
+    while True:
+        job = analysis_queue.claim(database, 'runner')
+        if job is None:
+            return claimed
+        claimed.append(job['document_id'])
+
+
+class TestPrioriteit:
+
+    def test_interactief_voor_batch_voor_achtergrond(self, database, conn):
+        batch_id = batches.create(conn, 1)
+        _add_document(conn, 1, status='completed')
+        analysis_queue.enqueue(conn, 1, 'criterion', {'criteria_id': 5})
+        _add_document(conn, 2, batch_id=batch_id)
+        analysis_queue.enqueue(conn, 2, 'full')
+        _add_document(conn, 3)
+        analysis_queue.enqueue(conn, 3, 'full')
+
+        priorities = dict(conn.execute('SELECT document_id, priority FROM analysis_jobs').fetchall())
+        assert priorities == {1: analysis_queue.PRIORITY_BACKGROUND, 2: analysis_queue.PRIORITY_BATCH,
+                              3: analysis_queue.PRIORITY_INTERACTIVE}
+        assert _claim_all(database) == [3, 2, 1]
+
+    def test_heranalyse_van_batchdocument_is_interactief(self, conn):
+        _add_document(conn, 1, batch_id=batches.create(conn, 1), status='completed')
+        analysis_queue.enqueue(conn, 1, 'partial', {'section_names': ['Inleiding']})
+        assert conn.execute('SELECT priority FROM analysis_jobs').fetchone()[0] == analysis_queue.PRIORITY_INTERACTIVE
+
+    def test_wachtende_job_schuift_op(self, database, conn, monkeypatch):
+        monkeypatch.setattr(Config, 'ANALYSIS_PRIORITY_AGING_S', 600)
+        _add_document(conn, 1, status='completed')
+        analysis_queue.enqueue(conn, 1, 'criterion', {'criteria_id': 5})
+        conn.execute("UPDATE analysis_jobs SET created_at=datetime('now', '-25 minutes')")
+        conn.commit()
+        _add_document(conn, 2)
+        analysis_queue.enqueue(conn, 2, 'full')
+        assert _claim_all(database) == [1, 2]
+
+    def test_llm_prioriteit_per_klasse(self, conn):
+        _add_document(conn, 1, batch_id=batches.create(conn, 1))
+        _add_document(conn, 2)
+        batch_job, _ = analysis_queue.enqueue(conn, 1, 'full')
+        interactive_job, _ = analysis_queue.enqueue(conn, 2, 'full')
+        assert analysis_queue.llm_priority(conn, batch_job) == PRIORITY_LOW
+        assert analysis_queue.llm_priority(conn, interactive_job) is None
+        assert analysis_queue.llm_priority(conn, None) is None
+
+
+class TestFairShare:
+
+    def test_organisatie_met_minste_lopende_jobs_eerst(self, database, conn):
+        for doc_id, org in ((1, 901), (2, 901), (3, 902)):
+            _add_document(conn, doc_id, organization_id=org)
+            analysis_queue.enqueue(conn, doc_id, 'full')
+        assert analysis_queue.claim(database, 'runner')['document_id'] == 1
+        # School A heeft een lopende job: de nieuwere job van school B gaat voor
+        assert analysis_queue.claim(database, 'runner')['document_id'] == 3
+        assert analysis_queue.claim(database, 'runner')['document_id'] == 2
+
+
+class TestQuota:
+
+    def test_maximaal_lopende_jobs_per_organisatie(self, database, conn, monkeypatch):
+        monkeypatch.setattr(Config, 'ORG_MAX_RUNNING_JOBS', 1)
+        for doc_id in (1, 2):
+            _add_document(conn, doc_id, organization_id=901)
+            analysis_queue.enqueue(conn, doc_id, 'full')
+        assert _claim_all(database) == [1]
+        position = analysis_queue.queue_position(conn, 2)
+        assert position['blocked'] == 'max_running_jobs'
+
+        conn.execute('UPDATE organizations SET max_running_jobs=2 WHERE id=901')
+        conn.commit()
+        assert _claim_all(database) == [2]
+
+    def test_tokens_per_uur(self, database, conn, monkeypatch):
+        monkeypatch.setattr(Config, 'ORG_MAX_TOKENS_PER_HOUR', 1000)
+        _add_document(conn, 1, organization_id=901, status='completed')
+        conn.execute("INSERT INTO llm_calls (created_at, document_id, input_tokens, output_tokens) "
+                     "VALUES (datetime('now', '-10 minutes'), 1, 900, 200)")
+        conn.commit()
+        _add_document(conn, 2, organization_id=901)
+        _add_document(conn, 3, organization_id=902)
+        analysis_queue.enqueue(conn, 2, 'full')
+        analysis_queue.enqueue(conn, 3, 'full')
+        assert _claim_all(database) == [3]
+        assert analysis_queue.organization_usage(conn)[901]['tokens_last_hour'] == 1100
+
+        conn.execute("UPDATE llm_calls SET created_at=datetime('now', '-2 hours')")
+        conn.commit()
+        assert _claim_all(database) == [2]
+
+
+class TestWachtrijpositie:
+
+    def test_positie_en_schatting(self, database, conn):
+        # Twee eerdere analyses van 60 s als basis voor de schatting
+        for doc_id in (1, 2):
+            _add_document(conn, doc_id, status='completed')
+            conn.execute(
+                "INSERT INTO analysis_jobs (document_id, kind, status, started_at, finished_at) "
+                "VALUES (?, 'full', 'done', datetime('now', '-70 seconds'), datetime('now', '-10 seconds'))",
+                (doc_id,))
+        for doc_id in (3, 4, 5, 6):
+            _add_document(conn, doc_id)
+            analysis_queue.enqueue(conn, doc_id, 'full')
+        analysis_queue.claim(database, 'runner')        # document 3 loopt, 1 runner nog vrij
+
+        assert analysis_queue.queue_position(conn, 3) is None
+        first = analysis_queue.queue_position(conn, 4)
+        assert (first['position'], first['running'], first['eta_s']) == (1, 1, 0)
+        last = analysis_queue.queue_position(conn, 6)
+        assert (last['position'], last['priority'], last['eta_s']) == (3, 'interactive', 60)
+
+    def test_status_api_toont_wachtrij(self, conn):
+        _add_document(conn, 1)
+        analysis_queue.enqueue(conn, 1, 'full')
+        app = Flask(__name__)
+        app.secret_key = 'test'
+        with app.test_request_context(), patch('routes.documents.get_db', return_value=conn):
+            from flask import session
+            session.update(user_id=1, user_role='user')
+            body = analysis_status_api(1).get_json()
+        assert body['status'] == 'pending'
+        assert body['queue']['position'] == 1
@@ -0,0 +1,201 @@
+"""
+Unit-tests voor src/analysis/llm_resilience.py
+
+Dekt:
+1. Circuit breaker: openen na fouten / trage calls, half-open proef-call, sluiten
+2. Failover naar het alternatieve model bij een open breaker
+3. Hedged requests: duplicaat na de p95, verliezer geannuleerd
+4. _call_llm_with_retry faalt direct bij een open breaker zonder alternatief
+"""
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from analysis import llm_resilience as res
+
+
+@pytest.fixture
+def config(monkeypatch):
+    from config import Config
+    monkeypatch.setattr(Config, 'LLM_BREAKER_FAILURES', 3)
+    monkeypatch.setattr(Config, 'LLM_BREAKER_COOLDOWN_S', 60)
+    monkeypatch.setattr(Config, 'LLM_BREAKER_SLOW_CALL_S', 0)
+    monkeypatch.setattr(Config, 'LLM_FAILOVER_MODELS', 'anthropic=gemini-2.5-flash,gemini=claude-haiku-4-5')
+    monkeypatch.setattr(Config, 'LLM_HEDGING', False)
+    res.reset_breakers()
+    return Config
+
+
+class TestCircuitBreaker:
+
+    def test_opent_na_opeenvolgende_fouten(self):
+        b = res.CircuitBreaker('anthropic', failure_threshold=3, cooldown_s=60, slow_call_s=0)
+        b.record_failure()
+        b.record_failure()
+        b.record_success(0.5)          # succes reset de teller
+        b.record_failure()
+        b.record_failure()
+        assert b.allow()
+        b.record_failure()
+        assert b.state == res.STATE_OPEN
+        assert not b.allow()
+        assert b.stats()['rejected'] == 1
+
+    def test_half_open_proef_call(self):
+        b = res.CircuitBreaker('anthropic', failure_threshold=1, cooldown_s=0.05, slow_call_s=0)
+        b.record_failure()
+        assert not b.allow()
+        time.sleep(0.06)
+        assert b.allow()               # één proef-call
+        assert not b.allow()           # de rest wacht op de uitkomst
+        b.record_success(0.2)
+        assert b.state == res.STATE_CLOSED
+
+    def test_trage_call_telt_als_fout(self):
+        b = res.CircuitBreaker('gemini', failure_threshold=2, cooldown_s=60, slow_call_s=1.0)
+        b.record_success(5.0)
+        b.record_success(6.0)
+        assert b.state == res.STATE_OPEN
+        assert b.stats()['slow_calls'] == 2
+
+    def test_percentielen(self):
+        b = res.CircuitBreaker('anthropic', failure_threshold=3, cooldown_s=60, slow_call_s=0)
+        for i in range(1, 101):
+            b.record_success(i / 10)
+        assert b.percentile(50) == 5.0
+        assert b.percentile(95) == 9.5
+        assert b.percentile(95, min_samples=500) is None
+
+
+class TestFailover:
+
+    def test_open_breaker_wijkt_uit_naar_alternatief(self, config):
+        for _ in range(3):
+            res.get_breaker('anthropic').record_failure()
+        calls = []
+        result, info = res.call_with_resilience('claude-haiku-4-5', lambda m, c: calls.append(m) or m)
+        assert calls == ['gemini-2.5-flash']
+        assert info['failover'] is True
+        assert result == 'gemini-2.5-flash'
+
+    def test_geen_alternatief_geeft_circuit_open(self, config, monkeypatch):
+        monkeypatch.setattr(config, 'LLM_FAILOVER_MODELS', '')
+        for _ in range(3):
+            res.get_breaker('anthropic').record_failure()
+        with pytest.raises(res.CircuitOpenError):
+            res.call_with_resilience('claude-haiku-4-5', lambda m, c: m)
+
+    def test_fouten_openen_breaker(self, config):
+        def boom(model, cancel):
+            raise RuntimeError('503')
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                res.call_with_resilience('claude-haiku-4-5', boom)
+        assert res.get_breaker('anthropic').state == res.STATE_OPEN
+
+    def test_rate_limit_en_4xx_openen_breaker_niet(self, config):
+        class BadRequest(Exception):
+            status_code = 400
+
+        errors = [RuntimeError('429 rate_limit_error'), BadRequest('invalid model'),
+                  RuntimeError('quota exceeded')] * 2
+        for exc in errors:
+            def boom(model, cancel, exc=exc):
+                raise exc
+            with pytest.raises(Exception):
+                res.call_with_resilience('claude-haiku-4-5', boom)
+        breaker = res.get_breaker('anthropic')
+        assert breaker.state == res.STATE_CLOSED and breaker.stats()['failures'] == 0
+
+    def test_herkenning_providerfouten(self):
+        class Overloaded(Exception):
+            status_code = 529
+
+        assert res.is_provider_fault(TimeoutError())
+        assert res.is_provider_fault(Overloaded('overloaded_error'))
+        assert res.is_provider_fault(RuntimeError('503 UNAVAILABLE'))
+        assert not res.is_provider_fault(RuntimeError('429 Too Many Requests'))
+        assert not res.is_provider_fault(ValueError('ongeldige JSON'))
+
+
+class TestHedging:
+
+    def test_duplicaat_wint_en_verliezer_wordt_geannuleerd(self, config, monkeypatch):
+        monkeypatch.setattr(config, 'LLM_HEDGING', True)
+        monkeypatch.setattr(config, 'LLM_HEDGE_MIN_SAMPLES', 5)
+        monkeypatch.setattr(config, 'LLM_HEDGE_MIN_DELAY_S', 0.05)
+        for _ in range(10):
+            res.get_breaker('anthropic').record_success(0.05)
+
+        primary_cancelled = threading.Event()
+
+        def call(model, cancel):
+            assert cancel is not None
+            if model == 'claude-haiku-4-5':
+                # Trage primaire call die tussen twee "fragmenten" de annulering ziet
+                for _ in range(200):
+                    if cancel.is_set():
+                        primary_cancelled.set()
+                        raise res.HedgeCancelled()
+                    time.sleep(0.01)
+                return 'primair'
+            return 'duplicaat'
+
+        t0 = time.time()
+        result, info = res.call_with_resilience('claude-haiku-4-5', call)
+        assert result == 'duplicaat'
+        assert info['hedged'] is True and info['model'] == 'gemini-2.5-flash'
+        assert time.time() - t0 < 1.0
+        assert primary_cancelled.wait(1.0)
+
+    def test_snelle_primaire_call_geen_duplicaat(self, config, monkeypatch):
+        monkeypatch.setattr(config, 'LLM_HEDGING', True)
+        monkeypatch.setattr(config, 'LLM_HEDGE_MIN_SAMPLES', 5)
+        monkeypatch.setattr(config, 'LLM_HEDGE_MIN_DELAY_S', 0.2)
+        for _ in range(10):
+            res.get_breaker('anthropic').record_success(0.2)
+        calls = []
+        result, info = res.call_with_resilience('claude-haiku-4-5', lambda m, c: calls.append(m) or 'ok')
+        assert calls == ['claude-haiku-4-5']
+        assert info['hedged'] is False
+
+
+class TestRetryMetBreaker:
+
+    def test_open_breaker_stopt_pogingen(self, config, monkeypatch):
+        import analysis.criterion_checking as cc
+        monkeypatch.setattr(config, 'LLM_FAILOVER_MODELS', '')
+        calls = []
+
+        def fake(model, system_prompt, cached_text, uncached_text, max_tokens=4096):
+            calls.append(model)
+            raise RuntimeError('overloaded')
+
+        with patch.object(cc, '_call_llm', side_effect=fake):
+            for _ in range(5):
+                result, exc = cc._call_llm_with_retry('claude-haiku-4-5', 's', 'c', 'u', 100, label='T')
+                assert result is None
+        # Na 3 fouten staat de breaker open: de overige calls bereiken de provider niet
+        assert len(calls) == 3
+        assert isinstance(exc, res.CircuitOpenError)
+
+    def test_failover_wordt_geteld(self, config):
+        import analysis.criterion_checking as cc
+        for _ in range(3):
+            res.get_breaker('anthropic').record_failure()
+
+        def fake(model, system_prompt, cached_text, uncached_text, max_tokens=4096):
+            return {'text': '{}', 'input_tokens': 1, 'output_tokens': 1, 'cache_created': 0, 'cache_read': 0}
+
+        cc.reset_token_usage(66)
+        with patch.object(cc, '_call_llm', side_effect=fake):
+            result, _ = cc._call_llm_with_retry('claude-haiku-4-5', 's', 'c', 'u', 100, label='T',
+                                                document_id=66)
+        assert result is not None
+        assert cc.get_token_usage_summary(66)['failover_calls'] == 1
@@ -0,0 +1,59 @@
+"""
+Unit-tests voor src/analysis/llm_scheduler.py — procesbrede priority-gate voor LLM-calls.
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from analysis.llm_scheduler import LlmScheduler, PRIORITY_HIGH, PRIORITY_LOW
+
+
+class TestLlmScheduler:
+
+    def test_nooit_meer_dan_max_gelijktijdig(self):
+        scheduler = LlmScheduler(2)
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def work():
+            with scheduler.slot():
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.01)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert peak[0] == 2
+        assert scheduler.stats() == {'max_concurrent': 2, 'active': 0, 'waiting': 0}
+
+    def test_hoge_prioriteit_eerst(self):
+        scheduler = LlmScheduler(1)
+        order = []
+        scheduler.acquire()   # bezet het enige slot
+
+        def wait_for(name, priority):
+            with scheduler.slot(priority):
+                order.append(name)
+
+        low = threading.Thread(target=wait_for, args=('laag', PRIORITY_LOW))
+        low.start()
+        while scheduler.stats()['waiting'] < 1:
+            time.sleep(0.001)
+        high = threading.Thread(target=wait_for, args=('hoog', PRIORITY_HIGH))
+        high.start()
+        while scheduler.stats()['waiting'] < 2:
+            time.sleep(0.001)
+
+        scheduler.release()
+        low.join()
+        high.join()
+        assert order == ['hoog', 'laag']
@@ -0,0 +1,114 @@
+"""
+Tests voor llm_stub_server.py (lokale Anthropic/Gemini-stub)
+
+Dekt:
+1. _call_llm met de echte SDK's tegen de stub (JSON, streaming, gestructureerde output)
+2. Prompt-cache-boekhouding: herhaalde prefix → cache_read
+3. Geïnjecteerde 429's worden als rate limit herkend
+4. Opnemen en afspelen van antwoorden (JSONL)
+"""
+import json
+import os
+import sys
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import analysis.criterion_checking as cc
+from config import Config
+from llm_stub_server import start_stub_server
+
+_CONTEXT = "Dit is een zin over het huurrecht en de bescherming van de huurder. " * 100
+_SECTIE = ("[TE BEOORDELEN SECTIE: 'Inleiding']\n"
+           "De huurder heeft recht op bescherming tegen opzegging door de verhuurder.\n"
+           "[/TE BEOORDELEN SECTIE]")
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    servers = []
+
+    def _start(**options):
+        options.setdefault('latency_median', 0.0)
+        options.setdefault('tokens_per_s', 0)
+        server = start_stub_server(**options)
+        servers.append(server)
+        monkeypatch.setattr(Config, 'ANTHROPIC_BASE_URL', server.url)
+        monkeypatch.setattr(Config, 'GEMINI_BASE_URL', server.url)
+        return server
+
+    yield _start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _stats(server) -> dict:
+    return json.load(urllib.request.urlopen(f"{server.url}/stats"))
+
+
+class TestCallLlmTegenStub:
+
+    @pytest.mark.parametrize('model', ['claude-haiku-4-5', 'gemini-2.5-flash'])
+    def test_gestructureerde_output(self, stub, model):
+        stub()
+        result = cc._call_llm(model, 'sys', _CONTEXT, _SECTIE,
+                              response_schema=cc._LLM_RESPONSE_JSON_SCHEMA)
+        assert result['parsed']['oordeel'] in ('goed', 'voldoende', 'matig', 'onvoldoende')
+        assert isinstance(result['parsed']['problemen'], list)
+        assert result['input_tokens'] > 0 and result['output_tokens'] > 0
+
+    @pytest.mark.parametrize('model', ['claude-haiku-4-5', 'gemini-2.5-flash'])
+    def test_streaming(self, stub, model):
+        server = stub()
+        fragmenten = []
+        result = cc._call_llm(model, 'sys', _CONTEXT, _SECTIE, on_text=fragmenten.append)
+        assert len(fragmenten) > 1
+        assert ''.join(fragmenten) == result['text']
+        cc._extract_json(result['text'])
+        assert _stats(server)['streamed'] == 1
+
+    def test_prompt_cache_bij_herhaalde_prefix(self, stub):
+        stub()
+        eerste = cc._call_llm('claude-haiku-4-5', 'sys', _CONTEXT, _SECTIE)
+        tweede = cc._call_llm('claude-haiku-4-5', 'sys', _CONTEXT, _SECTIE.replace('Inleiding', 'Slot'))
+        assert eerste['cache_created'] > 0 and eerste['cache_read'] == 0
+        assert tweede['cache_read'] == eerste['cache_created']
+
+    def test_geen_cache_onder_minimale_prefix(self, stub):
+        stub()
+        result = cc._call_llm('claude-haiku-4-5', 'sys', 'kort', _SECTIE)
+        assert result['cache_created'] == 0 and result['cache_read'] == 0
+
+    def test_rate_limit_wordt_herkend(self, stub):
+        server = stub(rate_limit_p=1.0)
+        with pytest.raises(Exception) as exc_info:
+            cc._call_llm('gemini-2.5-flash', 'sys', _CONTEXT, _SECTIE)
+        assert cc._is_rate_limit_error(exc_info.value)
+        assert _stats(server)['rate_limited'] >= 1
+
+
+class TestOpnemenEnAfspelen:
+
+    def test_opgenomen_antwoorden_worden_afgespeeld(self, stub, tmp_path):
+        opname = tmp_path / 'opname.jsonl'
+        stub(record=str(opname), seed=1)
+        origineel = cc._call_llm('claude-haiku-4-5', 'sys', _CONTEXT, _SECTIE)
+        regels = [json.loads(r) for r in opname.read_text(encoding='utf-8').splitlines()]
+        assert len(regels) == 1 and regels[0]['prompt_sha256']
+
+        stub(replies=str(opname), seed=2)
+        afgespeeld = cc._call_llm('claude-haiku-4-5', 'sys', _CONTEXT, _SECTIE)
+        assert afgespeeld['text'] == origineel['text']
+
+    def test_vast_antwoord_op_tekstfragment(self, stub, tmp_path):
+        replies = tmp_path / 'replies.jsonl'
+        antwoord = {'oordeel': 'onvoldoende', 'problemen': [], 'samenvatting': 'vast antwoord'}
+        replies.write_text(json.dumps({'contains': 'Inleiding', 'reply': antwoord}) + '\n', encoding='utf-8')
+        stub(replies=str(replies))
+        result = cc._call_llm('gemini-2.5-flash', 'sys', _CONTEXT, _SECTIE,
+                              response_schema=cc._LLM_RESPONSE_JSON_SCHEMA)
+        assert result['parsed'] == antwoord
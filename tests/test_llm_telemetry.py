@@ -0,0 +1,135 @@
+"""
+Unit-tests voor src/analysis/llm_telemetry.py
+
+Dekt:
+1. _call_llm_with_retry legt elke aanroep vast in llm_calls (ok en mislukt), gebundeld weggeschreven
+2. get_dashboard: latency-percentielen per model, tokens per documenttype, duurste criteria
+"""
+import os
+import sqlite3
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import analysis.criterion_checking as cc
+import db_utils
+from analysis import llm_telemetry
+from config import Config
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    path = str(tmp_path / 'telemetrie.db')
+    conn = sqlite3.connect(path)
+    db_utils.initialize_db(conn)
+    db_utils.migrate_db(conn)
+    conn.close()
+    monkeypatch.setattr(Config, 'LLM_TELEMETRY', True)
+    monkeypatch.setattr(Config, 'LLM_TELEMETRY_FLUSH_S', 60)
+    llm_telemetry.start_writer(path)
+    yield path
+    llm_telemetry.stop_writer()
+
+
+def _rows(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(r) for r in conn.execute('SELECT * FROM llm_calls ORDER BY id')]
+    finally:
+        conn.close()
+
+
+def _ok(model, system_prompt, cached_text, uncached_text, max_tokens=4096):
+    return {'text': '{}', 'input_tokens': 100, 'output_tokens': 20,
+            'cache_created': 0, 'cache_read': 900}
+
+
+class TestVastleggen:
+
+    def test_geslaagde_call(self, database):
+        with patch.object(cc, '_call_llm', side_effect=_ok):
+            cc._call_llm_with_retry('claude-haiku-4-5', 'sys', 'ctx', 'vraag', 512, label='test',
+                                    document_id=7, criterion_id=3, section_name='Inleiding')
+        assert _rows(database) == []        # nog in de wachtrij: niet op het hete pad geschreven
+        llm_telemetry.flush()
+
+        [row] = _rows(database)
+        assert (row['document_id'], row['criterion_id'], row['section_name']) == (7, 3, 'Inleiding')
+        assert row['model'] == 'claude-haiku-4-5' and row['outcome'] == 'ok' and row['attempts'] == 1
+        assert (row['input_tokens'], row['output_tokens'], row['cache_read']) == (100, 20, 900)
+        assert row['cost_usd'] > 0
+
+    def test_mislukte_call(self, database):
+        with patch.object(cc, '_call_llm', side_effect=RuntimeError('kapot')):
+            result, exc = cc._call_llm_with_retry('claude-haiku-4-5', 'sys', 'ctx', 'vraag', 512,
+                                                  label='test', document_id=7)
+        assert result is None
+        llm_telemetry.flush()
+        [row] = _rows(database)
+        assert row['outcome'] == 'fout' and row['input_tokens'] == 0
+
+    def test_latency_over_alle_pogingen(self, database):
+        import time
+        attempts = []
+        pause = time.sleep       # backoff na een rate-limit wordt hieronder overgeslagen
+
+        def _llm(*args, **kwargs):
+            attempts.append(1)
+            pause(0.05)
+            if len(attempts) < 3:
+                raise RuntimeError('429 rate_limit')
+            if len(attempts) == 3:
+                raise RuntimeError('kapot')
+
+        with patch.object(cc, '_call_llm', side_effect=_llm), patch('time.sleep'):
+            cc._call_llm_with_retry('claude-haiku-4-5', 'sys', 'ctx', 'vraag', 512, label='test', document_id=7)
+        llm_telemetry.flush()
+        [row] = _rows(database)
+        assert (row['outcome'], row['attempts']) == ('fout', 3)
+        assert row['latency_ms'] >= 150       # alle drie de pogingen, niet alleen de laatste
+
+    def test_zonder_writer_geen_effect(self, database):
+        llm_telemetry.stop_writer()
+        with patch.object(cc, '_call_llm', side_effect=_ok):
+            cc._call_llm_with_retry('claude-haiku-4-5', 'sys', 'ctx', 'vraag', 512, label='test')
+        llm_telemetry.flush()
+        assert _rows(database) == []
+
+
+class TestDashboard:
+
+    def test_aggregaten(self, database):
+        conn = sqlite3.connect(database)
+        conn.execute("INSERT INTO document_types (id, name, identifier) VALUES (90, 'Testtype telemetrie', 'testtype_telemetrie')")
+        conn.execute("INSERT INTO documents (id, name, original_filename, file_path, document_type_id) "
+                     "VALUES (10, 'doc', 'doc.docx', '/tmp/doc.docx', 90)")
+        conn.execute("INSERT INTO criteria (id, name, rule_type, application_scope) "
+                     "VALUES (95, 'Argumentatie', 'inhoudelijk', 'all')")
+        conn.commit()
+        for latency in range(1, 11):
+            llm_telemetry.record_call(document_id=10, criterion_id=95, model='claude-haiku-4-5',
+                                      latency=latency, llm_result={'input_tokens': 10, 'output_tokens': 5,
+                                                                   'cache_created': 0, 'cache_read': 30},
+                                      cost_usd=0.01)
+        llm_telemetry.record_call(document_id=10, model='gemini-2.5-flash', latency=0.5, outcome='fout')
+        llm_telemetry.flush()
+
+        dashboard = llm_telemetry.get_dashboard(conn)
+        conn.close()
+
+        assert dashboard['totals']['calls'] == 11 and dashboard['totals']['errors'] == 1
+        assert dashboard['totals']['cache_hit_ratio'] == 1.0
+        haiku = next(m for m in dashboard['per_model'] if m['model'] == 'claude-haiku-4-5')
+        assert (haiku['p50_s'], haiku['p95_s']) == (5.0, 10.0)
+        gemini = next(m for m in dashboard['per_model'] if m['model'] == 'gemini-2.5-flash')
+        assert gemini['p50_s'] is None and gemini['errors'] == 1
+        [doc_type] = dashboard['per_doc_type']
+        assert doc_type['document_type'] == 'Testtype telemetrie' and doc_type['documents'] == 1
+        assert doc_type['tokens_per_document'] == 10 * 45
+        [criterium] = dashboard['top_criteria']
+        assert criterium['name'] == 'Argumentatie' and criterium['calls'] == 10
+        assert criterium['cost_usd'] == 0.1
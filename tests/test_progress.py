@@ -0,0 +1,158 @@
+"""
+Unit-tests voor src/analysis/progress.py en de voortgangsstream (SSE)
+
+Dekt:
+1. ProgressReporter: stappen, afgeronde taken, ETA en seq in analysis_progress
+2. generate_feedback meldt de LLM-fase en elke afgeronde taak
+3. /api/analysis/<id>/events: progress-, feedback- en status-events, hervatten na Last-Event-ID
+"""
+import json
+import os
+import sqlite3
+import sys
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import analysis.criterion_checking as cc
+import db_utils
+from analysis.progress import ProgressReporter, read_progress
+from config import Config
+from routes.documents import analysis_events_api
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'ANALYSIS_SSE_INTERVAL_S', 0.01)
+    monkeypatch.setattr(Config, 'ANALYSIS_SSE_MAX_S', 5)
+    monkeypatch.setattr(Config, 'CRITERION_PROFILING', False)
+    path = str(tmp_path / 'voortgang.db')
+    conn = sqlite3.connect(path)
+    db_utils.initialize_db(conn)
+    db_utils.migrate_db(conn)
+    conn.execute("INSERT INTO documents (id, name, original_filename, file_path, analysis_status) "
+                 "VALUES (1, 'memo', 'memo.docx', '/tmp/memo.docx', 'analyzing')")
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def conn(database):
+    connection = sqlite3.connect(database)
+    yield connection
+    connection.close()
+
+
+def _events(body: str) -> list:
+    """Parse een SSE-body naar [(event, data, id)]."""
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n') if ': ' in line)
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data']), fields.get('id')))
+    return events
+
+
+class TestProgressReporter:
+
+    def test_stappen_en_taken(self, database, conn):
+        progress = ProgressReporter(database, 1, job_id=3, min_interval=0)
+        progress.stage('parse')
+        assert read_progress(conn, 1) == {'seq': 1, 'stage': 'parse', 'done': 0, 'total': 0, 'eta_s': None}
+
+        progress.stage('llm', total=4)
+        with patch('analysis.progress.time.time', side_effect=lambda: progress._stage_started + 2.0):
+            progress.task_done()
+        state = read_progress(conn, 1)
+        assert (state['stage'], state['done'], state['total']) == ('llm', 1, 4)
+        assert state['eta_s'] == pytest.approx(6.0)       # 2 s per taak, nog 3 taken
+        assert state['seq'] == 3
+
+    def test_taken_worden_gebundeld(self, database, conn):
+        progress = ProgressReporter(database, 1, min_interval=60)
+        progress.stage('llm', total=3)
+        progress.task_done()
+        assert read_progress(conn, 1)['done'] == 0        # binnen min_interval niet geschreven
+        progress.task_done(2)
+        assert read_progress(conn, 1)['done'] == 3        # laatste taak altijd
+
+
+class TestGenerateFeedback:
+
+    def test_meldt_llm_taken(self, database):
+        criterion = {'id': 5, 'name': 'Argumentatie', 'rule_type': 'inhoudelijk',
+                     'application_scope': 'all', 'check_type': 'llm_review', 'is_enabled': 1,
+                     'severity': 'warning', 'color': '#84A98C', 'max_mentions_per': 0,
+                     'parameters': json.dumps({'llm_criteria_prompt': 'Beoordeel.',
+                                               'llm_use_full_doc_context': False})}
+        sections = [{'name': naam, 'identifier': naam.lower(), 'found': True, 'level': 1,
+                     'db_id': None, 'content': f'{naam}: tekst. ' * 50, 'word_count': 100,
+                     'headings': []} for naam in ('Inleiding', 'Conclusie')]
+        progress = ProgressReporter(database, 1, min_interval=0)
+        with patch.object(cc, 'check_llm_review', return_value=None):
+            cc.generate_feedback('doc', sections, [criterion], None, 1, 7, progress=progress)
+        assert (progress.stage_name, progress.done, progress.total) == ('llm', 2, 2)
+
+
+class TestEventStream:
+
+    @pytest.fixture
+    def client(self, database):
+        app = Flask(__name__)
+        app.config.update(DATABASE=database, SECRET_KEY='test', TESTING=True)
+        app.add_url_rule('/api/analysis/<int:document_id>/events', 'analysis_events_api',
+                         analysis_events_api)
+        app.add_url_rule('/login', 'login', lambda: 'login')
+        with app.test_client() as client:
+            with client.session_transaction() as session:
+                session['user_id'] = 1
+            yield client
+
+    def test_voortgang_feedback_en_status(self, client, database, conn):
+        ProgressReporter(database, 1).stage('llm', total=2)
+        conn.execute("UPDATE documents SET analysis_data=? WHERE id=1",
+                     (json.dumps({'live_feedback': [{'message': 'a'}, {'message': 'b'}]}),))
+        conn.commit()
+
+        def _finish(*_):
+            conn.execute("UPDATE documents SET analysis_status='completed' WHERE id=1")
+            conn.commit()
+
+        with patch('routes.documents.time.sleep', side_effect=_finish):
+            resp = client.get('/api/analysis/1/events')
+            body = resp.get_data(as_text=True)       # de stream wordt pas hier gelezen
+        assert resp.mimetype == 'text/event-stream'
+        events = _events(body)
+        assert [e[0] for e in events] == ['progress', 'feedback', 'status']
+        assert events[0][1] == {'stage': 'llm', 'done': 0, 'total': 2, 'eta_s': None}
+        assert [i['message'] for i in events[1][1]['items']] == ['a', 'b'] and events[1][2] == '2'
+        assert events[2][1] == {'status': 'completed'}
+
+    def test_hervat_na_last_event_id(self, client, conn):
+        conn.execute("UPDATE documents SET analysis_data=? WHERE id=1",
+                     (json.dumps({'live_feedback': [{'message': 'a'}, {'message': 'b'}]}),))
+        conn.commit()
+
+        def _finish(*_):
+            conn.execute("UPDATE documents SET analysis_status='failed' WHERE id=1")
+            conn.commit()
+
+        with patch('routes.documents.time.sleep', side_effect=_finish):
+            resp = client.get('/api/analysis/1/events', headers={'Last-Event-ID': '1'})
+            events = _events(resp.get_data(as_text=True))
+        assert [i['message'] for e in events if e[0] == 'feedback' for i in e[1]['items']] == ['b']
+        assert events[-1][1] == {'status': 'failed'}
+
+    def test_wachtrij(self, client, conn):
+        conn.execute("UPDATE documents SET analysis_status='pending' WHERE id=1")
+        conn.commit()
+        with patch('routes.documents.time.sleep',
+                   side_effect=lambda *_: (conn.execute("UPDATE documents SET analysis_status='completed'"),
+                                           conn.commit())):
+            events = _events(client.get('/api/analysis/1/events').get_data(as_text=True))
+        assert events[0][:2] == ('progress', {'stage': 'queued', 'done': 0, 'total': 0, 'eta_s': None,
+                                              'position': None, 'blocked': None})
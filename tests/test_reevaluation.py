@@ -0,0 +1,227 @@
+"""
+Unit-tests voor src/analysis/reevaluation.py (herbeoordeling van één criterium)
+
+Dekt:
+1. Wachtrij: criterion-jobs laten het document op 'completed' en wijken voor een nieuwe analyse
+2. start / status / cancel: jobs voor voltooide documenten van de gekoppelde types
+3. run_criterion_reevaluation_background: herkenningscache, alleen de feedback van het
+   criterium vervangen, lage prioriteit, fingerprint bijwerken, annuleren
+"""
+import json
+import os
+import sqlite3
+import sys
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import analysis.criterion_checking as cc
+import analysis_queue
+import analysis_runner
+import db_utils
+from analysis import recognition_cache, reevaluation
+from analysis.llm_scheduler import PRIORITY_LOW
+from config import Config
+
+CRITERION = {'id': 901, 'name': 'Argumentatie', 'rule_type': 'inhoudelijk',
+             'application_scope': 'all', 'check_type': 'llm_review', 'is_enabled': 1,
+             'severity': 'warning', 'color': '#84A98C', 'max_mentions_per': 0,
+             'parameters': json.dumps({'llm_criteria_prompt': 'Beoordeel de argumentatie.',
+                                       'llm_use_full_doc_context': False})}
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'CRITERION_PROFILING', False)
+    monkeypatch.setattr(Config, 'LLM_TELEMETRY', False)
+    monkeypatch.setattr(Config, 'LLM_MAX_WORKERS', 1)
+    path = str(tmp_path / 'herbeoordeling.db')
+    conn = sqlite3.connect(path)
+    db_utils.initialize_db(conn)
+    db_utils.migrate_db(conn)
+    if 'document_type_id' not in [r[1] for r in conn.execute('PRAGMA table_info(sections)')]:
+        conn.execute('ALTER TABLE sections ADD COLUMN document_type_id INTEGER')
+    conn.execute("INSERT INTO criteria (id, name, rule_type, application_scope, is_enabled) "
+                 "VALUES (901, 'Argumentatie', 'inhoudelijk', 'all', 1)")
+    conn.execute("INSERT INTO criteria (id, name, rule_type, application_scope, is_enabled) "
+                 "VALUES (902, 'Bronnen', 'inhoudelijk', 'all', 1)")
+    conn.execute('INSERT INTO document_type_criteria_mappings (document_type_id, criteria_id) '
+                 'VALUES (1, 901), (1, 902)')
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def conn(database):
+    connection = sqlite3.connect(database)
+    connection.row_factory = sqlite3.Row
+    yield connection
+    connection.close()
+
+
+def _sections():
+    return [{'name': naam, 'identifier': naam.lower(), 'found': True, 'level': 1, 'db_id': None,
+             'content': f'{naam}: tekst over huur. ' * 20, 'word_count': 100, 'headings': []}
+            for naam in ('Inleiding', 'Conclusie')]
+
+
+def _add_document(conn, doc_id, document_type_id=1, status='completed', fingerprint='oud'):
+    data = {'feedback': [{'criteria_id': 901, 'section_name': 'Inleiding', 'message': 'oude argumentatie'},
+                         {'criteria_id': 5, 'section_name': 'Inleiding', 'message': 'bronnen'}]}
+    conn.execute(
+        "INSERT INTO documents (id, name, original_filename, file_path, document_type_id, analysis_status, "
+        "analysis_data, file_hash, config_fingerprint) VALUES (?,?,?,?,?,?,?,?,?)",
+        (doc_id, f'doc{doc_id}', f'doc{doc_id}.docx', f'/tmp/herbeoordeling_{doc_id}.docx', document_type_id,
+         status, json.dumps(data), f'hash{doc_id}', fingerprint)
+    )
+    conn.commit()
+
+
+class TestWachtrij:
+
+    def test_document_blijft_completed(self, database, conn):
+        _add_document(conn, 1)
+        analysis_queue.enqueue(conn, 1, 'criterion', {'criteria_id': 901})
+        job = analysis_queue.claim(database, 'runner')
+        assert job['kind'] == 'criterion'
+        assert conn.execute('SELECT analysis_status FROM documents WHERE id=1').fetchone()[0] == 'completed'
+
+    def test_nieuwe_analyse_vervangt_wachtende_herbeoordeling(self, conn):
+        _add_document(conn, 1)
+        old_id, _ = analysis_queue.enqueue(conn, 1, 'criterion', {'criteria_id': 901})
+        job_id, created = analysis_queue.enqueue(conn, 1, 'full')
+        assert created and job_id != old_id
+        assert conn.execute('SELECT status FROM analysis_jobs WHERE id=?', (old_id,)).fetchone()[0] == 'cancelled'
+        assert conn.execute('SELECT analysis_status FROM documents WHERE id=1').fetchone()[0] == 'pending'
+
+
+class TestBatch:
+
+    def test_start_status_en_annuleren(self, conn):
+        _add_document(conn, 1)
+        _add_document(conn, 2)
+        _add_document(conn, 3, status='failed')
+        _add_document(conn, 4, document_type_id=2)              # criterium niet gekoppeld
+        batch_id = reevaluation.start(conn, 901, {1: ('oud', 'nieuw')})
+        state = reevaluation.status(conn, batch_id)
+        assert (state['status'], state['total'], state['queued']) == ('running', 2, 2)
+
+        assert reevaluation.cancel(conn, batch_id) == 2
+        state = reevaluation.status(conn, batch_id)
+        assert (state['status'], state['queued'], state['cancelled']) == ('cancelled', 0, 2)
+        assert analysis_queue.active_job(conn, 1) is None
+
+    def test_tweede_wijziging_voegt_criterium_toe_aan_wachtende_job(self, conn):
+        _add_document(conn, 1)
+        first = reevaluation.start(conn, 901, {})
+        second = reevaluation.start(conn, 902, {})
+        jobs = conn.execute('SELECT payload FROM analysis_jobs').fetchall()
+        assert len(jobs) == 1
+        assert json.loads(jobs[0][0])['reevaluations'] == [{'criteria_id': 901, 'batch_id': first},
+                                                           {'criteria_id': 902, 'batch_id': second}]
+        assert (reevaluation.status(conn, second)['total'], reevaluation.status(conn, second)['queued']) == (1, 1)
+
+        # Annuleren van de eerste laat de tweede in de job staan
+        assert reevaluation.cancel(conn, first) == 1
+        payload = json.loads(conn.execute('SELECT payload FROM analysis_jobs').fetchone()[0])
+        assert payload['reevaluations'] == [{'criteria_id': 902, 'batch_id': second}]
+        assert reevaluation.status(conn, second)['queued'] == 1
+
+    def test_vervolgjob_na_lopende_job(self, database, conn):
+        _add_document(conn, 1)
+        reevaluation.start(conn, 901, {})
+        job = analysis_queue.claim(database, 'runner')
+        second = reevaluation.start(conn, 902, {})
+        assert reevaluation.status(conn, second)['queued'] == 1
+
+        assert analysis_queue.complete(database, job['id'], 'runner')
+        followup = analysis_queue.active_job(conn, 1)
+        assert followup['kind'] == 'criterion' and followup['status'] == 'queued'
+        assert json.loads(followup['payload'])['reevaluations'] == [{'criteria_id': 902, 'batch_id': second}]
+        assert reevaluation.status(conn, second)['queued'] == 1
+
+    def test_overgeslagen_naast_volledige_analyse(self, conn):
+        _add_document(conn, 1)
+        analysis_queue.enqueue(conn, 1, 'full')
+        conn.execute("UPDATE documents SET analysis_status='completed'")
+        conn.commit()
+        state = reevaluation.status(conn, reevaluation.start(conn, 901, {}))
+        assert (state['total'], state['skipped']) == (0, 1)
+
+    def test_klaar_als_alle_jobs_verwerkt_zijn(self, conn):
+        _add_document(conn, 1)
+        batch_id = reevaluation.start(conn, 901, {})
+        conn.execute("UPDATE analysis_jobs SET status='done'")
+        conn.commit()
+        state = reevaluation.status(conn, batch_id)
+        assert (state['status'], state['done'], state['progress']) == ('done', 1, 1.0)
+
+
+class TestRunner:
+
+    def _run(self, database, batch_id=None, calls=None):
+        calls = [] if calls is None else calls
+
+        def _llm(criterion, section, _db):
+            calls.append((section['name'], cc._document_priorities.get(1)))
+            return {'criteria_id': 901, 'criteria_name': 'Argumentatie', 'section_name': section['name'],
+                    'status': 'warning', 'message': f"nieuw {section['name']}", 'check_type': 'llm_review',
+                    'confidence': 0.9}
+
+        with patch('analysis.document_parsing.parse_document', side_effect=AssertionError('geparst')), \
+             patch('db_utils.get_criteria_for_document_type', return_value=[CRITERION]), \
+             patch.object(cc, 'check_llm_review', side_effect=_llm):
+            analysis_runner.run_criterion_reevaluation_background(
+                1, [{'criteria_id': 901, 'batch_id': batch_id}], Flask(__name__), database)
+        return calls
+
+    def _cache(self, database, conn):
+        key = recognition_cache.sections_key(db_utils.get_expected_sections(conn, 1))
+        recognition_cache.store(database, 1, 'hash1', key, 'volledige tekst', _sections())
+
+    def test_vervangt_alleen_feedback_van_het_criterium(self, database, conn):
+        _add_document(conn, 1)
+        self._cache(database, conn)
+        batch_id = reevaluation.start(conn, 901, {1: ('oud', 'nieuw')})
+        calls = self._run(database, batch_id)
+
+        assert sorted(calls) == [('Conclusie', PRIORITY_LOW), ('Inleiding', PRIORITY_LOW)]
+        row = conn.execute('SELECT analysis_status, analysis_data, config_fingerprint FROM documents '
+                           'WHERE id=1').fetchone()
+        messages = sorted(item['message'] for item in json.loads(row['analysis_data'])['feedback'])
+        assert messages == ['bronnen', 'nieuw Conclusie', 'nieuw Inleiding']
+        assert (row['analysis_status'], row['config_fingerprint']) == ('completed', 'nieuw')
+        assert 1 not in cc._document_priorities
+
+    def test_fingerprint_blijft_als_document_al_verouderd_was(self, database, conn):
+        _add_document(conn, 1, fingerprint='nog-ouder')
+        self._cache(database, conn)
+        self._run(database, reevaluation.start(conn, 901, {1: ('oud', 'nieuw')}))
+        assert conn.execute('SELECT config_fingerprint FROM documents WHERE id=1').fetchone()[0] == 'nog-ouder'
+
+    def test_opeenvolgende_wijzigingen_in_een_job(self, database, conn):
+        _add_document(conn, 1)
+        self._cache(database, conn)
+        first = reevaluation.start(conn, 901, {1: ('oud', 'tussen')})
+        second = reevaluation.start(conn, 902, {1: ('tussen', 'nieuw')})
+        with patch('db_utils.get_criteria_for_document_type', return_value=[CRITERION]), \
+             patch.object(cc, 'check_llm_review', return_value=None):
+            analysis_runner.run_criterion_reevaluation_background(
+                1, [{'criteria_id': 901, 'batch_id': first}, {'criteria_id': 902, 'batch_id': second}],
+                Flask(__name__), database)
+        row = conn.execute('SELECT analysis_data, config_fingerprint FROM documents WHERE id=1').fetchone()
+        assert row['config_fingerprint'] == 'nieuw'
+        assert sorted(json.loads(row['analysis_data'])['criterion_reevaluations']) == ['901', '902']
+
+    def test_geannuleerd_schrijft_niets(self, database, conn):
+        _add_document(conn, 1)
+        self._cache(database, conn)
+        batch_id = reevaluation.start(conn, 901, {})
+        reevaluation.cancel(conn, batch_id)
+        assert self._run(database, batch_id) == []
+        data = json.loads(conn.execute('SELECT analysis_data FROM documents WHERE id=1').fetchone()[0])
+        assert 'oude argumentatie' in [item['message'] for item in data['feedback']]
@@ -1,15 +1,16 @@
 """
 Tests voor opstart-gedrag van de applicatie.
 
-REGRESSIETEST: Documenten met status='analyzing' worden bij herstart
-automatisch teruggezet naar 'failed'.
-
-Bug: Als Flask crashte of herstartte midden in een analyse (bijv. door de
-debug-reloader die stdlib-bestanden bewaakt), bleef het document voor altijd
-op 'analyzing' staan en kon de gebruiker de analyse niet meer starten.
-
-Fix: Bij opstarten worden alle 'analyzing' documenten gereset naar 'failed'.
+Documenten met status='analyzing' die bij een herstart geen actieve job in de
+analysewachtrij hebben, worden automatisch opnieuw ingepland
+(analysis_queue.recover_interrupted).
+
+Oorspronkelijke bug: als Flask crashte of herstartte midden in een analyse (bijv.
+door de debug-reloader), bleef het document voor altijd op 'analyzing' staan.
+Eerste fix was terugzetten naar 'failed'; sinds de duurzame wachtrij gaat het werk
+niet meer verloren maar wordt het opnieuw opgepakt.
 """
+import json
 import sys
 import os
 import sqlite3
@@ -17,22 +18,19 @@ import pytest
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
+import analysis_queue
+import db_utils
+
 
 def _setup_db(db_path, statuses):
-    """Vul de test-DB met documenten met de opgegeven statussen."""
+    """Maak een test-DB met het volledige schema en documenten met de opgegeven statussen."""
     conn = sqlite3.connect(db_path)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS documents (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            filename TEXT NOT NULL,
-            original_filename TEXT NOT NULL,
-            analysis_status TEXT DEFAULT 'pending'
-        )
-    """)
+    db_utils.initialize_db(conn)
+    db_utils.migrate_db(conn)
     for i, status in enumerate(statuses):
         conn.execute(
-            "INSERT INTO documents (filename, original_filename, analysis_status) VALUES (?,?,?)",
-            (f'doc{i}.docx', f'Origineel{i}.docx', status)
+            "INSERT INTO documents (name, original_filename, file_path, analysis_status) VALUES (?,?,?,?)",
+            (f'doc{i}.docx', f'Origineel{i}.docx', f'/tmp/doc{i}.docx', status)
         )
     conn.commit()
     conn.close()
@@ -45,87 +43,69 @@ def _get_statuses(db_path):
     return {row[0]: row[1] for row in rows}
 
 
-class TestStuckAnalyseReset:
+def _jobs(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT document_id, status FROM analysis_jobs ORDER BY id").fetchall()
+    conn.close()
+    return rows
+
+
+class TestOnderbrokenAnalyseHerstel:
 
-    def test_analyzing_wordt_failed_bij_herstart(self, tmp_path):
-        """
-        REGRESSIE: Documenten met status 'analyzing' moeten bij herstart
-        worden teruggezet naar 'failed'.
-        """
+    def test_analyzing_wordt_opnieuw_ingepland(self, tmp_path):
+        """Documenten met status 'analyzing' krijgen bij herstart een nieuwe job."""
         db_path = str(tmp_path / 'test.db')
         _setup_db(db_path, ['analyzing', 'analyzing', 'completed'])
 
-        # Simuleer de reset-functie uit main.py
-        conn = sqlite3.connect(db_path)
-        result = conn.execute(
-            "UPDATE documents SET analysis_status='failed' "
-            "WHERE analysis_status='analyzing'"
-        )
-        rowcount = result.rowcount
-        conn.commit()
-        conn.close()
+        assert analysis_queue.recover_interrupted(db_path) == 2
 
         statuses = _get_statuses(db_path)
-        assert rowcount == 2, f"Verwacht 2 gereset, maar {rowcount} werden gereset."
-        assert statuses[1] == 'failed', "Doc 1 (was 'analyzing') moet 'failed' zijn."
-        assert statuses[2] == 'failed', "Doc 2 (was 'analyzing') moet 'failed' zijn."
+        assert statuses[1] == 'pending' and statuses[2] == 'pending'
         assert statuses[3] == 'completed', "Doc 3 (was 'completed') moet ongewijzigd blijven."
+        assert _jobs(db_path) == [(1, 'queued'), (2, 'queued')]
 
-    def test_pending_wordt_niet_gereset(self, tmp_path):
-        """'pending' documenten worden NIET gereset — alleen 'analyzing'."""
+    def test_pending_en_failed_worden_niet_aangeraakt(self, tmp_path):
         db_path = str(tmp_path / 'test.db')
         _setup_db(db_path, ['pending', 'analyzing', 'failed'])
 
+        analysis_queue.recover_interrupted(db_path)
+
+        statuses = _get_statuses(db_path)
+        assert statuses[1] == 'pending' and statuses[3] == 'failed'
+        assert _jobs(db_path) == [(2, 'queued')]
+
+    def test_document_met_actieve_job_niet_dubbel(self, tmp_path):
+        """Een document waarvan de job nog loopt (ander proces) krijgt geen tweede job."""
+        db_path = str(tmp_path / 'test.db')
+        _setup_db(db_path, ['analyzing'])
         conn = sqlite3.connect(db_path)
-        conn.execute(
-            "UPDATE documents SET analysis_status='failed' "
-            "WHERE analysis_status='analyzing'"
-        )
+        conn.execute("INSERT INTO analysis_jobs (document_id, status, lease_owner, lease_expires_at) "
+                     "VALUES (1, 'running', 'andere-host:1:1', datetime('now', '+60 seconds'))")
         conn.commit()
         conn.close()
 
-        statuses = _get_statuses(db_path)
-        assert statuses[1] == 'pending',   "'pending' mag niet worden gewijzigd."
-        assert statuses[2] == 'failed',    "'analyzing' → 'failed'."
-        assert statuses[3] == 'failed',    "'failed' blijft 'failed'."
+        assert analysis_queue.recover_interrupted(db_path) == 0
+        assert _jobs(db_path) == [(1, 'running')]
 
     def test_lege_db_geen_crash(self, tmp_path):
-        """Reset op lege DB mag niet crashen."""
+        """Herstel op een lege DB mag niet crashen."""
         db_path = str(tmp_path / 'empty.db')
-        conn = sqlite3.connect(db_path)
-        conn.execute("""
-            CREATE TABLE documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT, original_filename TEXT, analysis_status TEXT
-            )
-        """)
-        conn.commit()
-        conn.close()
+        _setup_db(db_path, [])
+        assert analysis_queue.recover_interrupted(db_path) == 0
 
+    def test_gedeeltelijke_heranalyse_blijft_gedeeltelijk(self, tmp_path):
+        """Een onderbroken heranalyse wordt opnieuw ingepland met dezelfde soort en secties."""
+        db_path = str(tmp_path / 'test.db')
+        _setup_db(db_path, ['analyzing'])
         conn = sqlite3.connect(db_path)
-        result = conn.execute(
-            "UPDATE documents SET analysis_status='failed' "
-            "WHERE analysis_status='analyzing'"
-        )
-        assert result.rowcount == 0
+        conn.execute("INSERT INTO analysis_jobs (document_id, kind, payload, status) "
+                     "VALUES (1, 'partial', '{\"section_names\": [\"Inleiding\"]}', 'failed')")
         conn.commit()
         conn.close()
 
-    def test_geen_analyzing_niets_veranderd(self, tmp_path):
-        """Als er geen 'analyzing' documenten zijn, verandert er niets."""
-        db_path = str(tmp_path / 'test.db')
-        _setup_db(db_path, ['completed', 'failed', 'pending'])
-
+        assert analysis_queue.recover_interrupted(db_path) == 1
         conn = sqlite3.connect(db_path)
-        result = conn.execute(
-            "UPDATE documents SET analysis_status='failed' "
-            "WHERE analysis_status='analyzing'"
-        )
-        assert result.rowcount == 0
-        conn.commit()
+        kind, payload = conn.execute(
+            "SELECT kind, payload FROM analysis_jobs WHERE status='queued'").fetchone()
         conn.close()
-
-        statuses = _get_statuses(db_path)
-        assert statuses[1] == 'completed'
-        assert statuses[2] == 'failed'
-        assert statuses[3] == 'pending'
+        assert kind == 'partial' and json.loads(payload) == {'section_names': ['Inleiding']}
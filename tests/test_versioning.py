@@ -0,0 +1,173 @@
+"""
+Unit-tests voor src/analysis/versioning.py (incrementele heranalyse van nieuwe versies)
+
+Dekt:
+1. Koppelen aan de vorige versie op bestandsnaam en op indeling
+2. plan_reuse: ongewijzigde secties hergebruiken, gewijzigde configuratie → alles opnieuw
+3. run_analysis_background: alleen gewijzigde secties gaan naar de LLM
+"""
+import json
+import os
+import sqlite3
+import sys
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import analysis.criterion_checking as cc
+import analysis_runner
+import db_utils
+from analysis import versioning
+from config import Config
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'ANALYSIS_INCREMENTAL', True)
+    monkeypatch.setattr(Config, 'CRITERION_PROFILING', False)
+    monkeypatch.setattr(Config, 'LLM_TELEMETRY', False)
+    monkeypatch.setattr(Config, 'LLM_DOCUMENT_DIGEST', False)
+    monkeypatch.setattr(Config, 'LLM_MAX_WORKERS', 1)
+    path = str(tmp_path / 'versies.db')
+    conn = sqlite3.connect(path)
+    db_utils.initialize_db(conn)
+    db_utils.migrate_db(conn)
+    # De weergave-query van de runner filtert secties op document_type_id
+    if 'document_type_id' not in [r[1] for r in conn.execute('PRAGMA table_info(sections)')]:
+        conn.execute('ALTER TABLE sections ADD COLUMN document_type_id INTEGER')
+    conn.execute("INSERT INTO document_types (id, name, identifier) VALUES (7, 'Scriptie (versies)', 'scriptie_versies')")
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def conn(database):
+    connection = sqlite3.connect(database)
+    connection.row_factory = sqlite3.Row
+    yield connection
+    connection.close()
+
+
+def _add_document(conn, doc_id, filename, user=1, status='pending', data=None):
+    conn.execute(
+        "INSERT INTO documents (id, name, original_filename, file_path, document_type_id, uploaded_by, "
+        "analysis_status, analysis_data) VALUES (?,?,?,?,7,?,?,?)",
+        (doc_id, filename, filename, f'/tmp/{doc_id}_{filename}', user, status,
+         json.dumps(data) if data is not None else None)
+    )
+    conn.commit()
+
+
+def _sections(conclusie='De huurder is beschermd.'):
+    return [{'name': naam, 'identifier': naam.lower(), 'found': True, 'level': 1, 'db_id': None,
+             'content': f'{naam}: {tekst} ' * 20, 'word_count': 100, 'headings': []}
+            for naam, tekst in (('Inleiding', 'Dit onderzoek gaat over huur.'), ('Conclusie', conclusie))]
+
+
+def _criteria():
+    return [{'id': 202, 'name': 'Argumentatie', 'rule_type': 'inhoudelijk',
+             'application_scope': 'all', 'check_type': 'llm_review', 'is_enabled': 1,
+             'severity': 'warning', 'color': '#84A98C', 'max_mentions_per': 0,
+             'parameters': json.dumps({'llm_criteria_prompt': 'Beoordeel de argumentatie.',
+                                       'llm_use_full_doc_context': False})}]
+
+
+class TestKoppelen:
+
+    def test_normalize_name(self):
+        assert versioning.normalize_name('Scriptie_Jansen_v3 (2).docx') == \
+            versioning.normalize_name('scriptie jansen definitief.docx')
+
+    def test_op_bestandsnaam(self, conn):
+        _add_document(conn, 1, 'Scriptie_Jansen_concept.docx', status='completed')
+        _add_document(conn, 2, 'Verslag stage.docx', status='completed')
+        _add_document(conn, 3, 'Scriptie_Jansen_v2.docx')
+        _add_document(conn, 4, 'Scriptie_Jansen_v2.docx', user=2)       # andere gebruiker
+        assert versioning.link_previous_version(conn, 3) == 1
+        assert conn.execute('SELECT previous_version_id FROM documents WHERE id=3').fetchone()[0] == 1
+        assert versioning.link_previous_version(conn, 4) is None
+
+    def test_op_indeling(self, conn):
+        data = {'sections': [{'name': 'Inleiding', 'found': True}, {'name': 'Conclusie', 'found': True}]}
+        _add_document(conn, 1, 'eerste.docx', status='completed', data=data)
+        _add_document(conn, 2, 'totaal_anders.docx')
+        assert versioning.link_previous_version(conn, 2, outline=['Inleiding', 'Conclusie']) == 1
+
+
+class TestPlanReuse:
+
+    def _previous(self, conn, signature='sig'):
+        sections = _sections()
+        _add_document(conn, 1, 'scriptie.docx', status='completed', data={
+            'section_hashes': versioning.section_hashes(sections),
+            'document_hash': 'oud',
+            'feedback': [
+                {'section_name': 'Inleiding', 'message': 'inleiding'},
+                {'section_name': 'Conclusie', 'message': 'conclusie'},
+                {'section_name': 'Hele Document', 'message': 'taal'},
+                {'section_name': 'Document', 'message': 'opmaak', 'check_type': 'formatting'},
+            ],
+        })
+        conn.execute('UPDATE documents SET config_fingerprint=? WHERE id=1', (signature,))
+        _add_document(conn, 2, 'scriptie_v2.docx')
+        versioning.link_previous_version(conn, 2)
+
+    def test_alleen_gewijzigde_secties(self, conn):
+        self._previous(conn)
+        hashes = versioning.section_hashes(_sections(conclusie='Een herschreven conclusie.'))
+        reuse = versioning.plan_reuse(conn, 2, hashes, 'sig', 'nieuw')
+        assert (reuse['changed'], reuse['unchanged'], reuse['doc_wide']) == ({'Conclusie'}, {'Inleiding'}, True)
+        assert [item['message'] for item in reuse['feedback']] == ['inleiding']
+        assert reuse['feedback'][0]['reused_from'] == 1
+
+    def test_ongewijzigde_tekst_hergebruikt_ook_documentbreed(self, conn):
+        self._previous(conn)
+        reuse = versioning.plan_reuse(conn, 2, versioning.section_hashes(_sections()), 'sig', 'oud')
+        assert not reuse['changed'] and not reuse['doc_wide']
+        assert [item['message'] for item in reuse['feedback']] == ['inleiding', 'conclusie', 'taal']
+
+    def test_andere_criteria_alles_opnieuw(self, conn):
+        self._previous(conn, signature='oude-configuratie')
+        assert versioning.plan_reuse(conn, 2, versioning.section_hashes(_sections()), 'sig', 'oud') is None
+
+
+class TestRunner:
+
+    def _run(self, database, document_id, sections, calls):
+        def _llm(criterion, section, _db):
+            calls.append(section['name'])
+            return {'criteria_id': 202, 'criteria_name': 'Argumentatie', 'section_name': section['name'],
+                    'status': 'warning', 'message': f"{section['name']} {len(calls)}", 'check_type': 'llm_review',
+                    'confidence': 0.9}
+
+        with patch('analysis.document_parsing.parse_document',
+                   return_value=(' '.join(s['content'] for s in sections), ['tekst'], [])), \
+             patch('db_utils.get_expected_sections', return_value=[]), \
+             patch('analysis.section_recognition.recognize_and_enrich_sections',
+                   return_value=(sections, [])), \
+             patch('analysis_runner.batch_save_section_content'), \
+             patch('db_utils.get_criteria_for_document_type', return_value=_criteria()), \
+             patch.object(cc, 'run_holistic_section_reviews', return_value=[]), \
+             patch.object(cc, 'check_llm_review', side_effect=_llm):
+            analysis_runner.run_analysis_background(document_id, Flask(__name__), database)
+
+    def test_tweede_versie_checkt_alleen_gewijzigde_sectie(self, database, conn):
+        _add_document(conn, 1, 'scriptie_concept.docx')
+        first, second = [], []
+        self._run(database, 1, _sections(), first)
+        assert sorted(first) == ['Conclusie', 'Inleiding']
+
+        _add_document(conn, 2, 'scriptie_definitief.docx')
+        versioning.link_previous_version(conn, 2)
+        self._run(database, 2, _sections(conclusie='Een herschreven conclusie.'), second)
+        assert second == ['Conclusie']
+
+        data = json.loads(conn.execute('SELECT analysis_data FROM documents WHERE id=2').fetchone()[0])
+        messages = sorted(item['message'] for item in data['feedback'])
+        assert messages == ['Conclusie 1', 'Inleiding 1']      # Inleiding uit versie 1
+        assert data['incremental']['previous_version_id'] == 1
+        assert data['incremental']['changed_sections'] == ['Conclusie']